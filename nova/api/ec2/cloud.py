@@ -47,6 +47,7 @@ from nova.objects import instance as instance_obj
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
+from nova.openstack.common import uuidutils
 from nova import quota
 from nova import servicegroup
 from nova import utils
@@ -208,6 +209,12 @@ def _format_mappings(properties, result):
         result['blockDeviceMapping'] = mappings
 
 
+def _uuids(resources, key):
+    """Returns the uuids in the key of resources, skipping other ids."""
+    return [resource[key] for resource in resources
+            if uuidutils.is_uuid_like(resource.get(key))]
+
+
 def db_to_inst_obj(context, db_instance):
     # NOTE(danms): This is a temporary helper method for converting
     # Instance DB objects to NovaObjects without needing to re-query.
@@ -232,6 +239,7 @@ class CloudController(object):
                                    security_group_api=self.security_group_api)
         self.keypair_api = compute_api.KeypairAPI()
         self.servicegroup_api = servicegroup.API()
+        ec2utils.preload_id_mappings()
 
     def __str__(self):
         return 'CloudController'
@@ -363,6 +371,14 @@ class CloudController(object):
         else:
             snapshots = self.volume_api.get_all_snapshots(context)
 
+        # Map the ec2 ids of every snapshot and of their volumes at once
+        # rather than while formatting each snapshot
+        ctxt = context.elevated()
+        ec2utils.get_int_ids_from_snapshot_uuids(ctxt,
+                                                 _uuids(snapshots, 'id'))
+        ec2utils.get_int_ids_from_volume_uuids(ctxt,
+                                               _uuids(snapshots, 'volume_id'))
+
         formatted_snapshots = []
         for s in snapshots:
             formatted = self._format_snapshot(context, s)
@@ -793,6 +809,16 @@ class CloudController(object):
                 volumes.append(volume)
         else:
             volumes = self.volume_api.get_all(context)
+
+        # Map the ec2 ids of every volume and of their instances and
+        # snapshots at once rather than while formatting each volume
+        ctxt = context.elevated()
+        ec2utils.get_int_ids_from_volume_uuids(ctxt, _uuids(volumes, 'id'))
+        ec2utils.get_int_ids_from_instance_uuids(
+            ctxt, _uuids(volumes, 'instance_uuid'))
+        ec2utils.get_int_ids_from_snapshot_uuids(
+            ctxt, _uuids(volumes, 'snapshot_id'))
+
         volumes = [self._format_volume(context, v) for v in volumes]
         return {'volumeSet': volumes}
 
@@ -1063,13 +1089,20 @@ class CloudController(object):
         return {'instancesSet': instances_set}
 
     def _format_instance_bdm(self, context, instance_uuid, root_device_name,
-                             result):
-        """Format InstanceBlockDeviceMappingResponseItemType."""
+                             result, bdms=None, volumes=None,
+                             volume_int_ids=None):
+        """Format InstanceBlockDeviceMappingResponseItemType.
+
+        bdms, volumes and volume_int_ids are the block device mappings of
+        the instance, and the volumes and their ec2 ids by volume id, when
+        the caller loaded them already.
+        """
         root_device_type = 'instance-store'
         mapping = []
-        for bdm in block_device.legacy_mapping(
-            db.block_device_mapping_get_all_by_instance(context,
-                                                        instance_uuid)):
+        if bdms is None:
+            bdms = db.block_device_mapping_get_all_by_instance(context,
+                                                               instance_uuid)
+        for bdm in block_device.legacy_mapping(bdms):
             volume_id = bdm['volume_id']
             if (volume_id is None or bdm['no_device']):
                 continue
@@ -1079,10 +1112,17 @@ class CloudController(object):
                 assert not bdm['virtual_name']
                 root_device_type = 'ebs'
 
-            vol = self.volume_api.get(context, volume_id)
+            vol = (volumes or {}).get(volume_id)
+            if vol is None:
+                vol = self.volume_api.get(context, volume_id)
             LOG.debug(_("vol = %s\n"), vol)
             # TODO(yamahata): volume attach time
-            ebs = {'volumeId': ec2utils.id_to_ec2_vol_id(volume_id),
+            if volume_int_ids and volume_id in volume_int_ids:
+                ec2_volume_id = ec2utils.id_to_ec2_id(
+                    volume_int_ids[volume_id], 'vol-%08x')
+            else:
+                ec2_volume_id = ec2utils.id_to_ec2_vol_id(volume_id)
+            ebs = {'volumeId': ec2_volume_id,
                    'deleteOnTermination': bdm['delete_on_termination'],
                    'attachTime': vol['attach_time'] or '',
                    'status': vol['attach_status'], }
@@ -1113,6 +1153,35 @@ class CloudController(object):
         result['groupSet'] = utils.convert_to_list_dict(
             security_group_names, 'groupId')
 
+    def _get_instances_bdms(self, context, instances):
+        """Loads the block device mappings of several instances at once.
+
+        Returns a dict of bdm lists keyed by instance uuid, and dicts of
+        the volumes they map and of the ec2 ids of these volumes, keyed by
+        volume id.
+        """
+        uuids = [instance['uuid'] for instance in instances]
+        bdms = dict((uuid, []) for uuid in uuids)
+        for bdm in db.block_device_mapping_get_all_by_instance_uuids(context,
+                                                                     uuids):
+            bdms[bdm['instance_uuid']].append(bdm)
+
+        volumes = {}
+        volume_ids = set([bdm['volume_id']
+                          for instance_bdms in bdms.itervalues()
+                          for bdm in instance_bdms if bdm['volume_id']])
+        volume_int_ids = ec2utils.get_int_ids_from_volume_uuids(
+            context.elevated(),
+            [volume_id for volume_id in volume_ids
+             if uuidutils.is_uuid_like(volume_id)])
+        if len(volume_ids) > 1:
+            # Volumes listed by a single request rather than one each,
+            # the ones it misses are looked up by _format_instance_bdm()
+            for volume in self.volume_api.get_all(context):
+                if volume['id'] in volume_ids:
+                    volumes[volume['id']] = volume
+        return bdms, volumes, volume_int_ids
+
     def _format_instances(self, context, instance_id=None, use_v6=False,
             instances_cache=None, **search_opts):
         # TODO(termie): this method is poorly named as its name does not imply
@@ -1126,6 +1195,14 @@ class CloudController(object):
 
         # NOTE(vish): instance_id is an optional list of ids to filter by
         if instance_id:
+            # Map the ec2 ids to uuids at once rather than id by id
+            int_ids = []
+            for ec2_id in instance_id:
+                try:
+                    int_ids.append(ec2utils.ec2_id_to_id(ec2_id))
+                except exception.InvalidEc2Id:
+                    pass
+            ec2utils.get_instance_uuids_from_int_ids(context, int_ids)
             instances = []
             for ec2_id in instance_id:
                 if ec2_id in instances_cache:
@@ -1148,18 +1225,39 @@ class CloudController(object):
             except exception.NotFound:
                 instances = []
 
+        if not context.is_admin:
+            instances = [instance for instance in instances
+                         if not pipelib.is_vpn_image(instance['image_ref'])]
+
+        # Look up what every instance needs in bulk rather than instance
+        # by instance
+        int_ids = ec2utils.get_int_ids_from_instance_uuids(
+            context.elevated(), [instance['uuid'] for instance in instances])
+        image_uuids = set()
+        for instance in instances:
+            image_uuids.add(instance['image_ref'])
+            image_uuids.update([instance[key]
+                                for key in ('kernel_id', 'ramdisk_id')
+                                if instance[key]])
+        image_ids = ec2utils.glance_ids_to_ids(context, image_uuids)
+        bdms, volumes, volume_int_ids = self._get_instances_bdms(context,
+                                                                 instances)
+        zones = ec2utils.get_availability_zones_by_hosts(
+            set([instance['host'] for instance in instances]))
+
         for instance in instances:
-            if not context.is_admin:
-                if pipelib.is_vpn_image(instance['image_ref']):
-                    continue
             i = {}
             instance_uuid = instance['uuid']
-            ec2_id = ec2utils.id_to_ec2_inst_id(instance_uuid)
+            ec2_id = ec2utils.id_to_ec2_id(int_ids[instance_uuid])
             i['instanceId'] = ec2_id
-            image_uuid = instance['image_ref']
-            i['imageId'] = ec2utils.glance_id_to_ec2_id(context, image_uuid)
-            self._format_kernel_id(context, instance, i, 'kernelId')
-            self._format_ramdisk_id(context, instance, i, 'ramdiskId')
+            i['imageId'] = ec2utils.image_ec2_id(
+                image_ids[instance['image_ref']])
+            if instance['kernel_id']:
+                i['kernelId'] = ec2utils.image_ec2_id(
+                    image_ids[instance['kernel_id']], 'aki')
+            if instance['ramdisk_id']:
+                i['ramdiskId'] = ec2utils.image_ec2_id(
+                    image_ids[instance['ramdisk_id']], 'ari')
             i['instanceState'] = _state_description(
                 instance['vm_state'], instance['shutdown_terminate'])
 
@@ -1197,10 +1295,10 @@ class CloudController(object):
             i['amiLaunchIndex'] = instance['launch_index']
             self._format_instance_root_device_name(instance, i)
             self._format_instance_bdm(context, instance['uuid'],
-                                      i['rootDeviceName'], i)
-            host = instance['host']
-            zone = ec2utils.get_availability_zone_by_host(host)
-            i['placement'] = {'availabilityZone': zone}
+                                      i['rootDeviceName'], i,
+                                      bdms[instance_uuid], volumes,
+                                      volume_int_ids)
+            i['placement'] = {'availabilityZone': zones[instance['host']]}
             if instance['reservation_id'] not in reservations:
                 r = {}
                 r['reservationId'] = instance['reservation_id']
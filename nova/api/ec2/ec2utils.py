@@ -16,9 +16,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import functools
 import re
 
+from oslo.config import cfg
+
 from nova import availability_zones
 from nova import context
 from nova import db
@@ -27,35 +28,239 @@ from nova.network import model as network_model
 from nova.objects import instance as instance_obj
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import log as logging
-from nova.openstack.common import memorycache
 from nova.openstack.common import timeutils
 from nova.openstack.common import uuidutils
+from nova import sharedcache
+
+ec2utils_opts = [
+    cfg.IntOpt('ec2_id_mapping_cache_size',
+               default=20000,
+               help='Number of ec2 id mappings of each kind of resource '
+                    'cached by each EC2 API worker'),
+    cfg.IntOpt('ec2_id_mapping_preload',
+               default=0,
+               help='Number of the most recently created ec2 id mappings '
+                    'of each kind of resource loaded in the cache when the '
+                    'EC2 API starts, 0 to load them on demand only'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(ec2utils_opts)
 
 LOG = logging.getLogger(__name__)
 # NOTE(vish): cache mapping for one week
 _CACHE_TIME = 7 * 24 * 60 * 60
-_CACHE = None
-
-
-def memoize(func):
-    @functools.wraps(func)
-    def memoizer(context, reqid):
-        global _CACHE
-        if not _CACHE:
-            _CACHE = memorycache.get_client()
-        key = "%s:%s" % (func.__name__, reqid)
-        key = str(key)
-        value = _CACHE.get(key)
+
+
+class _Generations(object):
+    """Dict of bounded size, evicting the least recently used entries.
+
+    Entries are set in a young generation, which becomes the old one
+    once it holds half the size.  Entries read from the old generation
+    move back to the young one, the others are dropped with it.
+    """
+
+    def __init__(self, size):
+        self._half_size = max(size // 2, 1)
+        self._young = {}
+        self._old = {}
+
+    def get(self, key):
+        value = self._young.get(key)
         if value is None:
-            value = func(context, reqid)
-            _CACHE.set(key, value, time=_CACHE_TIME)
+            value = self._old.pop(key, None)
+            if value is not None:
+                self.set(key, value)
         return value
-    return memoizer
+
+    def set(self, key, value):
+        self._young[key] = value
+        if len(self._young) >= self._half_size:
+            self._old = self._young
+            self._young = {}
+
+
+class IdMapping(object):
+    """Maps the uuids of a kind of resource to their ec2 ids and back.
+
+    The mappings never change once created, so each worker caches them
+    for itself, and in memcached or the cache segment shared by the API
+    workers when there is one.  Mappings missing from the caches are
+    looked up in the database in one query per batch.
+    """
+
+    def __init__(self, resource, get_ids, create, not_found):
+        self.resource = resource
+        self._get_ids = get_ids
+        self._create = create
+        self._not_found = not_found
+        self.reset()
+
+    def reset(self):
+        self._ids = _Generations(CONF.ec2_id_mapping_cache_size)
+        self._uuids = _Generations(CONF.ec2_id_mapping_cache_size)
+        self._store = None
+        self._store_checked = False
+        self.stats = dict(hits=0, shared_hits=0, misses=0, queries=0,
+                          created=0, preloaded=0)
+
+    def _get_store(self):
+        if not self._store_checked:
+            self._store = sharedcache.get_shared_client()
+            self._store_checked = True
+        return self._store
+
+    def _key(self, by_uuid, key):
+        return str('ec2-%s-%s:%s' % (self.resource,
+                                      'id' if by_uuid else 'uuid', key))
+
+    def _remember(self, mappings, share=True):
+        shared = {}
+        for uuid, int_id in mappings:
+            self._ids.set(uuid, int_id)
+            self._uuids.set(int_id, uuid)
+            shared[self._key(True, uuid)] = int_id
+            shared[self._key(False, int_id)] = uuid
+        store = self._get_store()
+        if share and shared and store is not None:
+            store.set_multi(shared, time=_CACHE_TIME)
+
+    def _get(self, context, keys, by_uuid):
+        local = self._ids if by_uuid else self._uuids
+        found = {}
+        for key in keys:
+            value = local.get(key)
+            if value is not None:
+                found[key] = value
+        self.stats['hits'] += len(found)
+        missing = [key for key in keys if key not in found]
+
+        store = self._get_store()
+        if missing and store is not None:
+            keys_by_shared_key = dict([(self._key(by_uuid, key), key)
+                                       for key in missing])
+            values = store.get_multi(keys_by_shared_key.keys())
+            mappings = []
+            for shared_key, value in values.iteritems():
+                key = keys_by_shared_key[shared_key]
+                found[key] = value
+                mappings.append((key, value) if by_uuid else (value, key))
+            self._remember(mappings, share=False)
+            self.stats['shared_hits'] += len(mappings)
+            missing = [key for key in missing if key not in found]
+
+        if missing:
+            if by_uuid:
+                mappings = self._get_ids(context, missing).items()
+            else:
+                mappings = db.ec2_id_mappings_get(context, self.resource,
+                                                  ids=missing)
+            self._remember(mappings)
+            for uuid, int_id in mappings:
+                if by_uuid:
+                    found[uuid] = int_id
+                else:
+                    found[int_id] = uuid
+            self.stats['misses'] += len(missing)
+            self.stats['queries'] += 1
+            LOG.debug(_('Looked up %(count)d %(resource)s ec2 id mappings, '
+                        'cache stats %(stats)s'),
+                      {'count': len(missing), 'resource': self.resource,
+                       'stats': self.stats})
+        return found
+
+    def get_ids(self, context, uuids):
+        """Returns the ec2 ids of uuids keyed by uuid, mapping new ones."""
+        uuids = set(uuids)
+        uuids.discard(None)
+        uuids = list(uuids)
+        ids = self._get(context, uuids, True)
+        for uuid in uuids:
+            if uuid not in ids:
+                ids[uuid] = self._create(context, uuid)['id']
+                self._remember([(uuid, ids[uuid])])
+                self.stats['created'] += 1
+        return ids
+
+    def get_id(self, context, uuid):
+        if uuid is None:
+            return
+        return self.get_ids(context, [uuid])[uuid]
+
+    def get_uuids(self, context, int_ids):
+        """Returns the uuids of the ec2 ids found, keyed by ec2 id."""
+        return self._get(context, list(set(int_ids)), False)
+
+    def get_uuid(self, context, int_id):
+        try:
+            int_id = int(int_id)
+        except (TypeError, ValueError):
+            raise self._not_found(int_id)
+        uuids = self.get_uuids(context, [int_id])
+        if int_id not in uuids:
+            raise self._not_found(int_id)
+        return uuids[int_id]
+
+    def preload(self, context, limit):
+        """Caches the most recently created mappings."""
+        # Oldest first, so that the most recent are evicted last
+        mappings = db.ec2_id_mappings_get(context, self.resource,
+                                          limit=limit)[::-1]
+        self._remember(mappings, share=False)
+        self.stats['preloaded'] += len(mappings)
+        self.stats['queries'] += 1
+
+
+_INSTANCES = IdMapping(
+    'instance',
+    lambda context, uuids: db.get_ec2_instance_ids_by_uuids(context, uuids),
+    lambda context, uuid: db.ec2_instance_create(context, uuid),
+    lambda int_id: exception.InstanceNotFound(instance_id=int_id))
+_VOLUMES = IdMapping(
+    'volume',
+    lambda context, uuids: db.get_ec2_volume_ids_by_uuids(context, uuids),
+    lambda context, uuid: db.ec2_volume_create(context, uuid),
+    lambda int_id: exception.VolumeNotFound(volume_id=int_id))
+_SNAPSHOTS = IdMapping(
+    'snapshot',
+    lambda context, uuids: db.get_ec2_snapshot_ids_by_uuids(context, uuids),
+    lambda context, uuid: db.ec2_snapshot_create(context, uuid),
+    lambda int_id: exception.SnapshotNotFound(snapshot_id=int_id))
+_IMAGES = IdMapping(
+    'image',
+    lambda context, uuids: db.s3_image_ids_get_by_uuids(context, uuids),
+    lambda context, uuid: db.s3_image_create(context, uuid),
+    lambda int_id: exception.ImageNotFound(image_id=int_id))
+
+_ID_MAPPINGS = (_INSTANCES, _VOLUMES, _SNAPSHOTS, _IMAGES)
 
 
 def reset_cache():
-    global _CACHE
-    _CACHE = None
+    for mapping in _ID_MAPPINGS:
+        mapping.reset()
+
+
+def preload_id_mappings():
+    """Caches the ec2 id mappings most recently created.
+
+    Meant to be called before the API workers are forked, so that they
+    share the pages of the mappings.
+    """
+    if CONF.ec2_id_mapping_preload <= 0:
+        return
+    ctxt = context.get_admin_context()
+    for mapping in _ID_MAPPINGS:
+        mapping.preload(ctxt, CONF.ec2_id_mapping_preload)
+    LOG.info(_('Preloaded ec2 id mappings: %s'),
+             ', '.join(['%d %s' % (mapping.stats['preloaded'],
+                                   mapping.resource)
+                        for mapping in _ID_MAPPINGS]))
+
+
+def get_id_mapping_stats():
+    """Returns the ec2 id mapping cache statistics of this worker."""
+    return dict([(mapping.resource, dict(mapping.stats))
+                 for mapping in _ID_MAPPINGS])
 
 
 def image_type(image_type):
@@ -100,21 +305,19 @@ def resource_type_from_id(context, resource_id):
     return known_types.get(type_marker)
 
 
-@memoize
 def id_to_glance_id(context, image_id):
     """Convert an internal (db) id to a glance id."""
-    return db.s3_image_get(context, image_id)['uuid']
+    return _IMAGES.get_uuid(context, image_id)
 
 
-@memoize
 def glance_id_to_id(context, glance_id):
     """Convert a glance id to an internal (db) id."""
-    if glance_id is None:
-        return
-    try:
-        return db.s3_image_get_by_uuid(context, glance_id)['id']
-    except exception.NotFound:
-        return db.s3_image_create(context, glance_id)['id']
+    return _IMAGES.get_id(context, glance_id)
+
+
+def glance_ids_to_ids(context, glance_ids):
+    """Convert several glance ids to internal (db) ids, keyed by glance id."""
+    return _IMAGES.get_ids(context, glance_ids)
 
 
 def ec2_id_to_glance_id(context, ec2_id):
@@ -175,6 +378,11 @@ def get_availability_zone_by_host(host, conductor_api=None):
         context.get_admin_context(), host, conductor_api)
 
 
+def get_availability_zones_by_hosts(hosts):
+    return availability_zones.get_hosts_availability_zones(
+        context.get_admin_context(), hosts)
+
+
 def id_to_ec2_id(instance_id, template='i-%08x'):
     """Convert an instance ID (int) to an ec2 ID (i-[base 16 number])."""
     return template % int(instance_id)
@@ -198,9 +406,8 @@ def ec2_inst_id_to_uuid(context, ec2_id):
     return get_instance_uuid_from_int_id(context, int_id)
 
 
-@memoize
 def get_instance_uuid_from_int_id(context, int_id):
-    return db.get_instance_uuid_by_ec2_id(context, int_id)
+    return _INSTANCES.get_uuid(context, int_id)
 
 
 def id_to_ec2_snap_id(snapshot_id):
@@ -275,29 +482,31 @@ def is_ec2_timestamp_expired(request, expires=None):
         return True
 
 
-@memoize
 def get_int_id_from_instance_uuid(context, instance_uuid):
-    if instance_uuid is None:
-        return
-    try:
-        return db.get_ec2_instance_id_by_uuid(context, instance_uuid)
-    except exception.NotFound:
-        return db.ec2_instance_create(context, instance_uuid)['id']
+    return _INSTANCES.get_id(context, instance_uuid)
+
+
+def get_int_ids_from_instance_uuids(context, instance_uuids):
+    """Returns the ec2 ids of several instance uuids, keyed by uuid."""
+    return _INSTANCES.get_ids(context, instance_uuids)
+
+
+def get_instance_uuids_from_int_ids(context, int_ids):
+    """Returns the uuids of the instance ec2 ids found, keyed by id."""
+    return _INSTANCES.get_uuids(context, int_ids)
+
+
+def get_int_ids_from_volume_uuids(context, volume_uuids):
+    """Returns the ec2 ids of several volume uuids, keyed by uuid."""
+    return _VOLUMES.get_ids(context, volume_uuids)
 
 
-@memoize
 def get_int_id_from_volume_uuid(context, volume_uuid):
-    if volume_uuid is None:
-        return
-    try:
-        return db.get_ec2_volume_id_by_uuid(context, volume_uuid)
-    except exception.NotFound:
-        return db.ec2_volume_create(context, volume_uuid)['id']
+    return _VOLUMES.get_id(context, volume_uuid)
 
 
-@memoize
 def get_volume_uuid_from_int_id(context, int_id):
-    return db.get_volume_uuid_by_ec2_id(context, int_id)
+    return _VOLUMES.get_uuid(context, int_id)
 
 
 def ec2_snap_id_to_uuid(ec2_id):
@@ -309,19 +518,17 @@ def ec2_snap_id_to_uuid(ec2_id):
     return get_snapshot_uuid_from_int_id(ctxt, int_id)
 
 
-@memoize
+def get_int_ids_from_snapshot_uuids(context, snapshot_uuids):
+    """Returns the ec2 ids of several snapshot uuids, keyed by uuid."""
+    return _SNAPSHOTS.get_ids(context, snapshot_uuids)
+
+
 def get_int_id_from_snapshot_uuid(context, snapshot_uuid):
-    if snapshot_uuid is None:
-        return
-    try:
-        return db.get_ec2_snapshot_id_by_uuid(context, snapshot_uuid)
-    except exception.NotFound:
-        return db.ec2_snapshot_create(context, snapshot_uuid)['id']
+    return _SNAPSHOTS.get_id(context, snapshot_uuid)
 
 
-@memoize
 def get_snapshot_uuid_from_int_id(context, int_id):
-    return db.get_snapshot_uuid_by_ec2_id(context, int_id)
+    return _SNAPSHOTS.get_uuid(context, int_id)
 
 
 _c2u = re.compile('(((?<=[a-z])[A-Z])|([A-Z](?![A-Z]|$)))')
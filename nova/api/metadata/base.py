@@ -97,45 +97,43 @@ class InvalidMetadataPath(Exception):
 class InstanceMetadata():
     """Instance metadata."""
 
+    # The sections of the metadata which need lookups are built on first
+    # use, by these methods
+    _LAZY_ATTRS = {
+        'availability_zone': '_load_availability_zone',
+        'ip_info': '_load_ip_info',
+        'security_groups': '_load_security_groups',
+        'mappings': '_load_mappings',
+        'ec2_ids': '_load_ec2_ids',
+        'network_info': '_load_network_info',
+        'content': '_load_content',
+        'files': '_load_content',
+        'network_config': '_load_content',
+        'vddriver': '_load_vddriver',
+        'conductor_api': '_load_conductor_api',
+    }
+
     def __init__(self, instance, address=None, content=None, extra_md=None,
                  conductor_api=None, network_info=None, vd_driver=None):
-        """Creation of this object should basically cover all time consuming
-        collection.  Methods after that should not cause time delays due to
-        network operations or lengthy cpu operations.
+        """Creation of this object only covers what the instance record
+        holds.  The sections needing lookups, like the network info or
+        the block device mappings, are looked up by the first method call
+        needing them and kept for the next ones.
 
         The user should then get a single instance and make multiple method
         calls on it.
         """
-        if not content:
-            content = []
-
         self.instance = instance
         self.extra_md = extra_md
 
         if conductor_api:
-            capi = conductor_api
-        else:
-            capi = conductor.API()
-
-        ctxt = context.get_admin_context()
-
-        self.availability_zone = ec2utils.get_availability_zone_by_host(
-                instance['host'], capi)
-
-        self.ip_info = ec2utils.get_ip_info_for_instance(ctxt, instance)
-
-        self.security_groups = capi.security_group_get_by_instance(ctxt,
-                                                              instance)
-
-        self.mappings = _format_instance_mapping(capi, ctxt, instance)
+            self.conductor_api = conductor_api
 
         if instance.get('user_data', None) is not None:
             self.userdata_raw = base64.b64decode(instance['user_data'])
         else:
             self.userdata_raw = None
 
-        self.ec2_ids = capi.get_ec2_ids(ctxt, instance)
-
         self.address = address
 
         # expose instance metadata.
@@ -145,42 +143,107 @@ class InstanceMetadata():
 
         self.uuid = instance.get('uuid')
 
-        self.content = {}
-        self.files = []
+        # 'content' is passed in from the configdrive code in
+        # nova/virt/libvirt/driver.py.  Thats how we get the injected files
+        # (personalities) in. AFAIK they're not stored in the db at all,
+        # so are not available later (web service metadata time).
+        self._injected_files = content or []
+
+        if network_info is not None:
+            self.network_info = network_info
+
+        self._vd_driver = vd_driver
+
+    def __getattr__(self, name):
+        # Only called for the attributes which aren't set yet
+        loader = self._LAZY_ATTRS.get(name)
+        if loader is None:
+            raise AttributeError(name)
+        getattr(self, loader)()
+        return self.__dict__[name]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Looked up again by the process using the unpickled metadata
+        state.pop('conductor_api', None)
+        return state
+
+    def _load_conductor_api(self):
+        self.conductor_api = conductor.API()
+
+    def _load_availability_zone(self):
+        self.availability_zone = ec2utils.get_availability_zone_by_host(
+                self.instance['host'], self.conductor_api)
+
+    def _load_ip_info(self):
+        ctxt = context.get_admin_context()
+        self.ip_info = ec2utils.get_ip_info_for_instance(ctxt, self.instance)
+
+    def _load_security_groups(self):
+        ctxt = context.get_admin_context()
+        capi = self.conductor_api
+        self.security_groups = capi.security_group_get_by_instance(
+            ctxt, self.instance)
+
+    def _load_mappings(self):
+        ctxt = context.get_admin_context()
+        self.mappings = _format_instance_mapping(self.conductor_api, ctxt,
+                                                 self.instance)
+
+    def _load_ec2_ids(self):
+        ctxt = context.get_admin_context()
+        self.ec2_ids = self.conductor_api.get_ec2_ids(ctxt, self.instance)
+
+    def _load_network_info(self):
+        ctxt = context.get_admin_context()
+        self.network_info = network.API().get_instance_nw_info(ctxt,
+                                                               self.instance)
 
-        # get network info, and the rendered network template
-        if network_info is None:
-            network_info = network.API().get_instance_nw_info(ctxt,
-                                                              instance)
+    def _load_content(self):
+        content = {}
+        files = []
 
-        self.network_config = None
-        cfg = netutils.get_injected_network_template(network_info)
+        # the rendered network template
+        network_config = None
+        cfg = netutils.get_injected_network_template(self.network_info)
 
         if cfg:
-            key = "%04i" % len(self.content)
-            self.content[key] = cfg
-            self.network_config = {"name": "network_config",
+            key = "%04i" % len(content)
+            content[key] = cfg
+            network_config = {"name": "network_config",
                 'content_path': "/%s/%s" % (CONTENT_DIR, key)}
 
-        # 'content' is passed in from the configdrive code in
-        # nova/virt/libvirt/driver.py.  Thats how we get the injected files
-        # (personalities) in. AFAIK they're not stored in the db at all,
-        # so are not available later (web service metadata time).
-        for (path, contents) in content:
-            key = "%04i" % len(self.content)
-            self.files.append({'path': path,
+        for (path, contents) in self._injected_files:
+            key = "%04i" % len(content)
+            files.append({'path': path,
                 'content_path': "/%s/%s" % (CONTENT_DIR, key)})
-            self.content[key] = contents
+            content[key] = contents
+
+        self.content = content
+        self.files = files
+        self.network_config = network_config
 
-        if vd_driver is None:
+    def _load_vddriver(self):
+        if self._vd_driver is None:
             vdclass = importutils.import_class(CONF.vendordata_driver)
         else:
-            vdclass = vd_driver
+            vdclass = self._vd_driver
+
+        self.vddriver = vdclass(instance=self.instance, address=self.address,
+                                extra_md=self.extra_md,
+                                network_info=self.network_info)
 
-        self.vddriver = vdclass(instance=instance, address=address,
-                                extra_md=extra_md, network_info=network_info)
+    def load(self):
+        """Looks up every section now rather than on first use."""
+        for name in self._LAZY_ATTRS:
+            getattr(self, name)
 
     def get_ec2_metadata(self, version):
+        return _resolve(self._get_ec2_tree(version))
+
+    def _get_ec2_tree(self, version):
+        # The values needing lookups are _Deferred, so that looking up a
+        # path of the tree only looks up what the path needs
         if version == "latest":
             version = VERSIONS[-1]
 
@@ -189,10 +252,12 @@ class InstanceMetadata():
 
         hostname = self._get_hostname()
 
-        floating_ips = self.ip_info['floating_ips']
-        floating_ip = floating_ips and floating_ips[0] or ''
+        def floating_ip():
+            floating_ips = self.ip_info['floating_ips']
+            return floating_ips and floating_ips[0] or ''
 
-        fmt_sgroups = [x['name'] for x in self.security_groups]
+        def fmt_sgroups():
+            return [x['name'] for x in self.security_groups]
 
         meta_data = {
             'ami-id': self.ec2_ids['ami-id'],
@@ -202,7 +267,7 @@ class InstanceMetadata():
             'hostname': hostname,
             'local-ipv4': self.address,
             'reservation-id': self.instance['reservation_id'],
-            'security-groups': fmt_sgroups}
+            'security-groups': _Deferred(fmt_sgroups)}
 
         # public keys are strangely rendered in ec2 metadata service
         #  meta-data/public-keys/ returns '0=keyname' (with no trailing /)
@@ -221,7 +286,7 @@ class InstanceMetadata():
         if self._check_version('2007-01-19', version):
             meta_data['local-hostname'] = hostname
             meta_data['public-hostname'] = hostname
-            meta_data['public-ipv4'] = floating_ip
+            meta_data['public-ipv4'] = _Deferred(floating_ip)
 
         if False and self._check_version('2007-03-01', version):
             # TODO(vish): store product codes
@@ -236,15 +301,16 @@ class InstanceMetadata():
             meta_data['ancestor-ami-ids'] = []
 
         if self._check_version('2007-12-15', version):
-            meta_data['block-device-mapping'] = self.mappings
+            meta_data['block-device-mapping'] = _Deferred(
+                lambda: self.mappings)
             if 'kernel-id' in self.ec2_ids:
                 meta_data['kernel-id'] = self.ec2_ids['kernel-id']
             if 'ramdisk-id' in self.ec2_ids:
                 meta_data['ramdisk-id'] = self.ec2_ids['ramdisk-id']
 
         if self._check_version('2008-02-01', version):
-            meta_data['placement'] = {'availability-zone':
-                                      self.availability_zone}
+            meta_data['placement'] = {'availability-zone': _Deferred(
+                lambda: self.availability_zone)}
 
         if self._check_version('2008-09-01', version):
             meta_data['instance-action'] = 'none'
@@ -257,8 +323,8 @@ class InstanceMetadata():
 
     def get_ec2_item(self, path_tokens):
         # get_ec2_metadata returns dict without top level version
-        data = self.get_ec2_metadata(path_tokens[0])
-        return find_path_in_tree(data, path_tokens[1:])
+        data = self._get_ec2_tree(path_tokens[0])
+        return _resolve(find_path_in_tree(data, path_tokens[1:]))
 
     def get_openstack_item(self, path_tokens):
         if path_tokens[0] == CONTENT_DIR:
@@ -470,6 +536,23 @@ def _format_instance_mapping(conductor_api, ctxt, instance):
     return block_device.instance_block_mapping(instance, bdms)
 
 
+class _Deferred(object):
+    """Value of a metadata tree computed when the tree is looked up."""
+
+    def __init__(self, func):
+        self.func = func
+
+
+def _resolve(data):
+    # Computes the _Deferred values of a tree
+    if isinstance(data, _Deferred):
+        data = data.func()
+    if isinstance(data, dict):
+        return dict([(key, _resolve(value))
+                     for key, value in data.iteritems()])
+    return data
+
+
 def ec2_md_print(data):
     if isinstance(data, dict):
         output = ''
@@ -495,6 +578,8 @@ def ec2_md_print(data):
 def find_path_in_tree(data, path_tokens):
     # given a dict/list tree, and a path in that tree, return data found there.
     for i in range(0, len(path_tokens)):
+        if isinstance(data, _Deferred):
+            data = data.func()
         if isinstance(data, dict) or isinstance(data, list):
             if path_tokens[i] in data:
                 data = data[path_tokens[i]]
@@ -17,27 +17,48 @@
 #    under the License.
 
 """Metadata request handler."""
+import datetime
 import hashlib
 import hmac
 import os
 
+from eventlet import greenthread
 from oslo.config import cfg
 import webob.dec
 import webob.exc
 
+from nova.api.ec2 import ec2utils
 from nova.api.metadata import base
+from nova.compute import vm_states
 from nova import conductor
+from nova import context
 from nova import exception
 from nova.openstack.common.gettextutils import _
+from nova.openstack.common import lockutils
 from nova.openstack.common import log as logging
-from nova.openstack.common import memorycache
+from nova.openstack.common import loopingcall
+from nova.openstack.common import timeutils
+from nova import sharedcache
 from nova import wsgi
 
 CACHE_EXPIRATION = 15  # in seconds
 
+# How long other workers wait for the one building some metadata
+BUILD_TIMEOUT = 10  # in seconds
+
 CONF = cfg.CONF
 CONF.import_opt('use_forwarded_for', 'nova.api.auth')
 
+metadata_cache_opts = [
+    cfg.IntOpt('metadata_cache_warm_interval',
+               default=0,
+               help='Seconds between the lookups of the instances which '
+                    'changed and are active, whose metadata is then built '
+                    'before they request it. 0 disables the lookups'),
+]
+
+CONF.register_opts(metadata_cache_opts)
+
 metadata_proxy_opts = [
     cfg.BoolOpt(
         'service_neutron_metadata_proxy',
@@ -61,45 +82,132 @@ class MetadataRequestHandler(wsgi.Application):
     """Serve metadata."""
 
     def __init__(self):
-        self._cache = memorycache.get_client()
+        self._cache = sharedcache.get_client()
         self.conductor_api = conductor.API()
+        self._warming_pid = None
+        self.cache_stats = dict(hits=0, waits=0, misses=0, warmed=0)
 
     def get_metadata_by_remote_address(self, address):
         if not address:
             raise exception.FixedIpNotFoundForAddress(address=address)
 
-        cache_key = 'metadata-%s' % address
-        data = self._cache.get(cache_key)
-        if data:
-            return data
+        return self._get_metadata(
+            'metadata-%s' % address,
+            base.get_metadata_by_address, self.conductor_api, address)
 
-        try:
-            data = base.get_metadata_by_address(self.conductor_api, address)
-        except exception.NotFound:
-            return None
+    def get_metadata_by_instance_id(self, instance_id, address):
+        return self._get_metadata(
+            'metadata-%s' % instance_id,
+            base.get_metadata_by_instance_id, self.conductor_api,
+            instance_id, address)
 
-        self._cache.set(cache_key, data, CACHE_EXPIRATION)
+    def _get_metadata(self, cache_key, get_metadata, *args):
+        """Returns the cached metadata, or builds and caches it.
 
-        return data
+        Concurrent requests for the same metadata wait for the first one
+        to build it, whether they are served by this worker or by others
+        sharing its cache.
+        """
 
-    def get_metadata_by_instance_id(self, instance_id, address):
-        cache_key = 'metadata-%s' % instance_id
         data = self._cache.get(cache_key)
         if data:
+            self.cache_stats['hits'] += 1
             return data
 
-        try:
-            data = base.get_metadata_by_instance_id(self.conductor_api,
-                                                    instance_id, address)
-        except exception.NotFound:
-            return None
-
-        self._cache.set(cache_key, data, CACHE_EXPIRATION)
+        with lockutils.lock(cache_key):
+            data = self._cache.get(cache_key)
+            if not data and not self._cache.add('%s-building' % cache_key,
+                                                True, time=BUILD_TIMEOUT):
+                data = self._wait_for(cache_key)
+            if data:
+                self.cache_stats['waits'] += 1
+                return data
+
+            self.cache_stats['misses'] += 1
+            LOG.debug(_('Building metadata %(key)s, metadata cache stats: '
+                        '%(stats)s'),
+                      {'key': cache_key, 'stats': self.cache_stats})
+            try:
+                data = get_metadata(*args)
+                # Looked up now, as shared caches only keep what is pickled
+                data.load()
+            except exception.NotFound:
+                return None
+            finally:
+                self._cache.delete('%s-building' % cache_key)
+
+            self._cache.set(cache_key, data, CACHE_EXPIRATION)
 
         return data
 
+    def _wait_for(self, cache_key):
+        """Waits for another worker to cache some metadata."""
+
+        for _i in xrange(BUILD_TIMEOUT * 10):
+            greenthread.sleep(0.1)
+            data = self._cache.get(cache_key)
+            if data:
+                return data
+            if not self._cache.get('%s-building' % cache_key):
+                return None
+
+    def _start_warming(self):
+        # In each worker, the launcher forks them after __init__()
+        interval = CONF.metadata_cache_warm_interval
+        if interval and self._warming_pid != os.getpid():
+            self._warming_pid = os.getpid()
+            timer = loopingcall.FixedIntervalLoopingCall(self.warm_cache)
+            timer.start(interval=interval, initial_delay=interval)
+
+    def warm_cache(self):
+        """Caches the metadata of the active instances which changed.
+
+        Instances which just became active are about to request their
+        metadata, all at the same time when many are booted together.
+        """
+
+        interval = CONF.metadata_cache_warm_interval
+        # Once per interval, by whichever worker sharing the cache is
+        # the first to try
+        if not self._cache.add('metadata-warming', True, time=interval):
+            return
+
+        ctxt = context.get_admin_context()
+        since = timeutils.utcnow() - datetime.timedelta(seconds=interval)
+        # Sent as a string, which is what it becomes over RPC anyway
+        filters = {'changes-since': timeutils.strtime(since),
+                   'vm_state': vm_states.ACTIVE, 'deleted': False}
+        try:
+            instances = self.conductor_api.instance_get_all_by_filters(
+                ctxt, filters)
+        except Exception:
+            LOG.exception(_('Failed to look up the instances which changed'))
+            return
+
+        for instance in instances:
+            addresses = ec2utils.get_ip_info_for_instance(
+                ctxt, instance)['fixed_ips']
+            if CONF.service_neutron_metadata_proxy:
+                cache_keys = ['metadata-%s' % instance['uuid']]
+            else:
+                cache_keys = ['metadata-%s' % address
+                              for address in addresses]
+
+            for cache_key, address in zip(cache_keys, addresses):
+                try:
+                    data = base.InstanceMetadata(instance, address)
+                    data.load()
+                except Exception:
+                    LOG.exception(_('Failed to build metadata for '
+                                    'instance %s'), instance['uuid'])
+                    break
+                self._cache.set(cache_key, data, CACHE_EXPIRATION)
+                self.cache_stats['warmed'] += 1
+
     @webob.dec.wsgify(RequestClass=wsgi.Request)
     def __call__(self, req):
+        self._start_warming()
+
         if os.path.normpath(req.path_info) == "/":
             return(base.ec2_md_print(base.VERSIONS + ["latest"]))
 
@@ -198,6 +198,8 @@ class APIRouter(base_wsgi.Router):
                     resource.controller = inherits.controller
             wsgi_resource = wsgi.Resource(resource.controller,
                                           inherits=inherits)
+            if resource.loader:
+                wsgi_resource.register_loader(resource.loader)
             self.resources[resource.collection] = wsgi_resource
             kargs = dict(
                 controller=wsgi_resource,
@@ -230,8 +232,11 @@ class APIRouter(base_wsgi.Router):
                       msg_format_dict)
 
             resource = self.resources[collection]
-            resource.register_actions(controller)
-            resource.register_extensions(controller)
+            if extension.loader:
+                resource.register_loader(extension.loader)
+            else:
+                resource.register_actions(controller)
+                resource.register_extensions(controller)
 
     def _setup_routes(self, mapper, ext_mgr, init_only):
         raise NotImplementedError()
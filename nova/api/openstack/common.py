@@ -15,8 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
 import functools
-import itertools
 import os
 import re
 import urlparse
@@ -330,11 +330,12 @@ def get_networks_for_instance_from_nw_info(nw_info):
         if label not in networks:
             networks[label] = {'ips': [], 'floating_ips': []}
 
-        networks[label]['ips'].extend(ips)
-        networks[label]['floating_ips'].extend(floaters)
-        for ip in itertools.chain(networks[label]['ips'],
-                                  networks[label]['floating_ips']):
-            ip['mac_address'] = vif['address']
+        # nw_info may be shared, so the addresses are annotated on copies
+        for key, vif_ips in (('ips', ips), ('floating_ips', floaters)):
+            for ip in vif_ips:
+                ip = copy.copy(ip)
+                ip['mac_address'] = vif['address']
+                networks[label][key].append(ip)
     return networks
 
 
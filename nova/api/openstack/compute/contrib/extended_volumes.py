@@ -29,8 +29,19 @@ class ExtendedVolumesController(wsgi.Controller):
         super(ExtendedVolumesController, self).__init__(*args, **kwargs)
         self.compute_api = compute.API()
 
-    def _extend_server(self, context, server, instance):
-        bdms = self.compute_api.get_instance_bdms(context, instance)
+    def _get_bdms(self, req, context, servers):
+        # Load the bdms of all the servers with a single query; they are
+        # shared with any other extension through the request cache.
+        def _load(uuids):
+            # server['id'] is guaranteed to be in the cache due to
+            # the core API adding it in its 'show' and 'detail' methods.
+            instances = [req.get_db_instance(uuid) for uuid in uuids]
+            return self.compute_api.get_instances_bdms(context, instances)
+        return req.prefetch_db_items('bdms',
+                                     [server['id'] for server in servers],
+                                     _load)
+
+    def _extend_server(self, server, bdms):
         volume_ids = [bdm['volume_id'] for bdm in bdms if bdm['volume_id']]
         key = "%s:volumes_attached" % Extended_volumes.alias
         server[key] = [{'id': volume_id} for volume_id in volume_ids]
@@ -42,10 +53,8 @@ class ExtendedVolumesController(wsgi.Controller):
             # Attach our slave template to the response object
             resp_obj.attach(xml=ExtendedVolumesServerTemplate())
             server = resp_obj.obj['server']
-            db_instance = req.get_db_instance(server['id'])
-            # server['id'] is guaranteed to be in the cache due to
-            # the core API adding it in its 'show' method.
-            self._extend_server(context, server, db_instance)
+            bdms = self._get_bdms(req, context, [server])
+            self._extend_server(server, bdms[server['id']])
 
     @wsgi.extends
     def detail(self, req, resp_obj):
@@ -54,11 +63,9 @@ class ExtendedVolumesController(wsgi.Controller):
             # Attach our slave template to the response object
             resp_obj.attach(xml=ExtendedVolumesServersTemplate())
             servers = list(resp_obj.obj['servers'])
+            bdms = self._get_bdms(req, context, servers)
             for server in servers:
-                db_instance = req.get_db_instance(server['id'])
-                # server['id'] is guaranteed to be in the cache due to
-                # the core API adding it in its 'detail' method.
-                self._extend_server(context, server, db_instance)
+                self._extend_server(server, bdms[server['id']])
 
 
 class Extended_volumes(extensions.ExtensionDescriptor):
@@ -171,8 +171,10 @@ class HypervisorsController(object):
         context = req.environ['nova.context']
         authorize(context)
         compute_nodes = self.host_api.compute_node_get_all(context)
-        return dict(hypervisors=[self._view_hypervisor(hyp, True)
-                                 for hyp in compute_nodes])
+        hypervisors = [self._view_hypervisor(hyp, True)
+                       for hyp in compute_nodes]
+        req.set_response_validators(etag=wsgi.entity_tag(hypervisors))
+        return dict(hypervisors=hypervisors)
 
     @wsgi.serializers(xml=HypervisorTemplate)
     def show(self, req, id):
@@ -241,6 +243,7 @@ class HypervisorsController(object):
         context = req.environ['nova.context']
         authorize(context)
         stats = self.host_api.compute_node_statistics(context)
+        req.set_response_validators(etag=wsgi.entity_tag(stats))
         return dict(hypervisor_statistics=stats)
 
 
@@ -27,9 +27,15 @@ ext_opts = [
                       'nova.api.openstack.compute.contrib.standard_extensions'
                       ],
                     help='osapi compute extension to load'),
+    cfg.StrOpt('osapi_compute_extension_manifest',
+               help='File describing the loaded osapi compute extensions. '
+                    'When it is up to date, extension modules are only '
+                    'imported once a request is routed to them; otherwise '
+                    'the extensions are loaded and the file is rewritten'),
 ]
 CONF = cfg.CONF
 CONF.register_opts(ext_opts)
+CONF.import_opt('osapi_compute_ext_list', 'nova.api.openstack.compute.contrib')
 
 LOG = logging.getLogger(__name__)
 
@@ -40,4 +46,9 @@ class ExtensionManager(base_extensions.ExtensionManager):
         self.cls_list = CONF.osapi_compute_extension
         self.extensions = {}
         self.sorted_ext_list = []
+        self.manifest = CONF.osapi_compute_extension_manifest
         self._load_extensions()
+
+    def _manifest_key(self):
+        key = super(ExtensionManager, self)._manifest_key()
+        return key + CONF.osapi_compute_ext_list
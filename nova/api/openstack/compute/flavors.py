@@ -72,12 +72,16 @@ class Controller(wsgi.Controller):
     @wsgi.serializers(xml=MinimalFlavorsTemplate)
     def index(self, req):
         """Return all flavors in brief."""
+        if self._set_flavors_validators(req):
+            return None
         limited_flavors = self._get_flavors(req)
         return self._view_builder.index(req, limited_flavors)
 
     @wsgi.serializers(xml=FlavorsTemplate)
     def detail(self, req):
         """Return all flavors in detail."""
+        if self._set_flavors_validators(req):
+            return None
         limited_flavors = self._get_flavors(req)
         req.cache_db_flavors(limited_flavors)
         return self._view_builder.detail(req, limited_flavors)
@@ -109,6 +113,22 @@ class Controller(wsgi.Controller):
                 msg = _('Invalid is_public filter [%s]') % is_public
                 raise webob.exc.HTTPBadRequest(explanation=msg)
 
+    def _set_flavors_validators(self, req):
+        """Tags the flavors list with validators that don't need the
+        flavors loaded, and returns whether the client already has it.
+        """
+        context = req.environ['nova.context']
+        validator = flavors.get_flavors_validator(context)
+
+        # Which flavors are listed depends on the query and on the project
+        # and admin-ness of who is asking
+        etag = wsgi.entity_tag([req.url, context.project_id,
+                                context.is_admin, validator['count'],
+                                validator['digest']])
+        req.set_response_validators(etag=etag,
+                                    last_modified=validator['updated_at'])
+        return req.is_not_modified()
+
     def _get_flavors(self, req):
         """Helper function that returns a list of flavor dicts."""
         filters = {}
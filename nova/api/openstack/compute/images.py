@@ -183,6 +183,7 @@ class Controller(wsgi.Controller):
                                                 **page_params)
         except exception.Invalid as e:
             raise webob.exc.HTTPBadRequest(explanation=e.format_message())
+        self._set_images_validators(req, images)
         return self._view_builder.index(req, images)
 
     @wsgi.serializers(xml=ImagesTemplate)
@@ -205,8 +206,18 @@ class Controller(wsgi.Controller):
             raise webob.exc.HTTPBadRequest(explanation=e.format_message())
 
         req.cache_db_items('images', images, 'id')
+        self._set_images_validators(req, images)
         return self._view_builder.detail(req, images)
 
+    def _set_images_validators(self, req, images):
+        """Tags the images list with a digest of the images.
+
+        The image service has no cheap way to tell that the list changed,
+        deleted images simply drop out of it, so this saves rendering and
+        sending the list but not fetching it.
+        """
+        req.set_response_validators(etag=wsgi.entity_tag([req.url, images]))
+
     def create(self, *args, **kwargs):
         raise webob.exc.HTTPMethodNotAllowed()
 
@@ -28,16 +28,20 @@ in your environment to assess your capabilities and multiply out to get
 figures.
 
 NOTE: As the rate-limiting here is done in memory, this only works per
-process (each process will have its own rate limiting counter).
+process (each process will have its own rate limiting counter), unless
+osapi_compute_shared_rate_limits is set: the requests each process counts
+are then added in batches to counters shared by the processes.
 """
 
 import collections
 import copy
+import hashlib
 import httplib
 import math
 import re
 import time
 
+from oslo.config import cfg
 import webob.dec
 import webob.exc
 
@@ -48,9 +52,29 @@ from nova.openstack.common.gettextutils import _
 from nova.openstack.common import importutils
 from nova.openstack.common import jsonutils
 from nova import quota
+from nova import sharedcache
 from nova import utils
 from nova import wsgi as base_wsgi
 
+limits_opts = [
+    cfg.BoolOpt('osapi_compute_shared_rate_limits',
+                default=False,
+                help='Count the requests of all the API workers against the '
+                     'rate limits, through the memcached servers or the '
+                     'shared cache segment of the workers'),
+    cfg.IntOpt('osapi_compute_rate_limit_batch',
+               default=10,
+               help='Requests a worker counts against a rate limit before '
+                    'adding them to the shared counter'),
+    cfg.IntOpt('osapi_compute_rate_limit_sync_interval',
+               default=1,
+               help='Seconds after which a worker adds the requests it '
+                    'counted to the shared counter of a rate limit, '
+                    'however few they are'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(limits_opts)
 
 QUOTAS = quota.QUOTAS
 
@@ -157,6 +181,13 @@ class Limit(object):
         self.last_request = None
         self.next_request = None
 
+        # Requests counted since the last sync with the shared counter,
+        # and the time window and value of the counter then
+        self.pending = 0
+        self.window = None
+        self.synced = 0
+        self.last_sync = None
+
         self.water_level = 0
         self.capacity = self.unit
         self.request_value = float(self.capacity) / float(self.value)
@@ -174,6 +205,14 @@ class Limit(object):
         if self.verb != verb or not re.match(self.regex, url):
             return
 
+        return self.record()
+
+    def record(self):
+        """
+        Records a request known to be relevant to this limit.
+
+        @return: the delay until the request can be made, or None
+        """
         now = self._get_time()
 
         if self.last_request is None:
@@ -200,6 +239,11 @@ class Limit(object):
 
         self.remaining = math.floor(((cap - water) / cap) * val)
         self.next_request = now
+        self.pending += 1
+
+    def pour(self, requests):
+        """Accounts for requests recorded by other processes."""
+        self.water_level += requests * self.request_value
 
     def _get_time(self):
         """Retrieve the current time. Broken out for testability."""
@@ -235,6 +279,58 @@ DEFAULT_LIMITS = [
 ]
 
 
+class LimitMatcher(object):
+    """
+    Finds the limits relevant to a request with a single regex match.
+
+    The regular expressions of the limits of each verb are combined into
+    one, as lookaheads capturing what each of them matches.  Expressions
+    with flags or groups of their own, which would clash, are matched
+    separately.
+    """
+
+    def __init__(self, limits):
+        """
+        Initialize a new `LimitMatcher`.
+
+        @param limits: List of `Limit` objects
+        """
+        verbs = collections.defaultdict(lambda: ([], [], []))
+        for index, limit in enumerate(limits):
+            patterns, indexes, separate = verbs[limit.verb]
+            regex = re.compile(limit.regex)
+            if regex.groups or regex.flags:
+                separate.append((index, regex))
+            else:
+                patterns.append('(?:(?=(%s))|)' % limit.regex)
+                indexes.append(index)
+
+        self._verbs = {}
+        for verb, (patterns, indexes, separate) in verbs.items():
+            combined = re.compile(''.join(patterns)) if patterns else None
+            self._verbs[verb] = (combined, indexes, separate)
+
+    def __call__(self, verb, url):
+        """
+        Return the indexes of the limits relevant to a request, in order.
+        """
+        try:
+            combined, indexes, separate = self._verbs[verb]
+        except KeyError:
+            return []
+
+        matched = []
+        if combined:
+            groups = combined.match(url).groups()
+            matched = [index for index, group in zip(indexes, groups)
+                       if group is not None]
+        if separate:
+            matched.extend(index for index, regex in separate
+                           if regex.match(url))
+            matched.sort()
+        return matched
+
+
 class RateLimitingMiddleware(base_wsgi.Middleware):
     """
     Rate-limits requests passing through this middleware. All limit information
@@ -310,12 +406,20 @@ class Limiter(object):
         """
         self.limits = copy.deepcopy(limits)
         self.levels = collections.defaultdict(lambda: copy.deepcopy(limits))
+        self.matcher = LimitMatcher(self.limits)
+        self.user_matchers = {}
 
         # Pick up any per-user limit information
         for key, value in kwargs.items():
             if key.startswith('user:'):
                 username = key[5:]
                 self.levels[username] = self.parse_limits(value)
+                self.user_matchers[username] = LimitMatcher(
+                    self.levels[username])
+
+        self.counters = None
+        if CONF.osapi_compute_shared_rate_limits:
+            self.counters = sharedcache.get_client()
 
     def get_limits(self, username=None):
         """
@@ -331,8 +435,13 @@ class Limiter(object):
         """
         delays = []
 
-        for limit in self.levels[username]:
-            delay = limit(verb, url)
+        levels = self.levels[username]
+        matcher = self.user_matchers.get(username, self.matcher)
+        for index in matcher(verb, url):
+            limit = levels[index]
+            delay = limit.record()
+            if self.counters is not None:
+                self._sync(username, limit)
             if delay:
                 delays.append((delay, limit.error_message))
 
@@ -342,6 +451,49 @@ class Limiter(object):
 
         return None, None
 
+    def _sync(self, username, limit):
+        """
+        Add the requests counted against a limit to its shared counter.
+
+        Done once enough requests were counted or enough time went by.
+        The requests the other processes added to the counter since the
+        last sync are poured into the limit.  Counters only last for the
+        time unit of the limit.
+        """
+        now = limit._get_time()
+        if (limit.last_sync is not None and
+                limit.pending < CONF.osapi_compute_rate_limit_batch and
+                now - limit.last_sync <
+                CONF.osapi_compute_rate_limit_sync_interval):
+            return
+
+        window = int(now // limit.unit)
+        if window != limit.window:
+            limit.window = window
+            limit.synced = 0
+        key = 'ratelimit-%s-%d' % (hashlib.md5(jsonutils.dumps(
+            [username, limit.verb, limit.regex, limit.value,
+             limit.unit])).hexdigest(), window)
+
+        if limit.pending:
+            total = self.counters.incr(key, limit.pending)
+            # add() fails if another process created the counter since
+            if total is None and self.counters.add(key, str(limit.pending),
+                                                   time=limit.unit * 2):
+                total = limit.pending
+            elif total is None:
+                total = self.counters.incr(key, limit.pending)
+        else:
+            total = self.counters.get(key)
+        total = int(total or 0)
+
+        others = total - limit.synced - limit.pending
+        if others > 0:
+            limit.pour(others)
+        limit.synced = total
+        limit.pending = 0
+        limit.last_sync = now
+
     # Note: This method gets called before the class is instantiated,
     # so this must be either a static method or a class method.  It is
     # used to develop a list of limits to feed to the constructor.  We
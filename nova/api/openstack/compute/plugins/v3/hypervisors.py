@@ -171,8 +171,10 @@ class HypervisorsController(object):
         context = req.environ['nova.context']
         authorize(context)
         compute_nodes = self.host_api.compute_node_get_all(context)
-        return dict(hypervisors=[self._view_hypervisor(hyp, True)
-                                 for hyp in compute_nodes])
+        hypervisors = [self._view_hypervisor(hyp, True)
+                       for hyp in compute_nodes]
+        req.set_response_validators(etag=wsgi.entity_tag(hypervisors))
+        return dict(hypervisors=hypervisors)
 
     @extensions.expected_errors(404)
     @wsgi.serializers(xml=HypervisorTemplate)
@@ -244,6 +246,7 @@ class HypervisorsController(object):
         context = req.environ['nova.context']
         authorize(context)
         stats = self.host_api.compute_node_statistics(context)
+        req.set_response_validators(etag=wsgi.entity_tag(stats))
         return dict(hypervisor_statistics=stats)
 
 
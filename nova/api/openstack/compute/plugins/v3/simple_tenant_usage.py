@@ -137,10 +137,10 @@ class SimpleTenantUsageController(object):
                                   period_stop, tenant_id=None, detailed=True):
 
         compute_api = api.API()
-        instances = compute_api.get_active_by_window(context,
-                                                     period_start,
-                                                     period_stop,
-                                                     tenant_id)
+        instances = compute_api.get_usage_by_window(context,
+                                                    period_start,
+                                                    period_stop,
+                                                    tenant_id)
         rval = {}
         flavors = {}
 
@@ -560,6 +560,9 @@ class Controller(wsgi.Controller):
                 search_opts['user_id'] = context.user_id
 
         limit, marker = common.get_limit_and_marker(req)
+        if self._set_servers_validators(req, context, search_opts):
+            # Resource answers with a 304, the client already has them
+            return None
         try:
             instance_list = self.compute_api.get_all(context,
                                                      search_opts=search_opts,
@@ -582,6 +585,26 @@ class Controller(wsgi.Controller):
         req.cache_db_instances(instance_list)
         return response
 
+    def _set_servers_validators(self, req, context, search_opts):
+        """Tags the servers list with validators that don't need the
+        servers loaded, and returns whether the client already has it.
+        """
+        try:
+            validator = self.compute_api.get_all_validator(
+                    context, search_opts=search_opts)
+        except exception.FlavorNotFound:
+            validator = None
+        if validator is None:
+            return False
+
+        # What the servers look like also depends on the query and on who
+        # is asking them
+        etag = wsgi.entity_tag([req.url, context.user_id, context.roles,
+                                validator['count'], validator['digest']])
+        req.set_response_validators(etag=etag,
+                                    last_modified=validator['updated_at'])
+        return req.is_not_modified()
+
     def _get_server(self, context, req, instance_uuid):
         """Utility function for looking up an instance by uuid."""
         try:
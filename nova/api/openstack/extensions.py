@@ -19,6 +19,9 @@
 import abc
 import functools
 import os
+import sys
+import tempfile
+import threading
 
 import webob.dec
 import webob.exc
@@ -29,6 +32,7 @@ from nova.api.openstack import xmlutil
 from nova import exception
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import importutils
+from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 import nova.policy
 
@@ -178,7 +182,16 @@ class ExtensionManager(object):
     See nova/tests/api/openstack/volume/extensions/foxinsocks.py or an
     example extension implementation.
 
+    When manifest is set to a file name, the description of the loaded
+    extensions is saved there and later managers register LazyExtension
+    objects from it instead of importing the extension modules.
+
     """
+    manifest = None
+
+    _loading_factory = None
+    _manifest_factories = None
+
     def sorted_extensions(self):
         if self.sorted_ext_list is None:
             self.sorted_ext_list = sorted(self.extensions.iteritems())
@@ -197,11 +210,16 @@ class ExtensionManager(object):
         alias = ext.alias
         LOG.audit(_('Loaded extension: %s'), alias)
 
-        if alias in self.extensions:
+        # The extension replaces the manifest entry standing in for it
+        if (alias in self.extensions and
+                not isinstance(self.extensions[alias], LazyExtension)):
             raise exception.NovaException("Found duplicate extension: %s"
                                           % alias)
         self.extensions[alias] = ext
         self.sorted_ext_list = None
+        if self._manifest_factories is not None:
+            self._manifest_factories.setdefault(self._loading_factory,
+                                                []).append(alias)
 
     def get_resources(self):
         """Returns a list of ResourceExtension objects."""
@@ -265,13 +283,44 @@ class ExtensionManager(object):
 
         # Call it
         LOG.debug(_("Calling extension factory %s"), ext_factory)
-        factory(self)
+        loading_factory = self._loading_factory
+        self._loading_factory = ext_factory
+        try:
+            factory(self)
+        finally:
+            self._loading_factory = loading_factory
+
+    def load_lazy_extension(self, alias):
+        """Import the extension a LazyExtension stands in for.
+
+        Returns the registered extension, or None if it failed to load.
+        """
+
+        ext = self.extensions.get(alias)
+        if isinstance(ext, LazyExtension):
+            try:
+                self.load_extension(ext.factory)
+            except Exception as exc:
+                LOG.warn(_('Failed to load extension %(ext_factory)s: '
+                           '%(exc)s'),
+                         {'ext_factory': ext.factory, 'exc': exc})
+            ext = self.extensions.get(alias)
+
+        if isinstance(ext, LazyExtension):
+            return None
+        return ext
 
     def _load_extensions(self):
         """Load extensions specified on the command line."""
 
+        if self.manifest and self._load_manifest():
+            return
+
         extensions = list(self.cls_list)
 
+        if self.manifest:
+            self._manifest_factories = {}
+
         for ext_factory in extensions:
             try:
                 self.load_extension(ext_factory)
@@ -280,6 +329,227 @@ class ExtensionManager(object):
                            '%(exc)s'),
                          {'ext_factory': ext_factory, 'exc': exc})
 
+        if self.manifest:
+            self._write_manifest()
+            self._manifest_factories = None
+
+    def _manifest_key(self):
+        """Configuration the saved manifest must have been built with."""
+        return [ext_factory for ext_factory in self.cls_list
+                if isinstance(ext_factory, basestring)]
+
+    def _load_manifest(self):
+        """Register the extensions described by the manifest.
+
+        Returns False, without registering anything, if the manifest is
+        missing or out of date.
+        """
+
+        try:
+            with open(self.manifest) as manifest_file:
+                manifest = jsonutils.loads(manifest_file.read())
+        except (IOError, ValueError):
+            return False
+
+        if (manifest.get('key') != self._manifest_key() or
+                manifest.get('files') != _file_stats(manifest.get('files'))):
+            LOG.info(_('Extension manifest %s is out of date'),
+                     self.manifest)
+            return False
+
+        for entry in manifest['extensions']:
+            if entry['lazy']:
+                self.register(LazyExtension(self, entry))
+                continue
+
+            try:
+                self.load_extension(entry['factory'])
+            except Exception as exc:
+                LOG.warn(_('Failed to load extension %(ext_factory)s: '
+                           '%(exc)s'),
+                         {'ext_factory': entry['factory'], 'exc': exc})
+        return True
+
+    def _write_manifest(self):
+        """Save the description of the loaded extensions."""
+
+        factories = {}
+        for ext_factory, aliases in self._manifest_factories.items():
+            # Only factories registering a single extension can be
+            # replayed one extension at a time
+            if isinstance(ext_factory, basestring) and len(aliases) == 1:
+                factories[aliases[0]] = ext_factory
+
+        entries = []
+        files = {}
+        for alias, ext in sorted(self.extensions.iteritems()):
+            if alias not in factories:
+                LOG.warn(_('Not saving extension manifest %(manifest)s: '
+                           'extension %(alias)s has no factory to load it'),
+                         {'manifest': self.manifest, 'alias': alias})
+                return
+
+            entry = _manifest_entry(ext, factories[alias])
+            entries.append(entry)
+
+            module = sys.modules[entry['factory'].rpartition('.')[0]]
+            filename = os.path.splitext(module.__file__)[0] + '.py'
+            files[filename] = None
+            files[os.path.dirname(filename)] = None
+
+        manifest = {'key': self._manifest_key(),
+                    'files': _file_stats(files),
+                    'extensions': entries}
+        # Other API workers may be reading the manifest, so it is written
+        # to a temporary file which then replaces it
+        dirname, basename = os.path.split(os.path.abspath(self.manifest))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=basename)
+        except OSError as exc:
+            LOG.warn(_('Failed to save extension manifest %(manifest)s: '
+                       '%(exc)s'), {'manifest': self.manifest, 'exc': exc})
+            return
+        try:
+            with os.fdopen(fd, 'w') as manifest_file:
+                manifest_file.write(jsonutils.dumps(manifest))
+            os.rename(tmp_path, self.manifest)
+        except (IOError, OSError) as exc:
+            LOG.warn(_('Failed to save extension manifest %(manifest)s: '
+                       '%(exc)s'), {'manifest': self.manifest, 'exc': exc})
+            os.unlink(tmp_path)
+
+
+def _file_stats(files):
+    """Modification time and size of each of the files."""
+
+    stats = {}
+    for filename in files or {}:
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            stats[filename] = None
+        else:
+            stats[filename] = [stat.st_mtime, stat.st_size]
+    return stats
+
+
+def _manifest_entry(ext, ext_factory):
+    """Describe an extension well enough to route to it unloaded."""
+
+    try:
+        resources = ext.get_resources()
+    except AttributeError:
+        resources = []
+    try:
+        controller_exts = ext.get_controller_extensions()
+    except AttributeError:
+        controller_exts = []
+
+    # Custom routes and inherited controllers need the real extension
+    # when the routes are built
+    lazy = True
+    for resource in resources:
+        if resource.custom_routes_fn or resource.inherits:
+            lazy = False
+
+    collections = []
+    for controller_ext in controller_exts:
+        if controller_ext.collection not in collections:
+            collections.append(controller_ext.collection)
+
+    return {'factory': ext_factory,
+            'lazy': lazy,
+            'name': ext.name,
+            'alias': ext.alias,
+            'description': ext.__doc__,
+            'namespace': ext.namespace,
+            'updated': ext.updated,
+            'resources': [dict(collection=resource.collection,
+                               parent=resource.parent,
+                               collection_actions=resource.collection_actions,
+                               member_actions=resource.member_actions,
+                               member_name=resource.member_name)
+                          for resource in resources],
+            'controller_extensions': collections}
+
+
+class LazyExtension(object):
+    """Stands in for an extension described by the extension manifest.
+
+    The extension module is only imported, and the extension registered
+    in place of this one, once a request is routed to one of its
+    resources or to a resource it extends.
+    """
+
+    def __init__(self, ext_mgr, entry):
+        self.ext_mgr = ext_mgr
+        self.factory = entry['factory']
+        self.name = entry['name']
+        self.alias = entry['alias']
+        self.__doc__ = entry['description']
+        self.namespace = entry['namespace']
+        self.updated = entry['updated']
+        self._resources = entry['resources']
+        self._collections = entry['controller_extensions']
+        self._controllers = None
+        self._controller_exts = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._controllers is not None:
+            return
+
+        with self._lock:
+            if self._controllers is not None:
+                return
+
+            controllers = {}
+            controller_exts = {}
+            ext = self.ext_mgr.load_lazy_extension(self.alias)
+            if ext is not None:
+                for resource in getattr(ext, 'get_resources', list)():
+                    controllers[resource.collection] = resource.controller
+                for controller_ext in getattr(ext,
+                                              'get_controller_extensions',
+                                              list)():
+                    controller_exts.setdefault(controller_ext.collection,
+                                               []).append(
+                        controller_ext.controller)
+
+            # Other requests only go ahead once everything is in place
+            self._controller_exts = controller_exts
+            self._controllers = controllers
+
+    def _load_resource(self, collection, wsgi_resource):
+        self._load()
+        controller = self._controllers.get(collection)
+        if controller:
+            wsgi_resource.controller = controller
+            wsgi_resource.register_actions(controller)
+
+    def _load_controller_extension(self, collection, wsgi_resource):
+        self._load()
+        for controller in self._controller_exts.get(collection, []):
+            wsgi_resource.register_actions(controller)
+            wsgi_resource.register_extensions(controller)
+
+    def get_resources(self):
+        resources = []
+        for resource in self._resources:
+            loader = functools.partial(self._load_resource,
+                                       resource['collection'])
+            resources.append(ResourceExtension(loader=loader, **resource))
+        return resources
+
+    def get_controller_extensions(self):
+        controller_exts = []
+        for collection in self._collections:
+            loader = functools.partial(self._load_controller_extension,
+                                       collection)
+            controller_exts.append(ControllerExtension(self, collection,
+                                                       None, loader=loader))
+        return controller_exts
+
 
 class ControllerExtension(object):
     """Extend core controllers of nova OpenStack API.
@@ -288,10 +558,11 @@ class ControllerExtension(object):
     controllers.
     """
 
-    def __init__(self, extension, collection, controller):
+    def __init__(self, extension, collection, controller, loader=None):
         self.extension = extension
         self.collection = collection
         self.controller = controller
+        self.loader = loader
 
 
 class ResourceExtension(object):
@@ -299,7 +570,8 @@ class ResourceExtension(object):
 
     def __init__(self, collection, controller=None, parent=None,
                  collection_actions=None, member_actions=None,
-                 custom_routes_fn=None, inherits=None, member_name=None):
+                 custom_routes_fn=None, inherits=None, member_name=None,
+                 loader=None):
         if not collection_actions:
             collection_actions = {}
         if not member_actions:
@@ -312,10 +584,22 @@ class ResourceExtension(object):
         self.custom_routes_fn = custom_routes_fn
         self.inherits = inherits
         self.member_name = member_name
+        self.loader = loader
 
 
-def load_standard_extensions(ext_mgr, logger, path, package, ext_list=None):
-    """Registers all standard API extensions."""
+# Extension factories found under each standard extension path, so that
+# the walk is only done once per process
+_STANDARD_EXTENSIONS = {}
+
+
+def _find_standard_extensions(path, package):
+    """Finds the extension factories of a standard extension package.
+
+    Returns a list of (classname, classpath) tuples for extension modules
+    and of (None, ext_name) tuples for subpackages providing extension().
+    """
+
+    factories = []
 
     # Walk through all the modules in our directory...
     our_dir = path[0]
@@ -328,28 +612,17 @@ def load_standard_extensions(ext_mgr, logger, path, package, ext_list=None):
             relpkg = '.%s' % '.'.join(relpath.split(os.sep))
 
         # Now, consider each file in turn, only considering .py files
-        for fname in filenames:
+        for fname in sorted(filenames):
             root, ext = os.path.splitext(fname)
 
             # Skip __init__ and anything that's not .py
             if ext != '.py' or root == '__init__':
                 continue
 
-            # Try loading it
             classname = "%s%s" % (root[0].upper(), root[1:])
             classpath = ("%s%s.%s.%s" %
                          (package, relpkg, root, classname))
-
-            if ext_list is not None and classname not in ext_list:
-                logger.debug("Skipping extension: %s" % classpath)
-                continue
-
-            try:
-                ext_mgr.load_extension(classpath)
-            except Exception as exc:
-                logger.warn(_('Failed to load extension %(classpath)s: '
-                              '%(exc)s'),
-                            {'classpath': classpath, 'exc': exc})
+            factories.append((classname, classpath))
 
         # Now, let's consider any subdirectories we may have...
         subdirs = []
@@ -361,22 +634,50 @@ def load_standard_extensions(ext_mgr, logger, path, package, ext_list=None):
             # If it has extension(), delegate...
             ext_name = "%s%s.%s.extension" % (package, relpkg, dname)
             try:
-                ext = importutils.import_class(ext_name)
+                importutils.import_class(ext_name)
             except ImportError:
                 # extension() doesn't exist on it, so we'll explore
                 # the directory for ourselves
                 subdirs.append(dname)
             else:
-                try:
-                    ext(ext_mgr)
-                except Exception as exc:
-                    logger.warn(_('Failed to load extension %(ext_name)s:'
-                                  '%(exc)s'),
-                                {'ext_name': ext_name, 'exc': exc})
+                factories.append((None, ext_name))
 
         # Update the list of directories we'll explore...
         dirnames[:] = subdirs
 
+    return factories
+
+
+def load_standard_extensions(ext_mgr, logger, path, package, ext_list=None):
+    """Registers all standard API extensions."""
+
+    key = (path[0], package)
+    if key not in _STANDARD_EXTENSIONS:
+        _STANDARD_EXTENSIONS[key] = _find_standard_extensions(path, package)
+
+    for classname, classpath in _STANDARD_EXTENSIONS[key]:
+        if classname is None:
+            ext_name = classpath
+            try:
+                ext_mgr.load_extension(ext_name)
+            except Exception as exc:
+                logger.warn(_('Failed to load extension %(ext_name)s:'
+                              '%(exc)s'),
+                            {'ext_name': ext_name, 'exc': exc})
+            continue
+
+        if ext_list is not None and classname not in ext_list:
+            logger.debug("Skipping extension: %s" % classpath)
+            continue
+
+        # Try loading it
+        try:
+            ext_mgr.load_extension(classpath)
+        except Exception as exc:
+            logger.warn(_('Failed to load extension %(classpath)s: '
+                          '%(exc)s'),
+                        {'classpath': classpath, 'exc': exc})
+
 
 def extension_authorizer(api_name, extension_name):
     def authorize(context, target=None, action=None):
@@ -15,19 +15,24 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+import hashlib
 import inspect
 import math
+import threading
 import time
 from xml.dom import minidom
 
 from lxml import etree
 import webob
+from webob import datetime_utils
 
 from nova.api.openstack import xmlutil
 from nova import exception
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
+from nova.openstack.common import timeutils
 from nova import wsgi
 
 
@@ -77,6 +82,7 @@ class Request(webob.Request):
     def __init__(self, *args, **kwargs):
         super(Request, self).__init__(*args, **kwargs)
         self._extension_data = {'db_items': {}}
+        self._response_validators = None
 
     def cache_db_items(self, key, items, item_key='id'):
         """
@@ -109,6 +115,27 @@ class Request(webob.Request):
         """
         return self.get_db_items(key).get(item_key)
 
+    def prefetch_db_items(self, key, item_keys, loader):
+        """
+        Allow API extensions to load the objects they need for many
+        items of a response with one query, rather than one per item.
+
+        loader is called once with the item keys which are not cached
+        yet and returns a dict of objects keyed by item key. Item keys
+        it returns nothing for are cached as None, so that no extension
+        looks them up again within the same API request.
+
+        Returns a dict of the objects for all of item_keys.
+        """
+        db_items = self._extension_data['db_items'].setdefault(key, {})
+        missing = [item_key for item_key in item_keys
+                   if item_key not in db_items]
+        if missing:
+            loaded = loader(missing)
+            for item_key in missing:
+                db_items[item_key] = loaded.get(item_key)
+        return dict((item_key, db_items[item_key]) for item_key in item_keys)
+
     def cache_db_instances(self, instances):
         self.cache_db_items('instances', instances, 'uuid')
 
@@ -133,6 +160,60 @@ class Request(webob.Request):
     def get_db_flavor(self, flavorid):
         return self.get_db_item('flavors', flavorid)
 
+    def set_response_validators(self, etag=None, last_modified=None):
+        """
+        Allow API methods to tag the response to a GET for conditional
+        requests.
+
+        etag identifies the version of the response and last_modified is
+        the (naive UTC) time of its last change; either may be None.  The
+        response carries them in its ETag and Last-Modified headers, and a
+        request that already has them in If-None-Match or, failing that,
+        If-Modified-Since gets a 304 without a body instead.
+
+        Validators set before loading the response data let the method
+        skip that work when is_not_modified() is True.  last_modified only
+        suits responses that can't change without it getting later, so a
+        list has to take the entries which left it into account.  It is
+        dropped until a second has passed since, as HTTP dates can't tell
+        it from the next changes within the same second.
+        """
+        if last_modified is not None:
+            now = _http_date(timeutils.utcnow())
+            if _http_date(last_modified) >= now - datetime.timedelta(
+                    seconds=1):
+                last_modified = None
+        self._response_validators = (etag, last_modified)
+
+    def is_not_modified(self):
+        """Whether the client already has the tagged response."""
+        if self._response_validators is None:
+            return False
+        if self.method not in ('GET', 'HEAD'):
+            return False
+        etag, last_modified = self._response_validators
+        if etag is not None and self.if_none_match:
+            return self._entity_tag(etag) in self.if_none_match
+        if last_modified is not None and self.if_modified_since:
+            return _http_date(last_modified) <= self.if_modified_since
+        return False
+
+    def set_validator_headers(self, response):
+        """Adds the validators of the tagged response to its headers."""
+        if self._response_validators is None:
+            return
+        etag, last_modified = self._response_validators
+        if etag is not None:
+            response.etag = self._entity_tag(etag)
+        if last_modified is not None:
+            response.last_modified = _http_date(last_modified)
+
+    def _entity_tag(self, etag):
+        # The JSON and XML representations are different entities
+        content_type = self.best_match_content_type()
+        return '%s-%s' % (etag, _MEDIA_TYPE_MAP.get(content_type,
+                                                     content_type))
+
     def best_match_content_type(self):
         """Determine the requested response content-type."""
         if 'nova.best_content_type' not in self.environ:
@@ -328,9 +409,50 @@ class DictSerializer(ActionDispatcher):
 class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization."""
 
+    # Responses holding a list of at least this many items are streamed
+    stream_min_items = 100
+    # Number of list items serialized into each chunk of a stream
+    stream_chunk_items = 100
+
     def default(self, data):
         return jsonutils.dumps(data)
 
+    def serialize_iter(self, data):
+        """Returns an iterator over chunks of the serialized data.
+
+        Only dicts holding a long list, like the response to a detail
+        request, are streamed; returns None for anything else.  The
+        chunks put together are the same as the output of serialize().
+        """
+        if not isinstance(data, dict):
+            return None
+        if not all(isinstance(key, basestring) for key in data):
+            return None
+        if not any(isinstance(value, list) and
+                   len(value) >= self.stream_min_items
+                   for value in data.itervalues()):
+            return None
+        return self._iter_dict(data)
+
+    def _iter_dict(self, data):
+        yield '{'
+        separator = ''
+        for key, value in data.iteritems():
+            if not isinstance(value, list):
+                yield '%s%s: %s' % (separator, jsonutils.dumps(key),
+                                    jsonutils.dumps(value))
+            else:
+                yield '%s%s: [' % (separator, jsonutils.dumps(key))
+                item_separator = ''
+                for start in xrange(0, len(value), self.stream_chunk_items):
+                    items = value[start:start + self.stream_chunk_items]
+                    # Strip the brackets of the serialized slice
+                    yield item_separator + jsonutils.dumps(items)[1:-1]
+                    item_separator = ', '
+                yield ']'
+            separator = ', '
+        yield '}'
+
 
 class XMLDictSerializer(DictSerializer):
 
@@ -484,6 +606,20 @@ def response(code):
     return decorator
 
 
+def _http_date(value):
+    """Returns a naive UTC datetime as HTTP dates carry it."""
+    return value.replace(microsecond=0, tzinfo=datetime_utils.UTC)
+
+
+def entity_tag(data):
+    """Returns an entity tag for the given response data.
+
+    The tag is a digest of the data, so it only changes when the data
+    does.  Suitable for Request.set_response_validators().
+    """
+    return hashlib.sha1(jsonutils.dumps(data, sort_keys=True)).hexdigest()
+
+
 class ResponseObject(object):
     """Bundles a response object with appropriate serializers.
 
@@ -600,8 +736,18 @@ class ResponseObject(object):
         for hdr, value in self._headers.items():
             response.headers[hdr] = str(value)
         response.headers['Content-Type'] = content_type
+        if request and self.code == 200:
+            request.set_validator_headers(response)
         if self.obj is not None:
-            response.body = serializer.serialize(self.obj)
+            body_iter = None
+            if hasattr(serializer, 'serialize_iter'):
+                body_iter = serializer.serialize_iter(self.obj)
+            if body_iter is not None:
+                # Send large responses out as they are serialized, rather
+                # than holding the whole body in memory first.
+                response.app_iter = body_iter
+            else:
+                response.body = serializer.serialize(self.obj)
 
         return response
 
@@ -738,6 +884,31 @@ class Resource(wsgi.Application):
         self.wsgi_extensions = {}
         self.wsgi_action_extensions = {}
         self.inherits = inherits
+        self._loaders = []
+        self._loaders_lock = threading.Lock()
+
+    def register_loader(self, loader):
+        """Defers part of the setup of this resource to its first use.
+
+        The loader is called with the resource before the first request
+        is dispatched to it, and registers the controller, its actions or
+        its extensions.
+        """
+
+        self._loaders.append(loader)
+
+    def _run_loaders(self):
+        if self._loaders:
+            # Concurrent requests wait for the loaders, and a loader is
+            # only dropped once it succeeded, so that no request is routed
+            # to a half set up resource.
+            with self._loaders_lock:
+                while self._loaders:
+                    self._loaders[0](self)
+                    self._loaders.pop(0)
+
+        if self.inherits:
+            self.inherits._run_loaders()
 
     def register_actions(self, controller):
         """Registers controller actions with this resource."""
@@ -888,6 +1059,8 @@ class Resource(wsgi.Application):
     def __call__(self, request):
         """WSGI method that controls (de)serialization and method dispatch."""
 
+        self._run_loaders()
+
         # Identify the action, its arguments, and the requested
         # content type
         action_args = self.get_action_args(request.environ)
@@ -975,6 +1148,13 @@ class Resource(wsgi.Application):
             else:
                 response = action_result
 
+            if resp_obj and request.is_not_modified():
+                # The client already has the response; the controller may
+                # not even have built it.
+                response = webob.Response(status=304)
+                request.set_validator_headers(response)
+                resp_obj = None
+
             # Run post-processing extensions
             if resp_obj:
                 # Do a preserialize to set up the response object
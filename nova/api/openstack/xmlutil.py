@@ -33,6 +33,12 @@ XMLNS_V11 = 'http://docs.openstack.org/compute/api/v1.1'
 XMLNS_COMMON_V10 = 'http://docs.openstack.org/common/api/v1.0'
 XMLNS_ATOM = 'http://www.w3.org/2005/Atom'
 
+# Bumped whenever a template element is modified, which invalidates the
+# compiled render plans.
+_TEMPLATE_GENERATION = 0
+_RENDER_PLANS = {}
+_RENDER_PLANS_MAX = 1000
+
 
 def validate_schema(xml, schema_name, version='v1.1'):
     if isinstance(xml, str):
@@ -225,6 +231,7 @@ class TemplateElement(object):
 
         self._children.append(elem)
         self._childmap[elem.tag] = elem
+        _template_modified()
 
     def extend(self, elems):
         """Append children to the element."""
@@ -246,6 +253,7 @@ class TemplateElement(object):
         # Update the children
         self._children.extend(elemlist)
         self._childmap.update(elemmap)
+        _template_modified()
 
     def insert(self, idx, elem):
         """Insert a child element at the given index."""
@@ -259,6 +267,7 @@ class TemplateElement(object):
 
         self._children.insert(idx, elem)
         self._childmap[elem.tag] = elem
+        _template_modified()
 
     def remove(self, elem):
         """Remove a child element."""
@@ -272,6 +281,7 @@ class TemplateElement(object):
 
         self._children.remove(elem)
         del self._childmap[elem.tag]
+        _template_modified()
 
     def get(self, key):
         """Get an attribute.
@@ -302,6 +312,7 @@ class TemplateElement(object):
             value = Selector(value)
 
         self.attrib[key] = value
+        _template_modified()
 
     def keys(self):
         """Return the attribute names."""
@@ -459,9 +470,11 @@ class TemplateElement(object):
             value = Selector(value)
 
         self._text = value
+        _template_modified()
 
     def _text_del(self):
         self._text = None
+        _template_modified()
 
     text = property(_text_get, _text_set, _text_del)
 
@@ -518,6 +531,198 @@ def SubTemplateElement(parent, tag, attrib=None, selector=None,
     return elem
 
 
+def _template_modified():
+    global _TEMPLATE_GENERATION
+    _TEMPLATE_GENERATION += 1
+
+
+def _overrides(obj, name, base):
+    """Whether obj's class overrides the method name of class base."""
+
+    return getattr(type(obj), name).im_func is not getattr(base, name).im_func
+
+
+def _compile_getter(selector, do_raise=False):
+    """Reduce a selector to a function of the object alone.
+
+    Single key Selectors and ConstantSelectors become direct getters;
+    any other selector is called as it is.
+    """
+
+    selector_type = type(selector)
+    if selector_type is ConstantSelector:
+        value = selector.value
+        return lambda obj: value
+    if selector_type is not Selector or len(selector.chain) > 1:
+        if do_raise:
+            return lambda obj: selector(obj, True)
+        return selector
+    if not selector.chain:
+        return lambda obj: obj
+
+    key = selector.chain[0]
+    if callable(key):
+        return key
+    if do_raise:
+        def _getter(obj):
+            try:
+                return obj[key]
+            except IndexError:
+                raise KeyError(key)
+    else:
+        def _getter(obj):
+            try:
+                return obj[key]
+            except (KeyError, IndexError):
+                return None
+    return _getter
+
+
+class _RenderNode(object):
+    """A template element compiled for rendering.
+
+    Merges a template element with the elements of the same name in the
+    slave templates, which only patch its text and attributes, and
+    reduces their selectors to direct getters.  Renders exactly like
+    Template._serialize() does.
+    """
+
+    def __init__(self, siblings):
+        elem = siblings[0]
+        self.tag = elem.tag
+        self.tag_is_callable = callable(elem.tag)
+        self.selector = _compile_getter(elem.selector)
+        self.subselector = None
+        if elem.subselector is not None:
+            self.subselector = _compile_getter(elem.subselector)
+        self.will_render = None
+        if _overrides(elem, 'will_render', TemplateElement):
+            self.will_render = elem.will_render
+
+        # Elements with their own apply() are applied as they are
+        self.appliers = None
+        self.text = None
+        self.attrs = []
+        if any(_overrides(sib, 'apply', TemplateElement)
+               for sib in siblings):
+            self.appliers = [sib.apply for sib in siblings]
+        else:
+            for sib in siblings:
+                if sib.text is not None:
+                    self.text = _compile_getter(sib.text)
+                for key, value in sib.attrib.items():
+                    self.attrs.append((key,
+                                       _compile_getter(value, do_raise=True)))
+
+        # Children are merged the way Template._serialize() does it
+        self.children = []
+        seen = set()
+        for idx, sibling in enumerate(siblings):
+            for child in sibling:
+                if child.tag in seen:
+                    continue
+                seen.add(child.tag)
+                nieces = [child]
+                for sib in siblings[idx + 1:]:
+                    if child.tag in sib:
+                        nieces.append(sib[child.tag])
+                self.children.append(_RenderNode(nieces))
+
+    def _make_element(self, parent, datum, nsmap):
+        if self.tag_is_callable:
+            tagname = self.tag(datum)
+        else:
+            tagname = self.tag
+        if parent is None:
+            elem = etree.Element(tagname, nsmap=nsmap)
+        else:
+            elem = etree.SubElement(parent, tagname, nsmap=nsmap)
+
+        if datum is None:
+            return elem
+
+        if self.appliers is not None:
+            for apply in self.appliers:
+                apply(elem, datum)
+            return elem
+
+        if self.text is not None:
+            elem.text = unicode(self.text(datum))
+        for key, getter in self.attrs:
+            try:
+                value = getter(datum)
+            except KeyError:
+                # Attribute has no value, so don't include it
+                continue
+            elem.set(key, unicode(value))
+        return elem
+
+    def render(self, parent, obj, nsmap=None):
+        """Render obj, returning the list of (element, datum) rendered."""
+
+        data = None if obj is None else self.selector(obj)
+
+        if self.will_render is not None:
+            if not self.will_render(data):
+                return []
+            if data is None:
+                return [(self._make_element(parent, None, nsmap), None)]
+        elif data is None:
+            return []
+
+        if not isinstance(data, list):
+            data = [data]
+        elif parent is None:
+            raise ValueError(_('root element selecting a list'))
+
+        subselector = self.subselector
+        elems = []
+        for datum in data:
+            if subselector is not None:
+                datum = subselector(datum)
+            elems.append((self._make_element(parent, datum, nsmap), datum))
+
+        for child in self.children:
+            for elem, datum in elems:
+                child.render(elem, datum)
+
+        return elems
+
+
+def _get_render_plan(siblings):
+    """Return the compiled render plan for a list of root siblings.
+
+    Plans are compiled once per combination of master and slave
+    template roots, and thrown away when any template is modified.
+    Returns None if the templates customize rendering in a way that
+    can not be compiled.
+    """
+
+    global _RENDER_PLANS
+    key = tuple(siblings)
+    cached = _RENDER_PLANS.get(key)
+    if cached is not None and cached[0] == _TEMPLATE_GENERATION:
+        return cached[1]
+
+    plan = None
+    if not any(_overrides(sib, method, TemplateElement)
+               for sib in _walk(siblings)
+               for method in ('render', '_render')):
+        plan = _RenderNode(siblings)
+
+    if len(_RENDER_PLANS) >= _RENDER_PLANS_MAX:
+        _RENDER_PLANS = {}
+    _RENDER_PLANS[key] = (_TEMPLATE_GENERATION, plan)
+    return plan
+
+
+def _walk(elems):
+    for elem in elems:
+        yield elem
+        for child in _walk(elem):
+            yield child
+
+
 class Template(object):
     """Represent a template."""
 
@@ -615,8 +820,15 @@ class Template(object):
         siblings = self._siblings()
         nsmap = self._nsmap()
 
-        # Form the element tree
-        return self._serialize(None, obj, siblings, nsmap)
+        # Form the element tree, with the compiled plan if possible
+        plan = None
+        if not _overrides(self, '_serialize', Template):
+            plan = _get_render_plan(siblings)
+        if plan is None:
+            return self._serialize(None, obj, siblings, nsmap)
+        elems = plan.render(None, obj, nsmap)
+        if elems:
+            return elems[0][0]
 
     def _siblings(self):
         """Hook method for computing root siblings.
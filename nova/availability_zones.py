@@ -18,7 +18,7 @@
 from oslo.config import cfg
 
 from nova import db
-from nova.openstack.common import memorycache
+from nova import sharedcache
 
 # NOTE(vish): azs don't change that often, so cache them for an hour to
 #             avoid hitting the db multiple times on every request.
@@ -42,7 +42,7 @@ def _get_cache():
     global MC
 
     if MC is None:
-        MC = memorycache.get_client()
+        MC = sharedcache.get_client()
 
     return MC
 
@@ -94,6 +94,19 @@ def get_host_availability_zone(context, host, conductor_api=None):
     return az
 
 
+def get_hosts_availability_zones(context, hosts):
+    """Returns the availability zones of several hosts, keyed by host."""
+    metadata = db.aggregate_host_get_by_metadata_key(
+        context, key='availability_zone')
+    zones = {}
+    for host in hosts:
+        if host in metadata:
+            zones[host] = list(metadata[host])[0]
+        else:
+            zones[host] = CONF.default_availability_zone
+    return zones
+
+
 def get_availability_zones(context, get_only_available=False):
     """Return available and unavailable zones on demands.
 
@@ -1545,6 +1545,17 @@ class API(base.Base):
         return self.db.instance_get_active_by_window_joined(context, begin,
                                                      end, project_id)
 
+    def get_usage_by_window(self, context, begin, end=None, project_id=None):
+        """Get the usage data of instances active over a window.
+
+        Returns a list of dicts holding only the instance fields usage
+        reports need, and the flavor items of system_metadata.
+        """
+        sys_meta_keys = ['instance_type_%s' % key
+                         for key in flavors.system_metadata_flavor_props]
+        return self.db.instance_get_usage_by_window(context, begin, end,
+                                                    project_id, sys_meta_keys)
+
     #NOTE(bcwaldon): this doesn't really belong in this class
     def get_instance_type(self, context, instance_type_id):
         """Get an instance type by instance type id."""
@@ -1588,6 +1599,49 @@ class API(base.Base):
         parameter.
         """
 
+        filters = self._get_all_filters(context, search_opts)
+        if filters is None:
+            # We already know we can't match the filter, so
+            # return an empty list
+            return []
+
+        inst_models = self._get_instances_by_filters(context, filters,
+                                                     sort_key, sort_dir,
+                                                     limit=limit,
+                                                     marker=marker)
+        if want_objects:
+            return inst_models
+
+        # Convert the models to dictionaries
+        instances = []
+        for inst_model in inst_models:
+            instances.append(obj_base.obj_to_primitive(inst_model))
+
+        return instances
+
+    def get_all_validator(self, context, search_opts=None):
+        """Get a cheap validator for the instances get_all() would return
+        for the given search options, whatever the pagination.
+
+        Returns a dict with the number of matching instances under 'count',
+        a digest of what is shown of them under 'digest' and the time of
+        the latest change to them, or to instances which stopped matching,
+        under 'updated_at'.  Returns None if the search options can't be
+        validated without the full search.
+        """
+        filters = self._get_all_filters(context, search_opts)
+        if filters is None:
+            return {'count': 0, 'digest': None, 'updated_at': None}
+        if 'ip6' in filters or 'ip' in filters:
+            # Matched by the network API rather than the database
+            return None
+        return self.db.instance_get_validator_by_filters(context, filters)
+
+    def _get_all_filters(self, context, search_opts):
+        """Check the policy for and build the DB filters of get_all().
+
+        Returns None if the search options can't match any instance.
+        """
         #TODO(bcwaldon): determine the best argument for target here
         target = {
             'project_id': context.project_id,
@@ -1644,25 +1698,10 @@ class API(base.Base):
                 else:
                     try:
                         remap_object(value)
-
-                    # We already know we can't match the filter, so
-                    # return an empty list
                     except ValueError:
-                        return []
+                        return None
 
-        inst_models = self._get_instances_by_filters(context, filters,
-                                                     sort_key, sort_dir,
-                                                     limit=limit,
-                                                     marker=marker)
-        if want_objects:
-            return inst_models
-
-        # Convert the models to dictionaries
-        instances = []
-        for inst_model in inst_models:
-            instances.append(obj_base.obj_to_primitive(inst_model))
-
-        return instances
+        return filters
 
     def _get_instances_by_filters(self, context, filters,
                                   sort_key, sort_dir,
@@ -2789,6 +2828,22 @@ class API(base.Base):
             return block_device.legacy_mapping(bdms)
         return bdms
 
+    def get_instances_bdms(self, context, instances, legacy=True):
+        """Get all bdm tables for several instances with a single query.
+
+        Returns a dict of bdm lists keyed by instance uuid, with an entry
+        for every instance.
+        """
+        uuids = [instance['uuid'] for instance in instances]
+        result = dict((uuid, []) for uuid in uuids)
+        for bdm in self.db.block_device_mapping_get_all_by_instance_uuids(
+                context, uuids):
+            result[bdm['instance_uuid']].append(bdm)
+        if legacy:
+            for uuid, bdms in result.iteritems():
+                result[uuid] = block_device.legacy_mapping(bdms)
+        return result
+
     def is_volume_backed_instance(self, context, instance, bdms):
         if not instance['image_ref']:
             return True
@@ -184,6 +184,20 @@ def get_all_flavors_sorted_list(ctxt=None, inactive=False, filters=None,
                              sort_dir=sort_dir, limit=limit, marker=marker)
 
 
+def get_flavors_validator(ctxt=None):
+    """Get a cheap validator for the flavors get_all_flavors_sorted_list()
+    returns, whatever the filters.
+
+    Returns a dict with a count of flavor rows under 'count', a digest of
+    them under 'digest' and the time of the latest change to the flavors
+    under 'updated_at'.
+    """
+    if ctxt is None:
+        ctxt = context.get_admin_context()
+
+    return db.flavor_get_validator(ctxt)
+
+
 def get_default_flavor():
     """Get the default flavor."""
     name = CONF.default_flavor
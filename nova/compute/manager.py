@@ -372,6 +372,13 @@ class ComputeVirtAPI(virtapi.VirtAPI):
         return self._compute.conductor_api.instance_type_get(context,
                                                              instance_type_id)
 
+    def action_event_start(self, context, values):
+        return self._compute.conductor_api.action_event_start(context, values)
+
+    def action_event_finish(self, context, values):
+        return self._compute.conductor_api.action_event_finish(context,
+                                                               values)
+
 
 class ComputeManager(manager.SchedulerDependentManager):
     """Manages the running instances from creation to destruction."""
@@ -294,7 +294,9 @@ def get_nw_info_for_instance(instance):
     info_cache = instance['info_cache'] or {}
     nw_info = info_cache.get('network_info') or []
     if not isinstance(nw_info, network_model.NetworkInfo):
-        nw_info = network_model.NetworkInfo.hydrate(nw_info)
+        # The same cache gets hydrated over and over again by API views and
+        # firewall rule expansion, so share a read-only copy of each value.
+        nw_info = network_model.hydrate_frozen(nw_info)
     return nw_info
 
 
@@ -335,6 +335,10 @@ class ConductorManager(manager.Manager):
 
     def instance_get_all_by_filters(self, context, filters, sort_key,
                                     sort_dir, columns_to_join=None):
+        changes_since = filters.get('changes-since')
+        if isinstance(changes_since, basestring):
+            filters = dict(filters)
+            filters['changes-since'] = timeutils.parse_strtime(changes_since)
         result = self.db.instance_get_all_by_filters(
             context, filters, sort_key, sort_dir,
             columns_to_join=columns_to_join)
@@ -422,10 +426,12 @@ class ConductorManager(manager.Manager):
 
         return jsonutils.to_primitive(result)
 
+    @rpc_common.client_exceptions(exception.InstanceActionNotFound)
     def action_event_start(self, context, values):
         evt = self.db.action_event_start(context, values)
         return jsonutils.to_primitive(evt)
 
+    @rpc_common.client_exceptions(exception.InstanceActionNotFound)
     def action_event_finish(self, context, values):
         evt = self.db.action_event_finish(context, values)
         return jsonutils.to_primitive(evt)
@@ -337,6 +337,11 @@ def floating_ip_get_by_fixed_ip_id(context, fixed_ip_id):
     return IMPL.floating_ip_get_by_fixed_ip_id(context, fixed_ip_id)
 
 
+def floating_ip_get_by_fixed_ip_ids(context, fixed_ip_ids):
+    """Get all floating ips associated with any of the given fixed ips."""
+    return IMPL.floating_ip_get_by_fixed_ip_ids(context, fixed_ip_ids)
+
+
 def floating_ip_update(context, address, values):
     """Update a floating ip by address or raise if it doesn't exist."""
     return IMPL.floating_ip_update(context, address, values)
@@ -511,6 +516,11 @@ def fixed_ips_by_virtual_interface(context, vif_id):
     return IMPL.fixed_ips_by_virtual_interface(context, vif_id)
 
 
+def fixed_ips_by_virtual_interfaces(context, vif_ids):
+    """Get fixed ips for all of the given virtual interfaces."""
+    return IMPL.fixed_ips_by_virtual_interfaces(context, vif_ids)
+
+
 def fixed_ip_update(context, address, values):
     """Create a fixed ip from the values dictionary."""
     return IMPL.fixed_ip_update(context, address, values)
@@ -608,6 +618,13 @@ def instance_get_all_by_filters(context, filters, sort_key='created_at',
                                             columns_to_join=columns_to_join)
 
 
+def instance_get_validator_by_filters(context, filters):
+    """Get the number of instances that match all filters and the time of
+    the latest change to them.
+    """
+    return IMPL.instance_get_validator_by_filters(context, filters)
+
+
 def instance_get_active_by_window_joined(context, begin, end=None,
                                          project_id=None, host=None):
     """Get instances and joins active during a certain time window.
@@ -619,6 +636,18 @@ def instance_get_active_by_window_joined(context, begin, end=None,
                                               project_id, host)
 
 
+def instance_get_usage_by_window(context, begin, end=None, project_id=None,
+                                 sys_meta_keys=None):
+    """Get the usage data of instances active during a certain time window.
+
+    Returns a list of dicts holding the instance columns usage reports
+    need and the system_metadata items named by sys_meta_keys.
+    Specifying a project_id will filter for a certain project.
+    """
+    return IMPL.instance_get_usage_by_window(context, begin, end,
+                                             project_id, sys_meta_keys)
+
+
 def instance_get_all_by_host(context, host, columns_to_join=None):
     """Get all instances belonging to a host."""
     return IMPL.instance_get_all_by_host(context, host, columns_to_join)
@@ -1100,6 +1129,14 @@ def get_ec2_volume_id_by_uuid(context, volume_id):
     return IMPL.get_ec2_volume_id_by_uuid(context, volume_id)
 
 
+def get_ec2_volume_ids_by_uuids(context, volume_ids):
+    """Get ec2 ids of several volume uuids, keyed by uuid.
+
+    Uuids without a mapping in the volume_id_mappings table are left out.
+    """
+    return IMPL.get_ec2_volume_ids_by_uuids(context, volume_ids)
+
+
 def get_volume_uuid_by_ec2_id(context, ec2_id):
     return IMPL.get_volume_uuid_by_ec2_id(context, ec2_id)
 
@@ -1116,6 +1153,14 @@ def get_ec2_snapshot_id_by_uuid(context, snapshot_id):
     return IMPL.get_ec2_snapshot_id_by_uuid(context, snapshot_id)
 
 
+def get_ec2_snapshot_ids_by_uuids(context, snapshot_ids):
+    """Get ec2 ids of several snapshot uuids, keyed by uuid.
+
+    Uuids without a mapping in the snapshot_id_mappings table are left out.
+    """
+    return IMPL.get_ec2_snapshot_ids_by_uuids(context, snapshot_ids)
+
+
 def ec2_snapshot_create(context, snapshot_id, forced_id=None):
     return IMPL.ec2_snapshot_create(context, snapshot_id, forced_id)
 
@@ -1147,6 +1192,12 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid):
                                                          instance_uuid)
 
 
+def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids):
+    """Get all block device mapping belonging to several instances."""
+    return IMPL.block_device_mapping_get_all_by_instance_uuids(
+        context, instance_uuids)
+
+
 def block_device_mapping_destroy(context, bdm_id):
     """Destroy the block device mapping."""
     return IMPL.block_device_mapping_destroy(context, bdm_id)
@@ -1384,6 +1435,11 @@ def flavor_get_all(context, inactive=False, filters=None, sort_key='flavorid',
 instance_type_get_all = flavor_get_all
 
 
+def flavor_get_validator(context):
+    """Get the number of flavor rows and the time of the latest change."""
+    return IMPL.flavor_get_validator(context)
+
+
 def flavor_get(context, id):
     """Get instance type by id."""
     return IMPL.flavor_get(context, id)
@@ -1623,6 +1679,14 @@ def s3_image_get_by_uuid(context, image_uuid):
     return IMPL.s3_image_get_by_uuid(context, image_uuid)
 
 
+def s3_image_ids_get_by_uuids(context, image_uuids):
+    """Get the ids of the local s3 images of several uuids, keyed by uuid.
+
+    Uuids without a local s3 image are left out.
+    """
+    return IMPL.s3_image_ids_get_by_uuids(context, image_uuids)
+
+
 def s3_image_create(context, image_uuid):
     """Create local s3 image represented by provided uuid."""
     return IMPL.s3_image_create(context, image_uuid)
@@ -1789,6 +1853,14 @@ def get_ec2_instance_id_by_uuid(context, instance_id):
     return IMPL.get_ec2_instance_id_by_uuid(context, instance_id)
 
 
+def get_ec2_instance_ids_by_uuids(context, instance_uuids):
+    """Get ec2 ids of several instance uuids, keyed by uuid.
+
+    Uuids without a mapping in the instance_id_mappings table are left out.
+    """
+    return IMPL.get_ec2_instance_ids_by_uuids(context, instance_uuids)
+
+
 def get_instance_uuid_by_ec2_id(context, ec2_id):
     """Get uuid through ec2 id from instance_id_mappings table."""
     return IMPL.get_instance_uuid_by_ec2_id(context, ec2_id)
@@ -1799,6 +1871,17 @@ def ec2_instance_create(context, instance_uuid, id=None):
     return IMPL.ec2_instance_create(context, instance_uuid, id)
 
 
+def ec2_id_mappings_get(context, resource, ids=None, limit=None):
+    """Get the ec2 id mappings of a kind of resource as (uuid, id) pairs.
+
+    resource is one of 'instance', 'volume', 'snapshot' or 'image'.  The
+    mappings are filtered by ec2 ids when given, and limited to the most
+    recently created ones when limit is given.  The get_ec2_*_ids_by_uuids
+    calls look mappings up by uuid.
+    """
+    return IMPL.ec2_id_mappings_get(context, resource, ids, limit)
+
+
 ####################
 
 
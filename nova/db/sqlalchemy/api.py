@@ -23,6 +23,7 @@ import collections
 import copy
 import datetime
 import functools
+import hashlib
 import sys
 import time
 import uuid
@@ -371,6 +372,15 @@ def service_destroy(context, service_id):
         if count == 0:
             raise exception.ServiceNotFound(service_id=service_id)
 
+        compute_nodes = model_query(context, models.ComputeNode,
+                                    session=session).\
+                    filter_by(service_id=service_id).\
+                    with_lockmode('update').\
+                    all()
+        for compute_node in compute_nodes:
+            _compute_node_statistics_apply(context, compute_node['id'],
+                                           compute_node, None, session)
+
         model_query(context, models.ComputeNode, session=session).\
                     filter_by(service_id=service_id).\
                     soft_delete(synchronize_session=False)
@@ -503,6 +513,64 @@ def _compute_node_get(context, compute_id, session=None):
     return result
 
 
+_COMPUTE_NODE_STATISTICS_FIELDS = ('count', 'vcpus', 'memory_mb', 'local_gb',
+                                   'vcpus_used', 'memory_mb_used',
+                                   'local_gb_used', 'free_ram_mb',
+                                   'free_disk_gb', 'current_workload',
+                                   'running_vms', 'disk_available_least')
+# The shard rows are created by migration 212, which uses the same number
+_COMPUTE_NODE_STATISTICS_SHARDS = 16
+
+
+def _compute_node_get_for_update(context, compute_id, session):
+    # Without the joins of _compute_node_get(), which can't be locked on
+    # the nullable side of an outer join on all backends.
+    result = model_query(context, models.ComputeNode, session=session).\
+            filter_by(id=compute_id).\
+            with_lockmode('update').\
+            first()
+
+    if not result:
+        raise exception.ComputeHostNotFound(host=compute_id)
+
+    return result
+
+
+def _compute_node_statistics_values(compute_node):
+    values = {'count': 1}
+    for field in _COMPUTE_NODE_STATISTICS_FIELDS[1:]:
+        values[field] = int(compute_node[field] or 0)
+    return values
+
+
+def _compute_node_statistics_apply(context, compute_id, old, new, session):
+    """Apply the change of one compute node to the statistics shards.
+
+    old and new are the compute node, or its statistics values, before and
+    after the change; None when it didn't exist before or doesn't after.
+    The caller must hold the compute node row lock so that two updates of
+    the same node can't both apply their delta to the same old values.
+    """
+    if old is not None and not isinstance(old, dict):
+        old = _compute_node_statistics_values(old)
+    if new is not None:
+        new = _compute_node_statistics_values(new)
+
+    table = models.ComputeNodeStatistics
+    deltas = {}
+    for field in _COMPUTE_NODE_STATISTICS_FIELDS:
+        delta = (new or {}).get(field, 0) - (old or {}).get(field, 0)
+        if delta:
+            column = getattr(table, field)
+            deltas[column] = column + delta
+    if not deltas:
+        return
+
+    model_query(context, table, session=session).\
+            filter_by(id=compute_id % _COMPUTE_NODE_STATISTICS_SHARDS).\
+            update(deltas, synchronize_session=False)
+
+
 @require_admin_context
 def compute_node_get_all(context):
     return model_query(context, models.ComputeNode).\
@@ -540,9 +608,13 @@ def compute_node_create(context, values):
     _prep_stats_dict(values)
     convert_datetimes(values, 'created_at', 'deleted_at', 'updated_at')
 
-    compute_node_ref = models.ComputeNode()
-    compute_node_ref.update(values)
-    compute_node_ref.save()
+    session = get_session()
+    with session.begin():
+        compute_node_ref = models.ComputeNode()
+        compute_node_ref.update(values)
+        compute_node_ref.save(session=session)
+        _compute_node_statistics_apply(context, compute_node_ref['id'],
+                                       None, compute_node_ref, session)
     return compute_node_ref
 
 
@@ -590,6 +662,8 @@ def compute_node_update(context, compute_id, values, prune_stats=False):
     session = get_session()
     with session.begin():
         _update_stats(context, stats, compute_id, session, prune_stats)
+        old_values = _compute_node_statistics_values(
+            _compute_node_get_for_update(context, compute_id, session))
         compute_ref = _compute_node_get(context, compute_id, session=session)
         # Always update this, even if there's going to be no other
         # changes in data.  This ensures that we invalidate the
@@ -597,44 +671,37 @@ def compute_node_update(context, compute_id, values, prune_stats=False):
         values['updated_at'] = timeutils.utcnow()
         convert_datetimes(values, 'created_at', 'deleted_at', 'updated_at')
         compute_ref.update(values)
+        _compute_node_statistics_apply(context, compute_id, old_values,
+                                       compute_ref, session)
     return compute_ref
 
 
 @require_admin_context
 def compute_node_delete(context, compute_id):
     """Delete a ComputeNode record."""
-    result = model_query(context, models.ComputeNode).\
-             filter_by(id=compute_id).\
-             soft_delete()
-
-    if not result:
-        raise exception.ComputeHostNotFound(host=compute_id)
+    session = get_session()
+    with session.begin():
+        compute_ref = _compute_node_get_for_update(context, compute_id,
+                                                   session)
+        _compute_node_statistics_apply(context, compute_id, compute_ref,
+                                       None, session)
+        model_query(context, models.ComputeNode, session=session).\
+                filter_by(id=compute_id).\
+                soft_delete(synchronize_session=False)
 
 
 def compute_node_statistics(context):
     """Compute statistics over all compute nodes."""
+    table = models.ComputeNodeStatistics
     result = model_query(context,
-                         func.count(models.ComputeNode.id),
-                         func.sum(models.ComputeNode.vcpus),
-                         func.sum(models.ComputeNode.memory_mb),
-                         func.sum(models.ComputeNode.local_gb),
-                         func.sum(models.ComputeNode.vcpus_used),
-                         func.sum(models.ComputeNode.memory_mb_used),
-                         func.sum(models.ComputeNode.local_gb_used),
-                         func.sum(models.ComputeNode.free_ram_mb),
-                         func.sum(models.ComputeNode.free_disk_gb),
-                         func.sum(models.ComputeNode.current_workload),
-                         func.sum(models.ComputeNode.running_vms),
-                         func.sum(models.ComputeNode.disk_available_least),
-                         base_model=models.ComputeNode,
+                         *[func.sum(getattr(table, field))
+                           for field in _COMPUTE_NODE_STATISTICS_FIELDS],
+                         base_model=table,
                          read_deleted="no").first()
 
     # Build a dict of the info--making no assumptions about result
-    fields = ('count', 'vcpus', 'memory_mb', 'local_gb', 'vcpus_used',
-              'memory_mb_used', 'local_gb_used', 'free_ram_mb', 'free_disk_gb',
-              'current_workload', 'running_vms', 'disk_available_least')
     return dict((field, int(result[idx] or 0))
-                for idx, field in enumerate(fields))
+                for idx, field in enumerate(_COMPUTE_NODE_STATISTICS_FIELDS))
 
 
 ###################
@@ -933,6 +1000,15 @@ def floating_ip_get_by_fixed_ip_id(context, fixed_ip_id):
                 all()
 
 
+@require_context
+def floating_ip_get_by_fixed_ip_ids(context, fixed_ip_ids):
+    if not fixed_ip_ids:
+        return []
+    return model_query(context, models.FloatingIp).\
+                filter(models.FloatingIp.fixed_ip_id.in_(fixed_ip_ids)).\
+                all()
+
+
 @require_context
 def floating_ip_update(context, address, values):
     session = get_session()
@@ -1305,6 +1381,17 @@ def fixed_ips_by_virtual_interface(context, vif_id):
     return result
 
 
+@require_context
+def fixed_ips_by_virtual_interfaces(context, vif_ids):
+    if not vif_ids:
+        return []
+    result = model_query(context, models.FixedIp, read_deleted="no").\
+                 filter(models.FixedIp.virtual_interface_id.in_(vif_ids)).\
+                 all()
+
+    return result
+
+
 @require_context
 def fixed_ip_update(context, address, values):
     session = get_session()
@@ -1760,7 +1847,116 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
 
     query_prefix = query_prefix.order_by(sort_fn[sort_dir](
             getattr(models.Instance, sort_key)))
+    query_prefix = _instances_filter(context, query_prefix, filters)
+
+    # paginate query
+    if marker is not None:
+        try:
+            marker = _instance_get_by_uuid(context, marker, session=session)
+        except exception.InstanceNotFound:
+            raise exception.MarkerNotFound(marker)
+    query_prefix = sqlalchemyutils.paginate_query(query_prefix,
+                           models.Instance, limit,
+                           [sort_key, 'created_at', 'id'],
+                           marker=marker,
+                           sort_dir=sort_dir)
 
+    return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
+
+
+def _rows_digest(digest, query):
+    """Feeds the rows of query to digest, in a stable order."""
+    for row in sorted([repr(tuple(row)) for row in query]):
+        digest.update(row)
+
+
+@require_context
+def instance_get_validator_by_filters(context, filters):
+    """Return a cheap validator for instance_get_all_by_filters() with
+    the same filters, whatever the pagination.
+
+    That is a dict with the number of matching instances under 'count',
+    a digest of the columns the API shows of them and of their info
+    caches, metadata, block device mappings, security groups and faults
+    under 'digest', and the time of the latest change to any instance of
+    the same project or user under 'updated_at'.  The digest changes on
+    every write to what is listed, while 'updated_at' also covers the
+    instances which were deleted or which stopped matching the filters.
+    No instance is loaded whole.
+    """
+    session = get_session()
+    instance = models.Instance
+    query = session.query(instance.uuid, instance.updated_at,
+                          instance.deleted, instance.vm_state,
+                          instance.task_state, instance.power_state,
+                          instance.display_name, instance.host,
+                          instance.progress, instance.instance_type_id)
+    rows = _instances_filter(context, query, filters).all()
+    digest = hashlib.sha1()
+    _rows_digest(digest, rows)
+
+    uuids = _instances_filter(context, session.query(instance.uuid),
+                              filters).subquery()
+    related = [
+        (models.InstanceInfoCache.instance_uuid,
+         models.InstanceInfoCache.network_info),
+        (models.InstanceMetadata.instance_uuid, models.InstanceMetadata.key,
+         models.InstanceMetadata.value, models.InstanceMetadata.deleted),
+        (models.BlockDeviceMapping.instance_uuid,
+         models.BlockDeviceMapping.device_name,
+         models.BlockDeviceMapping.volume_id,
+         models.BlockDeviceMapping.deleted),
+        (models.InstanceFault.instance_uuid, models.InstanceFault.id),
+    ]
+    for columns in related:
+        _rows_digest(digest, session.query(*columns).
+                                     filter(columns[0].in_(uuids)))
+    association = models.SecurityGroupInstanceAssociation
+    _rows_digest(digest, session.query(association.instance_uuid,
+                                       association.deleted,
+                                       models.SecurityGroup.name).
+                                 join(models.SecurityGroup,
+                                      association.security_group_id ==
+                                      models.SecurityGroup.id).
+                                 filter(association.instance_uuid.in_(uuids)))
+
+    # Instances leave the other filters on update or delete, which still
+    # makes the latest change of their project or user later
+    scope = dict([(key, filters[key]) for key in ('project_id', 'user_id')
+                  if key in filters])
+    times = []
+    scoped = _instances_filter(context,
+                               session.query(func.max(instance.created_at),
+                                             func.max(instance.updated_at),
+                                             func.max(instance.deleted_at)),
+                               scope)
+    times.extend(scoped.first())
+    uuids = _instances_filter(context, session.query(instance.uuid),
+                              scope).subquery()
+    for model in (models.InstanceInfoCache, models.InstanceMetadata,
+                  models.BlockDeviceMapping,
+                  models.SecurityGroupInstanceAssociation,
+                  models.InstanceFault):
+        latest = session.query(func.max(model.created_at),
+                               func.max(model.updated_at),
+                               func.max(model.deleted_at)).\
+                         filter(model.instance_uuid.in_(uuids))
+        times.extend(latest.first())
+    groups = session.query(func.max(models.SecurityGroup.updated_at)).\
+                     join(association, association.security_group_id ==
+                                       models.SecurityGroup.id).\
+                     filter(association.instance_uuid.in_(uuids))
+    times.extend(groups.first())
+
+    times = [time for time in times if time is not None]
+    return {'count': len(rows), 'digest': digest.hexdigest(),
+            'updated_at': times and max(times) or None}
+
+
+def _instances_filter(context, query_prefix, filters):
+    """Apply the filters of instance_get_all_by_filters() to a query on
+    instances.
+    """
     # Make a copy of the filters dictionary to use going forward, as we'll
     # be modifying it and we shouldn't affect the caller's use of it.
     filters = filters.copy()
@@ -1815,24 +2011,10 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                                 filters, exact_match_filter_names)
 
     query_prefix = regex_filter(query_prefix, models.Instance, filters)
-    query_prefix = tag_filter(context, query_prefix, models.Instance,
-                              models.InstanceMetadata,
-                              models.InstanceMetadata.instance_uuid,
-                              filters)
-
-    # paginate query
-    if marker is not None:
-        try:
-            marker = _instance_get_by_uuid(context, marker, session=session)
-        except exception.InstanceNotFound:
-            raise exception.MarkerNotFound(marker)
-    query_prefix = sqlalchemyutils.paginate_query(query_prefix,
-                           models.Instance, limit,
-                           [sort_key, 'created_at', 'id'],
-                           marker=marker,
-                           sort_dir=sort_dir)
-
-    return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
+    return tag_filter(context, query_prefix, models.Instance,
+                      models.InstanceMetadata,
+                      models.InstanceMetadata.instance_uuid,
+                      filters)
 
 
 def tag_filter(context, query, model, model_metadata,
@@ -1944,6 +2126,56 @@ def instance_get_active_by_window_joined(context, begin, end=None,
     return _instances_fill_metadata(context, query.all())
 
 
+_USAGE_COLUMNS = ('id', 'uuid', 'display_name', 'project_id', 'vm_state',
+                  'launched_at', 'terminated_at', 'instance_type_id',
+                  'deleted')
+_USAGE_BATCH_SIZE = 1000
+
+
+@require_context
+def instance_get_usage_by_window(context, begin, end=None, project_id=None,
+                                 sys_meta_keys=None):
+    """Return the usage data of instances active during window.
+
+    Only the instance columns in _USAGE_COLUMNS are loaded, along with the
+    key and value of the system_metadata items named by sys_meta_keys, or
+    of all of them if None.  The system_metadata is looked up for batches
+    of instances, rather than for all of them at once.
+    """
+    query = model_query(context, *[getattr(models.Instance, column)
+                                   for column in _USAGE_COLUMNS],
+                        base_model=models.Instance, read_deleted='yes')
+    query = query.filter(or_(models.Instance.terminated_at == None,
+                             models.Instance.terminated_at > begin))
+    if end:
+        query = query.filter(models.Instance.launched_at < end)
+    if project_id:
+        query = query.filter_by(project_id=project_id)
+    instances = [dict(zip(_USAGE_COLUMNS, row))
+                 for row in query.order_by(models.Instance.id).all()]
+
+    for start in xrange(0, len(instances), _USAGE_BATCH_SIZE):
+        _instances_usage_fill_system_metadata(
+                context, instances[start:start + _USAGE_BATCH_SIZE],
+                sys_meta_keys)
+    return instances
+
+
+def _instances_usage_fill_system_metadata(context, instances, keys):
+    model = models.InstanceSystemMetadata
+    query = model_query(context, model.instance_uuid, model.key, model.value,
+                        base_model=model).\
+                    filter(model.instance_uuid.in_(
+                        [instance['uuid'] for instance in instances]))
+    if keys is not None:
+        query = query.filter(model.key.in_(keys))
+    sys_meta = collections.defaultdict(list)
+    for instance_uuid, key, value in query:
+        sys_meta[instance_uuid].append({'key': key, 'value': value})
+    for instance in instances:
+        instance['system_metadata'] = sys_meta[instance['uuid']]
+
+
 def _instance_get_all_query(context, project_only=False, joins=None):
     if joins is None:
         joins = ['info_cache', 'security_groups']
@@ -3257,6 +3489,19 @@ def get_ec2_volume_id_by_uuid(context, volume_id):
     return result['id']
 
 
+@require_context
+def get_ec2_volume_ids_by_uuids(context, volume_ids):
+    if not volume_ids:
+        return {}
+    rows = model_query(context, models.VolumeIdMapping.uuid,
+                       models.VolumeIdMapping.id,
+                       base_model=models.VolumeIdMapping,
+                       read_deleted='yes').\
+                    filter(models.VolumeIdMapping.uuid.in_(volume_ids)).\
+                    all()
+    return dict(rows)
+
+
 @require_context
 def get_volume_uuid_by_ec2_id(context, ec2_id):
     result = _ec2_volume_get_query(context).\
@@ -3294,6 +3539,19 @@ def get_ec2_snapshot_id_by_uuid(context, snapshot_id):
     return result['id']
 
 
+@require_context
+def get_ec2_snapshot_ids_by_uuids(context, snapshot_ids):
+    if not snapshot_ids:
+        return {}
+    rows = model_query(context, models.SnapshotIdMapping.uuid,
+                       models.SnapshotIdMapping.id,
+                       base_model=models.SnapshotIdMapping,
+                       read_deleted='yes').\
+                    filter(models.SnapshotIdMapping.uuid.in_(snapshot_ids)).\
+                    all()
+    return dict(rows)
+
+
 @require_context
 def get_snapshot_uuid_by_ec2_id(context, ec2_id):
     result = _ec2_snapshot_get_query(context).\
@@ -3390,6 +3648,16 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid):
                  all()
 
 
+@require_context
+def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids):
+    if not instance_uuids:
+        return []
+    return _block_device_mapping_get_query(context).\
+                 filter(models.BlockDeviceMapping.instance_uuid.in_(
+                     instance_uuids)).\
+                 all()
+
+
 @require_context
 def block_device_mapping_destroy(context, bdm_id):
     _block_device_mapping_get_query(context).\
@@ -4121,6 +4389,32 @@ def flavor_get_all(context, inactive=False, filters=None,
     return [_dict_with_extra_specs(i) for i in inst_types]
 
 
+@require_context
+def flavor_get_validator(context):
+    """Return a cheap validator for flavor_get_all(), whatever the filters.
+
+    That is the number of rows, deleted or not, of the flavor and flavor
+    access tables, a digest of their columns and the time of the latest
+    change to them, in a dict with 'count', 'digest' and 'updated_at'
+    keys.
+    """
+    count = 0
+    digest = hashlib.sha1()
+    times = []
+    for model in (models.InstanceTypes, models.InstanceTypeProjects):
+        columns = list(model.__table__.columns)
+        rows = model_query(context, *columns, base_model=model,
+                           read_deleted="yes").all()
+        count += len(rows)
+        _rows_digest(digest, rows)
+        for row in rows:
+            times.extend(time for time in (row.created_at, row.updated_at,
+                                           row.deleted_at)
+                         if time is not None)
+    return {'count': count, 'digest': digest.hexdigest(),
+            'updated_at': times and max(times) or None}
+
+
 def _instance_type_get_id_from_flavor_query(context, flavor_id, session=None):
     return model_query(context, models.InstanceTypes.id, read_deleted="no",
                        session=session, base_model=models.InstanceTypes).\
@@ -4741,6 +5035,17 @@ def s3_image_get_by_uuid(context, image_uuid):
     return result
 
 
+def s3_image_ids_get_by_uuids(context, image_uuids):
+    """Find the ids of the local s3 images of the provided uuids."""
+    if not image_uuids:
+        return {}
+    rows = model_query(context, models.S3Image.uuid, models.S3Image.id,
+                       base_model=models.S3Image, read_deleted='yes').\
+                 filter(models.S3Image.uuid.in_(image_uuids)).\
+                 all()
+    return dict(rows)
+
+
 def s3_image_create(context, image_uuid):
     """Create local s3 image represented by provided uuid."""
     try:
@@ -5240,6 +5545,19 @@ def get_ec2_instance_id_by_uuid(context, instance_id):
     return result['id']
 
 
+@require_context
+def get_ec2_instance_ids_by_uuids(context, instance_uuids):
+    if not instance_uuids:
+        return {}
+    rows = model_query(context, models.InstanceIdMapping.uuid,
+                       models.InstanceIdMapping.id,
+                       base_model=models.InstanceIdMapping,
+                       read_deleted='yes').\
+                    filter(models.InstanceIdMapping.uuid.in_(instance_uuids)).\
+                    all()
+    return dict(rows)
+
+
 @require_context
 def get_instance_uuid_by_ec2_id(context, ec2_id):
     result = _ec2_instance_get_query(context).\
@@ -5259,6 +5577,28 @@ def _ec2_instance_get_query(context, session=None):
                        read_deleted='yes')
 
 
+_EC2_ID_MAPPING_MODELS = {
+    'instance': models.InstanceIdMapping,
+    'volume': models.VolumeIdMapping,
+    'snapshot': models.SnapshotIdMapping,
+    'image': models.S3Image,
+}
+
+
+@require_context
+def ec2_id_mappings_get(context, resource, ids=None, limit=None):
+    model = _EC2_ID_MAPPING_MODELS[resource]
+    query = model_query(context, model.uuid, model.id, base_model=model,
+                        read_deleted='yes')
+    if ids is not None:
+        if not ids:
+            return []
+        query = query.filter(model.id.in_(ids))
+    if limit is not None:
+        query = query.order_by(model.id.desc()).limit(limit)
+    return query.all()
+
+
 def _task_log_get_query(context, task_name, period_beginning,
                         period_ending, host=None, state=None, session=None):
     query = model_query(context, models.TaskLog, session=session).\
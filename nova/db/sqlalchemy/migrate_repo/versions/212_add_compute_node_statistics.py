@@ -0,0 +1,75 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, MetaData, Table
+
+from nova.db.sqlalchemy import api as db
+from nova.db.sqlalchemy import utils
+from nova.openstack.common import timeutils
+
+
+TABLE_NAME = 'compute_node_statistics'
+
+# Must match _COMPUTE_NODE_STATISTICS_SHARDS in nova.db.sqlalchemy.api
+SHARDS = 16
+
+FIELDS = ('vcpus', 'memory_mb', 'local_gb', 'vcpus_used', 'memory_mb_used',
+          'local_gb_used', 'free_ram_mb', 'free_disk_gb', 'current_workload',
+          'running_vms', 'disk_available_least')
+
+
+def _columns():
+    columns = [Column('created_at', DateTime),
+               Column('updated_at', DateTime),
+               Column('deleted_at', DateTime),
+               Column('id', Integer, primary_key=True, nullable=False),
+               Column('count', BigInteger, nullable=False, default=0)]
+    for field in FIELDS:
+        columns.append(Column(field, BigInteger, nullable=False, default=0))
+    columns.append(Column('deleted', Integer))
+    return columns
+
+
+def upgrade(migrate_engine):
+    meta = MetaData(bind=migrate_engine)
+
+    for name in (TABLE_NAME, db._SHADOW_TABLE_PREFIX + TABLE_NAME):
+        table = Table(name, meta, *_columns(),
+                      mysql_engine='InnoDB', mysql_charset='utf8')
+        table.create()
+    statistics = Table(TABLE_NAME, meta, autoload=True)
+
+    # Start every shard from the compute nodes that exist now; the
+    # compute node write paths keep them up to date from here on.
+    compute_nodes = utils.get_table(migrate_engine, 'compute_nodes')
+    shards = [dict(id=shard, count=0, deleted=0,
+                   created_at=timeutils.utcnow())
+              for shard in xrange(SHARDS)]
+    for shard in shards:
+        for field in FIELDS:
+            shard[field] = 0
+    query = compute_nodes.select().where(compute_nodes.c.deleted == 0)
+    for node in query.execute():
+        shard = shards[node['id'] % SHARDS]
+        shard['count'] += 1
+        for field in FIELDS:
+            shard[field] += node[field] or 0
+    migrate_engine.execute(statistics.insert(), shards)
+
+
+def downgrade(migrate_engine):
+    meta = MetaData(bind=migrate_engine)
+    for name in (TABLE_NAME, db._SHADOW_TABLE_PREFIX + TABLE_NAME):
+        table = Table(name, meta, autoload=True)
+        table.drop()
@@ -139,6 +139,31 @@ class ComputeNodeStat(BASE, NovaBase):
         return "{%d: %s = %s}" % (self.compute_node_id, self.key, self.value)
 
 
+class ComputeNodeStatistics(BASE, NovaBase):
+    """Running totals of the compute node resources, kept up to date as
+    compute nodes are created, updated and deleted.
+
+    The totals are split over a fixed number of shards by compute node id
+    so that concurrent compute node updates don't all queue on one row.
+    """
+    __tablename__ = 'compute_node_statistics'
+    __table_args__ = ()
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    count = Column(BigInteger, nullable=False, default=0)
+    vcpus = Column(BigInteger, nullable=False, default=0)
+    memory_mb = Column(BigInteger, nullable=False, default=0)
+    local_gb = Column(BigInteger, nullable=False, default=0)
+    vcpus_used = Column(BigInteger, nullable=False, default=0)
+    memory_mb_used = Column(BigInteger, nullable=False, default=0)
+    local_gb_used = Column(BigInteger, nullable=False, default=0)
+    free_ram_mb = Column(BigInteger, nullable=False, default=0)
+    free_disk_gb = Column(BigInteger, nullable=False, default=0)
+    current_workload = Column(BigInteger, nullable=False, default=0)
+    running_vms = Column(BigInteger, nullable=False, default=0)
+    disk_available_least = Column(BigInteger, nullable=False, default=0)
+
+
 class Certificate(BASE, NovaBase):
     """Represents a x509 certificate."""
     __tablename__ = 'certificates'
@@ -173,6 +198,8 @@ class Instance(BASE, NovaBase):
               'host', 'node', 'deleted'),
         Index('instances_host_deleted_cleaned_idx',
               'host', 'deleted', 'cleaned'),
+        Index('instances_project_id_updated_at_idx',
+              'project_id', 'updated_at'),
     )
     injected_files = []
 
@@ -1182,6 +1182,10 @@ class ConfigDriveMountFailed(NovaException):
                 "Error: %(error)s")
 
 
+class ConfigDriveTooLarge(NovaException):
+    msg_fmt = _("Config drive contents do not fit in %(size)d bytes.")
+
+
 class ConfigDriveUnknownFormat(NovaException):
     msg_fmt = _("Unknown config drive format %(format)s. Select one of "
                 "iso9660 or vfat.")
@@ -66,6 +66,14 @@ glance_opts = [
                 help='A list of url scheme that can be downloaded directly '
                      'via the direct_url.  Currently supported schemes: '
                      '[file].'),
+    cfg.IntOpt('glance_image_cache_ttl',
+               default=30,
+               help='Seconds the metadata of active images is cached for '
+                    'by each process, 0 to fetch it from glance every time'),
+    cfg.IntOpt('glance_image_cache_size',
+               default=1000,
+               help='Number of images whose metadata is cached by each '
+                    'process'),
     ]
 
 LOG = logging.getLogger(__name__)
@@ -77,6 +85,123 @@ CONF.import_opt('my_ip', 'nova.netconf')
 _DOWNLOAD_MODULES = image_xfers.load_transfer_modules()
 
 
+class _ImageCache(object):
+    """Metadata of active images, by image id.
+
+    Entries expire after glance_image_cache_ttl seconds, and the least
+    recently used ones are evicted beyond glance_image_cache_size.  An
+    entry is only served to the projects glance showed the image to,
+    unless the image is public, and what glance showed an admin only to
+    admins, who may see the private images of other projects.  Images
+    listed with the updated_at of their entry aren't translated again.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._uses = itertools.count()
+        self.stats = dict(hits=0, misses=0, reused=0, evictions=0)
+
+    def _get(self, image_id):
+        entry = self._entries.get(image_id)
+        if entry is None:
+            return None
+        if timeutils.utcnow_ts() >= entry['expires']:
+            del self._entries[image_id]
+            return None
+        entry['used'] = self._uses.next()
+        return entry
+
+    @staticmethod
+    def _viewer(context):
+        return (getattr(context, 'project_id', None),
+                bool(getattr(context, 'is_admin', False)))
+
+    def get(self, context, image_id):
+        """Returns a copy of the cached metadata of the image, or None."""
+        if CONF.glance_image_cache_ttl <= 0:
+            return None
+        entry = self._get(image_id)
+        project_id, is_admin = self._viewer(context)
+        if entry is None or not (entry['is_public'] or
+                                 (project_id, False) in entry['viewers'] or
+                                 (is_admin and
+                                  (project_id, True) in entry['viewers'])):
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return copy.deepcopy(entry['image_meta'])
+
+    def translate(self, context, image, translate):
+        """Translates the image, unless it is cached as listed."""
+        if CONF.glance_image_cache_ttl <= 0:
+            return translate(image)
+        entry = self._get(image.id)
+        if (entry is not None and
+                entry['updated_at'] == getattr(image, 'updated_at', None)):
+            self.stats['reused'] += 1
+            image_meta = copy.deepcopy(entry['image_meta'])
+        else:
+            image_meta = translate(image)
+        self.set(context, image, image_meta)
+        return image_meta
+
+    def set(self, context, image, image_meta):
+        """Caches the metadata of the image, as shown to the context."""
+        if CONF.glance_image_cache_ttl <= 0:
+            return
+        if getattr(image, 'status', None) != 'active':
+            self._entries.pop(image.id, None)
+            return
+
+        updated_at = getattr(image, 'updated_at', None)
+        entry = self._entries.get(image.id)
+        if entry is None or entry['updated_at'] != updated_at:
+            entry = dict(updated_at=updated_at, viewers=set(),
+                         image_meta=copy.deepcopy(image_meta))
+            self._entries[image.id] = entry
+        entry['is_public'] = getattr(image, 'is_public', False)
+        entry['expires'] = (timeutils.utcnow_ts() +
+                            CONF.glance_image_cache_ttl)
+        entry['used'] = self._uses.next()
+        viewer = self._viewer(context)
+        if viewer[0]:
+            entry['viewers'].add(viewer)
+        self._evict()
+
+    def _evict(self):
+        size = max(CONF.glance_image_cache_size, 1)
+        if len(self._entries) <= size:
+            return
+        # Down to three quarters of the size, to sort the entries once
+        # in a while only
+        entries = sorted(self._entries.items(),
+                         key=lambda item: item[1]['used'])
+        for image_id, _entry in entries[:len(entries) - size * 3 // 4]:
+            del self._entries[image_id]
+            self.stats['evictions'] += 1
+
+    def delete(self, image_id):
+        self._entries.pop(image_id, None)
+
+
+_IMAGE_CACHE = _ImageCache()
+
+
+def reset_image_cache():
+    """Empties the image metadata cache, mainly for testing purposes."""
+    global _IMAGE_CACHE
+    _IMAGE_CACHE = _ImageCache()
+
+
+def get_image_cache_stats():
+    """Returns the counters of the image metadata cache of this process.
+
+    hits counts the image shows served without calling glance, reused the
+    listed images that weren't translated again.
+    """
+    return dict(_IMAGE_CACHE.stats)
+
+
 def generate_glance_url():
     """Generate the URL to glance."""
     return "%s://%s:%d" % (CONF.glance_protocol, CONF.glance_host,
@@ -253,7 +378,8 @@ class GlanceImageService(object):
         _images = []
         for image in images:
             if self._is_image_available(context, image):
-                _images.append(self._translate_from_glance(image))
+                _images.append(_IMAGE_CACHE.translate(
+                    context, image, self._translate_from_glance))
 
         return _images
 
@@ -274,6 +400,10 @@ class GlanceImageService(object):
 
     def show(self, context, image_id):
         """Returns a dict with image data for the given opaque image id."""
+        image_meta = _IMAGE_CACHE.get(context, image_id)
+        if image_meta is not None:
+            return image_meta
+
         try:
             image = self._client.call(context, 1, 'get', image_id)
         except Exception:
@@ -283,6 +413,7 @@ class GlanceImageService(object):
             raise exception.ImageNotFound(image_id=image_id)
 
         base_image_meta = self._translate_from_glance(image)
+        _IMAGE_CACHE.set(context, image, base_image_meta)
         return base_image_meta
 
     def _get_locations(self, context, image_id):
@@ -374,6 +505,7 @@ class GlanceImageService(object):
         except Exception:
             _reraise_translated_image_exception(image_id)
         else:
+            _IMAGE_CACHE.delete(image_id)
             return self._translate_from_glance(image_meta)
 
     def delete(self, context, image_id):
@@ -387,9 +519,11 @@ class GlanceImageService(object):
         try:
             self._client.call(context, 1, 'delete', image_id)
         except glanceclient.exc.NotFound:
+            _IMAGE_CACHE.delete(image_id)
             raise exception.ImageNotFound(image_id=image_id)
         except glanceclient.exc.HTTPForbidden:
             raise exception.ImageNotAuthorized(image_id=image_id)
+        _IMAGE_CACHE.delete(image_id)
         return True
 
     @staticmethod
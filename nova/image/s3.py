@@ -92,6 +92,16 @@ class S3ImageService(object):
         self.service.__init__(*args, **kwargs)
 
     def _translate_uuids_to_ids(self, context, images):
+        # Map the ids of every image at once rather than image by image
+        image_uuids = []
+        for image in images:
+            if 'id' in image:
+                image_uuids.append(image['id'])
+            properties = image.get('properties') or {}
+            image_uuids.extend([properties[prop]
+                                for prop in ('kernel_id', 'ramdisk_id')
+                                if prop in properties])
+        ec2utils.glance_ids_to_ids(context, image_uuids)
         return [self._translate_uuid_to_id(context, img) for img in images]
 
     def _translate_uuid_to_id(self, context, image):
@@ -78,6 +78,9 @@ class FloatingIP(object):
         except exception.NotFound:
             return
 
+        # Rebinding is done per interface in bulk, so that the iptables
+        # rules are applied once rather than once per floating ip.
+        by_interface = {}
         for floating_ip in floating_ips:
             fixed_ip_id = floating_ip.get('fixed_ip_id')
             if fixed_ip_id:
@@ -90,14 +93,16 @@ class FloatingIP(object):
                     LOG.debug(msg)
                     continue
                 interface = CONF.public_interface or floating_ip['interface']
-                try:
-                    self.l3driver.add_floating_ip(floating_ip['address'],
-                                                  fixed_ip['address'],
-                                                  interface,
-                                                  fixed_ip['network'])
-                except processutils.ProcessExecutionError:
-                    LOG.debug(_('Interface %s not found'), interface)
-                    raise exception.NoFloatingIpInterface(interface=interface)
+                by_interface.setdefault(interface, []).append(
+                    (floating_ip['address'], fixed_ip['address'],
+                     interface, fixed_ip['network']))
+
+        for interface, args in by_interface.iteritems():
+            try:
+                self.l3driver.add_floating_ips(args)
+            except processutils.ProcessExecutionError:
+                LOG.debug(_('Interface %s not found'), interface)
+                raise exception.NoFloatingIpInterface(interface=interface)
 
     def allocate_for_instance(self, context, **kwargs):
         """Handles allocating the floating IP resources for an instance.
@@ -57,6 +57,19 @@ class L3Driver(object):
         """
         raise NotImplementedError()
 
+    def add_floating_ips(self, floating_ips):
+        """Add several floating IPs at once.
+
+        :param floating_ips: list of (floating_ip, fixed_ip,
+                             l3_interface_id, network) tuples, as taken by
+                             add_floating_ip().
+
+        Drivers which can batch the work should override this.
+        """
+        for floating_ip, fixed_ip, l3_interface_id, network in floating_ips:
+            self.add_floating_ip(floating_ip, fixed_ip, l3_interface_id,
+                                 network)
+
     def remove_floating_ip(self, floating_ip, fixed_ip, l3_interface_id,
                            network=None):
         raise NotImplementedError()
@@ -115,6 +128,14 @@ class LinuxNetL3(L3Driver):
                                           l3_interface_id, network)
         linux_net.bind_floating_ip(floating_ip, l3_interface_id)
 
+    def add_floating_ips(self, floating_ips):
+        linux_net.ensure_floating_forwards(floating_ips)
+        by_interface = {}
+        for floating_ip, fixed_ip, l3_interface_id, network in floating_ips:
+            by_interface.setdefault(l3_interface_id, []).append(floating_ip)
+        for l3_interface_id, addresses in by_interface.iteritems():
+            linux_net.bind_floating_ips(addresses, l3_interface_id)
+
     def remove_floating_ip(self, floating_ip, fixed_ip, l3_interface_id,
                            network=None):
         linux_net.unbind_floating_ip(floating_ip, l3_interface_id)
@@ -163,6 +184,9 @@ class NullL3(L3Driver):
                         network=None):
         pass
 
+    def add_floating_ips(self, floating_ips):
+        pass
+
     def remove_floating_ip(self, floating_ip, fixed_ip, l3_interface_id,
                            network=None):
         pass
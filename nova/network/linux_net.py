@@ -25,6 +25,7 @@ import netaddr
 import os
 import re
 
+from eventlet import greenpool
 from oslo.config import cfg
 
 from nova import db
@@ -95,6 +96,11 @@ linux_net_opts = [
     cfg.IntOpt('send_arp_for_ha_count',
                default=3,
                help='send this many gratuitous ARPs for HA setup'),
+    cfg.IntOpt('send_arp_for_ha_concurrency',
+               default=16,
+               help='maximum number of addresses gratuitous ARPs are sent '
+                    'for at the same time when many floating ips are bound '
+                    'at once'),
     cfg.BoolOpt('use_single_default_gateway',
                 default=False,
                 help='Use single default gateway. Only first nic of vm will '
@@ -716,6 +722,48 @@ def bind_floating_ip(floating_ip, device):
         send_arp_for_ip(floating_ip, device, CONF.send_arp_for_ha_count)
 
 
+def send_arp_for_ips(ips, device, count):
+    """Send gratuitous ARPs for several ips, a few of them at a time."""
+    pool = greenpool.GreenPool(CONF.send_arp_for_ha_concurrency)
+    for ip in ips:
+        pool.spawn_n(send_arp_for_ip, ip, device, count)
+    pool.waitall()
+
+
+def bind_floating_ips(floating_ips, device):
+    """Bind several ips to a public interface.
+
+    The addresses which are not bound yet are added with a single
+    ``ip -batch`` call, and gratuitous ARPs are only sent once all of them
+    are in place.
+    """
+    out, err = _execute('ip', 'addr', 'show', 'dev', device,
+                        run_as_root=True)
+    bound = set()
+    for line in out.split('\n'):
+        fields = line.split()
+        if fields and fields[0] == 'inet':
+            bound.add(fields[1])
+    missing = [ip for ip in floating_ips if '%s/32' % ip not in bound]
+    if missing:
+        commands = ''.join('addr add %s/32 dev %s\n' % (ip, device)
+                           for ip in missing)
+        try:
+            _execute('ip', '-batch', '-', process_input=commands,
+                     run_as_root=True)
+        except processutils.ProcessExecutionError:
+            # ip stops at the first failing command of a batch, e.g. an
+            # address which got bound in the meantime, so finish the job
+            # one address at a time.
+            for ip in missing:
+                _execute('ip', 'addr', 'add', str(ip) + '/32',
+                         'dev', device,
+                         run_as_root=True, check_exit_code=[0, 2, 254])
+
+    if CONF.send_arp_for_ha and CONF.send_arp_for_ha_count > 0:
+        send_arp_for_ips(floating_ips, device, CONF.send_arp_for_ha_count)
+
+
 def unbind_floating_ip(floating_ip, device):
     """Unbind a public ip from public interface."""
     _execute('ip', 'addr', 'del', str(floating_ip) + '/32',
@@ -762,6 +810,22 @@ def ensure_floating_forward(floating_ip, fixed_ip, device, network):
         ensure_ebtables_rules(*floating_ebtables_rules(fixed_ip, network))
 
 
+def ensure_floating_forwards(floating_ips):
+    """Ensure the forwarding rules of several floating ips.
+
+    :param floating_ips: list of (floating_ip, fixed_ip, device, network)
+                         tuples, as taken by ensure_floating_forward().
+
+    The iptables rules are applied once for all of them.
+    """
+    iptables_manager.defer_apply_on()
+    try:
+        for floating_ip, fixed_ip, device, network in floating_ips:
+            ensure_floating_forward(floating_ip, fixed_ip, device, network)
+    finally:
+        iptables_manager.defer_apply_off()
+
+
 def remove_floating_forward(floating_ip, fixed_ip, device, network):
     """Remove forwarding for floating ip."""
     for chain, rule in floating_forward_rules(floating_ip, fixed_ip, device):
@@ -43,6 +43,7 @@ topologies.  All of the network commands are issued to a subclass of
 
 """
 
+import copy
 import datetime
 import itertools
 import math
@@ -554,22 +555,71 @@ class NetworkManager(manager.Manager):
 
         vifs = self.db.virtual_interface_get_by_instance(context,
                                                          instance_uuid)
-        networks = {}
-
-        for vif in vifs:
-            if vif.get('network_id') is not None:
-                network = self._get_network_by_id(context, vif['network_id'])
-                networks[vif['uuid']] = network
+        networks = self._get_networks_for_vifs(context, vifs)
 
         nw_info = self.build_network_info_model(context, vifs, networks,
                                                          rxtx_factor, host)
         return nw_info
 
+    def _get_networks_for_vifs(self, context, vifs):
+        """Returns a dict mapping vif uuids to their network, looking up
+        each distinct network only once.
+        """
+        networks = {}
+        networks_by_id = {}
+        for vif in vifs:
+            network_id = vif.get('network_id')
+            if network_id is None:
+                continue
+            if network_id not in networks_by_id:
+                networks_by_id[network_id] = self._get_network_by_id(
+                        context, network_id)
+            networks[vif['uuid']] = networks_by_id[network_id]
+        return networks
+
+    def _prefetch_network_info(self, context, vifs):
+        """Fetches the fixed and floating ips of all vifs in two queries.
+
+        :returns: dict with 'fixed_ips' mapping vif ids to fixed addresses,
+                  'floating_ips' mapping fixed addresses to floating
+                  addresses and an empty 'subnets' cache used while
+                  building the models
+        """
+        fixed_ips = self.db.fixed_ips_by_virtual_interfaces(
+                context, [vif['id'] for vif in vifs])
+
+        fixed_ips_by_vif = {}
+        fixed_addresses = {}
+        for fixed_ip in fixed_ips:
+            fixed_ips_by_vif.setdefault(fixed_ip['virtual_interface_id'],
+                                        []).append(fixed_ip['address'])
+            fixed_addresses[fixed_ip['id']] = fixed_ip['address']
+
+        floating_ips = self.db.floating_ip_get_by_fixed_ip_ids(
+                context, fixed_addresses.keys())
+
+        floating_ips_by_fixed = {}
+        for floating_ip in floating_ips:
+            fixed_address = fixed_addresses[floating_ip['fixed_ip_id']]
+            floating_ips_by_fixed.setdefault(fixed_address,
+                                             []).append(floating_ip['address'])
+
+        return {'fixed_ips': fixed_ips_by_vif,
+                'floating_ips': floating_ips_by_fixed,
+                'subnets': {}}
+
     def build_network_info_model(self, context, vifs, networks,
-                                 rxtx_factor, instance_host):
+                                 rxtx_factor, instance_host, prefetched=None):
         """Builds a NetworkInfo object containing all network information
         for an instance.
+
+        :param prefetched: bulk ip data from _prefetch_network_info(),
+                           fetched for the given vifs if not passed in
         """
+        if prefetched is None:
+            prefetched = self._prefetch_network_info(context, vifs)
+        subnets_cache = prefetched['subnets']
+
         nw_info = network_model.NetworkInfo()
         for vif in vifs:
             vif_dict = {'id': vif['uuid'],
@@ -584,8 +634,14 @@ class NetworkManager(manager.Manager):
 
             # get network dict for vif from args and build the subnets
             network = networks[vif['uuid']]
-            subnets = self._get_subnets_from_network(context, network, vif,
-                                                     instance_host)
+
+            # subnets only depend on the network and the host, so build
+            # them once and hand each vif its own copy
+            subnets_key = (network['uuid'], instance_host)
+            if subnets_key not in subnets_cache:
+                subnets_cache[subnets_key] = self._get_subnets_from_network(
+                        context, network, vif, instance_host)
+            subnets = copy.deepcopy(subnets_cache[subnets_key])
 
             # if rxtx_cap data are not set everywhere, set to none
             try:
@@ -594,14 +650,10 @@ class NetworkManager(manager.Manager):
                 rxtx_cap = None
 
             # get fixed_ips
-            v4_IPs = self.ipam.get_v4_ips_by_interface(context,
-                                                       network['uuid'],
-                                                       vif['uuid'],
-                                                       network['project_id'])
-            v6_IPs = self.ipam.get_v6_ips_by_interface(context,
-                                                       network['uuid'],
-                                                       vif['uuid'],
-                                                       network['project_id'])
+            v4_IPs = prefetched['fixed_ips'].get(vif['id'], [])
+            v6_IPs = self.ipam.get_v6_ips_by_network(context, network,
+                                                     vif['address'],
+                                                     network['project_id'])
 
             # create model FixedIPs from these fixed_ips
             network_IPs = [network_model.FixedIP(address=ip_address)
@@ -612,13 +664,12 @@ class NetworkManager(manager.Manager):
             for fixed_ip in network_IPs:
                 if fixed_ip['version'] == 6:
                     continue
-                gfipbfa = self.ipam.get_floating_ips_by_fixed_address
-                floating_ips = gfipbfa(context, fixed_ip['address'])
-                floating_ips = [network_model.IP(address=ip['address'],
-                                                 type='floating')
-                                for ip in floating_ips]
-                for ip in floating_ips:
-                    fixed_ip.add_floating_ip(ip)
+                floating_ips = prefetched['floating_ips'].get(
+                        fixed_ip['address'], [])
+                for address in floating_ips:
+                    fixed_ip.add_floating_ip(
+                            network_model.IP(address=address,
+                                             type='floating'))
 
             # add ips to subnets they belong to
             for subnet in subnets:
@@ -660,8 +711,7 @@ class NetworkManager(manager.Manager):
                                   vif, instance_host=None):
         """Returns the 1 or 2 possible subnets for a nova network."""
         # get subnets
-        ipam_subnets = self.ipam.get_subnets_by_net_id(context,
-                           network['project_id'], network['uuid'], vif['uuid'])
+        ipam_subnets = self.ipam.get_subnets_by_network(context, network)
 
         subnets = []
         for subnet in ipam_subnets:
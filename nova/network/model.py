@@ -279,8 +279,9 @@ class VIF(Model):
                       'meta': {...}}]
         """
         if self['network']:
-            # remove unnecessary fields on fixed_ips
-            ips = [IP(**ensure_string_keys(ip)) for ip in self.fixed_ips()]
+            # remove unnecessary fields on copies of the fixed_ips
+            ips = [IP(**dict(ensure_string_keys(ip), meta=dict(ip['meta'])))
+                   for ip in self.fixed_ips()]
             for ip in ips:
                 # remove floating ips from IP, since this is a flat structure
                 # of all IPs
@@ -439,6 +440,142 @@ class NetworkInfo(list):
         return network_info
 
 
+def _readonly(self, *args, **kwargs):
+    raise TypeError(_('FrozenNetworkInfo can not be modified'))
+
+
+def _thaw(cls, items):
+    thawed = cls.__new__(cls)
+    dict.update(thawed, items)
+    return thawed
+
+
+class _FrozenDict(dict):
+    """Read-only dict or model found inside a FrozenNetworkInfo."""
+
+    _thawed_class = dict
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        # copies and pickles are private, so hand out a mutable object
+        return (_thaw, (self._thawed_class, dict(self)))
+
+
+class _FrozenList(list):
+    """Read-only list found inside a FrozenNetworkInfo."""
+
+    append = extend = insert = pop = remove = reverse = sort = _readonly
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    __setslice__ = __delslice__ = _readonly
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+_FROZEN_CLASSES = {dict: _FrozenDict}
+
+
+def _freeze(value):
+    """Returns a read-only copy of value and of everything it holds."""
+    if isinstance(value, (_FrozenDict, _FrozenList)):
+        return value
+    if isinstance(value, dict):
+        cls = type(value)
+        if cls not in _FROZEN_CLASSES:
+            _FROZEN_CLASSES[cls] = type('Frozen' + cls.__name__,
+                                        (_FrozenDict, cls),
+                                        {'_thawed_class': cls})
+        frozen = dict.__new__(_FROZEN_CLASSES[cls])
+        dict.update(frozen, [(key, _freeze(item))
+                             for key, item in value.iteritems()])
+        return frozen
+    if isinstance(value, list):
+        return _FrozenList([_freeze(item) for item in value])
+    if isinstance(value, tuple):
+        return tuple([_freeze(item) for item in value])
+    return value
+
+
+class FrozenNetworkInfo(NetworkInfo):
+    """Read-only NetworkInfo whose derived views are computed only once.
+
+    Instances are shared between callers through hydrate_frozen(), so
+    neither the model, the VIFs, networks, subnets and IPs it holds, nor
+    the results of its views can be modified.  Copies of any of them are
+    mutable, or use NetworkInfo.hydrate() to get a private model instead.
+    """
+
+    def __init__(self, network_info=None):
+        super(FrozenNetworkInfo, self).__init__(network_info or [])
+        self._views = {}
+
+    append = extend = insert = pop = remove = reverse = sort = _readonly
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    __setslice__ = __delslice__ = _readonly
+
+    def __reduce__(self):
+        # copies and pickles are private, so hand out a mutable NetworkInfo
+        return (NetworkInfo, (list(self),))
+
+    def _view(self, name, method):
+        if name not in self._views:
+            self._views[name] = _freeze(method(self))
+        return list(self._views[name])
+
+    def fixed_ips(self):
+        return self._view('fixed_ips', NetworkInfo.fixed_ips)
+
+    def floating_ips(self):
+        return self._view('floating_ips', NetworkInfo.floating_ips)
+
+    def json(self):
+        if 'json' not in self._views:
+            self._views['json'] = NetworkInfo.json(self)
+        return self._views['json']
+
+    def legacy(self):
+        return self._view('legacy', NetworkInfo.legacy)
+
+    @classmethod
+    def hydrate(cls, network_info):
+        if isinstance(network_info, basestring):
+            network_info = jsonutils.loads(network_info)
+        return cls([_freeze(VIF.hydrate(vif)) for vif in network_info])
+
+
+# The memo is simply emptied once it holds this many entries, which keeps
+# it bounded without any bookkeeping on each lookup.
+FROZEN_CACHE_SIZE = 4096
+_FROZEN_CACHE = {}
+
+
+def hydrate_frozen(network_info):
+    """Returns a shared FrozenNetworkInfo for network_info.
+
+    :param network_info: the cached network info, as a json string or a
+                         list of primitives.  Only json strings are
+                         memoized, by their value, anything else is
+                         hydrated to a private NetworkInfo.
+    """
+    if not isinstance(network_info, basestring):
+        return NetworkInfo.hydrate(network_info)
+
+    nw_info = _FROZEN_CACHE.get(network_info)
+    if nw_info is None:
+        nw_info = FrozenNetworkInfo.hydrate(network_info)
+        if len(_FROZEN_CACHE) >= FROZEN_CACHE_SIZE:
+            _FROZEN_CACHE.clear()
+        _FROZEN_CACHE[network_info] = nw_info
+    return nw_info
+
+
+def reset_frozen_cache():
+    """Empties the hydrate_frozen() memo, mainly for testing purposes."""
+    _FROZEN_CACHE.clear()
+
+
 class NetworkInfoAsyncWrapper(NetworkInfo):
     """Wrapper around NetworkInfo that allows retrieving NetworkInfo
     in an async manner.
@@ -27,6 +27,15 @@ from nova.openstack.common import log as logging
 CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
+# The admin token is shared by every admin client in the process, so that
+# building a client does not cost a round trip to keystone each time.
+_ADMIN_AUTH_TOKEN = None
+
+
+def reset_state():
+    global _ADMIN_AUTH_TOKEN
+    _ADMIN_AUTH_TOKEN = None
+
 
 def _get_auth_token():
     try:
@@ -47,9 +56,47 @@ def _get_auth_token():
             LOG.error(_('Neutron client authentication failed: %s'), e)
 
 
+def _get_admin_auth_token():
+    global _ADMIN_AUTH_TOKEN
+    if _ADMIN_AUTH_TOKEN is None:
+        _ADMIN_AUTH_TOKEN = _get_auth_token()
+    return _ADMIN_AUTH_TOKEN
+
+
+class AdminClientWrapper(object):
+    """Wraps a neutron client built with the shared admin token.
+
+    The client holds the admin credentials too, so it re-authenticates by
+    itself when the token expires; every call then publishes the client's
+    current token so that later clients start out with the fresh one.
+    """
+
+    def __init__(self, base_client):
+        self.base_client = base_client
+
+    def __getattr__(self, name):
+        attr = getattr(self.base_client, name)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self._update_token()
+        return wrapper
+
+    def _update_token(self):
+        global _ADMIN_AUTH_TOKEN
+        token = self.base_client.httpclient.auth_token
+        if token:
+            _ADMIN_AUTH_TOKEN = token
+
+
 def _get_client(token=None):
-    if not token and CONF.neutron_auth_strategy:
-        token = _get_auth_token()
+    admin = not token and CONF.neutron_auth_strategy
+    if admin:
+        token = _get_admin_auth_token()
     params = {
         'endpoint_url': CONF.neutron_url,
         'timeout': CONF.neutron_url_timeout,
@@ -60,7 +107,18 @@ def _get_client(token=None):
         params['token'] = token
     else:
         params['auth_strategy'] = None
-    return clientv20.Client(**params)
+    if not admin:
+        return clientv20.Client(**params)
+
+    params.update({
+        'username': CONF.neutron_admin_username,
+        'tenant_name': CONF.neutron_admin_tenant_name,
+        'region_name': CONF.neutron_region_name,
+        'password': CONF.neutron_admin_password,
+        'auth_url': CONF.neutron_admin_auth_url,
+        'auth_strategy': CONF.neutron_auth_strategy,
+    })
+    return AdminClientWrapper(clientv20.Client(**params))
 
 
 def get_client(context, admin=False):
@@ -100,12 +100,85 @@ refresh_cache = network_api.refresh_cache
 update_instance_info_cache = network_api.update_instance_cache_with_nw_info
 
 
+class NeutronCache(object):
+    """Per process cache of neutron data which rarely changes.
+
+    Entries are grouped by kind (e.g. 'extensions') and expire
+    after the number of seconds they were stored with; invalidate() drops
+    them explicitly. Hits and misses are counted per kind, see get_stats().
+    """
+
+    def __init__(self):
+        self.reset()
+
+    # Expired entries are only purged this often, so that the cache does
+    # not keep growing when keys are not looked up again.
+    PURGE_INTERVAL = 60
+
+    def reset(self):
+        self._data = {}
+        self._stats = {}
+        self._next_purge = 0
+
+    def get(self, kind, key=None):
+        """Return the cached value, or None if missing or expired."""
+        stats = self._stats.setdefault(kind, {'hits': 0, 'misses': 0})
+        entry = self._data.get((kind, key))
+        if entry is not None:
+            if entry[0] > time.time():
+                stats['hits'] += 1
+                return entry[1]
+            del self._data[(kind, key)]
+        stats['misses'] += 1
+        return None
+
+    def set(self, kind, key, value, ttl):
+        """Cache value for ttl seconds. Nothing is cached if ttl <= 0."""
+        if ttl <= 0:
+            return
+        now = time.time()
+        if now >= self._next_purge:
+            for cache_key, (expires, _value) in self._data.items():
+                if expires <= now:
+                    del self._data[cache_key]
+            self._next_purge = now + self.PURGE_INTERVAL
+        self._data[(kind, key)] = (now + ttl, value)
+
+    def get_or_fetch(self, kind, key, ttl, fetch):
+        """Return the cached value, calling fetch() to fill in a miss."""
+        if ttl <= 0:
+            return fetch()
+        value = self.get(kind, key)
+        if value is None:
+            value = fetch()
+            self.set(kind, key, value, ttl)
+        return value
+
+    def invalidate(self, kind=None, key=None):
+        """Drop a single entry, every entry of a kind or everything."""
+        if kind is None:
+            self._data.clear()
+        elif key is not None:
+            self._data.pop((kind, key), None)
+        else:
+            for cache_key in self._data.keys():
+                if cache_key[0] == kind:
+                    del self._data[cache_key]
+
+    def get_stats(self):
+        """Return the hit and miss counters, keyed by kind."""
+        return dict((kind, dict(stats))
+                    for kind, stats in self._stats.iteritems())
+
+
+NEUTRON_CACHE = NeutronCache()
+
+
 class API(base.Base):
     """API for interacting with the neutron 2.x API."""
 
     def __init__(self):
         super(API, self).__init__()
-        self.last_neutron_extension_sync = None
         self.extensions = {}
         self.conductor_api = conductor.API()
         self.security_group_api = (
@@ -335,15 +408,12 @@ class API(base.Base):
 
     def _refresh_neutron_extensions_cache(self):
         """Refresh the neutron extensions cache when necessary."""
-        if (not self.last_neutron_extension_sync or
-            ((time.time() - self.last_neutron_extension_sync)
-             >= CONF.neutron_extension_sync_interval)):
+        def _fetch():
             neutron = neutronv2.get_client(context.get_admin_context())
             extensions_list = neutron.list_extensions()['extensions']
-            self.last_neutron_extension_sync = time.time()
-            self.extensions.clear()
-            self.extensions = dict((ext['name'], ext)
-                                   for ext in extensions_list)
+            return dict((ext['name'], ext) for ext in extensions_list)
+        self.extensions = NEUTRON_CACHE.get_or_fetch(
+            'extensions', None, CONF.neutron_extension_sync_interval, _fetch)
 
     def _has_port_binding_extension(self, refresh_cache=False):
         if refresh_cache:
@@ -802,18 +872,27 @@ class API(base.Base):
             raise exception.FloatingIpMultipleFoundForAddress(address=address)
         return fips[0]
 
-    def _get_floating_ips_by_fixed_and_port(self, client, fixed_ip, port):
-        """Get floatingips from fixed ip and port."""
+    def _get_floating_ips_by_ports(self, client, ports):
+        """Get the floatingips of several ports with a single query.
+
+        The result is keyed by (port id, fixed ip address).
+        """
+        floating_ips = {}
+        port_ids = [port['id'] for port in ports if port.get('fixed_ips')]
+        if not port_ids:
+            return floating_ips
         try:
-            data = client.list_floatingips(fixed_ip_address=fixed_ip,
-                                           port_id=port)
+            data = client.list_floatingips(port_id=port_ids)
         # If a neutron plugin does not implement the L3 API a 404 from
         # list_floatingips will be raised.
         except neutronv2.exceptions.NeutronClientException as e:
             if e.status_code == 404:
-                return []
+                return floating_ips
             raise
-        return data['floatingips']
+        for fip in data['floatingips']:
+            key = (fip['port_id'], fip['fixed_ip_address'])
+            floating_ips.setdefault(key, []).append(fip)
+        return floating_ips
 
     def release_floating_ip(self, context, address,
                             affect_auto_assigned=False):
@@ -875,12 +954,14 @@ class API(base.Base):
         """Force add a network to the project."""
         raise NotImplementedError()
 
-    def _nw_info_get_ips(self, client, port):
+    def _nw_info_get_ips(self, client, port, floating_ips=None):
+        if floating_ips is None:
+            floating_ips = self._get_floating_ips_by_ports(client, [port])
         network_IPs = []
         for fixed_ip in port['fixed_ips']:
             fixed = network_model.FixedIP(address=fixed_ip['ip_address'])
-            floats = self._get_floating_ips_by_fixed_and_port(
-                client, fixed_ip['ip_address'], port['id'])
+            floats = floating_ips.get((port['id'], fixed_ip['ip_address']),
+                                      [])
             for ip in floats:
                 fip = network_model.IP(address=ip['floating_ip_address'],
                                        type='floating')
@@ -888,8 +969,9 @@ class API(base.Base):
             network_IPs.append(fixed)
         return network_IPs
 
-    def _nw_info_get_subnets(self, context, port, network_IPs):
-        subnets = self._get_subnets_from_port(context, port)
+    def _nw_info_get_subnets(self, context, port, network_IPs,
+                             subnet_data=None):
+        subnets = self._get_subnets_from_port(context, port, subnet_data)
         for subnet in subnets:
             subnet['ips'] = [fixed_ip for fixed_ip in network_IPs
                              if fixed_ip.is_in_subnet(subnet)]
@@ -955,10 +1037,21 @@ class API(base.Base):
         _ensure_requested_network_ordering(lambda x: x['network_id'],
                                            ports, net_ids)
 
+        return self._nw_info_build_vifs(context, client, ports, networks)
+
+    def _nw_info_build_vifs(self, context, client, ports, networks,
+                            floating_ips=None, subnet_data=None):
+        if floating_ips is None:
+            floating_ips = self._get_floating_ips_by_ports(client, ports)
+        if subnet_data is None:
+            subnet_data = self._get_subnet_data(context,
+                                                self._get_subnet_ids(ports))
+
         nw_info = network_model.NetworkInfo()
         for port in ports:
-            network_IPs = self._nw_info_get_ips(client, port)
-            subnets = self._nw_info_get_subnets(context, port, network_IPs)
+            network_IPs = self._nw_info_get_ips(client, port, floating_ips)
+            subnets = self._nw_info_get_subnets(context, port, network_IPs,
+                                                subnet_data)
 
             devname = "tap" + port['id']
             devname = devname[:network_model.NIC_NAME_LEN]
@@ -976,7 +1069,44 @@ class API(base.Base):
                 devname=devname))
         return nw_info
 
-    def _get_subnets_from_port(self, context, port):
+    @staticmethod
+    def _get_subnet_ids(ports):
+        subnet_ids = []
+        for port in ports:
+            for ip in port.get('fixed_ips', []):
+                if ip['subnet_id'] not in subnet_ids:
+                    subnet_ids.append(ip['subnet_id'])
+        return subnet_ids
+
+    def _get_subnet_data(self, context, subnet_ids):
+        """Return neutron's subnets with the given ids, keyed by id.
+
+        Each subnet also carries the address of its DHCP server, if any.
+        The subnets are fetched with one list_subnets call, and the DHCP
+        ports of their networks with one list_ports call.
+        """
+        if not subnet_ids:
+            return {}
+
+        client = neutronv2.get_client(context)
+        data = client.list_subnets(id=subnet_ids)
+        subnets = dict((subnet['id'], dict(subnet, dhcp_server=None))
+                       for subnet in data.get('subnets', []))
+        if subnets:
+            # attempt to populate DHCP server field
+            net_ids = list(set(subnet['network_id']
+                               for subnet in subnets.values()))
+            search_opts = {'network_id': net_ids,
+                           'device_owner': 'network:dhcp'}
+            data = client.list_ports(**search_opts)
+            for p in data.get('ports', []):
+                for ip_pair in p['fixed_ips']:
+                    subnet = subnets.get(ip_pair['subnet_id'])
+                    if subnet and not subnet['dhcp_server']:
+                        subnet['dhcp_server'] = ip_pair['ip_address']
+        return subnets
+
+    def _get_subnets_from_port(self, context, port, subnet_data=None):
         """Return the subnets for a given port."""
 
         fixed_ips = port['fixed_ips']
@@ -987,28 +1117,22 @@ class API(base.Base):
         # related to the port. To avoid this, the method returns here.
         if not fixed_ips:
             return []
-        search_opts = {'id': [ip['subnet_id'] for ip in fixed_ips]}
-        data = neutronv2.get_client(context).list_subnets(**search_opts)
-        ipam_subnets = data.get('subnets', [])
+        subnet_ids = self._get_subnet_ids([port])
+        if subnet_data is None:
+            subnet_data = self._get_subnet_data(context, subnet_ids)
         subnets = []
 
-        for subnet in ipam_subnets:
+        for subnet_id in subnet_ids:
+            subnet = subnet_data.get(subnet_id)
+            if subnet is None:
+                continue
             subnet_dict = {'cidr': subnet['cidr'],
                            'gateway': network_model.IP(
                                 address=subnet['gateway_ip'],
                                 type='gateway'),
             }
-
-            # attempt to populate DHCP server field
-            search_opts = {'network_id': subnet['network_id'],
-                           'device_owner': 'network:dhcp'}
-            data = neutronv2.get_client(context).list_ports(**search_opts)
-            dhcp_ports = data.get('ports', [])
-            for p in dhcp_ports:
-                for ip_pair in p['fixed_ips']:
-                    if ip_pair['subnet_id'] == subnet['id']:
-                        subnet_dict['dhcp_server'] = ip_pair['ip_address']
-                        break
+            if subnet['dhcp_server']:
+                subnet_dict['dhcp_server'] = subnet['dhcp_server']
 
             subnet_object = network_model.Subnet(**subnet_dict)
             for dns in subnet.get('dns_nameservers', []):
@@ -41,6 +41,12 @@ class NeutronNovaIPAMLib(object):
            associated with a Neutron Network UUID.
         """
         n = db.network_get_by_uuid(context.elevated(), net_id)
+        return self.get_subnets_by_network(context, n)
+
+    def get_subnets_by_network(self, context, n):
+        """Returns information about the IPv4 and IPv6 subnets
+           of an already fetched network record.
+        """
         subnet_v4 = {
             'network_id': n['uuid'],
             'cidr': n['cidr'],
@@ -85,9 +91,17 @@ class NeutronNovaIPAMLib(object):
         admin_context = context.elevated()
         network = db.network_get_by_uuid(admin_context, net_id)
         vif_rec = db.virtual_interface_get_by_uuid(context, vif_id)
+        return self.get_v6_ips_by_network(context, network, vif_rec['address'],
+                                          project_id)
+
+    def get_v6_ips_by_network(self, context, network, vif_address,
+                              project_id):
+        """Returns a list containing a single IPv6 address string for
+           a virtual interface address on an already fetched network record.
+        """
         if network['cidr_v6']:
             ip = ipv6.to_global(network['cidr_v6'],
-                                vif_rec['address'],
+                                vif_address,
                                 project_id)
             return [ip]
         return []
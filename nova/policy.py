@@ -18,6 +18,9 @@
 """Policy Engine For Nova."""
 
 import os.path
+import re
+import time
+import weakref
 
 from oslo.config import cfg
 
@@ -34,6 +37,11 @@ policy_opts = [
     cfg.StrOpt('policy_default_rule',
                default='default',
                help=_('Rule checked when requested rule is not found')),
+    cfg.IntOpt('policy_check_interval',
+               default=1,
+               help=_('Number of seconds between checks of the policy file '
+                      'for changes. Set to 0 to check on every policy '
+                      'enforcement')),
     ]
 
 CONF = cfg.CONF
@@ -41,13 +49,20 @@ CONF.register_opts(policy_opts)
 
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+_COMPILED_RULES = None
+# The policy state of the request contexts, kept off the contexts so that
+# they can still be copied
+_CONTEXT_POLICIES = weakref.WeakKeyDictionary()
 
 
 def reset():
     global _POLICY_PATH
     global _POLICY_CACHE
+    global _COMPILED_RULES
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _COMPILED_RULES = None
+    _CONTEXT_POLICIES.clear()
     policy.reset()
 
 
@@ -60,8 +75,16 @@ def init():
             _POLICY_PATH = CONF.find_file(_POLICY_PATH)
         if not _POLICY_PATH:
             raise exception.ConfigNotFound(path=CONF.policy_file)
+    # Only stat the policy file once every policy_check_interval seconds,
+    # as init() runs for every single policy check.
+    now = time.time()
+    checked_at = _POLICY_CACHE.get('checked_at')
+    if (checked_at is not None and
+            0 <= now - checked_at < CONF.policy_check_interval):
+        return
     utils.read_cached_file(_POLICY_PATH, _POLICY_CACHE,
                            reload_func=_set_rules)
+    _POLICY_CACHE['checked_at'] = now
 
 
 def _set_rules(data):
@@ -69,6 +92,268 @@ def _set_rules(data):
     policy.set_rules(policy.Rules.load_json(data, default_rule))
 
 
+_TARGET_KEY_RE = re.compile(r'%\((\w+)\)s')
+
+
+class _Credentials(dict):
+    """The policy credentials of a context, with its roles lowercased."""
+
+    def __init__(self, values):
+        super(_Credentials, self).__init__(values)
+        self.lower_roles = frozenset(role.lower() for role in self['roles'])
+
+
+class _CompiledRules(object):
+    """Policy rules compiled into plain python callables.
+
+    Every rule is turned into a closure taking (target, creds), so that
+    checking it does not walk the generic Check tree. Checks this module
+    does not know how to compile, like http checks, are called as they
+    are.
+
+    For every rule the target keys it depends on are recorded, which
+    allows its decisions to be memoized per target. The credential keys
+    referenced by all the rules are recorded as well, which tells when
+    the credentials of a context need to be recomputed.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.default_rule = getattr(rules, 'default_rule', None)
+        self._cred_keys = set(['is_admin', 'roles'])
+        # Whether any check needs to see all of the credentials.
+        self.opaque = False
+        self._compiled = {}
+        self._deps = {}
+        self._target_keys = {}
+        for name, check in rules.items():
+            deps = {'keys': set(), 'rules': set(), 'opaque': False}
+            self._compiled[name] = self._compile(check, deps)
+            self._deps[name] = deps
+        self._cred_attrs = tuple(sorted(self._cred_keys - set(['roles'])))
+
+    def get(self, name):
+        """Return the compiled rule for name, honouring the default rule."""
+        compiled = self._compiled.get(name)
+        if compiled is None and self.default_rule in self._compiled:
+            compiled = self._compiled[self.default_rule]
+        return compiled
+
+    def fingerprint(self, context):
+        """Return the values of the context attributes the rules look at.
+
+        Returns None if the credentials of context can not be cached.
+        """
+        if self.opaque:
+            return None
+        try:
+            # roles is copied, as elevated() appends to the list in place
+            return (tuple([getattr(context, attr)
+                           for attr in self._cred_attrs]),
+                    tuple(context.roles))
+        except AttributeError:
+            return None
+
+    def target_keys(self, name):
+        """Return the target keys the rule name depends on.
+
+        Returns None if the rule may depend on any part of the target.
+        """
+        if name not in self._compiled:
+            name = self.default_rule
+        try:
+            return self._target_keys[name]
+        except KeyError:
+            pass
+        keys = set()
+        seen = set()
+        pending = [name]
+        while pending:
+            current = pending.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            if current not in self._compiled:
+                if self.default_rule not in self._compiled:
+                    continue
+                current = self.default_rule
+            deps = self._deps[current]
+            if deps['opaque']:
+                keys = None
+                break
+            keys.update(deps['keys'])
+            pending.extend(deps['rules'])
+        if keys is not None:
+            keys = tuple(sorted(keys))
+        self._target_keys[name] = keys
+        return keys
+
+    def _compile(self, check, deps):
+        check_type = type(check)
+        if check_type is policy.TrueCheck:
+            return lambda target, creds: True
+        if check_type is policy.FalseCheck:
+            return lambda target, creds: False
+        if check_type is policy.NotCheck:
+            return self._compile_not(self._compile(check.rule, deps))
+        if check_type in (policy.AndCheck, policy.OrCheck):
+            checks = tuple(self._compile(rule, deps) for rule in check.rules)
+            if check_type is policy.AndCheck:
+                return self._compile_and(checks)
+            return self._compile_or(checks)
+        if check_type is policy.RuleCheck:
+            deps['rules'].add(check.match)
+            return self._compile_rule(check.match)
+        if check_type is policy.RoleCheck:
+            return self._compile_role(check.match.lower())
+        if check_type is policy.GenericCheck:
+            return self._compile_generic(check.kind, check.match, deps)
+        if check_type is IsAdminCheck:
+            return self._compile_is_admin(check.expected)
+        deps['opaque'] = True
+        self.opaque = True
+        return check
+
+    @staticmethod
+    def _compile_not(check):
+        return lambda target, creds: not check(target, creds)
+
+    @staticmethod
+    def _compile_and(checks):
+        def _and(target, creds):
+            for check in checks:
+                if not check(target, creds):
+                    return False
+            return True
+        return _and
+
+    @staticmethod
+    def _compile_or(checks):
+        def _or(target, creds):
+            for check in checks:
+                if check(target, creds):
+                    return True
+            return False
+        return _or
+
+    def _compile_rule(self, name):
+        def _rule(target, creds):
+            compiled = self.get(name)
+            if compiled is None:
+                return False
+            try:
+                return compiled(target, creds)
+            except KeyError:
+                # We don't have any matching rule; fail closed
+                return False
+        return _rule
+
+    @staticmethod
+    def _compile_role(role):
+        return lambda target, creds: role in creds.lower_roles
+
+    def _compile_generic(self, kind, match, deps):
+        self._cred_keys.add(kind)
+        if '%' not in match:
+            return (lambda target, creds:
+                    kind in creds and match == unicode(creds[kind]))
+        keys = _TARGET_KEY_RE.findall(match)
+        if _TARGET_KEY_RE.sub('', match).count('%'):
+            deps['opaque'] = True
+        deps['keys'].update(keys)
+
+        def _generic(target, creds):
+            value = match % target
+            return kind in creds and value == unicode(creds[kind])
+        return _generic
+
+    @staticmethod
+    def _compile_is_admin(expected):
+        return lambda target, creds: creds['is_admin'] == expected
+
+
+def _get_compiled_rules():
+    """Return the compiled form of the rules currently in use.
+
+    Rules are recompiled whenever a different set of rules is loaded.
+    """
+    global _COMPILED_RULES
+    rules = policy._rules
+    if not rules:
+        return None
+    if _COMPILED_RULES is None or _COMPILED_RULES.rules is not rules:
+        _COMPILED_RULES = _CompiledRules(rules)
+    return _COMPILED_RULES
+
+
+class _ContextPolicy(object):
+    """The policy credentials and decisions cached for a request context."""
+
+    def __init__(self, compiled, fingerprint, credentials):
+        self.compiled = compiled
+        self.fingerprint = fingerprint
+        self.credentials = credentials
+        self.decisions = {}
+
+
+def _get_context_policy(context, compiled):
+    """Return the policy state cached for context.
+
+    The credentials are only rebuilt from context.to_dict() when the
+    rules or one of the context attributes the rules look at change,
+    e.g. on a context returned by elevated(). If some check needs to see
+    all of the credentials nothing is cached.
+    """
+    fingerprint = compiled.fingerprint(context)
+    if fingerprint is None:
+        return _ContextPolicy(compiled, None,
+                              _Credentials(context.to_dict()))
+    try:
+        state = _CONTEXT_POLICIES.get(context)
+    except TypeError:
+        # Can't be weakly referenced, so nothing is cached
+        return _ContextPolicy(compiled, None,
+                              _Credentials(context.to_dict()))
+    if (state is None or state.compiled is not compiled or
+            state.fingerprint != fingerprint):
+        state = _ContextPolicy(compiled, fingerprint,
+                               _Credentials(context.to_dict()))
+        _CONTEXT_POLICIES[context] = state
+    return state
+
+
+def _evaluate(compiled, action, target, credentials):
+    rule = compiled.get(action)
+    if rule is None:
+        # If the rule doesn't exist, fail closed
+        return False
+    try:
+        return rule(target, credentials)
+    except KeyError:
+        return False
+
+
+def _check(context, action, target):
+    compiled = _get_compiled_rules()
+    if compiled is None:
+        # No rules to reference means we're going to fail closed
+        return False
+    state = _get_context_policy(context, compiled)
+    target_keys = compiled.target_keys(action)
+    if target_keys is None:
+        return _evaluate(compiled, action, target, state.credentials)
+    try:
+        key = (action,) + tuple([target.get(k) for k in target_keys])
+        result = state.decisions[key]
+    except KeyError:
+        result = _evaluate(compiled, action, target, state.credentials)
+        state.decisions[key] = result
+    except (TypeError, AttributeError):
+        # The target values can not be used as a key
+        result = _evaluate(compiled, action, target, state.credentials)
+    return result
+
+
 def enforce(context, action, target, do_raise=True):
     """Verifies that the action is valid on the target in this context.
 
@@ -93,14 +378,13 @@ def enforce(context, action, target, do_raise=True):
     """
     init()
 
-    credentials = context.to_dict()
+    result = _check(context, action, target)
 
-    # Add the exception arguments if asked to do a raise
-    extra = {}
-    if do_raise:
-        extra.update(exc=exception.PolicyNotAuthorized, action=action)
+    # Raise the exception if asked to
+    if do_raise and result is False:
+        raise exception.PolicyNotAuthorized(action=action)
 
-    return policy.check(action, target, credentials, **extra)
+    return result
 
 
 def check_is_admin(context):
@@ -109,11 +393,15 @@ def check_is_admin(context):
     """
     init()
 
+    compiled = _get_compiled_rules()
+    if compiled is None:
+        return False
+
     #the target is user-self
-    credentials = context.to_dict()
+    credentials = _get_context_policy(context, compiled).credentials
     target = credentials
 
-    return policy.check('context_is_admin', target, credentials)
+    return _evaluate(compiled, 'context_is_admin', target, credentials)
 
 
 @policy.register('is_admin')
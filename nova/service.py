@@ -34,6 +34,7 @@ from nova.openstack.common import log as logging
 from nova.openstack.common import rpc
 from nova.openstack.common import service
 from nova import servicegroup
+from nova import sharedcache
 from nova import utils
 from nova import version
 from nova import wsgi
@@ -305,6 +306,9 @@ class WSGIService(object):
         self.name = name
         self.manager = self._get_manager()
         self.loader = loader or wsgi.Loader()
+        # Before the app creates its caches, for the forked workers to
+        # share them
+        sharedcache.init()
         self.app = self.loader.load_app(name)
         self.host = getattr(CONF, '%s_listen' % name, "0.0.0.0")
         self.port = getattr(CONF, '%s_listen_port' % name, 0)
@@ -0,0 +1,393 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Cache shared by the worker processes of the API services.
+
+The parent process creates a shared memory segment before it forks the
+workers, so that every worker maps the same pages.  The segment is split
+in fixed size slots holding pickled entries.  Readers don't lock: each
+slot has a sequence number that writers make odd while they change the
+slot, and entries are copied out of the mapping and only unpickled once
+the sequence number shows they weren't changed meanwhile.  Writers are
+serialized by a record lock on a file, which the kernel releases if the
+process holding it dies.
+
+Every entry records the generation of the segment it was written in, and
+flush_all() moves the segment to a new generation, which invalidates all
+the entries at once.
+"""
+
+import cPickle
+import fcntl
+import hashlib
+import mmap
+import struct
+import tempfile
+
+from oslo.config import cfg
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+from nova.openstack.common import memorycache
+from nova.openstack.common import timeutils
+
+shared_cache_opts = [
+    cfg.IntOpt('shared_cache_size',
+               default=0,
+               help='Size in MiB of the cache segment shared by the worker '
+                    'processes of the API services, 0 to let each worker '
+                    'cache for itself. Not used with memcached_servers'),
+    cfg.IntOpt('shared_cache_slot_size',
+               default=16384,
+               help='Size in bytes of the slots of the shared cache '
+                    'segment. Larger entries are cached by each worker'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(shared_cache_opts)
+CONF.import_opt('memcached_servers', 'nova.openstack.common.memorycache')
+
+LOG = logging.getLogger(__name__)
+
+# Generation of the segment
+_HEADER = struct.Struct('=Q')
+_HEADER_SIZE = 64
+# Sequence number, key digest, expiry time, generation and entry length
+_SLOT = struct.Struct('=IQdQI')
+_SEQUENCE = struct.Struct('=I')
+
+# Slots an entry can be stored in
+_PROBES = 4
+# Reads of a slot being written before giving up on it
+_RETRIES = 3
+
+_MISSING = object()
+
+_SEGMENT = None
+
+
+def init():
+    """Creates the shared segment.
+
+    Must be called by the parent process before the workers are forked.
+    """
+
+    global _SEGMENT
+
+    if (_SEGMENT is None and CONF.shared_cache_size > 0 and
+            not CONF.memcached_servers):
+        _SEGMENT = Segment(CONF.shared_cache_size * 1024 * 1024,
+                           CONF.shared_cache_slot_size)
+        LOG.info(_('Created shared cache segment of %(slots)d slots of '
+                   '%(slot_size)d bytes'),
+                 {'slots': _SEGMENT.slots, 'slot_size': _SEGMENT.slot_size})
+
+
+def reset():
+    """Drops the shared segment, mainly for testing purposes."""
+
+    global _SEGMENT
+
+    _SEGMENT = None
+
+
+def get_client(memcached_servers=None):
+    """Returns a client of the shared segment.
+
+    Falls back to memorycache.get_client() when memcached servers are
+    configured or when there is no shared segment.
+    """
+
+    if _SEGMENT is None or memcached_servers or CONF.memcached_servers:
+        return memorycache.get_client(memcached_servers)
+    return Client(_SEGMENT)
+
+
+def get_shared_client(memcached_servers=None):
+    """Returns a client of memcached or of the shared segment.
+
+    Returns None when neither is configured, or when the memcache module
+    is missing, for the callers that keep their own cache in that case.
+    """
+
+    if memcached_servers or CONF.memcached_servers:
+        client = memorycache.get_client(memcached_servers)
+        if not isinstance(client, memorycache.Client):
+            return client
+    elif _SEGMENT is not None:
+        return Client(_SEGMENT)
+
+
+def _digest(key):
+    # Stable across processes, 0 marks a free slot
+    return struct.unpack('=Q', hashlib.md5(key).digest()[:8])[0] or 1
+
+
+class _ProcessLock(object):
+    """Lock held by one of the processes sharing a file at a time.
+
+    Record locks belong to processes, so the forked processes exclude
+    each other through the file they inherit, and a process that dies
+    releases the lock it holds.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+
+    def __enter__(self):
+        fcntl.lockf(self._file, fcntl.LOCK_EX)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        fcntl.lockf(self._file, fcntl.LOCK_UN)
+
+
+class Segment(object):
+    """Shared memory split in fixed size slots of pickled entries."""
+
+    def __init__(self, size, slot_size):
+        self.slot_size = slot_size
+        self.slots = (size - _HEADER_SIZE) // slot_size
+        if self.slots < _PROBES or slot_size <= _SLOT.size:
+            raise ValueError(_('Shared cache segment of %(size)d bytes '
+                               'is too small for slots of %(slot_size)d '
+                               'bytes') %
+                             {'size': size, 'slot_size': slot_size})
+
+        # Anonymous mappings are shared with the forked processes
+        self._mm = mmap.mmap(-1, _HEADER_SIZE + self.slots * slot_size)
+        self._lock = _ProcessLock()
+
+    def _generation(self):
+        return _HEADER.unpack_from(self._mm, 0)[0]
+
+    def _offsets(self, digest):
+        for probe in xrange(_PROBES):
+            yield _HEADER_SIZE + ((digest + probe) % self.slots *
+                                  self.slot_size)
+
+    def _read(self, offset, key, digest, generation, now):
+        for _retry in xrange(_RETRIES):
+            seq, slot_digest, expires, slot_generation, length = \
+                _SLOT.unpack_from(self._mm, offset)
+            if seq % 2:
+                # Being written
+                continue
+            if (slot_digest != digest or slot_generation != generation or
+                    (expires and now >= expires)):
+                return _MISSING
+
+            start = offset + _SLOT.size
+            entry = self._mm[start:start + min(length,
+                                               self.slot_size - _SLOT.size)]
+            if _SEQUENCE.unpack_from(self._mm, offset)[0] != seq:
+                # Rewritten while it was read, the copy may mix entries
+                continue
+            if len(entry) != length:
+                return _MISSING
+            try:
+                slot_key, value = cPickle.loads(entry)
+            except Exception:
+                return _MISSING
+            if slot_key != key:
+                return _MISSING
+            return value
+        return _MISSING
+
+    def get(self, key):
+        """Returns the value of the key, or _MISSING."""
+
+        digest = _digest(key)
+        generation = self._generation()
+        now = timeutils.utcnow_ts()
+        for offset in self._offsets(digest):
+            value = self._read(offset, key, digest, generation, now)
+            if value is not _MISSING:
+                return value
+        return _MISSING
+
+    def _find(self, digest):
+        for offset in self._offsets(digest):
+            if _SLOT.unpack_from(self._mm, offset)[1] == digest:
+                return offset
+
+    def _write(self, offset, digest=0, expires=0, generation=0, entry=''):
+        seq = _SEQUENCE.unpack_from(self._mm, offset)[0]
+        _SEQUENCE.pack_into(self._mm, offset, (seq + 1) & 0xffffffff)
+        start = offset + _SLOT.size
+        self._mm[start:start + len(entry)] = entry
+        _SLOT.pack_into(self._mm, offset, (seq + 2) & 0xffffffff, digest,
+                        expires, generation, len(entry))
+
+    def _entry(self, key, value):
+        try:
+            entry = cPickle.dumps((key, value), cPickle.HIGHEST_PROTOCOL)
+        except (cPickle.PicklingError, TypeError):
+            return None
+        if len(entry) > self.slot_size - _SLOT.size:
+            return None
+        return entry
+
+    def _store(self, key, entry, expires):
+        digest = _digest(key)
+        generation = self._generation()
+        now = timeutils.utcnow_ts()
+        offset = self._find(digest)
+        if offset is None:
+            # Take a free, stale or expired slot, or evict the entry in
+            # the first one
+            for offset in self._offsets(digest):
+                _seq, slot_digest, slot_expires, slot_generation, \
+                    _length = _SLOT.unpack_from(self._mm, offset)
+                if (not slot_digest or slot_generation != generation or
+                        (slot_expires and now >= slot_expires)):
+                    break
+            else:
+                offset = self._offsets(digest).next()
+        self._write(offset, digest, expires, generation, entry)
+
+    def set(self, key, value, expires=0):
+        """Stores the value of the key until expires.
+
+        Returns False when the value can't be pickled or doesn't fit in a
+        slot.
+        """
+
+        entry = self._entry(key, value)
+        if entry is None:
+            return False
+        with self._lock:
+            self._store(key, entry, expires)
+        return True
+
+    def add(self, key, value, expires=0):
+        """Stores the value of the key unless it is set.
+
+        Returns None when the value can't be pickled or doesn't fit in a
+        slot, otherwise whether it was stored.
+        """
+
+        entry = self._entry(key, value)
+        if entry is None:
+            return None
+        with self._lock:
+            if self.get(key) is not _MISSING:
+                return False
+            self._store(key, entry, expires)
+        return True
+
+    def incr(self, key, delta):
+        """Increments the value of the key, returns _MISSING if unset."""
+
+        with self._lock:
+            value = self.get(key)
+            if value is _MISSING:
+                return _MISSING
+            new_value = int(value) + delta
+            offset = self._find(_digest(key))
+            expires = _SLOT.unpack_from(self._mm, offset)[2]
+            self._write(offset, _digest(key), expires, self._generation(),
+                        cPickle.dumps((key, str(new_value)),
+                                      cPickle.HIGHEST_PROTOCOL))
+        return new_value
+
+    def delete(self, key):
+        with self._lock:
+            offset = self._find(_digest(key))
+            if offset is not None:
+                self._write(offset)
+
+    def flush(self):
+        """Invalidates every entry by moving to a new generation."""
+
+        with self._lock:
+            _HEADER.pack_into(self._mm, 0, self._generation() + 1)
+
+
+class Client(object):
+    """Replicates memorycache.Client over a shared segment.
+
+    Values that can't be pickled or don't fit in a slot are cached by
+    this process only.
+    """
+
+    def __init__(self, segment):
+        self._segment = segment
+        self._local = memorycache.Client()
+
+    def get(self, key):
+        """Retrieves the value for a key or None."""
+        value = self._segment.get(key)
+        if value is _MISSING:
+            return self._local.get(key)
+        return value
+
+    def get_multi(self, keys):
+        """Retrieves the values of several keys, keyed by the keys found."""
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def set(self, key, value, time=0, min_compress_len=0):
+        """Sets the value for a key."""
+        expires = 0
+        if time != 0:
+            expires = timeutils.utcnow_ts() + time
+        if self._segment.set(key, value, expires):
+            self._local.delete(key)
+            return True
+
+        # Don't let other processes read the previous value
+        self._segment.delete(key)
+        return self._local.set(key, value, time, min_compress_len)
+
+    def set_multi(self, mapping, time=0, min_compress_len=0):
+        """Sets the values of several keys, returns the keys not set."""
+        return [key for key, value in mapping.iteritems()
+                if not self.set(key, value, time, min_compress_len)]
+
+    def add(self, key, value, time=0, min_compress_len=0):
+        """Sets the value for a key if it doesn't exist."""
+        expires = 0
+        if time != 0:
+            expires = timeutils.utcnow_ts() + time
+        added = self._segment.add(key, value, expires)
+        if added is not None:
+            if added:
+                self._local.delete(key)
+            return added
+
+        if self.get(key) is not None:
+            return False
+        self._segment.delete(key)
+        return self._local.set(key, value, time, min_compress_len)
+
+    def incr(self, key, delta=1):
+        """Increments the value for a key."""
+        new_value = self._segment.incr(key, delta)
+        if new_value is _MISSING:
+            return self._local.incr(key, delta)
+        return new_value
+
+    def delete(self, key, time=0):
+        """Deletes the value associated with a key."""
+        self._segment.delete(key)
+        self._local.delete(key)
+
+    def flush_all(self):
+        """Deletes the shared values and the values of this process."""
+        self._segment.flush()
+        self._local = memorycache.Client()
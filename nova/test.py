@@ -42,7 +42,9 @@ import testtools
 from nova import context
 from nova import db
 from nova.db import migration
+from nova.image import glance
 from nova.network import manager as network_manager
+from nova.network import model as network_model
 from nova.objects import base as objects_base
 from nova.openstack.common.db.sqlalchemy import session
 from nova.openstack.common import log as logging
@@ -246,6 +248,8 @@ class TestCase(testtools.TestCase):
         self._base_test_obj_backup = copy.copy(
             objects_base.NovaObject._obj_classes)
         self.addCleanup(self._restore_obj_registry)
+        self.addCleanup(network_model.reset_frozen_cache)
+        self.addCleanup(glance.reset_image_cache)
 
         mox_fixture = self.useFixture(MoxStubout())
         self.mox = mox_fixture.mox
@@ -585,6 +585,40 @@ class CinderCloudTestCase(test.TestCase):
 
         self._tearDownBlockDeviceMapping(inst1, inst2, volumes)
 
+    def test_describe_instances_bdms_loaded_in_bulk(self):
+        (inst1, inst2, volumes) = self._setUpBlockDeviceMapping()
+
+        def not_called(*args, **kwargs):
+            self.fail('block device mappings loaded instance by instance')
+
+        bdm_get = db.block_device_mapping_get_all_by_instance
+        self.stubs.Set(db, 'block_device_mapping_get_all_by_instance',
+                       not_called)
+        self.stubs.Set(self.cloud.volume_api, 'get', not_called)
+        ec2_ids = [ec2utils.id_to_ec2_id(inst1['id']),
+                   ec2utils.id_to_ec2_id(inst2['id'])]
+        result = self.cloud.describe_instances(self.context,
+                                               instance_id=ec2_ids)
+        instances = dict([(instance['instanceId'], instance)
+                          for reservation in result['reservationSet']
+                          for instance in reservation['instancesSet']])
+
+        result = instances[ec2_ids[0]]
+        self.assertThat(
+            self._expected_instance_bdm1,
+            matchers.IsSubDictOf(result))
+        self._assertEqualBlockDeviceMapping(
+            self._expected_block_device_mapping0, result['blockDeviceMapping'])
+
+        result = instances[ec2_ids[1]]
+        self.assertThat(
+            self._expected_instance_bdm2,
+            matchers.IsSubDictOf(result))
+
+        self.stubs.Set(db, 'block_device_mapping_get_all_by_instance',
+                       bdm_get)
+        self._tearDownBlockDeviceMapping(inst1, inst2, volumes)
+
     def _setUpImageSet(self, create_volumes_and_snapshots=False):
         self.flags(max_local_block_devices=-1)
         mappings1 = [
@@ -48,6 +48,7 @@ from nova.network import api as network_api
 from nova.network import neutronv2
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
+from nova import sharedcache
 from nova import test
 from nova.tests.api.openstack.compute.contrib import (
     test_neutron_security_groups as test_neutron)
@@ -2404,12 +2405,9 @@ class CloudTestCase(test.TestCase):
                 }
         self.stubs.Set(self.cloud.compute_api, 'get', fake_get)
 
-        def fake_get_instance_uuid_by_ec2_id(ctxt, int_id):
-            if int_id == 305419896:
-                return 'e5fe5518-0288-4fa3-b0c4-c79764101b85'
-            raise exception.InstanceNotFound(instance_id=int_id)
-        self.stubs.Set(db, 'get_instance_uuid_by_ec2_id',
-                        fake_get_instance_uuid_by_ec2_id)
+        db.ec2_instance_create(self.context,
+                               'e5fe5518-0288-4fa3-b0c4-c79764101b85',
+                               id=305419896)
 
         get_attribute = functools.partial(
             self.cloud.describe_instance_attribute,
@@ -2794,6 +2792,106 @@ class CloudTestCase(test.TestCase):
                 ec2utils.resource_type_from_id(self.context, 'x-12345'),
                 None)
 
+    def test_get_int_ids_from_instance_uuids(self):
+        mapped = db.ec2_instance_create(self.context, 'fake-uuid1')
+        int_ids = ec2utils.get_int_ids_from_instance_uuids(
+            self.context, ['fake-uuid1', 'fake-uuid2', 'fake-uuid1'])
+        self.assertEqual(mapped['id'], int_ids['fake-uuid1'])
+        # Mapped on demand, like get_int_id_from_instance_uuid() does
+        self.assertEqual(db.get_ec2_instance_id_by_uuid(self.context,
+                                                        'fake-uuid2'),
+                         int_ids['fake-uuid2'])
+
+        def not_called(*args, **kwargs):
+            self.fail('ec2 id mapped or looked up again')
+
+        self.stubs.Set(db, 'ec2_instance_create', not_called)
+        self.assertEqual(int_ids, ec2utils.get_int_ids_from_instance_uuids(
+            self.context, int_ids.keys()))
+
+        self.stubs.Set(db, 'get_ec2_instance_ids_by_uuids', not_called)
+        self.stubs.Set(db, 'ec2_id_mappings_get', not_called)
+        self.assertEqual(int_ids['fake-uuid2'],
+                         ec2utils.get_int_id_from_instance_uuid(
+                             self.context, 'fake-uuid2'))
+        self.assertEqual('fake-uuid1',
+                         ec2utils.get_instance_uuid_from_int_id(
+                             self.context, int_ids['fake-uuid1']))
+
+    def test_get_instance_uuid_from_int_id_not_found(self):
+        self.assertRaises(exception.InstanceNotFound,
+                          ec2utils.get_instance_uuid_from_int_id,
+                          self.context, 100500)
+        self.assertRaises(exception.ImageNotFound,
+                          ec2utils.id_to_glance_id, self.context, 'ami-1')
+
+    def test_id_mappings_shared_between_workers(self):
+        self.flags(shared_cache_size=1, shared_cache_slot_size=1024)
+        self.addCleanup(sharedcache.reset)
+        sharedcache.init()
+        ec2utils.reset_cache()
+        int_id = ec2utils.get_int_id_from_volume_uuid(self.context,
+                                                      'fake-uuid')
+
+        # As seen by another worker
+        ec2utils.reset_cache()
+
+        def not_called(*args, **kwargs):
+            self.fail('ec2 id mapping looked up in the database')
+
+        self.stubs.Set(db, 'get_ec2_volume_ids_by_uuids', not_called)
+        self.stubs.Set(db, 'ec2_id_mappings_get', not_called)
+        self.assertEqual('fake-uuid', ec2utils.get_volume_uuid_from_int_id(
+            self.context, int_id))
+        self.assertEqual(int_id, ec2utils.get_int_id_from_volume_uuid(
+            self.context, 'fake-uuid'))
+        stats = ec2utils.get_id_mapping_stats()['volume']
+        self.assertEqual(1, stats['shared_hits'])
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(0, stats['queries'])
+
+    def test_preload_id_mappings(self):
+        self.flags(ec2_id_mapping_preload=2)
+        mappings = [db.ec2_snapshot_create(self.context, 'fake-uuid%d' % i)
+                    for i in xrange(3)]
+        ec2utils.preload_id_mappings()
+        stats = ec2utils.get_id_mapping_stats()
+        self.assertEqual(2, stats['snapshot']['preloaded'])
+
+        queries = []
+        orig_get = db.get_ec2_snapshot_ids_by_uuids
+
+        def fake_get(context, uuids):
+            queries.append(uuids)
+            return orig_get(context, uuids)
+
+        self.stubs.Set(db, 'get_ec2_snapshot_ids_by_uuids', fake_get)
+        int_ids = ec2utils.get_int_ids_from_snapshot_uuids(
+            self.context, ['fake-uuid0', 'fake-uuid1', 'fake-uuid2'])
+        self.assertEqual([mapping['id'] for mapping in mappings],
+                         [int_ids['fake-uuid%d' % i] for i in xrange(3)])
+        self.assertEqual([['fake-uuid0']], queries)
+
+    def test_id_mapping_cache_size(self):
+        self.flags(ec2_id_mapping_cache_size=4)
+        ec2utils.reset_cache()
+        ec2utils.get_int_ids_from_instance_uuids(
+            self.context, ['fake-uuid%d' % i for i in xrange(3)])
+        # Reading the first one keeps it when the second is evicted
+        ec2utils.get_int_id_from_instance_uuid(self.context, 'fake-uuid0')
+
+        queries = []
+        orig_get = db.get_ec2_instance_ids_by_uuids
+
+        def fake_get(context, uuids):
+            queries.append(uuids)
+            return orig_get(context, uuids)
+
+        self.stubs.Set(db, 'get_ec2_instance_ids_by_uuids', fake_get)
+        ec2utils.get_int_ids_from_instance_uuids(
+            self.context, ['fake-uuid0', 'fake-uuid1', 'fake-uuid2'])
+        self.assertEqual([['fake-uuid1']], queries)
+
 
 class CloudTestCaseNeutronProxy(test.TestCase):
     def setUp(self):
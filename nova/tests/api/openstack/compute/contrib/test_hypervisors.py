@@ -14,6 +14,7 @@
 #    under the License.
 
 from lxml import etree
+import webob
 from webob import exc
 
 from nova.api.openstack.compute.contrib import hypervisors
@@ -335,6 +336,39 @@ class HypervisorsTest(test.TestCase):
                     running_vms=4,
                     disk_available_least=200)))
 
+    def _get_etag(self, action, etag=None):
+        req = fakes.HTTPRequest.blank('/v2/fake/os-hypervisors/' + action,
+                                      use_admin_context=True)
+        if etag:
+            req.headers['If-None-Match'] = etag
+        getattr(self.controller, action)(req)
+        resp = webob.Response()
+        req.set_validator_headers(resp)
+        return resp.headers['ETag'], req.is_not_modified()
+
+    def test_statistics_not_modified(self):
+        etag, not_modified = self._get_etag('statistics')
+        self.assertFalse(not_modified)
+        self.assertEqual((etag, True), self._get_etag('statistics', etag))
+
+    def test_statistics_modified(self):
+        etag = self._get_etag('statistics')[0]
+
+        def fake_statistics(context):
+            stats = fake_compute_node_statistics(context)
+            stats['running_vms'] += 1
+            return stats
+
+        self.stubs.Set(db, 'compute_node_statistics', fake_statistics)
+        new_etag, not_modified = self._get_etag('statistics', etag)
+        self.assertFalse(not_modified)
+        self.assertNotEqual(etag, new_etag)
+
+    def test_detail_not_modified(self):
+        etag, not_modified = self._get_etag('detail')
+        self.assertFalse(not_modified)
+        self.assertEqual((etag, True), self._get_etag('detail', etag))
+
 
 class HypervisorsSerializersTest(test.TestCase):
     def compare_to_exemplar(self, exemplar, hyper):
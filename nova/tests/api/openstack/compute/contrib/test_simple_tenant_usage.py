@@ -73,7 +73,7 @@ def get_fake_db_instance(start, end, instance_id, tenant_id):
             'system_metadata': sys_meta}
 
 
-def fake_instance_get_active_by_window_joined(self, context, begin, end,
+def fake_instance_get_usage_by_window(self, context, begin, end,
         project_id):
             return [get_fake_db_instance(START,
                                          STOP,
@@ -85,8 +85,8 @@ def fake_instance_get_active_by_window_joined(self, context, begin, end,
 class SimpleTenantUsageTest(test.TestCase):
     def setUp(self):
         super(SimpleTenantUsageTest, self).setUp()
-        self.stubs.Set(api.API, "get_active_by_window",
-                       fake_instance_get_active_by_window_joined)
+        self.stubs.Set(api.API, "get_usage_by_window",
+                       fake_instance_get_usage_by_window)
         self.admin_context = context.RequestContext('fakeadmin_0',
                                                     'faketenant_0',
                                                     is_admin=True)
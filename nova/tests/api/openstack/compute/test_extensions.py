@@ -16,6 +16,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+
+import fixtures
 import iso8601
 from lxml import etree
 from oslo.config import cfg
@@ -431,6 +434,70 @@ class ExtensionManagerTest(ExtensionTestCase):
         self.assertFalse(ext_mgr.is_loaded('THIRD'))
 
 
+class ExtensionManifestTest(ExtensionTestCase):
+
+    def setUp(self):
+        super(ExtensionManifestTest, self).setUp()
+        self.manifest = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                     'extensions.json')
+        self.flags(osapi_compute_extension_manifest=self.manifest)
+        # Saves the manifest
+        compute_extensions.ExtensionManager()
+        self.assertTrue(os.path.exists(self.manifest))
+
+    def test_lazy_extensions(self):
+        ext_mgr = compute_extensions.ExtensionManager()
+        fox = ext_mgr.extensions['FOXNSOX']
+        self.assertTrue(isinstance(fox, base_extensions.LazyExtension))
+        self.assertEqual('The Fox In Socks Extension.', fox.__doc__)
+
+        app = compute.APIRouter(ext_mgr)
+        self.assertTrue(isinstance(ext_mgr.extensions['FOXNSOX'],
+                                   base_extensions.LazyExtension))
+        request = webob.Request.blank("/fake/foxnsocks")
+        response = request.get_response(app)
+        self.assertEqual(200, response.status_int)
+        self.assertEqual(response_body, response.body)
+        self.assertFalse(isinstance(ext_mgr.extensions['FOXNSOX'],
+                                    base_extensions.LazyExtension))
+
+    def test_lazy_controller_extensions(self):
+        app = fakes.wsgi_app(init_only=('flavors',))
+        request = webob.Request.blank("/v2/fake/flavors/1?chewing=newblue")
+        request.environ['api.version'] = '2'
+        response = request.get_response(app)
+        self.assertEqual(200, response.status_int)
+        response_data = jsonutils.loads(response.body)
+        self.assertEqual('newblue', response_data['flavor']['googoose'])
+        self.assertEqual("Pig Bands!", response_data['big_bands'])
+
+    def test_manifest_replaced(self):
+        renames = []
+        orig_rename = os.rename
+
+        def fake_rename(src, dst):
+            renames.append(dst)
+            self.assertTrue(os.path.exists(src))
+            return orig_rename(src, dst)
+
+        self.stubs.Set(os, 'rename', fake_rename)
+        self.flags(osapi_compute_extension=CONF.osapi_compute_extension[1:])
+        compute_extensions.ExtensionManager()
+        self.assertEqual([self.manifest], renames)
+        self.assertEqual(['extensions.json'],
+                         os.listdir(os.path.dirname(self.manifest)))
+
+    def test_out_of_date_manifest(self):
+        ext_list = CONF.osapi_compute_extension[:]
+        ext_list.remove('nova.tests.api.openstack.compute.extensions.'
+                        'foxinsocks.Foxinsocks')
+        self.flags(osapi_compute_extension=ext_list)
+        ext_mgr = compute_extensions.ExtensionManager()
+        self.assertFalse(ext_mgr.is_loaded('FOXNSOX'))
+        for ext in ext_mgr.extensions.values():
+            self.assertFalse(isinstance(ext, base_extensions.LazyExtension))
+
+
 class ActionExtensionTest(ExtensionTestCase):
 
     def _send_server_action_request(self, url, body):
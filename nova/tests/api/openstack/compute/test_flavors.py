@@ -311,6 +311,33 @@ class FlavorsTest(test.TestCase):
         self.assertThat({'limit': ['2'], 'marker': ['2']},
                         matchers.DictMatches(params))
 
+    def test_get_flavor_list_detail_not_modified(self):
+        req = fakes.HTTPRequest.blank('/v2/fake/flavors/detail')
+        self.assertEqual(len(self.controller.detail(req)['flavors']), 2)
+        response = webob.Response()
+        req.set_validator_headers(response)
+
+        loads = []
+        orig_get_all = nova.compute.flavors.get_all_flavors_sorted_list
+
+        def fake_get_all(*args, **kwargs):
+            loads.append(1)
+            return orig_get_all(*args, **kwargs)
+
+        self.stubs.Set(nova.compute.flavors, "get_all_flavors_sorted_list",
+                       fake_get_all)
+        req = fakes.HTTPRequest.blank('/v2/fake/flavors/detail')
+        req.headers['If-None-Match'] = response.headers['ETag']
+        self.assertEqual(self.controller.detail(req), None)
+        self.assertTrue(req.is_not_modified())
+        self.assertEqual([], loads)
+
+        db.flavor_access_add(context.get_admin_context(), '1', 'fake')
+        req = fakes.HTTPRequest.blank('/v2/fake/flavors/detail')
+        req.headers['If-None-Match'] = response.headers['ETag']
+        self.assertEqual(len(self.controller.detail(req)['flavors']), 2)
+        self.assertFalse(req.is_not_modified())
+
     def test_get_flavor_list_detail(self):
         req = fakes.HTTPRequest.blank('/v2/fake/flavors/detail')
         flavor = self.controller.detail(req)
@@ -275,6 +275,23 @@ class ImagesControllerTest(test.TestCase):
         self.assertThat({'limit': ['2'], 'marker': ['124']},
                         matchers.DictMatches(params))
 
+    def test_get_image_details_not_modified(self):
+        request = fakes.HTTPRequest.blank('/v2/fake/images/detail')
+        self.controller.detail(request)
+        response = webob.Response()
+        request.set_validator_headers(response)
+        self.assertTrue(response.headers['ETag'])
+
+        request = fakes.HTTPRequest.blank('/v2/fake/images/detail')
+        request.headers['If-None-Match'] = response.headers['ETag']
+        self.controller.detail(request)
+        self.assertTrue(request.is_not_modified())
+
+        request = fakes.HTTPRequest.blank('/v2/fake/images/detail?limit=2')
+        request.headers['If-None-Match'] = response.headers['ETag']
+        self.controller.detail(request)
+        self.assertFalse(request.is_not_modified())
+
     def _detail_request(self, filters, request):
         context = request.environ['nova.context']
         self.image_service.detail(context, filters=filters).AndReturn([])
@@ -29,6 +29,8 @@ from nova.api.openstack.compute import views
 from nova.api.openstack import xmlutil
 import nova.context
 from nova.openstack.common import jsonutils
+from nova.openstack.common import memorycache
+from nova import sharedcache
 from nova import test
 from nova.tests.api.openstack import fakes
 from nova.tests import matchers
@@ -638,6 +640,74 @@ class LimiterTest(BaseLimitTestSuite):
         self.assertEqual(expected, results)
 
 
+class LimitMatcherTest(test.TestCase):
+    """
+    Tests for the `limits.LimitMatcher` class.
+    """
+
+    def test_matches(self):
+        matcher = limits.LimitMatcher(TEST_LIMITS + [
+            limits.Limit("PUT", "/servers/*", "^/servers/(.*)", 1, 1),
+            limits.Limit("PUT", "/images", "(?i)^/images", 1, 1)])
+        self.assertEqual([], matcher("GET", "/anything"))
+        self.assertEqual([], matcher("DELETE", "/servers"))
+        self.assertEqual([0], matcher("GET", "/delayed"))
+        self.assertEqual([1, 2], matcher("POST", "/servers"))
+        self.assertEqual([3, 4, 5], matcher("PUT", "/servers/abcd"))
+        self.assertEqual([3, 6], matcher("PUT", "/IMAGES"))
+
+
+class SharedLimiterTest(BaseLimitTestSuite):
+    """
+    Tests for `limits.Limiter` objects sharing their counters.
+    """
+
+    def setUp(self):
+        super(SharedLimiterTest, self).setUp()
+        self.flags(osapi_compute_shared_rate_limits=True,
+                   osapi_compute_rate_limit_batch=1)
+        client = memorycache.Client()
+        self.stubs.Set(sharedcache, 'get_client', lambda: client)
+        self.limiters = [limits.Limiter(TEST_LIMITS),
+                         limits.Limiter(TEST_LIMITS)]
+
+    def _check(self, limiter, num, verb, url, username=None):
+        for x in xrange(num):
+            yield limiter.check_for_delay(verb, url, username)[0]
+
+    def test_shared_limits(self):
+        first, second = self.limiters
+        expected = [None] * 5
+        results = list(self._check(first, 5, "PUT", "/anything"))
+        self.assertEqual(expected, results)
+
+        expected = [None] * 5 + [6.0]
+        results = list(self._check(second, 6, "PUT", "/anything"))
+        self.assertEqual(expected, results)
+
+        # Other users have their own counters
+        expected = [None] * 10
+        results = list(self._check(second, 10, "PUT", "/anything", "user1"))
+        self.assertEqual(expected, results)
+
+    def test_batched_counts(self):
+        self.flags(osapi_compute_rate_limit_batch=5)
+        first, second = self.limiters
+        list(self._check(first, 7, "PUT", "/anything"))
+
+        # The first request and a batch of 5 were counted
+        expected = [None] * 4 + [6.0]
+        results = list(self._check(second, 5, "PUT", "/anything"))
+        self.assertEqual(expected, results)
+
+        # Once the interval went by, whatever was counted is added
+        self.time += 1.0
+        list(self._check(second, 1, "PUT", "/anything"))
+        expected = [None, 17.0]
+        results = list(self._check(first, 2, "PUT", "/anything"))
+        self.assertEqual(expected, results)
+
+
 class WsgiLimiterTest(BaseLimitTestSuite):
     """
     Tests for `limits.WsgiLimiter` class.
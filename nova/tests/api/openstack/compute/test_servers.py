@@ -548,6 +548,65 @@ class ServersControllerTest(ControllerTest):
         num_servers = len(res_dict['servers'])
         self.assertEqual(0, num_servers)
 
+    def test_get_server_list_not_modified(self):
+        validator = {'count': 2, 'digest': 'abc',
+                     'updated_at': datetime.datetime(2013, 9, 1, 10, 0, 0)}
+
+        def fake_get_all_validator(compute_self, context, search_opts=None):
+            self.assertEqual(search_opts['project_id'], 'fake')
+            return validator
+
+        self.stubs.Set(compute_api.API, 'get_all_validator',
+                       fake_get_all_validator)
+        loads = []
+        orig_get_all = compute_api.API.get_all
+
+        def fake_get_all(*args, **kwargs):
+            loads.append(1)
+            return orig_get_all(*args, **kwargs)
+
+        self.stubs.Set(compute_api.API, 'get_all', fake_get_all)
+
+        def _detail(url='/fake/servers/detail', **headers):
+            req = fakes.HTTPRequest.blank(url)
+            req.headers.update(headers)
+            return req, self.controller.detail(req)
+
+        req, res_dict = _detail()
+        self.assertEqual(len(res_dict['servers']), 5)
+        response = webob.Response()
+        req.set_validator_headers(response)
+        etag = response.headers['ETag']
+        self.assertEqual(response.headers['Last-Modified'],
+                         'Sun, 01 Sep 2013 10:00:00 GMT')
+
+        # The servers aren't loaded for a 304
+        req, res_dict = _detail(**{'If-None-Match': etag})
+        self.assertEqual(res_dict, None)
+        self.assertTrue(req.is_not_modified())
+        req, res_dict = _detail(**{'If-Modified-Since':
+                                   'Sun, 01 Sep 2013 10:00:00 GMT'})
+        self.assertEqual(res_dict, None)
+        self.assertTrue(req.is_not_modified())
+        self.assertEqual(1, len(loads))
+
+        # Another page of the servers is a different response
+        req, res_dict = _detail('/fake/servers/detail?limit=1',
+                                **{'If-None-Match': etag})
+        self.assertEqual(len(res_dict['servers']), 1)
+        self.assertFalse(req.is_not_modified())
+
+        # And so are the servers once they changed
+        validator['digest'] = 'def'
+        req, res_dict = _detail(**{'If-None-Match': etag})
+        self.assertEqual(len(res_dict['servers']), 5)
+        self.assertFalse(req.is_not_modified())
+        validator['updated_at'] = datetime.datetime(2013, 9, 1, 10, 0, 1)
+        req, res_dict = _detail(**{'If-Modified-Since':
+                                   'Sun, 01 Sep 2013 10:00:00 GMT'})
+        self.assertEqual(len(res_dict['servers']), 5)
+        self.assertFalse(req.is_not_modified())
+
     def test_get_server_list_with_reservation_id(self):
         req = fakes.HTTPRequest.blank('/fake/servers?reservation_id=foo')
         res_dict = self.controller.index(req)
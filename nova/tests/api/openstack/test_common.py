@@ -27,7 +27,9 @@ import xml.dom.minidom as minidom
 from nova.api.openstack import common
 from nova.api.openstack import xmlutil
 from nova import exception
+from nova.network import model as network_model
 from nova import test
+from nova.tests import fake_network_cache_model
 from nova.tests import utils
 
 
@@ -324,6 +326,15 @@ class MiscFunctionsTest(test.TestCase):
         self.assertRaises(webob.exc.HTTPBadRequest,
                 common.check_img_metadata_properties_quota, ctxt, metadata3)
 
+    def test_get_networks_for_instance_from_shared_nw_info(self):
+        nw_info = network_model.FrozenNetworkInfo.hydrate(
+                [fake_network_cache_model.new_vif()])
+        networks = common.get_networks_for_instance_from_nw_info(nw_info)
+        self.assertEqual(4, len(networks['public']['ips']))
+        for ip in networks['public']['ips']:
+            self.assertEqual('aa:aa:aa:aa:aa:aa', ip['mac_address'])
+        self.assertFalse('mac_address' in nw_info.fixed_ips()[0])
+
     def test_task_and_vm_state_from_status(self):
         fixture = 'reboot'
         actual = common.task_and_vm_state_from_status(fixture)
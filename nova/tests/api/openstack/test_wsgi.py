@@ -1,10 +1,13 @@
 # vim: tabstop=4 shiftwidth=4 softtabstop=4
 
+import datetime
 import inspect
 import webob
 
 from nova.api.openstack import wsgi
 from nova import exception
+from nova.openstack.common import jsonutils
+from nova.openstack.common import timeutils
 from nova import test
 from nova.tests.api.openstack import fakes
 from nova.tests import utils
@@ -97,6 +100,82 @@ class RequestTest(test.TestCase):
                  'uuid1': instances[1],
                  'uuid2': instances[2]})
 
+    def test_prefetch_db_items(self):
+        request = wsgi.Request.blank('/foo')
+        calls = []
+
+        def loader(keys):
+            calls.append(keys)
+            return dict((key, 'item-%s' % key) for key in keys
+                        if key != 'uuid2')
+
+        self.assertEqual(request.prefetch_db_items('bdms',
+                                                   ['uuid0', 'uuid1'],
+                                                   loader),
+                {'uuid0': 'item-uuid0', 'uuid1': 'item-uuid1'})
+        self.assertEqual(request.prefetch_db_items('bdms',
+                                                   ['uuid1', 'uuid2'],
+                                                   loader),
+                {'uuid1': 'item-uuid1', 'uuid2': None})
+        self.assertEqual(request.prefetch_db_items('bdms', ['uuid2'],
+                                                   loader),
+                {'uuid2': None})
+        self.assertEqual(calls, [['uuid0', 'uuid1'], ['uuid2']])
+
+    def test_is_not_modified_etag(self):
+        request = wsgi.Request.blank('/foo')
+        self.assertFalse(request.is_not_modified())
+        request.set_response_validators(etag='abc')
+        self.assertFalse(request.is_not_modified())
+
+        request.headers['If-None-Match'] = '"abc-json"'
+        self.assertTrue(request.is_not_modified())
+
+        request = wsgi.Request.blank('/foo.xml')
+        request.set_response_validators(etag='abc')
+        request.headers['If-None-Match'] = '"abc-json"'
+        self.assertFalse(request.is_not_modified())
+
+    def test_is_not_modified_last_modified(self):
+        request = wsgi.Request.blank('/foo')
+        request.set_response_validators(
+            etag='abc', last_modified=datetime.datetime(2013, 9, 1, 10, 0, 0,
+                                                        123))
+        request.headers['If-Modified-Since'] = 'Sun, 01 Sep 2013 10:00:00 GMT'
+        self.assertTrue(request.is_not_modified())
+        request.headers['If-Modified-Since'] = 'Sun, 01 Sep 2013 09:59:59 GMT'
+        self.assertFalse(request.is_not_modified())
+
+        # If-None-Match takes precedence
+        request.headers['If-Modified-Since'] = 'Sun, 01 Sep 2013 10:00:00 GMT'
+        request.headers['If-None-Match'] = '"def-json"'
+        self.assertFalse(request.is_not_modified())
+
+    def test_last_modified_within_the_second_dropped(self):
+        timeutils.set_time_override(datetime.datetime(2013, 9, 1, 10, 0, 1,
+                                                      500))
+        self.addCleanup(timeutils.clear_time_override)
+        request = wsgi.Request.blank('/foo')
+        request.set_response_validators(
+            last_modified=datetime.datetime(2013, 9, 1, 10, 0, 0, 123))
+        request.headers['If-Modified-Since'] = 'Sun, 01 Sep 2013 10:00:00 GMT'
+        # A change later in 10:00:00 would have the same Last-Modified
+        self.assertFalse(request.is_not_modified())
+        response = webob.Response()
+        request.set_validator_headers(response)
+        self.assertNotIn('Last-Modified', response.headers)
+
+        timeutils.advance_time_seconds(1)
+        request.set_response_validators(
+            last_modified=datetime.datetime(2013, 9, 1, 10, 0, 0, 123))
+        self.assertTrue(request.is_not_modified())
+
+    def test_is_not_modified_only_get(self):
+        request = wsgi.Request.blank('/foo', method='POST')
+        request.set_response_validators(etag='abc')
+        request.headers['If-None-Match'] = '"abc-json"'
+        self.assertFalse(request.is_not_modified())
+
 
 class ActionDispatcherTest(test.TestCase):
     def test_dispatch(self):
@@ -142,6 +221,24 @@ class JSONDictSerializerTest(test.TestCase):
         result = result.replace('\n', '').replace(' ', '')
         self.assertEqual(result, expected_json)
 
+    def test_serialize_iter(self):
+        serializer = wsgi.JSONDictSerializer()
+        serializer.stream_min_items = 3
+        serializer.stream_chunk_items = 2
+        input_dict = {'servers': [{'id': i, 'name': u'server-\xe9'}
+                                  for i in xrange(5)],
+                      'servers_links': [{'rel': 'next', 'href': 'foo'}],
+                      'marker': None}
+        chunks = list(serializer.serialize_iter(input_dict))
+        self.assertEqual(''.join(chunks), serializer.serialize(input_dict))
+        self.assertTrue(len(chunks) > 5)
+
+    def test_serialize_iter_short_list(self):
+        serializer = wsgi.JSONDictSerializer()
+        self.assertEqual(serializer.serialize_iter({'servers': [1, 2]}),
+                         None)
+        self.assertEqual(serializer.serialize_iter([1, 2]), None)
+
 
 class TextDeserializerTest(test.TestCase):
     def test_dispatch_default(self):
@@ -246,6 +343,21 @@ class XMLDeserializerTest(test.TestCase):
 
 
 class ResourceTest(test.TestCase):
+    def test_failed_loader_kept(self):
+        calls = []
+
+        def loader(resource):
+            calls.append(resource)
+            if len(calls) == 1:
+                raise exception.NovaException()
+
+        resource = wsgi.Resource(None)
+        resource.register_loader(loader)
+        self.assertRaises(exception.NovaException, resource._run_loaders)
+        resource._run_loaders()
+        resource._run_loaders()
+        self.assertEqual([resource, resource], calls)
+
     def test_resource_call(self):
         class Controller(object):
             def index(self, req):
@@ -257,6 +369,31 @@ class ResourceTest(test.TestCase):
         self.assertEqual(response.body, 'off')
         self.assertEqual(response.status_int, 200)
 
+    def test_resource_call_validators(self):
+        class Controller(object):
+            def index(self, req):
+                req.set_response_validators(
+                    etag='abc',
+                    last_modified=datetime.datetime(2013, 9, 1, 10, 0, 0))
+                if req.is_not_modified():
+                    return None
+                return {'foo': 'bar'}
+
+        app = fakes.TestRouter(Controller())
+        req = webob.Request.blank('/tests')
+        response = req.get_response(app)
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(response.headers['ETag'], '"abc-json"')
+        self.assertEqual(response.headers['Last-Modified'],
+                         'Sun, 01 Sep 2013 10:00:00 GMT')
+
+        req = webob.Request.blank('/tests')
+        req.headers['If-None-Match'] = response.headers['ETag']
+        response = req.get_response(app)
+        self.assertEqual(response.status_int, 304)
+        self.assertEqual(response.body, '')
+        self.assertEqual(response.headers['ETag'], '"abc-json"')
+
     def test_resource_not_authorized(self):
         class Controller(object):
             def index(self, req):
@@ -992,6 +1129,16 @@ class ResponseObjectTest(test.TestCase):
             self.assertEqual(response.status_int, 202)
             self.assertEqual(response.body, mtype)
 
+    def test_serialize_streams_long_lists(self):
+        obj = {'servers': [{'id': i} for i in xrange(200)]}
+        robj = wsgi.ResponseObject(obj)
+        request = wsgi.Request.blank('/tests/123')
+        response = robj.serialize(request, 'application/json',
+                                  {'json': wsgi.JSONDictSerializer})
+
+        self.assertEqual(response.content_length, None)
+        self.assertEqual(jsonutils.loads(''.join(response.app_iter)), obj)
+
 
 class ValidBodyTest(test.TestCase):
 
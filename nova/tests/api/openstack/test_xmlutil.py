@@ -708,6 +708,71 @@ class TemplateTest(test.TestCase):
         templ = xmlutil.Template(None)
         self.assertEqual(templ.serialize(None), '')
 
+    def _make_server_templates(self):
+        root = xmlutil.TemplateElement('servers')
+        server = xmlutil.SubTemplateElement(root, 'server',
+                                            selector='servers',
+                                            id='id', name='name')
+        server.set('missing')
+        meta = xmlutil.SubTemplateElement(
+            server, 'meta',
+            selector=lambda obj, do_raise=False: obj['metadata'].items())
+        meta.set('key', 0)
+        meta.text = 1
+        status = xmlutil.SubTemplateElement(server, 'status')
+        status.text = xmlutil.EmptyStringSelector('status')
+        master = xmlutil.MasterTemplate(root, 1, nsmap=dict(f='foo'))
+
+        root_slave = xmlutil.TemplateElement('servers')
+        server_slave = xmlutil.SubTemplateElement(root_slave, 'server',
+                                                  selector='servers',
+                                                  host='host')
+        server_slave.set('const', xmlutil.ConstantSelector('value'))
+        xmlutil.SubTemplateElement(server_slave, 'image', selector='image',
+                                   id='id')
+        slave = xmlutil.SlaveTemplate(root_slave, 1, nsmap=dict(b='bar'))
+        master.attach(slave)
+        return master
+
+    def test_compiled_serialize(self):
+        obj = {'servers': [{'id': i, 'name': 'server%d' % i,
+                            'host': 'host%d' % (i % 2),
+                            'metadata': {'a': 1},
+                            'image': {'id': 'image%d' % i} if i else None,
+                            'status': u'ACTIVE\xe9' if i else None}
+                           for i in xrange(3)]}
+        obj['servers'][0]['metadata'] = {}
+
+        master = self._make_server_templates()
+        expected = etree.tostring(master._serialize(None, obj,
+                                                    master._siblings(),
+                                                    master._nsmap()))
+        self.assertEqual(etree.tostring(master.make_tree(obj)), expected)
+
+    def test_render_plan_cached(self):
+        master = self._make_server_templates()
+        siblings = master._siblings()
+        plan = xmlutil._get_render_plan(siblings)
+        self.assertTrue(plan is xmlutil._get_render_plan(siblings))
+
+        # Modifying a template compiles a new plan
+        siblings[0]['server'].set('extra')
+        self.assertFalse(plan is xmlutil._get_render_plan(siblings))
+
+    def test_render_plan_custom_render(self):
+        class CustomTemplateElement(xmlutil.TemplateElement):
+            def render(self, parent, obj, patches=[], nsmap=None):
+                return super(CustomTemplateElement, self).render(
+                    parent, obj, patches, nsmap)
+
+        root = xmlutil.TemplateElement('test')
+        root.append(CustomTemplateElement('child'))
+        self.assertEqual(xmlutil._get_render_plan([root]), None)
+
+        tmpl = xmlutil.Template(root)
+        result = tmpl.make_tree({'child': 'value'})
+        self.assertEqual(result[0].tag, 'child')
+
 
 class MasterTemplateBuilder(xmlutil.TemplateBuilder):
     def construct(self):
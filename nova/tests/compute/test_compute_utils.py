@@ -28,12 +28,15 @@ from nova import db
 from nova import exception
 from nova.image import glance
 from nova.network import api as network_api
+from nova.network import model as network_model
 from nova.openstack.common import importutils
+from nova.openstack.common import jsonutils
 from nova.openstack.common.notifier import api as notifier_api
 from nova.openstack.common.notifier import test_notifier
 from nova import test
 from nova.tests import fake_instance_actions
 from nova.tests import fake_network
+from nova.tests import fake_network_cache_model
 import nova.tests.image.fake
 
 CONF = cfg.CONF
@@ -439,3 +442,36 @@ class UsageInfoTestCase(test.TestCase):
                                                     "create.start",
                                                     aggregate_payload)
         self.assertEquals(len(test_notifier.NOTIFICATIONS), 0)
+
+
+class GetNwInfoForInstanceTestCase(test.NoDBTestCase):
+    def _instance(self, address='aa:aa:aa:aa:aa:aa', updated_at=None):
+        nw_info = network_model.NetworkInfo(
+                [fake_network_cache_model.new_vif({'address': address})])
+        return {'uuid': 'fake-uuid',
+                'info_cache': {'network_info': nw_info.json(),
+                               'updated_at': updated_at}}
+
+    def test_memoized_per_cache_value(self):
+        instance = self._instance()
+        nw_info = compute_utils.get_nw_info_for_instance(instance)
+        self.assertTrue(isinstance(nw_info, network_model.FrozenNetworkInfo))
+        self.assertTrue(
+            nw_info is compute_utils.get_nw_info_for_instance(instance))
+        self.assertTrue(nw_info is compute_utils.get_nw_info_for_instance(
+                self._instance(updated_at=1)))
+
+        updated = compute_utils.get_nw_info_for_instance(
+                self._instance(address='bb:bb:bb:bb:bb:bb'))
+        self.assertFalse(nw_info is updated)
+        self.assertEqual('bb:bb:bb:bb:bb:bb', updated[0]['address'])
+
+    def test_not_memoized_without_json(self):
+        instance = self._instance()
+        instance['info_cache']['network_info'] = jsonutils.loads(
+                instance['info_cache']['network_info'])
+        nw_info = compute_utils.get_nw_info_for_instance(instance)
+        self.assertFalse(isinstance(nw_info,
+                                    network_model.FrozenNetworkInfo))
+        self.assertFalse(
+            nw_info is compute_utils.get_nw_info_for_instance(instance))
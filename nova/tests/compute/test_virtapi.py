@@ -75,6 +75,14 @@ class VirtAPIBaseTest(test.TestCase, test.APICoverage):
         self.assertExpected('instance_type_get',
                             'fake-instance-type')
 
+    def test_action_event_start(self):
+        self.assertExpected('action_event_start',
+                            {'event': 'fake-event'})
+
+    def test_action_event_finish(self):
+        self.assertExpected('action_event_finish',
+                            {'event': 'fake-event'})
+
 
 class FakeVirtAPITest(VirtAPIBaseTest):
 
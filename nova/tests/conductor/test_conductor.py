@@ -14,6 +14,8 @@
 
 """Tests for the conductor service."""
 
+import datetime
+
 import mox
 
 from nova.api.ec2 import ec2utils
@@ -698,6 +700,20 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
                                                     instance=fake_inst,
                                                     volume_id='fake-volume')
 
+    def test_instance_get_all_by_filters_changes_since(self):
+        instance = self._create_fake_instance()
+        db.instance_update(self.context, instance['uuid'],
+                           {'display_name': 'changed'})
+        # As serialized over RPC
+        since = timeutils.strtime(timeutils.utcnow() -
+                                  datetime.timedelta(minutes=1))
+        filters = {'changes-since': since, 'deleted': False}
+        result = self.conductor.instance_get_all_by_filters(
+            self.context, filters, 'created_at', 'desc')
+        self.assertEqual([instance['uuid']],
+                         [inst['uuid'] for inst in result])
+        self.assertEqual(since, filters['changes-since'])
+
     def test_instance_get_all_by_filters(self):
         filters = {'foo': 'bar'}
         self.mox.StubOutWithMock(db, 'instance_get_all_by_filters')
@@ -792,6 +808,21 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
                            db_exception=exc.HostBinaryNotFound(binary='binary',
                                                                host='host'))
 
+    def test_action_event_without_action(self):
+        not_found = exc.InstanceActionNotFound(request_id='fake-req',
+                                               instance_uuid='fake-uuid')
+        for name in ('action_event_start', 'action_event_finish'):
+            self.mox.StubOutWithMock(db, name)
+            getattr(db, name)(self.context, {}).AndRaise(not_found)
+        self.mox.ReplayAll()
+        # Expected when no action was recorded, so not logged as an error
+        self.assertRaises(rpc_common.ClientException,
+                          self.conductor.action_event_start,
+                          self.context, {})
+        self.assertRaises(rpc_common.ClientException,
+                          self.conductor.action_event_finish,
+                          self.context, {})
+
     def test_security_groups_trigger_handler(self):
         self.mox.StubOutWithMock(self.conductor_manager.security_group_api,
                                  'trigger_handler')
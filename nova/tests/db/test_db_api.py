@@ -1620,6 +1620,134 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertEqual(result[0]['uuid'], instance['uuid'])
         self.assertEqual(result[0]['system_metadata'], [])
 
+    def test_instance_get_usage_by_window(self):
+        now = timeutils.utcnow()
+        begin = now - datetime.timedelta(hours=2)
+        inst1 = self.create_instance_with_args(
+            launched_at=begin - datetime.timedelta(hours=1))
+        inst2 = self.create_instance_with_args(
+            launched_at=begin, terminated_at=now, project_id='project2')
+        # Terminated before the window started
+        self.create_instance_with_args(
+            launched_at=begin - datetime.timedelta(hours=3),
+            terminated_at=begin - datetime.timedelta(hours=1))
+        # Launched after the window ended
+        self.create_instance_with_args(
+            launched_at=now + datetime.timedelta(hours=1))
+
+        result = db.instance_get_usage_by_window(
+                self.ctxt, begin, now, sys_meta_keys=['smkey1'])
+        self.assertTrue(isinstance(result, list))
+        self.assertEqual([inst1['uuid'], inst2['uuid']],
+                         [instance['uuid'] for instance in result])
+        self.assertEqual(result[1]['terminated_at'], now)
+        self.assertEqual(result[1]['project_id'], 'project2')
+        self.assertEqual({'smkey1': 'smval1'},
+                         utils.metadata_to_dict(result[0]['system_metadata']))
+        self.assertFalse('info_cache' in result[0])
+
+        result = db.instance_get_usage_by_window(
+                self.ctxt, begin, now, project_id='project2')
+        self.assertEqual([inst2['uuid']],
+                         [instance['uuid'] for instance in result])
+        self.assertEqual({'smkey1': 'smval1', 'smkey2': 'smval2'},
+                         utils.metadata_to_dict(result[0]['system_metadata']))
+
+    def test_instance_get_usage_by_window_batches(self):
+        self.stubs.Set(sqlalchemy_api, '_USAGE_BATCH_SIZE', 2)
+        now = timeutils.utcnow()
+        uuids = [self.create_instance_with_args(launched_at=now)['uuid']
+                 for i in xrange(5)]
+        result = db.instance_get_usage_by_window(
+                self.ctxt, now - datetime.timedelta(hours=1))
+        self.assertEqual(uuids, [instance['uuid'] for instance in result])
+        for instance in result:
+            self.assertEqual(len(instance['system_metadata']), 2)
+
+    def test_instance_get_validator_by_filters(self):
+        # Every change happens within the same second
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        filters = {'project_id': 'project1', 'deleted': False}
+
+        def _validator():
+            return db.instance_get_validator_by_filters(self.ctxt, filters)
+
+        validator = _validator()
+        self.assertEqual(0, validator['count'])
+        self.assertEqual(None, validator['updated_at'])
+        instance = self.create_instance_with_args(vm_state='active')
+        self.create_instance_with_args(vm_state='active',
+                                       project_id='project2')
+        validator = _validator()
+        self.assertEqual(1, validator['count'])
+        group = db.security_group_create(self.ctxt, {'name': 'group1',
+                                                     'project_id': 'project1'})
+
+        changes = [
+            lambda: db.instance_update(self.ctxt, instance['uuid'],
+                                       {'display_name': 'foo'}),
+            lambda: db.instance_metadata_update(self.ctxt, instance['uuid'],
+                                                {'mkey3': 'mval3'}, False),
+            lambda: db.instance_metadata_delete(self.ctxt, instance['uuid'],
+                                                'mkey1'),
+            lambda: db.instance_info_cache_update(self.ctxt,
+                                                  instance['uuid'],
+                                                  {'network_info': '[]'}),
+            lambda: db.block_device_mapping_create(self.ctxt,
+                    {'instance_uuid': instance['uuid'],
+                     'device_name': '/dev/vdb', 'volume_id': 'vol1'}),
+            lambda: db.block_device_mapping_destroy_by_instance_and_volume(
+                    self.ctxt, instance['uuid'], 'vol1'),
+            lambda: db.instance_add_security_group(self.ctxt,
+                                                   instance['uuid'],
+                                                   group['id']),
+            lambda: db.security_group_update(self.ctxt, group['id'],
+                                             {'name': 'group2'}),
+            lambda: db.instance_remove_security_group(self.ctxt,
+                                                      instance['uuid'],
+                                                      group['id']),
+            lambda: db.instance_fault_create(self.ctxt,
+                    {'instance_uuid': instance['uuid'], 'code': 500,
+                     'message': 'boom'}),
+        ]
+        for change in changes:
+            change()
+            new_validator = _validator()
+            self.assertEqual(1, new_validator['count'])
+            self.assertNotEqual(validator['digest'], new_validator['digest'])
+            validator = new_validator
+
+        self.assertEqual(validator, _validator())
+        db.instance_destroy(self.ctxt, instance['uuid'])
+        self.assertEqual(0, _validator()['count'])
+
+    def test_instance_get_validator_by_filters_left_instances(self):
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        filters = {'project_id': 'project1', 'deleted': False,
+                   'vm_state': 'active'}
+        instances = [self.create_instance_with_args(vm_state='active')
+                     for i in xrange(2)]
+        validators = [db.instance_get_validator_by_filters(self.ctxt,
+                                                           filters)]
+
+        # Instances which stop matching or are deleted still make the
+        # latest change later
+        changes = [
+            lambda: db.instance_update(self.ctxt, instances[0]['uuid'],
+                                       {'vm_state': 'stopped'}),
+            lambda: db.instance_destroy(self.ctxt, instances[1]['uuid']),
+        ]
+        for change in changes:
+            timeutils.advance_time_seconds(1)
+            change()
+            validators.append(db.instance_get_validator_by_filters(
+                self.ctxt, filters))
+            self.assertTrue(validators[-1]['updated_at'] >
+                            validators[-2]['updated_at'])
+        self.assertEqual(0, validators[-1]['count'])
+
     def test_instance_get_all_hung_in_rebooting(self):
         # Ensure no instances are returned.
         results = db.instance_get_all_hung_in_rebooting(self.ctxt, 10)
@@ -2405,6 +2533,24 @@ class InstanceTypeTestCase(BaseInstanceTypeTestCase):
         self._assertEqualObjects(inst_type, self._get_base_values(),
                                  ignored_keys)
 
+    def test_flavor_get_validator(self):
+        # Every change happens within the same second
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        validators = [db.flavor_get_validator(self.ctxt)]
+
+        def _change(func, *args):
+            func(self.ctxt, *args)
+            validator = db.flavor_get_validator(self.ctxt)
+            self.assertNotIn(validator, validators)
+            validators.append(validator)
+
+        _change(db.flavor_create, self._get_base_values())
+        _change(db.flavor_access_add, 'fake_flavor', 'project1')
+        _change(db.flavor_access_remove, 'fake_flavor', 'project1')
+        _change(db.flavor_destroy, 'fake_name')
+        self.assertEqual(validators[-1], db.flavor_get_validator(self.ctxt))
+
     def test_instance_type_destroy(self):
         specs1 = {'a': '1', 'b': '2'}
         inst_type1 = self._create_inst_type({'name': 'name1', 'flavorid': 'a1',
@@ -3047,6 +3193,33 @@ class FixedIPTestCase(BaseInstanceTypeTestCase):
             [FIXED_IP_ADDRESS_1, FIXED_IP_ADDRESS_2],
             [ips_list[0].address, ips_list[1].address])
 
+    def test_fixed_ips_by_virtual_interfaces(self):
+        instance_uuid = self._create_instance()
+
+        vif1 = db.virtual_interface_create(
+            self.ctxt, dict(instance_uuid=instance_uuid))
+        vif2 = db.virtual_interface_create(
+            self.ctxt, dict(instance_uuid=instance_uuid))
+        vif3 = db.virtual_interface_create(
+            self.ctxt, dict(instance_uuid=instance_uuid))
+
+        db.fixed_ip_create(self.ctxt, dict(
+            virtual_interface_id=vif1.id, address='192.168.1.5'))
+        db.fixed_ip_create(self.ctxt, dict(
+            virtual_interface_id=vif2.id, address='192.168.1.6'))
+        db.fixed_ip_create(self.ctxt, dict(
+            virtual_interface_id=vif3.id, address='192.168.1.7'))
+
+        ips_list = db.fixed_ips_by_virtual_interfaces(self.ctxt,
+                                                      [vif1.id, vif2.id])
+        self._assertEqualListsOfPrimitivesAsSets(
+            ['192.168.1.5', '192.168.1.6'],
+            [ip.address for ip in ips_list])
+
+    def test_fixed_ips_by_virtual_interfaces_empty(self):
+        self.assertEqual([], db.fixed_ips_by_virtual_interfaces(self.ctxt,
+                                                                []))
+
     def test_fixed_ips_by_virtual_interface_no_ip_found(self):
         instance_uuid = self._create_instance()
 
@@ -3725,6 +3898,26 @@ class FloatingIpTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                                          fixed_ip['id'])
             self.assertEqual(float_addr, float_ip[0]['address'])
 
+    def test_floating_ip_get_by_fixed_ip_ids(self):
+        fixed_float = [
+            ('1.1.1.1', '2.2.2.1'),
+            ('1.1.1.2', '2.2.2.2'),
+            ('1.1.1.3', '2.2.2.3')
+        ]
+
+        for fixed_addr, float_addr in fixed_float:
+            self._create_floating_ip({'address': float_addr})
+            self._create_fixed_ip({'address': fixed_addr})
+            db.floating_ip_fixed_ip_associate(self.ctxt, float_addr,
+                                              fixed_addr, 'some_host')
+
+        fixed_ip_ids = [db.fixed_ip_get_by_address(self.ctxt, fixed_addr)['id']
+                        for fixed_addr, float_addr in fixed_float[:2]]
+        float_ips = db.floating_ip_get_by_fixed_ip_ids(self.ctxt,
+                                                       fixed_ip_ids)
+        self.assertEqual(['2.2.2.1', '2.2.2.2'],
+                         sorted(ip['address'] for ip in float_ips))
+
     def test_floating_ip_update(self):
         float_ip = self._create_floating_ip({})
 
@@ -4241,6 +4434,32 @@ class BlockDeviceMappingTestCase(test.TestCase):
         bmd = db.block_device_mapping_get_all_by_instance(self.ctxt, uuid2)
         self.assertEqual(len(bmd), 2)
 
+    def test_block_device_mapping_get_all_by_instance_uuids(self):
+        uuid1 = self.instance['uuid']
+        uuid2 = db.instance_create(self.ctxt, {})['uuid']
+        uuid3 = db.instance_create(self.ctxt, {})['uuid']
+
+        bmds_values = [{'instance_uuid': uuid1,
+                        'device_name': 'first'},
+                       {'instance_uuid': uuid2,
+                        'device_name': 'second'},
+                       {'instance_uuid': uuid3,
+                        'device_name': 'third'}]
+
+        for bdm in bmds_values:
+            self._create_bdm(bdm)
+
+        bmd = db.block_device_mapping_get_all_by_instance_uuids(
+                self.ctxt, [uuid1, uuid2])
+        self.assertEqual(len(bmd), 2)
+        self.assertEqual(sorted(b['device_name'] for b in bmd),
+                         ['first', 'second'])
+
+    def test_block_device_mapping_get_all_by_instance_uuids_empty(self):
+        self._create_bdm({})
+        bmd = db.block_device_mapping_get_all_by_instance_uuids(self.ctxt, [])
+        self.assertEqual(bmd, [])
+
     def test_block_device_mapping_destroy(self):
         bdm = self._create_bdm({})
         db.block_device_mapping_destroy(self.ctxt, bdm['id'])
@@ -5080,6 +5299,14 @@ class S3ImageTestCase(test.TestCase):
         self.assertRaises(exception.ImageNotFound, db.s3_image_get, self.ctxt,
                           100500)
 
+    def test_s3_image_ids_get_by_uuids(self):
+        ids = db.s3_image_ids_get_by_uuids(
+            self.ctxt, self.values + [uuidutils.generate_uuid()])
+        self.assertEqual(sorted(self.values), sorted(ids.keys()))
+        for uuid in self.values:
+            self.assertEqual(db.s3_image_get_by_uuid(self.ctxt, uuid).id,
+                             ids[uuid])
+
     def test_s3_image_get_by_uuid_not_found(self):
         self.assertRaises(exception.ImageNotFound, db.s3_image_get_by_uuid,
                           self.ctxt, uuidutils.generate_uuid())
@@ -5194,6 +5421,39 @@ class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
         for k, v in stats.iteritems():
             self.assertEqual(v, self.item[k])
 
+    def test_compute_node_statistics_follow_updates(self):
+        service = db.service_create(self.ctxt, dict(self.service_dict,
+                                                    host='host2'))
+        values = dict(self.compute_node_dict, service_id=service['id'],
+                      vcpus=6, running_vms=3, disk_available_least=None,
+                      stats={})
+        second = db.compute_node_create(self.ctxt, values)
+
+        db.compute_node_update(self.ctxt, self.item['id'],
+                               {'vcpus_used': 1, 'running_vms': '2',
+                                'free_ram_mb': 512})
+        stats = db.compute_node_statistics(self.ctxt)
+        self.assertEqual(2, stats['count'])
+        self.assertEqual(8, stats['vcpus'])
+        self.assertEqual(1, stats['vcpus_used'])
+        self.assertEqual(5, stats['running_vms'])
+        self.assertEqual(1536, stats['free_ram_mb'])
+        self.assertEqual(100, stats['disk_available_least'])
+
+        db.compute_node_delete(self.ctxt, self.item['id'])
+        stats = db.compute_node_statistics(self.ctxt)
+        self.assertEqual(1, stats['count'])
+        self.assertEqual(6, stats['vcpus'])
+        self.assertEqual(3, stats['running_vms'])
+        self.assertEqual(0, stats['disk_available_least'])
+
+        db.service_destroy(self.ctxt, service['id'])
+        stats = db.compute_node_statistics(self.ctxt)
+        self.assertEqual(0, stats['count'])
+        self.assertEqual(0, stats['vcpus'])
+        self.assertRaises(exception.ComputeHostNotFound,
+                          db.compute_node_delete, self.ctxt, second['id'])
+
     def test_compute_node_not_found(self):
         self.assertRaises(exception.ComputeHostNotFound, db.compute_node_get,
                           self.ctxt, 100500)
@@ -5786,6 +6046,14 @@ class Ec2TestCase(test.TestCase):
         vol_id = db.get_ec2_volume_id_by_uuid(self.ctxt, 'fake-uuid')
         self.assertEqual(vol['id'], vol_id)
 
+    def test_get_ec2_volume_ids_by_uuids(self):
+        vol1 = db.ec2_volume_create(self.ctxt, 'fake-uuid1')
+        vol2 = db.ec2_volume_create(self.ctxt, 'fake-uuid2')
+        vol_ids = db.get_ec2_volume_ids_by_uuids(
+            self.ctxt, ['fake-uuid1', 'fake-uuid2', 'uuid-not-present'])
+        self.assertEqual({'fake-uuid1': vol1['id'],
+                          'fake-uuid2': vol2['id']}, vol_ids)
+
     def test_get_volume_uuid_by_ec2_id(self):
         vol = db.ec2_volume_create(self.ctxt, 'fake-uuid')
         vol_uuid = db.get_volume_uuid_by_ec2_id(self.ctxt, vol['id'])
@@ -5811,6 +6079,14 @@ class Ec2TestCase(test.TestCase):
         snap_id = db.get_ec2_snapshot_id_by_uuid(self.ctxt, 'fake-uuid')
         self.assertEqual(snap['id'], snap_id)
 
+    def test_get_ec2_snapshot_ids_by_uuids(self):
+        snap1 = db.ec2_snapshot_create(self.ctxt, 'fake-uuid1')
+        snap2 = db.ec2_snapshot_create(self.ctxt, 'fake-uuid2')
+        snap_ids = db.get_ec2_snapshot_ids_by_uuids(
+            self.ctxt, ['fake-uuid1', 'fake-uuid2', 'uuid-not-present'])
+        self.assertEqual({'fake-uuid1': snap1['id'],
+                          'fake-uuid2': snap2['id']}, snap_ids)
+
     def test_get_snapshot_uuid_by_ec2_id(self):
         snap = db.ec2_snapshot_create(self.ctxt, 'fake-uuid')
         snap_uuid = db.get_snapshot_uuid_by_ec2_id(self.ctxt, snap['id'])
@@ -5836,6 +6112,41 @@ class Ec2TestCase(test.TestCase):
         inst_id = db.get_ec2_instance_id_by_uuid(self.ctxt, 'fake-uuid')
         self.assertEqual(inst['id'], inst_id)
 
+    def test_get_ec2_instance_ids_by_uuids(self):
+        inst1 = db.ec2_instance_create(self.ctxt, 'fake-uuid1')
+        inst2 = db.ec2_instance_create(self.ctxt, 'fake-uuid2')
+        db.ec2_instance_create(self.ctxt, 'fake-uuid3')
+        inst_ids = db.get_ec2_instance_ids_by_uuids(
+            self.ctxt, ['fake-uuid1', 'fake-uuid2', 'uuid-not-present'])
+        self.assertEqual({'fake-uuid1': inst1['id'],
+                          'fake-uuid2': inst2['id']}, inst_ids)
+        self.assertEqual({}, db.get_ec2_instance_ids_by_uuids(self.ctxt, []))
+
+    def test_ec2_id_mappings_get_instances(self):
+        db.ec2_instance_create(self.ctxt, 'fake-uuid1')
+        inst2 = db.ec2_instance_create(self.ctxt, 'fake-uuid2')
+        inst3 = db.ec2_instance_create(self.ctxt, 'fake-uuid3')
+        mappings = db.ec2_id_mappings_get(
+            self.ctxt, 'instance', ids=[inst3['id'], 100500])
+        self.assertEqual([('fake-uuid3', inst3['id'])], mappings)
+        mappings = db.ec2_id_mappings_get(self.ctxt, 'instance', limit=2)
+        self.assertEqual([('fake-uuid3', inst3['id']),
+                          ('fake-uuid2', inst2['id'])], mappings)
+        self.assertEqual([], db.ec2_id_mappings_get(self.ctxt, 'instance',
+                                                    ids=[]))
+
+    def test_ec2_id_mappings_get_images(self):
+        image = db.s3_image_create(self.ctxt, 'fake-uuid')
+        self.assertEqual([('fake-uuid', image['id'])],
+                         db.ec2_id_mappings_get(self.ctxt, 'image',
+                                                ids=[image['id']]))
+
+    def test_ec2_id_mappings_get_requires_context(self):
+        ctxt = context.RequestContext(user_id=None, project_id=None,
+                                      is_admin=False)
+        self.assertRaises(exception.NotAuthorized, db.ec2_id_mappings_get,
+                          ctxt, 'instance')
+
     def test_get_instance_uuid_by_ec2_id(self):
         inst = db.ec2_instance_create(self.ctxt, 'fake-uuid')
         inst_uuid = db.get_instance_uuid_by_ec2_id(self.ctxt, inst['id'])
@@ -2811,6 +2811,50 @@ class TestNovaMigrations(BaseMigrationTestCase, CommonTestsMixIn):
         metadata.insert().values(data).execute()
         self.assertIsNotNone(metadata.insert().values(data).execute())
 
+    def _pre_upgrade_212(self, engine):
+        compute_nodes = db_utils.get_table(engine, 'compute_nodes')
+        compute_nodes.delete().execute()
+        node = {'service_id': 1, 'vcpus': 4, 'memory_mb': 1024,
+                'local_gb': 10, 'vcpus_used': 1, 'memory_mb_used': 512,
+                'local_gb_used': 5, 'hypervisor_type': 'fake_type',
+                'hypervisor_version': 1, 'cpu_info': 'info',
+                'running_vms': 1, 'disk_available_least': None}
+        data = [dict(node, id=1, deleted=0),
+                dict(node, id=17, deleted=0, disk_available_least=3),
+                dict(node, id=2, deleted=2)]
+        engine.execute(compute_nodes.insert(), data)
+        return data
+
+    def _check_212(self, engine, data):
+        statistics = db_utils.get_table(engine, 'compute_node_statistics')
+        shards = dict((row['id'], row)
+                      for row in statistics.select().execute())
+        self.assertEqual(range(16), sorted(shards))
+        self.assertEqual(2, shards[1]['count'])
+        self.assertEqual(8, shards[1]['vcpus'])
+        self.assertEqual(2, shards[1]['running_vms'])
+        self.assertEqual(3, shards[1]['disk_available_least'])
+        self.assertEqual(0, shards[2]['count'])
+        self.assertEqual(0, shards[2]['vcpus'])
+        self.assertIn('shadow_compute_node_statistics', engine.table_names())
+
+    def _post_downgrade_212(self, engine):
+        self.assertNotIn('compute_node_statistics', engine.table_names())
+        self.assertNotIn('shadow_compute_node_statistics',
+                         engine.table_names())
+
+    def _check_213(self, engine, data):
+        instances = db_utils.get_table(engine, 'instances')
+        index_data = [(idx.name, sorted(idx.columns.keys()))
+                      for idx in instances.indexes]
+        self.assertIn(('instances_project_id_updated_at_idx',
+                       ['project_id', 'updated_at']), index_data)
+
+    def _post_downgrade_213(self, engine):
+        instances = db_utils.get_table(engine, 'instances')
+        index_names = [idx.name for idx in instances.indexes]
+        self.assertNotIn('instances_project_id_updated_at_idx', index_names)
+
 
 class TestBaremetalMigrations(BaseMigrationTestCase, CommonTestsMixIn):
     """Test sqlalchemy-migrate migrations."""
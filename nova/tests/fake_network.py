@@ -284,6 +284,7 @@ def fake_get_instance_nw_info(stubs, num_networks=1, ips_per_vif=2,
     fixed_ips = []
 
     networks = [fake_network(x) for x in xrange(1, num_networks + 1)]
+    all_floating_ips = []
 
     def fixed_ips_fake(*args, **kwargs):
         global fixed_ips
@@ -291,6 +292,18 @@ def fake_get_instance_nw_info(stubs, num_networks=1, ips_per_vif=2,
                for i in xrange(1, num_networks + 1)
                for j in xrange(ips_per_vif)]
         fixed_ips = ips
+        for ip in ips:
+            all_floating_ips.extend(ip['floating_ips'])
+        return ips
+
+    def fixed_ips_by_vifs_fake(context, vif_ids):
+        # NOTE: every vif gets a fresh batch of fixed ips, matching what
+        #       the per-vif lookups used to return
+        ips = []
+        for vif_id in vif_ids:
+            for ip in fixed_ips_fake():
+                ip['virtual_interface_id'] = vif_id
+                ips.append(ip)
         return ips
 
     def floating_ips_fake(context, address):
@@ -299,6 +312,11 @@ def fake_get_instance_nw_info(stubs, num_networks=1, ips_per_vif=2,
                 return ip['floating_ips']
         return []
 
+    def floating_ips_by_fixed_ip_ids_fake(context, fixed_ip_ids):
+        return [floating_ip for fixed_ip_id in fixed_ip_ids
+                for floating_ip in all_floating_ips
+                if floating_ip['fixed_ip_id'] == fixed_ip_id]
+
     def fixed_ips_v6_fake():
         return ['2001:db8:0:%x::1' % i
                 for i in xrange(1, num_networks + 1)]
@@ -337,6 +355,10 @@ def fake_get_instance_nw_info(stubs, num_networks=1, ips_per_vif=2,
             gateway='2001:db8:0:%x::1' % i)
         return [subnet_v4, subnet_v6]
 
+    def get_subnets_by_network(self, context, network):
+        return get_subnets_by_net_id(self, context, network['project_id'],
+                                     network['uuid'], None)
+
     def get_network_by_uuid(context, uuid):
         return dict(id=1,
                     cidr_v6='fe80::/64',
@@ -352,6 +374,9 @@ def fake_get_instance_nw_info(stubs, num_networks=1, ips_per_vif=2,
 
     stubs.Set(db, 'fixed_ip_get_by_instance', fixed_ips_fake)
     stubs.Set(db, 'floating_ip_get_by_fixed_address', floating_ips_fake)
+    stubs.Set(db, 'fixed_ips_by_virtual_interfaces', fixed_ips_by_vifs_fake)
+    stubs.Set(db, 'floating_ip_get_by_fixed_ip_ids',
+              floating_ips_by_fixed_ip_ids_fake)
     stubs.Set(db, 'virtual_interface_get_by_uuid', vif_by_uuid_fake)
     stubs.Set(db, 'network_get_by_uuid', get_network_by_uuid)
     stubs.Set(db, 'virtual_interface_get_by_instance', virtual_interfaces_fake)
@@ -364,6 +389,10 @@ def fake_get_instance_nw_info(stubs, num_networks=1, ips_per_vif=2,
                     get_v4_fake)
     stubs.Set(nova_ipam_lib.NeutronNovaIPAMLib, 'get_v6_ips_by_interface',
                     get_v6_fake)
+    stubs.Set(nova_ipam_lib.NeutronNovaIPAMLib, 'get_subnets_by_network',
+              get_subnets_by_network)
+    stubs.Set(nova_ipam_lib.NeutronNovaIPAMLib, 'get_v6_ips_by_network',
+                    get_v6_fake)
 
     class FakeContext(nova.context.RequestContext):
         def is_admin(self):
@@ -19,6 +19,7 @@ class GuestFS(object):
 
     def __init__(self):
         self.drives = []
+        self.labels = {}
         self.running = False
         self.closed = False
         self.mounts = []
@@ -34,12 +35,20 @@ class GuestFS(object):
         self.running = False
         self.mounts = []
         self.drives = []
+        self.labels = {}
 
     def close(self):
         self.closed = True
 
     def add_drive_opts(self, file, *args, **kwargs):
         self.drives.append((file, kwargs['format']))
+        if 'label' in kwargs:
+            self.labels[kwargs['label']] = (file, kwargs['format'])
+
+    def remove_drive(self, label):
+        if label not in self.labels:
+            raise RuntimeError("remove_drive: %s: no such label" % label)
+        self.drives.remove(self.labels.pop(label))
 
     def get_attach_method(self):
         return self.attach_method
@@ -64,6 +73,10 @@ class GuestFS(object):
                     "mount: %s: No such file or directory" % mntpoint)
         self.mounts.append((options, device, mntpoint))
 
+    def umount_all(self):
+        self.mounts = []
+        self.root_mounted = False
+
     def mkdir_p(self, path):
         if path not in self.files:
             self.files[path] = {
@@ -32,6 +32,7 @@ from oslo.config import cfg
 from nova import context
 from nova import exception
 from nova.image import glance
+from nova.openstack.common import timeutils
 from nova import test
 from nova.tests.api.openstack import fakes
 from nova.tests.glance import stubs as glance_stubs
@@ -470,6 +471,125 @@ class TestGlanceImageService(test.TestCase):
         self.assertEqual(image_meta['created_at'], self.NOW_DATETIME)
         self.assertEqual(image_meta['updated_at'], self.NOW_DATETIME)
 
+    def _counting_client(self):
+        client = glance_stubs.StubGlanceClient()
+        calls = []
+        orig_get = client.images.get
+
+        def get(image_id):
+            calls.append(image_id)
+            return orig_get(image_id)
+
+        client.images.get = get
+        self.service = self._create_image_service(client)
+        return client, calls
+
+    def test_show_caches_active_images(self):
+        client, calls = self._counting_client()
+        image_id = client.create(**self._make_fixture(status='active')).id
+        image_meta = self.service.show(self.context, image_id)
+        image_meta['properties']['changed'] = True
+        self.assertEqual({}, self.service.show(self.context,
+                                               image_id)['properties'])
+        self.assertEqual(1, len(calls))
+        self.assertEqual(1, glance.get_image_cache_stats()['hits'])
+
+        # Private images are only served to the projects glance showed
+        # them to
+        other = context.RequestContext('other', 'other', auth_token=True)
+        self.service.show(other, image_id)
+        self.assertEqual(2, len(calls))
+
+        self.service.update(self.context, image_id, {'name': 'new'})
+        self.assertEqual('new', self.service.show(self.context,
+                                                  image_id)['name'])
+        self.assertEqual(3, len(calls))
+
+    def test_show_cache_admin_views(self):
+        client, calls = self._counting_client()
+        image_id = client.create(**self._make_fixture(status='active')).id
+        admin = context.RequestContext('admin', 'fake', is_admin=True,
+                                       auth_token=True)
+        self.service.show(admin, image_id)
+
+        # What glance showed an admin isn't served to the members of the
+        # project
+        self.service.show(self.context, image_id)
+        self.assertEqual(2, len(calls))
+
+        # Though what it showed them is served to admins
+        self.service.show(admin, image_id)
+        self.assertEqual(2, len(calls))
+
+    def test_show_does_not_cache_inactive_images(self):
+        client, calls = self._counting_client()
+        image_id = client.create(**self._make_fixture(status='saving')).id
+        self.service.show(self.context, image_id)
+        self.service.show(self.context, image_id)
+        self.assertEqual(2, len(calls))
+
+    def test_show_cache_expiry(self):
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self.flags(glance_image_cache_ttl=10)
+        client, calls = self._counting_client()
+        image_id = client.create(**self._make_fixture(status='active')).id
+        self.service.show(self.context, image_id)
+        timeutils.advance_time_seconds(9)
+        self.service.show(self.context, image_id)
+        self.assertEqual(1, len(calls))
+        timeutils.advance_time_seconds(1)
+        self.service.show(self.context, image_id)
+        self.assertEqual(2, len(calls))
+
+        self.flags(glance_image_cache_ttl=0)
+        self.service.show(self.context, image_id)
+        self.assertEqual(3, len(calls))
+
+    def test_show_cache_eviction(self):
+        self.flags(glance_image_cache_size=4)
+        client, calls = self._counting_client()
+        image_ids = [client.create(**self._make_fixture(status='active')).id
+                     for i in xrange(5)]
+        for image_id in image_ids:
+            self.service.show(self.context, image_id)
+            # The first one is the most recently used
+            self.service.show(self.context, image_ids[0])
+        self.assertEqual(2, glance.get_image_cache_stats()['evictions'])
+
+        del calls[:]
+        self.service.show(self.context, image_ids[0])
+        self.service.show(self.context, image_ids[4])
+        self.assertEqual([], calls)
+        self.service.show(self.context, image_ids[1])
+        self.assertEqual([image_ids[1]], calls)
+
+    def test_detail_reuses_cached_images(self):
+        client, calls = self._counting_client()
+        image_id = client.create(**self._make_fixture(status='active')).id
+
+        translations = []
+        orig_translate = self.service._translate_from_glance
+
+        def translate(image):
+            translations.append(image.id)
+            return orig_translate(image)
+
+        self.stubs.Set(self.service, '_translate_from_glance', translate)
+        first = self.service.detail(self.context)
+        self.assertEqual(first, self.service.detail(self.context))
+        self.assertEqual(1, len(translations))
+        self.assertEqual(1, glance.get_image_cache_stats()['reused'])
+
+        # Listed images are shown from the cache
+        self.assertEqual(first[0], self.service.show(self.context, image_id))
+        self.assertEqual([], calls)
+
+        # Unless updated since
+        client.update(image_id, updated_at='2010-10-12T10:30:22')
+        self.service.detail(self.context)
+        self.assertEqual(2, len(translations))
+
     def test_download_with_retries(self):
         tries = [0]
 
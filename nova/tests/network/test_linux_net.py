@@ -28,6 +28,7 @@ from nova.network import linux_net
 from nova.openstack.common import fileutils
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
+from nova.openstack.common import processutils
 from nova.openstack.common import timeutils
 from nova import test
 from nova import utils
@@ -867,6 +868,55 @@ class LinuxNetworkTestCase(test.TestCase):
         dup_forward_rules = len(linux_net.iptables_manager.ipv4['nat'].rules)
         self.assertEqual(two_forward_rules, dup_forward_rules)
 
+    def test_ensure_floating_forwards_applies_once(self):
+        ln = linux_net
+        self.stubs.Set(ln, 'ensure_ebtables_rules', lambda *a, **kw: None)
+        self.mox.StubOutWithMock(ln.iptables_manager, '_apply')
+        ln.iptables_manager._apply()
+        self.mox.ReplayAll()
+        net = {'bridge': 'br100', 'cidr': '10.0.0.0/24'}
+        ln.ensure_floating_forwards(
+            [('10.10.10.%d' % i, '10.0.0.%d' % i, 'eth0', net)
+             for i in xrange(10)])
+        self.assertFalse(ln.iptables_manager.iptables_apply_deferred)
+
+    def _test_bind_floating_ips(self, batch_fails=False):
+        self.flags(fake_network=False, send_arp_for_ha=True)
+        executes = []
+        existing = ("2: eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> "
+            "    mtu 1500 qdisc pfifo_fast state UNKNOWN qlen 1000\n"
+            "    link/ether de:ad:be:ef:be:ef brd ff:ff:ff:ff:ff:ff\n"
+            "    inet 10.10.10.1/32 scope global eth0\n")
+
+        def fake_execute(*args, **kwargs):
+            executes.append((args, kwargs.get('process_input')))
+            if args[:3] == ('ip', 'addr', 'show'):
+                return existing, ""
+            if args[:2] == ('ip', '-batch') and batch_fails:
+                raise processutils.ProcessExecutionError()
+            return "", ""
+        self.stubs.Set(utils, 'execute', fake_execute)
+        linux_net.bind_floating_ips(['10.10.10.1', '10.10.10.2',
+                                     '10.10.10.3'], 'eth0')
+        return executes
+
+    def test_bind_floating_ips(self):
+        executes = self._test_bind_floating_ips()
+        self.assertEqual(executes[:2], [
+            (('ip', 'addr', 'show', 'dev', 'eth0'), None),
+            (('ip', '-batch', '-'),
+             'addr add 10.10.10.2/32 dev eth0\n'
+             'addr add 10.10.10.3/32 dev eth0\n')])
+        arps = sorted(args[2] for args, _input in executes[2:])
+        self.assertEqual(arps, ['10.10.10.1', '10.10.10.2', '10.10.10.3'])
+
+    def test_bind_floating_ips_batch_failure(self):
+        executes = self._test_bind_floating_ips(batch_fails=True)
+        self.assertEqual([args for args, _input in executes[2:4]], [
+            ('ip', 'addr', 'add', '10.10.10.2/32', 'dev', 'eth0'),
+            ('ip', 'addr', 'add', '10.10.10.3/32', 'dev', 'eth0')])
+        self.assertEqual(len(executes), 7)
+
     def test_apply_ran(self):
         manager = linux_net.IptablesManager()
         manager.iptables_apply_deferred = False
@@ -949,23 +949,23 @@ class VlanNetworkTestCase(test.TestCase):
             raise exception.FixedIpNotFound(id=fixed_ip_id)
         self.stubs.Set(self.network.db, 'fixed_ip_get', fixed_ip_get)
 
-        self.mox.StubOutWithMock(self.network.l3driver, 'add_floating_ip')
+        self.mox.StubOutWithMock(self.network.l3driver, 'add_floating_ips')
         self.flags(public_interface=False)
-        self.network.l3driver.add_floating_ip('fakefloat',
-                                              'fakefixed',
-                                              'fakeiface',
-                                              'fakenet')
+        self.network.l3driver.add_floating_ips([('fakefloat',
+                                                 'fakefixed',
+                                                 'fakeiface',
+                                                 'fakenet')])
         self.mox.ReplayAll()
         self.network.init_host_floating_ips()
         self.mox.UnsetStubs()
         self.mox.VerifyAll()
 
-        self.mox.StubOutWithMock(self.network.l3driver, 'add_floating_ip')
+        self.mox.StubOutWithMock(self.network.l3driver, 'add_floating_ips')
         self.flags(public_interface='fooiface')
-        self.network.l3driver.add_floating_ip('fakefloat',
-                                              'fakefixed',
-                                              'fooiface',
-                                              'fakenet')
+        self.network.l3driver.add_floating_ips([('fakefloat',
+                                                 'fakefixed',
+                                                 'fooiface',
+                                                 'fakenet')])
         self.mox.ReplayAll()
         self.network.init_host_floating_ips()
         self.mox.UnsetStubs()
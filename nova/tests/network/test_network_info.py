@@ -16,8 +16,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
+
 from nova import exception
 from nova.network import model
+from nova.openstack.common import jsonutils
 from nova import test
 from nova.tests import fake_network_cache_model
 from nova.virt import netutils
@@ -378,6 +381,89 @@ class NetworkInfoTests(test.TestCase):
                  fake_network_cache_model.new_ip(
                         {'address': '10.10.0.3'})] * 4)
 
+    def test_frozen_model_views(self):
+        ninfo = model.NetworkInfo([fake_network_cache_model.new_vif(),
+                fake_network_cache_model.new_vif(
+                        {'address': 'bb:bb:bb:bb:bb:bb'})])
+        ninfo = model.NetworkInfo.hydrate(ninfo.json())
+        frozen = model.FrozenNetworkInfo.hydrate(ninfo.json())
+        self.assertEqual(ninfo, frozen)
+        self.assertEqual(ninfo.fixed_ips(), frozen.fixed_ips())
+        self.assertEqual(ninfo.floating_ips(), frozen.floating_ips())
+        self.assertEqual(ninfo.legacy(), frozen.legacy())
+        self.assertEqual(jsonutils.loads(ninfo.json()),
+                         jsonutils.loads(frozen.json()))
+
+        # views are computed once, but callers get their own lists
+        self.assertTrue(frozen.fixed_ips()[0] is frozen.fixed_ips()[0])
+        self.assertFalse(frozen.fixed_ips() is frozen.fixed_ips())
+
+    def test_frozen_model_is_read_only(self):
+        frozen = model.FrozenNetworkInfo.hydrate(
+                [fake_network_cache_model.new_vif()])
+        vif = fake_network_cache_model.new_vif()
+        self.assertRaises(TypeError, frozen.append, vif)
+        self.assertRaises(TypeError, frozen.extend, [vif])
+        self.assertRaises(TypeError, frozen.pop)
+        self.assertRaises(TypeError, frozen.__setitem__, 0, vif)
+        self.assertRaises(TypeError, frozen.__delitem__, 0)
+
+        ninfo = copy.deepcopy(frozen)
+        self.assertFalse(isinstance(ninfo, model.FrozenNetworkInfo))
+        self.assertEqual(frozen, ninfo)
+        ninfo.append(vif)
+        self.assertEqual(2, len(ninfo))
+
+    def test_frozen_model_is_read_only_throughout(self):
+        frozen = model.FrozenNetworkInfo.hydrate(
+                [fake_network_cache_model.new_vif()])
+        vif = frozen[0]
+        subnet = vif['network']['subnets'][0]
+        fixed_ip = subnet['ips'][0]
+        self.assertTrue(isinstance(vif, model.VIF))
+        self.assertTrue(isinstance(subnet, model.Subnet))
+        self.assertRaises(TypeError, vif.__setitem__, 'address', 'x')
+        self.assertRaises(TypeError, vif['network'].__setitem__, 'label', 'x')
+        self.assertRaises(TypeError, subnet.add_ip, model.IP('10.0.0.9'))
+        self.assertRaises(TypeError, fixed_ip['meta'].update, {'a': 'b'})
+        self.assertRaises(TypeError, fixed_ip['floating_ips'].append,
+                          model.IP('192.168.0.9'))
+        self.assertRaises(TypeError, frozen.legacy()[0][1].__setitem__,
+                          'mac', 'x')
+        self.assertRaises(TypeError, frozen.fixed_ips()[0].__setitem__,
+                          'mac_address', 'x')
+
+        # but the views still work, and copies are private
+        self.assertEqual(4, len(vif.labeled_ips()['ips']))
+        ninfo = copy.deepcopy(frozen)
+        ninfo[0]['network']['subnets'][0]['ips'][0]['meta']['a'] = 'b'
+        self.assertFalse('a' in fixed_ip['meta'])
+        ip = copy.copy(fixed_ip)
+        ip['mac_address'] = 'x'
+        self.assertTrue(isinstance(ip, model.FixedIP))
+        self.assertFalse('mac_address' in fixed_ip)
+        self.assertEqual(frozen, model.NetworkInfo.hydrate(frozen.json()))
+
+    def test_hydrate_frozen_memoizes_by_value(self):
+        nw_json = model.NetworkInfo(
+                [fake_network_cache_model.new_vif()]).json()
+        first = model.hydrate_frozen(nw_json)
+        self.assertTrue(isinstance(first, model.FrozenNetworkInfo))
+        self.assertTrue(first is model.hydrate_frozen(nw_json[:]))
+        self.assertTrue(first is model.hydrate_frozen(
+                ''.join(list(nw_json))))
+        other = model.NetworkInfo([fake_network_cache_model.new_vif(
+                {'address': 'bb:bb:bb:bb:bb:bb'})]).json()
+        self.assertFalse(first is model.hydrate_frozen(other))
+
+        # primitives are not memoized
+        nw_info = model.hydrate_frozen(jsonutils.loads(nw_json))
+        self.assertFalse(isinstance(nw_info, model.FrozenNetworkInfo))
+        self.assertEqual(first, nw_info)
+
+        model.reset_frozen_cache()
+        self.assertFalse(first is model.hydrate_frozen(nw_json))
+
     def _test_injected_network_template(self, should_inject, use_ipv6=False,
                                         gateway=True):
         """Check that netutils properly decides whether to inject based on
@@ -130,6 +130,48 @@ class TestNeutronClient(test.TestCase):
         self.mox.ReplayAll()
         neutronv2.get_client(my_context)
 
+    def test_admin_token_is_reused(self):
+        self.flags(neutron_auth_strategy='keystone')
+        self.flags(neutron_url='http://anyhost/')
+        self.addCleanup(neutronv2.reset_state)
+        my_context = context.RequestContext('userid', 'my_tenantid')
+        self.mox.StubOutWithMock(neutronv2, '_get_auth_token')
+        neutronv2._get_auth_token().AndReturn('admin_token')
+        self.mox.StubOutWithMock(client.Client, "__init__")
+        client.Client.__init__(
+            endpoint_url=CONF.neutron_url,
+            token='admin_token',
+            timeout=CONF.neutron_url_timeout,
+            insecure=False,
+            ca_cert=None,
+            username=CONF.neutron_admin_username,
+            tenant_name=CONF.neutron_admin_tenant_name,
+            region_name=CONF.neutron_region_name,
+            password=CONF.neutron_admin_password,
+            auth_url=CONF.neutron_admin_auth_url,
+            auth_strategy='keystone').MultipleTimes().AndReturn(None)
+        self.mox.ReplayAll()
+        neutronv2.get_client(my_context, admin=True)
+        neutronv2.get_client(my_context, admin=True)
+
+    def test_admin_client_publishes_refreshed_token(self):
+        self.addCleanup(neutronv2.reset_state)
+
+        class FakeHTTPClient(object):
+            auth_token = 'old_token'
+
+        class FakeClient(object):
+            httpclient = FakeHTTPClient()
+
+            def list_ports(self):
+                # The token expired and the client re-authenticated.
+                self.httpclient.auth_token = 'new_token'
+                return {'ports': []}
+
+        wrapper = neutronv2.AdminClientWrapper(FakeClient())
+        self.assertEqual(wrapper.list_ports(), {'ports': []})
+        self.assertEqual(neutronv2._get_admin_auth_token(), 'new_token')
+
 
 class TestNeutronv2Base(test.TestCase):
 
@@ -248,6 +290,7 @@ class TestNeutronv2Base(test.TestCase):
                                'fixed_ip_address': fixed_ip_address,
                                'router_id': 'router_id1'}
         self._returned_nw_info = []
+        self.addCleanup(neutronapi.NEUTRON_CACHE.reset)
         self.mox.StubOutWithMock(neutronv2, 'get_client')
         self.moxed_client = self.mox.CreateMock(client.Client)
         self.addCleanup(CONF.reset)
@@ -369,9 +412,13 @@ class TestNeutronv2Base(test.TestCase):
                 self.moxed_client.create_port(
                     MyComparator(port_req_body)).AndReturn(res_port)
 
+        # The available networks are handed over in requested order.
+        ordered_nets = list(nets)
+        neutronapi._ensure_requested_network_ordering(
+            lambda x: x['id'], ordered_nets, req_net_ids)
         api._get_instance_nw_info(mox.IgnoreArg(),
                                   self.instance,
-                                  networks=nets).AndReturn(
+                                  networks=ordered_nets).AndReturn(
                                         self._returned_nw_info)
         self.mox.ReplayAll()
         return api
@@ -419,23 +466,20 @@ class TestNeutronv2Base(test.TestCase):
             shared=False).AndReturn({'networks': nets})
         self.moxed_client.list_networks(
             shared=True).AndReturn({'networks': []})
-        for i in xrange(1, number + 1):
-            float_data = number == 1 and self.float_data1 or self.float_data2
-            for ip in port_data[i - 1]['fixed_ips']:
-                float_data = [x for x in float_data
-                              if x['fixed_ip_address'] == ip['ip_address']]
-                self.moxed_client.list_floatingips(
-                    fixed_ip_address=ip['ip_address'],
-                    port_id=port_data[i - 1]['id']).AndReturn(
-                        {'floatingips': float_data})
-            subnet_data = i == 1 and self.subnet_data1 or self.subnet_data2
-            self.moxed_client.list_subnets(
-                id=mox.SameElementsAs(['my_subid%s' % i])).AndReturn(
-                    {'subnets': subnet_data})
-            self.moxed_client.list_ports(
-                network_id=subnet_data[0]['network_id'],
-                device_owner='network:dhcp').AndReturn(
-                    {'ports': []})
+        float_data = number == 1 and self.float_data1 or self.float_data2
+        self.moxed_client.list_floatingips(
+            port_id=[port['id'] for port in port_data]).AndReturn(
+                {'floatingips': float_data})
+        subnet_data = self.subnet_data1 + (number == 2 and
+                                           self.subnet_data2 or [])
+        self.moxed_client.list_subnets(
+            id=['my_subid%s' % i for i in xrange(1, number + 1)]).AndReturn(
+                {'subnets': subnet_data})
+        self.moxed_client.list_ports(
+            network_id=mox.SameElementsAs(
+                [subnet['network_id'] for subnet in subnet_data]),
+            device_owner='network:dhcp').AndReturn(
+                {'ports': []})
         self.mox.ReplayAll()
         nw_inf = api.get_instance_nw_info(self.context, self.instance)
         for i in xrange(0, number):
@@ -478,17 +522,14 @@ class TestNeutronv2(TestNeutronv2Base):
             tenant_id=self.instance['project_id'],
             device_id=self.instance['uuid']).AndReturn(
                 {'ports': self.port_data1})
-        port_data = self.port_data1
-        for ip in port_data[0]['fixed_ips']:
-            self.moxed_client.list_floatingips(
-                fixed_ip_address=ip['ip_address'],
-                port_id=port_data[0]['id']).AndReturn(
-                    {'floatingips': self.float_data1})
+        self.moxed_client.list_floatingips(
+            port_id=['my_portid1']).AndReturn(
+                {'floatingips': self.float_data1})
         self.moxed_client.list_subnets(
-            id=mox.SameElementsAs(['my_subid1'])).AndReturn(
+            id=['my_subid1']).AndReturn(
                 {'subnets': self.subnet_data1})
         self.moxed_client.list_ports(
-            network_id='my_netid1',
+            network_id=['my_netid1'],
             device_owner='network:dhcp').AndReturn(
                 {'ports': self.dhcp_port_data1})
         neutronv2.get_client(mox.IgnoreArg(),
@@ -553,6 +594,18 @@ class TestNeutronv2(TestNeutronv2Base):
         api._refresh_neutron_extensions_cache()
         self.assertEquals({'nvp-qos': {'name': 'nvp-qos'}}, api.extensions)
 
+    def test_refresh_neutron_extensions_cache_shared(self):
+        api = neutronapi.API()
+        self.moxed_client.list_extensions().AndReturn(
+            {'extensions': [{'name': 'nvp-qos'}]})
+        self.mox.ReplayAll()
+        api._refresh_neutron_extensions_cache()
+        api2 = neutronapi.API()
+        api2._refresh_neutron_extensions_cache()
+        self.assertEquals({'nvp-qos': {'name': 'nvp-qos'}}, api2.extensions)
+        self.assertEqual(neutronapi.NEUTRON_CACHE.get_stats()['extensions'],
+                         {'hits': 1, 'misses': 1})
+
     def test_populate_neutron_extension_values_rxtx_factor(self):
         api = neutronapi.API()
         self.moxed_client.list_extensions().AndReturn(
@@ -833,13 +886,10 @@ class TestNeutronv2(TestNeutronv2Base):
         self.moxed_client.list_networks(shared=True).AndReturn(
             {'networks': []})
         float_data = number == 1 and self.float_data1 or self.float_data2
-        for data in port_data[1:]:
-            for ip in data['fixed_ips']:
-                self.moxed_client.list_floatingips(
-                    fixed_ip_address=ip['ip_address'],
-                    port_id=data['id']).AndReturn(
-                        {'floatingips': float_data[1:]})
-        for port in port_data[1:]:
+        if port_data[1:]:
+            self.moxed_client.list_floatingips(
+                port_id=[data['id'] for data in port_data[1:]]).AndReturn(
+                    {'floatingips': float_data[1:]})
             self.moxed_client.list_subnets(id=['my_subid2']).AndReturn({})
 
         self.mox.ReplayAll()
@@ -1107,6 +1157,21 @@ class TestNeutronv2(TestNeutronv2Base):
         req_ids = [net['id'] for net in (self.nets3[0], self.nets3[-1])]
         self._get_available_networks(prv_nets, pub_nets, req_ids)
 
+    def test_get_available_networks_not_cached(self):
+        # A network may have just been created, deleted or shared, so the
+        # lists used to allocate and validate are always fresh.
+        api = neutronapi.API()
+        for i in xrange(2):
+            self.moxed_client.list_networks(
+                tenant_id=self.instance['project_id'],
+                shared=False).AndReturn({'networks': self.nets1})
+            self.moxed_client.list_networks(
+                shared=True).AndReturn({'networks': []})
+        self.mox.ReplayAll()
+        for i in xrange(2):
+            api._get_available_networks(self.context,
+                                        self.instance['project_id'])
+
     def test_get_floating_ip_pools(self):
         api = neutronapi.API()
         search_opts = {'router:external': True}
@@ -1460,12 +1525,36 @@ class TestNeutronv2(TestNeutronv2Base):
         NeutronNotFound = exceptions.NeutronClientException(
             status_code=404)
         self.moxed_client.list_floatingips(
-            fixed_ip_address='1.1.1.1', port_id=1).AndRaise(NeutronNotFound)
+            port_id=[1]).AndRaise(NeutronNotFound)
         self.mox.ReplayAll()
         neutronv2.get_client('fake')
-        floatingips = api._get_floating_ips_by_fixed_and_port(
-            self.moxed_client, '1.1.1.1', 1)
-        self.assertEqual(floatingips, [])
+        floatingips = api._get_floating_ips_by_ports(
+            self.moxed_client, [{'id': 1, 'fixed_ips': [{}]}])
+        self.assertEqual(floatingips, {})
+
+    def test_get_floating_ips_by_ports(self):
+        api = neutronapi.API()
+        fake_ports = [{'id': 'port0',
+                       'fixed_ips': [{'ip_address': '1.1.1.1'}]},
+                      {'id': 'port1',
+                       'fixed_ips': [{'ip_address': '2.2.2.2'},
+                                     {'ip_address': '3.3.3.3'}]},
+                      {'id': 'port2', 'fixed_ips': []}]
+        fake_fips = [{'port_id': 'port1', 'fixed_ip_address': '3.3.3.3',
+                      'floating_ip_address': '10.0.0.1'},
+                     {'port_id': 'port1', 'fixed_ip_address': '3.3.3.3',
+                      'floating_ip_address': '10.0.0.2'},
+                     {'port_id': 'port0', 'fixed_ip_address': '1.1.1.1',
+                      'floating_ip_address': '10.0.0.3'}]
+        self.moxed_client.list_floatingips(
+            port_id=['port0', 'port1']).AndReturn({'floatingips': fake_fips})
+        self.mox.ReplayAll()
+        neutronv2.get_client('fake')
+        floatingips = api._get_floating_ips_by_ports(self.moxed_client,
+                                                     fake_ports)
+        self.assertEqual(floatingips,
+                         {('port0', '1.1.1.1'): fake_fips[2:],
+                          ('port1', '3.3.3.3'): fake_fips[:2]})
 
     def test_nw_info_get_ips(self):
         fake_port = {
@@ -1474,10 +1563,11 @@ class TestNeutronv2(TestNeutronv2Base):
             'id': 'port-id',
             }
         api = neutronapi.API()
-        self.mox.StubOutWithMock(api, '_get_floating_ips_by_fixed_and_port')
-        api._get_floating_ips_by_fixed_and_port(
-            self.moxed_client, '1.1.1.1', 'port-id').AndReturn(
-                [{'floating_ip_address': '10.0.0.1'}])
+        self.mox.StubOutWithMock(api, '_get_floating_ips_by_ports')
+        api._get_floating_ips_by_ports(
+            self.moxed_client, [fake_port]).AndReturn(
+                {('port-id', '1.1.1.1'): [
+                    {'floating_ip_address': '10.0.0.1'}]})
         self.mox.ReplayAll()
         neutronv2.get_client('fake')
         result = api._nw_info_get_ips(self.moxed_client, fake_port)
@@ -1496,7 +1586,7 @@ class TestNeutronv2(TestNeutronv2Base):
         fake_ips = [model.IP(x['ip_address']) for x in fake_port['fixed_ips']]
         api = neutronapi.API()
         self.mox.StubOutWithMock(api, '_get_subnets_from_port')
-        api._get_subnets_from_port(self.context, fake_port).AndReturn(
+        api._get_subnets_from_port(self.context, fake_port, None).AndReturn(
             [fake_subnet])
         self.mox.ReplayAll()
         neutronv2.get_client('fake')
@@ -1550,7 +1640,8 @@ class TestNeutronv2(TestNeutronv2Base):
         fake_ports = [
             {'id': 'port0',
              'network_id': 'net-id',
-             'fixed_ips': [{'ip_address': '1.1.1.1'}],
+             'fixed_ips': [{'ip_address': '1.1.1.1',
+                            'subnet_id': 'subnet0'}],
              'mac_address': 'de:ad:be:ef:00:01',
              'binding:vif_type': model.VIF_TYPE_BRIDGE,
              },
@@ -1572,12 +1663,17 @@ class TestNeutronv2(TestNeutronv2Base):
         self.moxed_client.list_ports(
             tenant_id='fake', device_id='uuid').AndReturn(
                 {'ports': fake_ports})
-        self.mox.StubOutWithMock(api, '_get_floating_ips_by_fixed_and_port')
-        api._get_floating_ips_by_fixed_and_port(
-            self.moxed_client, '1.1.1.1', 'port0').AndReturn(
-                [{'floating_ip_address': '10.0.0.1'}])
+        self.mox.StubOutWithMock(api, '_get_floating_ips_by_ports')
+        api._get_floating_ips_by_ports(
+            self.moxed_client, fake_ports[:1]).AndReturn(
+                {('port0', '1.1.1.1'): [
+                    {'floating_ip_address': '10.0.0.1'}]})
+        self.mox.StubOutWithMock(api, '_get_subnet_data')
+        api._get_subnet_data(self.context, ['subnet0']).AndReturn(
+            'fake-subnet-data')
         self.mox.StubOutWithMock(api, '_get_subnets_from_port')
-        api._get_subnets_from_port(self.context, fake_ports[0]).AndReturn(
+        api._get_subnets_from_port(self.context, fake_ports[0],
+                                   'fake-subnet-data').AndReturn(
             fake_subnets)
         self.mox.ReplayAll()
         neutronv2.get_client('fake')
@@ -1599,6 +1695,175 @@ class TestNeutronv2(TestNeutronv2Base):
         self.assertEqual(networks, [])
 
 
+class TestNeutronCache(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestNeutronCache, self).setUp()
+        self.now = 1000.0
+        self.stubs.Set(neutronapi.time, 'time', lambda: self.now)
+        self.cache = neutronapi.NeutronCache()
+
+    def test_get_set_and_expiry(self):
+        self.assertEqual(self.cache.get('networks', 'key'), None)
+        self.cache.set('networks', 'key', ['net'], 10)
+        self.assertEqual(self.cache.get('networks', 'key'), ['net'])
+        self.now += 10
+        self.assertEqual(self.cache.get('networks', 'key'), None)
+        self.assertEqual(self.cache.get_stats(),
+                         {'networks': {'hits': 1, 'misses': 2}})
+
+    def test_set_without_ttl(self):
+        self.cache.set('networks', 'key', ['net'], 0)
+        self.assertEqual(self.cache.get('networks', 'key'), None)
+
+    def test_get_or_fetch(self):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return ['net']
+
+        for i in xrange(3):
+            self.assertEqual(
+                self.cache.get_or_fetch('networks', 'key', 10, fetch),
+                ['net'])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.cache.get_or_fetch('networks', 'key', 0, fetch),
+                         ['net'])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.cache.get_stats(),
+                         {'networks': {'hits': 2, 'misses': 1}})
+
+    def test_invalidate(self):
+        self.cache.set('networks', 'a', 1, 10)
+        self.cache.set('networks', 'b', 2, 10)
+        self.cache.set('extensions', None, 3, 10)
+        self.cache.invalidate('networks', 'a')
+        self.assertEqual(self.cache.get('networks', 'a'), None)
+        self.assertEqual(self.cache.get('networks', 'b'), 2)
+        self.cache.invalidate('networks')
+        self.assertEqual(self.cache.get('networks', 'b'), None)
+        self.assertEqual(self.cache.get('extensions'), 3)
+        self.cache.invalidate()
+        self.assertEqual(self.cache.get('extensions'), None)
+
+    def test_expired_entries_are_purged(self):
+        self.cache.set('subnet', 'a', 1, 10)
+        self.now += self.cache.PURGE_INTERVAL
+        self.cache.set('subnet', 'b', 2, 10)
+        self.assertEqual(self.cache._data.keys(), [('subnet', 'b')])
+
+
+class FakeNeutronClient(object):
+    """A tiny in-memory neutron which counts the queries made to it."""
+
+    def __init__(self, ports, floatingips, subnets, networks):
+        self.data = {'ports': ports,
+                     'floatingips': floatingips,
+                     'subnets': subnets,
+                     'networks': networks}
+        self.calls = []
+
+    def _list(self, resource, **search_opts):
+        self.calls.append(resource)
+        result = []
+        for item in self.data[resource]:
+            for key, value in search_opts.iteritems():
+                if not isinstance(value, list):
+                    value = [value]
+                if item.get(key) not in value:
+                    break
+            else:
+                result.append(item)
+        return {resource: result}
+
+    def list_ports(self, **search_opts):
+        return self._list('ports', **search_opts)
+
+    def list_floatingips(self, **search_opts):
+        return self._list('floatingips', **search_opts)
+
+    def list_subnets(self, **search_opts):
+        return self._list('subnets', **search_opts)
+
+    def list_networks(self, **search_opts):
+        return self._list('networks', **search_opts)
+
+
+class TestNeutronv2BulkNetworkInfo(test.TestCase):
+
+    def setUp(self):
+        super(TestNeutronv2BulkNetworkInfo, self).setUp()
+        self.addCleanup(neutronapi.NEUTRON_CACHE.reset)
+        self.context = context.RequestContext('userid', 'my_tenantid')
+        self.instances = []
+        ports = []
+        floatingips = []
+        subnets = []
+        networks = []
+        for i in xrange(3):
+            instance_uuid = str(uuid.uuid4())
+            net_id = 'net%d' % i
+            networks.append({'id': net_id, 'name': 'netname%d' % i,
+                             'tenant_id': 'my_tenantid'})
+            subnets.append({'id': 'subnet%d' % i,
+                            'network_id': net_id,
+                            'cidr': '10.0.%d.0/24' % i,
+                            'gateway_ip': '10.0.%d.1' % i,
+                            'dns_nameservers': ['8.8.8.8']})
+            ports.append({'id': 'port%d' % i,
+                          'device_id': instance_uuid,
+                          'device_owner': 'compute:nova',
+                          'tenant_id': 'my_tenantid',
+                          'network_id': net_id,
+                          'mac_address': 'de:ad:be:ef:00:0%d' % i,
+                          'fixed_ips': [{'ip_address': '10.0.%d.2' % i,
+                                         'subnet_id': 'subnet%d' % i}]})
+            ports.append({'id': 'dhcp%d' % i,
+                          'device_id': 'dhcp',
+                          'device_owner': 'network:dhcp',
+                          'tenant_id': 'my_tenantid',
+                          'network_id': net_id,
+                          'fixed_ips': [{'ip_address': '10.0.%d.3' % i,
+                                         'subnet_id': 'subnet%d' % i}]})
+            floatingips.append({'port_id': 'port%d' % i,
+                                'fixed_ip_address': '10.0.%d.2' % i,
+                                'floating_ip_address': '172.0.0.%d' % i})
+            info_cache = {'network_info': jsonutils.dumps(
+                [{'network': {'id': net_id}}])}
+            self.instances.append({'uuid': instance_uuid,
+                                   'display_name': 'instance%d' % i,
+                                   'project_id': 'my_tenantid',
+                                   'info_cache': info_cache})
+        self.client = FakeNeutronClient(ports, floatingips, subnets,
+                                        networks)
+        self.stubs.Set(neutronv2, 'get_client',
+                       lambda context, admin=False: self.client)
+        self.api = neutronapi.API()
+        self.stubs.Set(self.api.db, 'instance_info_cache_update',
+                       lambda *args, **kwargs: None)
+
+    def _verify_nw_info(self, nw_info, i):
+        self.assertEqual(len(nw_info), 1)
+        self.assertEqual(nw_info[0]['id'], 'port%d' % i)
+        self.assertEqual(nw_info[0]['network']['label'], 'netname%d' % i)
+        subnet = nw_info[0]['network']['subnets'][0]
+        self.assertEqual(subnet['cidr'], '10.0.%d.0/24' % i)
+        self.assertEqual(subnet.get_meta('dhcp_server'), '10.0.%d.3' % i)
+        fixed_ips = nw_info.fixed_ips()
+        self.assertEqual(fixed_ips[0]['address'], '10.0.%d.2' % i)
+        self.assertEqual(fixed_ips[0].floating_ip_addresses(),
+                         ['172.0.0.%d' % i])
+
+    def test_get_instance_nw_info_query_count(self):
+        nw_info = self.api.get_instance_nw_info(
+            self.context, self.instances[1],
+            networks=self.client.data['networks'])
+        self._verify_nw_info(nw_info, 1)
+        self.assertEqual(self.client.calls,
+                         ['ports', 'floatingips', 'subnets', 'ports'])
+
+
 class TestNeutronv2ModuleMethods(test.TestCase):
     def test_ensure_requested_network_ordering_no_preference_ids(self):
         l = [1, 2, 3]
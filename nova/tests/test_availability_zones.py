@@ -123,6 +123,15 @@ class AvailabilityZoneTestCases(test.TestCase):
         self.assertEquals(self.availability_zone,
                         az.get_host_availability_zone(self.context, self.host))
 
+    def test_get_hosts_availability_zones(self):
+        service = self._create_service_with_topic('compute', self.host)
+        self._add_to_aggregate(service, self.agg)
+
+        self.assertEquals({self.host: self.availability_zone,
+                           'other-host': self.default_az},
+                          az.get_hosts_availability_zones(
+                              self.context, [self.host, 'other-host']))
+
     def test_update_host_availability_zone(self):
         """Test availability zone could be update by given host."""
         service = self._create_service_with_topic('compute', self.host)
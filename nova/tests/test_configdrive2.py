@@ -18,13 +18,53 @@
 
 import mox
 import os
+import struct
 import tempfile
 
+from nova import exception
 from nova import test
 
 from nova.openstack.common import fileutils
 from nova import utils
 from nova.virt import configdrive
+from nova.virt.disk import vfat
+
+
+class FakeInstanceMetadata(object):
+    def __init__(self):
+        self.generated = False
+
+    def metadata_for_config_drive(self):
+        self.generated = True
+        yield ('openstack/latest/meta_data.json', '{"uuid": "fake"}')
+        yield ('openstack/content/0000', 'x' * 5000)
+
+
+def _iso_file(image, path, sector=17):
+    """Reads a file from the Joliet, or the primary, tree of an image."""
+    joliet = sector == 17
+    descriptor = image[sector * 2048:(sector + 1) * 2048]
+    record = descriptor[156:190]
+    for name in path.split('/'):
+        location, size = struct.unpack('<I4xI', record[2:14])
+        directory = image[location * 2048:location * 2048 + size]
+        offset = 0
+        while offset < len(directory):
+            length = ord(directory[offset])
+            if not length:
+                offset = (offset // 2048 + 1) * 2048
+                continue
+            record = directory[offset:offset + length]
+            identifier = record[33:33 + ord(record[32])]
+            if joliet and len(identifier) > 1:
+                identifier = identifier.decode('utf-16-be')
+            if identifier.split(';')[0] == name:
+                break
+            offset += length
+        else:
+            raise KeyError(path)
+    location, size = struct.unpack('<I4xI', record[2:14])
+    return image[location * 2048:location * 2048 + size]
 
 
 class ConfigDriveTestCase(test.TestCase):
@@ -89,3 +129,73 @@ class ConfigDriveTestCase(test.TestCase):
         finally:
             if imagefile:
                 fileutils.delete_if_exists(imagefile)
+
+    def _make_drive(self, drive_format):
+        self.flags(config_drive_format=drive_format)
+        instance_md = FakeInstanceMetadata()
+        with configdrive.ConfigDriveBuilder(instance_md=instance_md) as c:
+            self.assertFalse(instance_md.generated)
+            c._add_file('this/is/a/path/hello', 'This is some content')
+            with utils.tempdir() as tmpdir:
+                imagefile = os.path.join(tmpdir, 'disk.config')
+                c.make_drive(imagefile)
+                self.assertEqual(None, c.tempdir)
+                with open(imagefile, 'rb') as f:
+                    return f.read()
+
+    def test_make_drive_iso9660(self):
+        image = self._make_drive('iso9660')
+
+        self.assertEqual('\1CD001', image[16 * 2048:16 * 2048 + 6])
+        self.assertEqual('config-2'.ljust(32), image[16 * 2048 + 40:
+                                                     16 * 2048 + 72])
+        self.assertEqual('\2CD001', image[17 * 2048:17 * 2048 + 6])
+        self.assertEqual('config-2'.ljust(16).encode('utf-16-be'),
+                         image[17 * 2048 + 40:17 * 2048 + 72])
+        self.assertEqual('This is some content',
+                         _iso_file(image, 'this/is/a/path/hello'))
+        self.assertEqual('{"uuid": "fake"}',
+                         _iso_file(image, 'openstack/latest/meta_data.json'))
+        self.assertEqual('x' * 5000,
+                         _iso_file(image, 'openstack/content/0000'))
+        self.assertEqual('{"uuid": "fake"}',
+                         _iso_file(image, 'openstack/latest/meta_data.json',
+                                   sector=16))
+
+    def test_make_drive_vfat(self):
+        image = self._make_drive('vfat')
+
+        self.assertEqual(configdrive.CONFIGDRIVESIZE_BYTES, len(image))
+        self.assertEqual('\x55\xaa', image[510:512])
+        self.assertEqual('config-2   FAT16   ', image[43:62])
+        # Long names are stored in UTF-16 entries
+        self.assertTrue('h\0e\0l\0l\0o\0' in image)
+        # The data is written from the first cluster
+        layout = vfat._Layout(len(image) // vfat.SECTOR_SIZE)
+        offset = layout.offset(2)
+        self.assertEqual('This is some content', image[offset:offset + 20])
+
+    def test_make_drive_vfat_too_large(self):
+        with utils.tempdir() as tmpdir:
+            self.assertRaises(exception.ConfigDriveTooLarge,
+                              vfat.write_image,
+                              os.path.join(tmpdir, 'disk.config'),
+                              [('big', 'x' * (1024 * 1024))], 'config-2',
+                              512 * 1024)
+
+    def test_make_drive_external_tools(self):
+        self.flags(config_drive_external_tools=True)
+        self.mox.StubOutWithMock(utils, 'execute')
+        utils.execute('genisoimage', '-o', 'disk.config', '-ldots',
+                      '-allow-lowercase', '-allow-multidot', '-l',
+                      '-publisher', mox.IgnoreArg(), '-quiet', '-J', '-r',
+                      '-V', 'config-2', mox.IgnoreArg(), attempts=1,
+                      run_as_root=False).AndReturn(None)
+        self.mox.ReplayAll()
+
+        instance_md = FakeInstanceMetadata()
+        with configdrive.ConfigDriveBuilder(instance_md=instance_md) as c:
+            c.make_drive('disk.config')
+            self.assertTrue(os.path.exists(os.path.join(
+                c.tempdir, 'openstack', 'content', '0000')))
+        self.assertFalse(os.path.exists(c.tempdir))
@@ -20,6 +20,7 @@
 
 import base64
 import copy
+import datetime
 import hashlib
 import hmac
 import json
@@ -30,20 +31,26 @@ try:
 except ImportError:
     import pickle
 
+from eventlet import greenthread
 import mox
 from oslo.config import cfg
 import webob
 
+from nova.api.ec2 import ec2utils
 from nova.api.metadata import base
 from nova.api.metadata import handler
 from nova.api.metadata import password
 from nova import block_device
 from nova.compute import flavors
+from nova.compute import vm_states
 from nova.conductor import api as conductor_api
+from nova.conductor import manager as conductor_manager
 from nova import db
 from nova.db.sqlalchemy import api
 from nova import exception
 from nova.network import api as network_api
+from nova.openstack.common import jsonutils
+from nova import sharedcache
 from nova import test
 from nova.tests import fake_network
 from nova import utils
@@ -283,7 +290,8 @@ class MetadataTestCase(test.TestCase):
         netutils.get_injected_network_template(network_info).AndReturn(False)
         self.mox.ReplayAll()
 
-        base.InstanceMetadata(INSTANCES[0], network_info=network_info)
+        base.InstanceMetadata(INSTANCES[0],
+                              network_info=network_info).network_config
 
     def test_InstanceMetadata_invoke_metadata_for_config_drive(self):
         inst = copy.copy(self.instance)
@@ -307,7 +315,39 @@ class MetadataTestCase(test.TestCase):
 
         self.mox.ReplayAll()
 
-        base.InstanceMetadata(INSTANCES[0])
+        base.InstanceMetadata(INSTANCES[0]).network_config
+
+    def test_InstanceMetadata_looks_up_sections_when_needed(self):
+        self.mox.StubOutWithMock(network_api.API, "get_instance_nw_info")
+        self.mox.StubOutWithMock(conductor_api.LocalAPI,
+                                 "block_device_mapping_get_all_by_instance")
+        self.mox.ReplayAll()
+
+        md = fake_InstanceMetadata(self.stubs, copy.copy(self.instance))
+        self.assertEqual('i-00000001',
+                         md.lookup('/latest/meta-data/instance-id'))
+        self.assertEqual(USER_DATA_STRING,
+                         md.lookup('/openstack/2012-08-10/user_data'))
+        self.assertFalse('mappings' in md.__dict__)
+        self.assertFalse('network_info' in md.__dict__)
+
+        # Kept for the next lookups
+        self.mox.UnsetStubs()
+        self.mox.StubOutWithMock(ec2utils, "get_ip_info_for_instance")
+        ec2utils.get_ip_info_for_instance(
+            mox.IgnoreArg(), mox.IgnoreArg()).AndReturn(
+                {'fixed_ips': [], 'floating_ips': ['1.2.3.4']})
+        self.mox.ReplayAll()
+        self.assertEqual('1.2.3.4', md.lookup('/latest/meta-data/public-ipv4'))
+        self.assertEqual('1.2.3.4', md.lookup('/latest/meta-data/public-ipv4'))
+
+    def test_unpickled_metadata_looks_up_sections(self):
+        md = fake_InstanceMetadata(self.stubs, copy.copy(self.instance))
+        md.conductor_api
+        md = pickle.loads(pickle.dumps(md, protocol=0))
+        self.assertFalse('conductor_api' in md.__dict__)
+        self.assertEqual(['default'],
+                         md.lookup('/latest/meta-data/security-groups'))
 
 
 class OpenStackMetadataTestCase(test.TestCase):
@@ -661,6 +701,110 @@ class MetadataHandlerTestCase(test.TestCase):
                      'X-Instance-ID-Signature': signed})
         self.assertEqual(response.status_int, 500)
 
+    def test_concurrent_requests_build_metadata_once(self):
+        built = []
+
+        def fake_get_metadata(conductor_api, address):
+            built.append(address)
+            greenthread.sleep(0.1)
+            return self.mdinst
+
+        self.stubs.Set(base, 'get_metadata_by_address', fake_get_metadata)
+        app = handler.MetadataRequestHandler()
+        threads = [greenthread.spawn(app.get_metadata_by_remote_address,
+                                     '192.168.1.2') for i in xrange(5)]
+        for thread in threads:
+            self.assertEqual(self.mdinst, thread.wait())
+
+        self.assertEqual(['192.168.1.2'], built)
+        self.assertEqual(self.mdinst,
+                         app.get_metadata_by_remote_address('192.168.1.2'))
+        self.assertEqual(dict(hits=1, waits=4, misses=1, warmed=0),
+                         app.cache_stats)
+
+    def test_shared_cache_keeps_loaded_metadata(self):
+        self.flags(shared_cache_size=1, shared_cache_slot_size=65536)
+        self.addCleanup(sharedcache.reset)
+        sharedcache.init()
+        self.stubs.Set(base, 'get_metadata_by_address',
+                       lambda conductor_api, address: fake_InstanceMetadata(
+                           self.stubs, copy.copy(self.instance),
+                           address=address))
+        app = handler.MetadataRequestHandler()
+        app.get_metadata_by_remote_address('192.168.1.2')
+
+        # As unpickled by another worker
+        data = app.get_metadata_by_remote_address('192.168.1.2')
+        for name in base.InstanceMetadata._LAZY_ATTRS:
+            # The only one not pickled
+            if name != 'conductor_api':
+                self.assertTrue(name in data.__dict__)
+        self.assertEqual(dict(hits=1, waits=0, misses=1, warmed=0),
+                         app.cache_stats)
+
+    def test_not_found_metadata_is_not_cached(self):
+        self.stubs.Set(base, 'get_metadata_by_address',
+                       return_non_existing_address)
+        app = handler.MetadataRequestHandler()
+        self.assertEqual(None,
+                         app.get_metadata_by_remote_address('192.168.1.2'))
+
+        self.stubs.Set(base, 'get_metadata_by_address',
+                       lambda conductor_api, address: self.mdinst)
+        self.assertEqual(self.mdinst,
+                         app.get_metadata_by_remote_address('192.168.1.2'))
+
+    def test_warm_cache(self):
+        self.flags(metadata_cache_warm_interval=60)
+        filters = []
+
+        def fake_db_get_all_by_filters(context, search_filters, *args,
+                                       **kwargs):
+            filters.append(search_filters)
+            return [self.instance]
+
+        self.stubs.Set(db, 'instance_get_all_by_filters',
+                       fake_db_get_all_by_filters)
+        manager = conductor_manager.ConductorManager()
+
+        def fake_get_all_by_filters(context, search_filters):
+            # As the filters reach the conductor over RPC
+            search_filters = jsonutils.loads(jsonutils.dumps(search_filters))
+            return manager.instance_get_all_by_filters(
+                context, search_filters, 'created_at', 'desc')
+
+        app = handler.MetadataRequestHandler()
+        self.stubs.Set(app.conductor_api, 'instance_get_all_by_filters',
+                       fake_get_all_by_filters)
+        self.stubs.Set(ec2utils, 'get_ip_info_for_instance',
+                       lambda context, instance: {'fixed_ips': ['10.0.0.2']})
+
+        class FakeInstanceMetadata(object):
+            def __init__(self, instance, address):
+                self.address = address
+                self.loaded = False
+
+            def load(self):
+                self.loaded = True
+
+        self.stubs.Set(base, 'InstanceMetadata', FakeInstanceMetadata)
+        self.stubs.Set(base, 'get_metadata_by_address',
+                       return_non_existing_address)
+
+        app.warm_cache()
+        self.assertEqual(vm_states.ACTIVE, filters[0]['vm_state'])
+        self.assertTrue(isinstance(filters[0]['changes-since'],
+                                   datetime.datetime))
+        data = app.get_metadata_by_remote_address('10.0.0.2')
+        self.assertEqual('10.0.0.2', data.address)
+        self.assertTrue(data.loaded)
+        self.assertEqual(dict(hits=1, waits=0, misses=0, warmed=1),
+                         app.cache_stats)
+
+        # Already warmed during this interval
+        app.warm_cache()
+        self.assertEqual(1, len(filters))
+
 
 class MetadataPasswordTestCase(test.TestCase):
     def setUp(self):
@@ -17,6 +17,7 @@
 
 """Test of Policy Engine For Nova."""
 
+import copy
 import os.path
 import StringIO
 import urllib2
@@ -58,6 +59,32 @@ class PolicyFileTestCase(test.TestCase):
             self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
                               self.context, action, self.target)
 
+    def test_policy_file_check_rate_limited(self):
+        with utils.tempdir() as tmpdir:
+            tmpfilename = os.path.join(tmpdir, 'policy')
+
+            self.flags(policy_file=tmpfilename, policy_check_interval=60)
+            policy.reset()
+
+            action = "example:test"
+            with open(tmpfilename, "w") as policyfile:
+                policyfile.write('{"example:test": ""}')
+            policy.enforce(self.context, action, self.target)
+
+            self.mox.StubOutWithMock(utils, 'read_cached_file')
+            self.mox.ReplayAll()
+            policy.enforce(self.context, action, self.target)
+            self.mox.VerifyAll()
+            self.mox.UnsetStubs()
+
+            with open(tmpfilename, "w") as policyfile:
+                policyfile.write('{"example:test": "!"}')
+            # Pretend the file was last checked more than a minute ago
+            policy._POLICY_CACHE['checked_at'] -= 61
+            policy._POLICY_CACHE['mtime'] = None
+            self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                              self.context, action, self.target)
+
 
 class PolicyTestCase(test.TestCase):
     def setUp(self):
@@ -147,6 +174,85 @@ class PolicyTestCase(test.TestCase):
         policy.enforce(admin_context, uppercase_action, self.target)
 
 
+class CompiledPolicyTestCase(test.TestCase):
+    def setUp(self):
+        super(CompiledPolicyTestCase, self).setUp()
+        rules = {
+            "admin_or_owner": "is_admin:True or project_id:%(project_id)s",
+            "example:owner": "rule:admin_or_owner",
+            "example:admin": "role:admin",
+            "example:not_admin": "not role:admin",
+            "example:missing_key": "user_id:%(user_id)s",
+        }
+        self.policy.set_rules(rules)
+        self.context = context.RequestContext('fake', 'fake', roles=['member'])
+        self.evaluated = []
+        orig_evaluate = policy._evaluate
+
+        def fake_evaluate(compiled, action, target, credentials):
+            self.evaluated.append(action)
+            return orig_evaluate(compiled, action, target, credentials)
+
+        self.stubs.Set(policy, '_evaluate', fake_evaluate)
+
+    def test_decisions_memoized_per_target_key(self):
+        policy.enforce(self.context, "example:owner", {'project_id': 'fake'})
+        policy.enforce(self.context, "example:owner", {'project_id': 'fake',
+                                                       'uuid': 'foo'})
+        self.assertEqual(self.evaluated, ["example:owner"])
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, "example:owner",
+                          {'project_id': 'other'})
+        self.assertEqual(self.evaluated, ["example:owner"] * 2)
+
+    def test_decisions_not_shared_between_contexts(self):
+        other = context.RequestContext('fake', 'other', roles=['member'])
+        policy.enforce(self.context, "example:owner", {'project_id': 'fake'})
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          other, "example:owner", {'project_id': 'fake'})
+
+    def test_credentials_computed_once(self):
+        calls = []
+        orig_to_dict = self.context.to_dict
+
+        def fake_to_dict():
+            calls.append(1)
+            return orig_to_dict()
+
+        self.stubs.Set(self.context, 'to_dict', fake_to_dict)
+        for project_id in ('fake', 'a', 'b', 'c'):
+            policy.enforce(self.context, "example:owner",
+                           {'project_id': project_id}, do_raise=False)
+        self.assertEqual(len(calls), 1)
+
+    def test_elevated_context_rechecked(self):
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, "example:admin", {})
+        self.assertTrue(policy.enforce(self.context, "example:not_admin", {}))
+        elevated = self.context.elevated()
+        self.assertTrue(policy.enforce(elevated, "example:admin", {}))
+        self.assertTrue(policy.enforce(elevated, "example:owner",
+                                       {'project_id': 'other'}))
+
+    def test_enforced_context_deep_copied(self):
+        policy.enforce(self.context, "example:owner", {'project_id': 'fake'})
+        copied = copy.deepcopy(self.context)
+        self.assertEqual(self.context.to_dict(), copied.to_dict())
+        self.assertTrue(policy.enforce(copied, "example:owner",
+                                       {'project_id': 'fake'}))
+
+    def test_missing_target_key_fails_closed(self):
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, "example:missing_key", {})
+
+    def test_rules_recompiled_on_change(self):
+        policy.enforce(self.context, "example:owner", {'project_id': 'fake'})
+        self.policy.set_rules({"example:owner": "!"})
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, "example:owner",
+                          {'project_id': 'fake'})
+
+
 class DefaultPolicyTestCase(test.TestCase):
 
     def setUp(self):
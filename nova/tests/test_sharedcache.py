@@ -0,0 +1,140 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Tests for the cache shared by the API worker processes
+"""
+
+import os
+import signal
+
+from nova.openstack.common import memorycache
+from nova.openstack.common import timeutils
+from nova import sharedcache
+from nova import test
+
+
+class SharedCacheTestCase(test.TestCase):
+
+    def setUp(self):
+        super(SharedCacheTestCase, self).setUp()
+        self.flags(shared_cache_size=1, shared_cache_slot_size=1024)
+        self.addCleanup(sharedcache.reset)
+        sharedcache.init()
+        self.client = sharedcache.get_client()
+
+    def test_get_client(self):
+        self.assertTrue(isinstance(self.client, sharedcache.Client))
+
+        sharedcache.reset()
+        self.flags(shared_cache_size=0)
+        sharedcache.init()
+        self.assertTrue(isinstance(sharedcache.get_client(),
+                                   memorycache.Client))
+
+    def test_get_shared_client(self):
+        self.assertTrue(isinstance(sharedcache.get_shared_client(),
+                                   sharedcache.Client))
+
+        sharedcache.reset()
+        self.assertEqual(None, sharedcache.get_shared_client())
+
+    def test_get_set_multi(self):
+        self.assertEqual([], self.client.set_multi({'key1': 1, 'key2': 2}))
+        self.assertEqual({'key1': 1, 'key2': 2},
+                         self.client.get_multi(['key1', 'key2', 'key3']))
+
+    def test_set_get_delete(self):
+        self.assertEqual(None, self.client.get('key'))
+        self.assertTrue(self.client.set('key', {'value': 1}))
+        self.assertEqual({'value': 1}, self.client.get('key'))
+        self.assertEqual({'value': 1}, sharedcache.get_client().get('key'))
+
+        self.client.set('key', 'other')
+        self.assertEqual('other', self.client.get('key'))
+        self.client.delete('key')
+        self.assertEqual(None, self.client.get('key'))
+
+    def test_expiry(self):
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self.client.set('key', 'value', time=10)
+        timeutils.advance_time_seconds(9)
+        self.assertEqual('value', self.client.get('key'))
+        timeutils.advance_time_seconds(1)
+        self.assertEqual(None, self.client.get('key'))
+
+    def test_add_incr(self):
+        self.assertEqual(None, self.client.incr('key'))
+        self.assertTrue(self.client.add('key', '1'))
+        self.assertFalse(self.client.add('key', '2'))
+        self.assertEqual(3, self.client.incr('key', 2))
+        self.assertEqual('3', sharedcache.get_client().get('key'))
+
+    def test_flush_all(self):
+        self.client.set('key', 'value')
+        sharedcache.get_client().flush_all()
+        self.assertEqual(None, self.client.get('key'))
+        self.client.set('key', 'new value')
+        self.assertEqual('new value', self.client.get('key'))
+
+    def test_local_values(self):
+        # Too large for a slot, and not picklable
+        values = ['x' * 1024, lambda: None]
+        for value in values:
+            self.client.set('key', 'shared')
+            self.client.set('key', value)
+            self.assertEqual(value, self.client.get('key'))
+            self.assertEqual(None, sharedcache.get_client().get('key'))
+
+    def test_eviction(self):
+        for i in xrange(5000):
+            self.client.set('key-%d' % i, i)
+        self.assertEqual(4999, self.client.get('key-4999'))
+
+    def test_shared_with_forked_processes(self):
+        pid = os.fork()
+        if not pid:
+            self.client.set('key', 'from child')
+            os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual('from child', self.client.get('key'))
+
+    def test_lock_released_by_killed_process(self):
+        segment = sharedcache._SEGMENT
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if not pid:
+            segment._lock.__enter__()
+            os.write(write_fd, 'locked')
+            while True:
+                pass
+        os.read(read_fd, 6)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        os.close(read_fd)
+        os.close(write_fd)
+
+        self.client.set('key', 'after kill')
+        self.assertEqual('after kill', self.client.get('key'))
+
+    def test_slot_length_bounded(self):
+        self.client.set('key', 'value')
+        segment = sharedcache._SEGMENT
+        offset = segment._find(sharedcache._digest('key'))
+        seq, digest, expires, generation, _length = \
+            sharedcache._SLOT.unpack_from(segment._mm, offset)
+        sharedcache._SLOT.pack_into(segment._mm, offset, seq, digest,
+                                    expires, generation, 1 << 30)
+        self.assertEqual(None, self.client.get('key'))
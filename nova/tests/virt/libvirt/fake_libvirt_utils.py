@@ -106,6 +106,14 @@ def get_disk_type(path):
     return disk_type
 
 
+def clone_image(src, dest):
+    pass
+
+
+def reflink_image(src, dest):
+    pass
+
+
 def copy_image(src, dest):
     pass
 
@@ -118,6 +126,14 @@ def create_lvm_image(vg, lv, size, sparse=False):
     pass
 
 
+def create_thin_volume(vg, pool, lv, size):
+    pass
+
+
+def create_thin_snapshot(vg, origin, lv):
+    pass
+
+
 def volume_group_free_space(vg):
     pass
 
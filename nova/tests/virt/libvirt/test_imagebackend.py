@@ -21,6 +21,7 @@ import fixtures
 from oslo.config import cfg
 
 from nova import exception
+from nova.openstack.common import processutils
 from nova.openstack.common import uuidutils
 from nova import test
 from nova.tests import fake_processutils
@@ -180,7 +181,9 @@ class RawTestCase(_ImageTestCase, test.TestCase):
 
     def test_create_image_generated(self):
         fn = self.prepare_mocks()
-        fn(target=self.PATH)
+        self.mox.StubOutWithMock(imagebackend.libvirt_utils, 'clone_image')
+        fn(target=self.TEMPLATE_PATH)
+        imagebackend.libvirt_utils.clone_image(self.TEMPLATE_PATH, self.PATH)
         self.mox.ReplayAll()
 
         image = self.image_class(self.INSTANCE, self.NAME)
@@ -188,6 +191,19 @@ class RawTestCase(_ImageTestCase, test.TestCase):
 
         self.mox.VerifyAll()
 
+    def test_cache_template(self):
+        self.mox.StubOutWithMock(os.path, 'exists')
+        os.path.exists(self.TEMPLATE_DIR).AndReturn(True)
+        os.path.exists(self.TEMPLATE_PATH).AndReturn(False)
+        fn = self.mox.CreateMockAnything()
+        fn(target=self.TEMPLATE_PATH, swap_mb=1)
+        self.mox.ReplayAll()
+
+        self.image_class.cache_template(fn, self.TEMPLATE, self.SIZE,
+                                        swap_mb=1)
+
+        self.mox.VerifyAll()
+
     def test_create_image_extend(self):
         fn = self.prepare_mocks()
         fn(target=self.TEMPLATE_PATH, image_id=None)
@@ -200,6 +216,35 @@ class RawTestCase(_ImageTestCase, test.TestCase):
 
         self.mox.VerifyAll()
 
+    def test_snapshot_upload_path(self):
+        self.mox.StubOutWithMock(imagebackend.libvirt_utils, 'reflink_image')
+        imagebackend.libvirt_utils.reflink_image(self.PATH,
+                                                 self.PATH + '.snap')
+        self.mox.ReplayAll()
+
+        image = self.image_class(self.INSTANCE, self.NAME,
+                                 snapshot_name='snap')
+        self.assertEqual(image.snapshot_upload_path('qcow2'), None)
+        self.assertEqual(image.snapshot_upload_path('raw'),
+                         self.PATH + '.snap')
+
+        self.mox.VerifyAll()
+
+    def test_snapshot_upload_path_without_reflink(self):
+        self.mox.StubOutWithMock(imagebackend.libvirt_utils, 'reflink_image')
+        self.mox.StubOutWithMock(imagebackend.fileutils, 'delete_if_exists')
+        imagebackend.libvirt_utils.reflink_image(
+            self.PATH, self.PATH + '.snap').AndRaise(
+                processutils.ProcessExecutionError())
+        imagebackend.fileutils.delete_if_exists(self.PATH + '.snap')
+        self.mox.ReplayAll()
+
+        image = self.image_class(self.INSTANCE, self.NAME,
+                                 snapshot_name='snap')
+        self.assertEqual(image.snapshot_upload_path('raw'), None)
+
+        self.mox.VerifyAll()
+
     def test_correct_format(self):
         info = self.mox.CreateMockAnything()
         self.stubs.UnsetAll()
@@ -426,6 +471,25 @@ class LvmTestCase(_ImageTestCase, test.TestCase):
         self.flags(libvirt_sparse_logical_volumes=True)
         self._create_image(True)
 
+    def test_create_image_thin(self):
+        self.flags(libvirt_images_thin_pool='pool')
+        fn = self.prepare_mocks()
+        self.mox.StubOutWithMock(self.libvirt_utils, 'create_thin_volume')
+        fn(target=self.TEMPLATE_PATH)
+        self.disk.get_disk_size(self.TEMPLATE_PATH
+                                         ).AndReturn(self.TEMPLATE_SIZE)
+        self.libvirt_utils.create_thin_volume(self.VG, 'pool', self.LV,
+                                              self.TEMPLATE_SIZE)
+        cmd = ('qemu-img', 'convert', '-O', 'raw', self.TEMPLATE_PATH,
+               self.PATH)
+        self.utils.execute(*cmd, run_as_root=True)
+        self.mox.ReplayAll()
+
+        image = self.image_class(self.INSTANCE, self.NAME)
+        image.create_image(fn, self.TEMPLATE_PATH, None)
+
+        self.mox.VerifyAll()
+
     def test_create_image_generated(self):
         self._create_image_generated(False)
 
@@ -440,6 +504,80 @@ class LvmTestCase(_ImageTestCase, test.TestCase):
         self.flags(libvirt_sparse_logical_volumes=True)
         self._create_image_resize(True)
 
+    def test_create_image_generated_swap(self):
+        fn = self.prepare_mocks()
+        self.libvirt_utils.create_lvm_image(self.VG, self.LV,
+                                            self.SIZE, sparse=False)
+        fn(target=self.PATH, swap_mb=1)
+        self.mox.ReplayAll()
+
+        image = self.image_class(self.INSTANCE, self.NAME)
+        image.create_image(fn, self.TEMPLATE_PATH, self.SIZE, swap_mb=1)
+
+        self.mox.VerifyAll()
+
+    def _prepare_thin_template(self, fn, exists):
+        self.flags(libvirt_images_thin_pool='pool')
+        template_lv = 'template_template'
+        template_path = os.path.join('/dev', self.VG, template_lv)
+        self.mox.StubOutWithMock(os.path, 'exists')
+        self.mox.StubOutWithMock(self.libvirt_utils, 'create_thin_volume')
+        os.path.exists(template_path).AndReturn(exists)
+        if not exists:
+            self.libvirt_utils.create_thin_volume(self.VG, 'pool',
+                                                  template_lv, self.SIZE)
+            fn(target=template_path, ephemeral_size=1)
+        return template_lv
+
+    def test_create_image_thin_template(self):
+        fn = self.prepare_mocks()
+        template_lv = self._prepare_thin_template(fn, exists=False)
+        self.mox.StubOutWithMock(self.libvirt_utils, 'create_thin_snapshot')
+        self.libvirt_utils.create_thin_snapshot(self.VG, template_lv,
+                                                self.LV)
+        self.mox.ReplayAll()
+
+        image = self.image_class(self.INSTANCE, self.NAME)
+        image.create_image(fn, self.TEMPLATE_PATH, self.SIZE,
+                           ephemeral_size=1)
+
+        self.mox.VerifyAll()
+
+    def test_create_image_thin_template_exists(self):
+        fn = self.prepare_mocks()
+        template_lv = self._prepare_thin_template(fn, exists=True)
+        self.mox.StubOutWithMock(self.libvirt_utils, 'create_thin_snapshot')
+        self.libvirt_utils.create_thin_snapshot(self.VG, template_lv,
+                                                self.LV)
+        self.mox.ReplayAll()
+
+        image = self.image_class(self.INSTANCE, self.NAME)
+        image.create_image(fn, self.TEMPLATE_PATH, self.SIZE,
+                           ephemeral_size=1)
+
+        self.mox.VerifyAll()
+
+    def test_cache_template_thin(self):
+        self.flags(libvirt_images_type='lvm',
+                   libvirt_images_thin_pool='pool')
+        template_path = os.path.join('/dev', self.VG, 'template_template')
+        fn = self.prepare_mocks()
+        self.mox.StubOutWithMock(os.path, 'exists')
+        self.mox.StubOutWithMock(self.libvirt_utils, 'create_thin_volume')
+        os.path.exists(self.TEMPLATE_DIR).AndReturn(True)
+        os.path.exists(template_path).AndReturn(False)
+        self.libvirt_utils.create_thin_volume(self.VG, 'pool',
+                                              'template_template', self.SIZE)
+        # The new volume is formatted though it exists
+        os.path.exists(template_path).AndReturn(True)
+        fn(target=template_path, ephemeral_size=1)
+        self.mox.ReplayAll()
+
+        self.image_class.cache_template(fn, self.TEMPLATE, self.SIZE,
+                                        ephemeral_size=1)
+
+        self.mox.VerifyAll()
+
     def test_create_image_negative(self):
         fn = self.prepare_mocks()
         fn(target=self.TEMPLATE_PATH)
@@ -495,6 +633,43 @@ class LvmTestCase(_ImageTestCase, test.TestCase):
 
         self.assertEqual(fake_processutils.fake_execute_get_log(), [])
 
+    def _snapshot_image(self, pool):
+        self.mox.StubOutWithMock(self.libvirt_utils, 'logical_volume_info')
+        self.libvirt_utils.logical_volume_info(self.PATH).AndReturn(
+            {'VG': self.VG, 'LV': self.LV, 'Pool': pool})
+        self.mox.StubOutWithMock(self.libvirt_utils, 'create_thin_snapshot')
+        self.mox.StubOutWithMock(self.libvirt_utils, 'chown')
+
+    def test_snapshot_thin(self):
+        snapshot_path = os.path.join('/dev', self.VG, 'snap')
+        self._snapshot_image('pool')
+        self.libvirt_utils.create_thin_snapshot(self.VG, self.LV, 'snap')
+        self.libvirt_utils.chown(snapshot_path, os.getuid())
+        self.mox.ReplayAll()
+
+        image = self.image_class(path=self.PATH, snapshot_name='snap')
+        image.snapshot_create()
+        self.assertEqual(image.snapshot_upload_path('qcow2'), None)
+        self.assertEqual(image.snapshot_upload_path('raw'), snapshot_path)
+
+        self.mox.VerifyAll()
+
+    def test_snapshot_classic_not_uploaded_directly(self):
+        commands = []
+        self.useFixture(fixtures.MonkeyPatch(
+            'nova.tests.virt.libvirt.fake_libvirt_utils.execute',
+            lambda *cmd, **kwargs: commands.append(cmd)))
+        self._snapshot_image('')
+        self.mox.ReplayAll()
+
+        image = self.image_class(path=self.PATH, snapshot_name='snap')
+        image.snapshot_create()
+        self.assertEqual(image.snapshot_upload_path('raw'), None)
+        self.assertEqual([('lvcreate', '-L', CONF.libvirt_lvm_snapshot_size,
+                           '-s', '--name', 'snap', self.PATH)], commands)
+
+        self.mox.VerifyAll()
+
 
 class BackendTestCase(test.TestCase):
     INSTANCE = {'name': 'fake-instance',
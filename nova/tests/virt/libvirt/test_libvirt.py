@@ -1486,6 +1486,67 @@ class LibvirtConnTestCase(test.TestCase):
         self.assertEquals(snapshot['disk_format'], 'raw')
         self.assertEquals(snapshot['name'], snapshot_name)
 
+    def test_snapshot_direct_upload(self):
+        expected_calls = [
+            {'args': (),
+             'kwargs':
+                 {'task_state': task_states.IMAGE_PENDING_UPLOAD}},
+            {'args': (),
+             'kwargs':
+                 {'task_state': task_states.IMAGE_UPLOADING,
+                  'expected_state': task_states.IMAGE_PENDING_UPLOAD}}]
+        func_call_matcher = matchers.FunctionCallMatcher(expected_calls)
+
+        self.flags(libvirt_snapshots_directory='./',
+                   libvirt_snapshot_direct_upload=True)
+
+        image_service = nova.tests.image.fake.FakeImageService()
+        instance_ref = db.instance_create(self.context, self.test_instance)
+        properties = {'instance_id': instance_ref['id'],
+                      'user_id': str(self.context.user_id)}
+        sent_meta = {'name': 'test-snap', 'is_public': False,
+                     'status': 'creating', 'properties': properties}
+        recv_meta = image_service.create(context, sent_meta)
+
+        self.mox.StubOutWithMock(libvirt_driver.LibvirtDriver, '_conn')
+        libvirt_driver.LibvirtDriver._conn.lookupByName = self.fake_lookup
+        self.stubs.Set(libvirt_driver.libvirt_utils, 'disk_type', 'raw')
+        self.mox.ReplayAll()
+
+        calls = []
+
+        def fake_reflink_image(src, dest):
+            calls.append('clone')
+            libvirt_driver.libvirt_utils.files[dest] = 'snapshot'
+
+        def fake_create_domain(*args, **kwargs):
+            calls.append('resume')
+
+        def fake_update(*args, **kwargs):
+            calls.append('upload')
+            return real_update(*args, **kwargs)
+
+        def fake_convert_image(*args, **kwargs):
+            self.fail('Snapshot extracted')
+
+        real_update = image_service.update
+        self.stubs.Set(libvirt_driver.libvirt_utils, 'reflink_image',
+                       fake_reflink_image)
+        self.stubs.Set(images, 'convert_image', fake_convert_image)
+        self.stubs.Set(image_service, 'update', fake_update)
+
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        self.stubs.Set(conn, '_create_domain', fake_create_domain)
+        conn.snapshot(self.context, instance_ref, recv_meta['id'],
+                      func_call_matcher.call)
+
+        # The instance is resumed before the upload
+        self.assertEqual(['clone', 'resume', 'upload'], calls)
+        snapshot = image_service.show(context, recv_meta['id'])
+        self.assertIsNone(func_call_matcher.match())
+        self.assertEquals(snapshot['status'], 'active')
+        self.assertEquals(snapshot['disk_format'], 'raw')
+
     def test_lxc_snapshot_in_raw_format(self):
         expected_calls = [
             {'args': (),
@@ -3016,6 +3077,31 @@ class LibvirtConnTestCase(test.TestCase):
             ]
         self.assertEquals(gotFiles, wantFiles)
 
+    def test_preformat_templates(self):
+        # Invalid sizes are skipped
+        self.flags(libvirt_preformatted_ephemeral_sizes=['20', '40', '2O'],
+                   libvirt_preformatted_swap_sizes=['0', '512'])
+        gotTemplates = []
+
+        class FakeImage(imagebackend.Image):
+            @classmethod
+            def cache_template(cls, fetch_func, filename, size,
+                               *args, **kwargs):
+                if filename == 'ephemeral_40_default':
+                    raise test.TestingException()
+                gotTemplates.append({'filename': filename, 'size': size})
+
+        self.stubs.Set(imagebackend.Backend, 'backend',
+                       lambda self, image_type=None: FakeImage)
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        conn._preformat_templates()
+
+        # A template failing doesn't keep the others from being created
+        self.assertEqual([{'filename': 'ephemeral_20_default',
+                           'size': 20 * 1024 * 1024 * 1024},
+                          {'filename': 'swap_512',
+                           'size': 512 * 1024 * 1024}], gotTemplates)
+
     def test_create_image_with_swap(self):
         gotFiles = []
 
@@ -4073,6 +4159,9 @@ class LibvirtConnTestCase(test.TestCase):
             def __init__(self, vcpus):
                 self._vcpus = vcpus
 
+            def name(self):
+                return 'instance-00000001'
+
             def vcpus(self):
                 if self._vcpus is None:
                     return None
@@ -4092,6 +4181,32 @@ class LibvirtConnTestCase(test.TestCase):
 
         self.assertEqual(5, driver.get_vcpu_used())
 
+    def test_guestfs_appliances_hidden(self):
+        class NamedFakeDomain(FakeVirtDomain):
+            def __init__(self, name):
+                super(NamedFakeDomain, self).__init__()
+                self._name = name
+
+            def name(self):
+                return self._name
+
+            def vcpus(self):
+                return ([1, 1], [True, True])
+
+        domains = {1: NamedFakeDomain('instance-00000001'),
+                   2: NamedFakeDomain(libvirt_driver.GUESTFS_DOMAIN_PREFIX +
+                                      '12345')}
+        self.mox.StubOutWithMock(libvirt_driver.LibvirtDriver, '_conn')
+        libvirt_driver.LibvirtDriver._conn.lookupByID = domains.get
+        libvirt_driver.LibvirtDriver._conn.numOfDomains = lambda: 2
+        libvirt_driver.LibvirtDriver._conn.listDomainsID = lambda: [1, 2]
+        libvirt_driver.LibvirtDriver._conn.listDefinedDomains = lambda: []
+
+        self.mox.ReplayAll()
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        self.assertEqual(['instance-00000001'], conn.list_instances())
+        self.assertEqual(2, conn.get_vcpu_used())
+
     def test_get_instance_capabilities(self):
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
 
@@ -5259,6 +5374,29 @@ disk size: 4.4M''', ''))
         self.mox.ReplayAll()
         self.assertEquals(disk.get_disk_size('/some/path'), 4592640)
 
+    def test_clone_image(self):
+        with utils.tempdir() as tmpdir:
+            src_path = os.path.join(tmpdir, 'template')
+            dst_path = os.path.join(tmpdir, 'disk')
+            with open(src_path, 'w') as fp:
+                fp.write('canary')
+                fp.truncate(1024 * 1024)
+
+            libvirt_utils.clone_image(src_path, dst_path)
+            with open(dst_path, 'r') as fp:
+                self.assertEquals(fp.read(6), 'canary')
+            self.assertEqual(1024 * 1024, os.path.getsize(dst_path))
+
+    def test_create_thin_volume_and_snapshot(self):
+        self.mox.StubOutWithMock(utils, 'execute')
+        utils.execute('lvcreate', '-V', '1024b', '-T', 'vg/pool',
+                      '-n', 'template', run_as_root=True, attempts=3)
+        utils.execute('lvcreate', '-s', '-kn', '-n', 'disk', 'vg/template',
+                      run_as_root=True, attempts=3)
+        self.mox.ReplayAll()
+        libvirt_utils.create_thin_volume('vg', 'pool', 'template', 1024)
+        libvirt_utils.create_thin_snapshot('vg', 'template', 'disk')
+
     def test_copy_image(self):
         dst_fd, dst_path = tempfile.mkstemp()
         try:
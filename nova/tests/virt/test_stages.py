@@ -0,0 +1,124 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from eventlet import greenthread
+
+from nova import context
+from nova import db
+from nova import exception
+from nova import test
+from nova.virt import fake
+from nova.virt import stages
+
+
+class PipelineTestCase(test.TestCase):
+
+    def setUp(self):
+        super(PipelineTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.instance = db.instance_create(self.context, {})
+        self.virtapi = fake.FakeVirtAPI()
+        self.log = []
+
+    def _pipeline(self, workers=4):
+        return stages.Pipeline(self.context, self.virtapi, self.instance,
+                               'test_', workers=workers)
+
+    def _stage(self, name, sleeps=1, error=None):
+        def stage():
+            self.log.append(('start', name))
+            for _i in xrange(sleeps):
+                greenthread.sleep(0)
+            self.log.append(('end', name))
+            if error:
+                raise error
+        return stage
+
+    def test_concurrent_stages(self):
+        pipeline = self._pipeline()
+        pipeline.add('root', self._stage('root', sleeps=3))
+        pipeline.add('swap', self._stage('swap'))
+        pipeline.add('inject', self._stage('inject'), requires=('root',))
+        pipeline.run()
+
+        self.assertEqual([('start', 'root'), ('start', 'swap'),
+                          ('end', 'swap'), ('end', 'root'),
+                          ('start', 'inject'), ('end', 'inject')], self.log)
+        self.assertEqual(set(['root', 'swap', 'inject']),
+                         set(pipeline.timings))
+
+    def test_workers(self):
+        pipeline = self._pipeline(workers=1)
+        pipeline.add('root', self._stage('root', sleeps=3))
+        pipeline.add('swap', self._stage('swap'))
+        pipeline.run()
+
+        self.assertEqual([('start', 'root'), ('end', 'root'),
+                          ('start', 'swap'), ('end', 'swap')], self.log)
+
+    def test_failure(self):
+        pipeline = self._pipeline()
+        pipeline.add('root', self._stage('root',
+                                         error=test.TestingException()))
+        pipeline.add('swap', self._stage('swap', sleeps=3))
+        pipeline.add('inject', self._stage('inject'), requires=('root',))
+        self.assertRaises(test.TestingException, pipeline.run)
+
+        # The running stages are waited for, the others aren't started
+        self.assertEqual([('start', 'root'), ('start', 'swap'),
+                          ('end', 'root'), ('end', 'swap')], self.log)
+
+    def test_requires_added_stages(self):
+        pipeline = self._pipeline()
+        self.assertRaises(ValueError, pipeline.add, 'inject',
+                          self._stage('inject'), requires=('root',))
+        pipeline.add('root', self._stage('root'))
+        self.assertRaises(ValueError, pipeline.add, 'root',
+                          self._stage('root'))
+
+    def test_events(self):
+        self.context.request_id = 'req-fake'
+        db.action_start(self.context, {
+            'action': 'create', 'request_id': 'req-fake',
+            'instance_uuid': self.instance['uuid'],
+            'user_id': self.context.user_id,
+            'project_id': self.context.project_id})
+        pipeline = self._pipeline()
+        pipeline.add('root', self._stage('root'))
+        pipeline.add('swap', self._stage('swap',
+                                         error=test.TestingException()))
+        self.assertRaises(test.TestingException, pipeline.run)
+
+        action = db.action_get_by_request_id(
+            self.context, self.instance['uuid'], 'req-fake')
+        events = db.action_events_get(self.context, action['id'])
+        results = dict([(event['event'], event['result'])
+                        for event in events])
+        self.assertEqual({'test_root': 'Success', 'test_swap': 'Error'},
+                         results)
+        for event in events:
+            self.assertTrue(event['finish_time'] >= event['start_time'])
+
+    def test_events_without_action(self):
+        self.stubs.Set(self.virtapi, 'action_event_start',
+                       self._raise_not_found)
+        pipeline = self._pipeline()
+        pipeline.add('root', self._stage('root'))
+        pipeline.run()
+        self.assertEqual([('start', 'root'), ('end', 'root')], self.log)
+
+    def _raise_not_found(self, context, values):
+        raise exception.InstanceActionNotFound(
+            request_id=values['request_id'],
+            instance_uuid=values['instance_uuid'])
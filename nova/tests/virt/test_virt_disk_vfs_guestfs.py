@@ -16,6 +16,8 @@
 
 import sys
 
+from eventlet import greenthread
+
 from nova import exception
 from nova import test
 
@@ -29,6 +31,7 @@ class VirtDiskVFSGuestFSTest(test.TestCase):
         super(VirtDiskVFSGuestFSTest, self).setUp()
         sys.modules['guestfs'] = fakeguestfs
         vfsimpl.guestfs = fakeguestfs
+        self.stubs.Set(vfsimpl, '_pool', None)
 
     def test_appliance_setup_inspect(self):
         vfs = vfsimpl.VFSGuestFS(imgfile="/dummy.qcow2",
@@ -119,6 +122,172 @@ class VirtDiskVFSGuestFSTest(test.TestCase):
         self.assertEqual(handle.closed, True)
         self.assertEqual(len(handle.mounts), 0)
 
+    def test_appliance_pool(self):
+        self.flags(libguestfs_appliances=1)
+        vfs = vfsimpl.VFSGuestFS(imgfile="/dummy.qcow2",
+                                 imgfmt="qcow2",
+                                 partition=2,
+                                 owner="fake-project")
+        vfs.setup()
+
+        handle = vfs.handle
+        self.assertEqual(handle.running, True)
+        self.assertEqual(handle.drives, [("/dummy.qcow2", "qcow2")])
+        self.assertEqual(len(handle.mounts), 1)
+        self.assertEqual(handle.mounts[0][1], "/dev/disk/guestfs/image2")
+        self.assertTrue(handle.auginit)
+
+        vfs.teardown()
+
+        self.assertEqual(vfs.handle, None)
+        self.assertEqual(handle.running, True)
+        self.assertEqual(handle.closed, False)
+        self.assertEqual(handle.drives, [])
+        self.assertEqual(len(handle.mounts), 0)
+        self.assertFalse(handle.auginit)
+
+        # The next image is hotplugged into the same appliance
+        vfs = vfsimpl.VFSGuestFS(imgfile="/other.qcow2",
+                                 imgfmt="qcow2",
+                                 partition=-1,
+                                 owner="fake-project")
+        vfs.setup()
+        self.assertTrue(vfs.handle is handle)
+        self.assertEqual(handle.drives, [("/other.qcow2", "qcow2")])
+        self.assertEqual(len(handle.mounts), 3)
+        vfs.teardown()
+
+    def test_appliance_pool_setup_fails(self):
+        self.flags(libguestfs_appliances=1)
+        vfs = vfsimpl.VFSGuestFS(imgfile="/dummy.qcow2",
+                                 imgfmt="qcow2",
+                                 partition=-1,
+                                 owner="fake-project")
+        handles = []
+
+        def fake_inspect_os():
+            handles.append(vfs.handle)
+            return []
+
+        self.stubs.Set(fakeguestfs.GuestFS, 'inspect_os',
+                       lambda _self: fake_inspect_os())
+        self.assertRaises(exception.NovaException, vfs.setup)
+        self.assertEqual(vfs.handle, None)
+
+        # The drive was removed and the appliance given back
+        handle = handles[0]
+        self.assertEqual(handle.drives, [])
+        self.assertEqual(handle.running, True)
+        self.assertEqual(vfsimpl.appliance_pool().get("fake-project"), handle)
+
+    def test_appliance_pool_remove_fails(self):
+        self.flags(libguestfs_appliances=1)
+        vfs = vfsimpl.VFSGuestFS(imgfile="/dummy.qcow2",
+                                 imgfmt="qcow2",
+                                 partition=None,
+                                 owner="fake-project")
+        vfs.setup()
+        handle = vfs.handle
+        handle.labels.clear()
+        vfs.teardown()
+
+        self.assertEqual(vfs.handle, None)
+        self.assertEqual(handle.running, False)
+        self.assertEqual(handle.closed, True)
+
+        vfs.setup()
+        self.assertFalse(vfs.handle is handle)
+        vfs.teardown()
+
+    def test_appliance_pool_owners(self):
+        self.flags(libguestfs_appliances=2)
+        handles = {}
+        for owner in ("project1", "project2", "project1", "project3"):
+            vfs = vfsimpl.VFSGuestFS(imgfile="/dummy.qcow2",
+                                     imgfmt="qcow2",
+                                     partition=None,
+                                     owner=owner)
+            vfs.setup()
+            handles.setdefault(owner, []).append(vfs.handle)
+            vfs.teardown()
+
+        # Appliances only take the images of one owner, the appliance of
+        # the owner least recently served is shut down for a new owner
+        self.assertTrue(handles["project1"][0] is handles["project1"][1])
+        self.assertFalse(handles["project2"][0] is handles["project1"][0])
+        self.assertEqual(handles["project1"][0].running, True)
+        self.assertEqual(handles["project2"][0].closed, True)
+        self.assertEqual(handles["project3"][0].running, True)
+
+    def test_appliance_pool_concurrent_launches(self):
+        pool = vfsimpl.AppliancePool(2)
+        launches = []
+
+        def fake_launch():
+            launches.append(1)
+            if len(launches) == 2:
+                raise exception.NovaException()
+            # Launching yields to other greenthreads
+            greenthread.sleep(0)
+            return fakeguestfs.GuestFS()
+
+        self.stubs.Set(pool, '_launch', fake_launch)
+        handle = pool.get("project1")
+        pool.put("project1", handle)
+
+        # The failed launch gives its slot back
+        self.assertRaises(exception.NovaException, pool.get, "project2")
+        self.assertEqual(1, pool._running)
+
+        threads = [greenthread.spawn(pool.get, owner)
+                   for owner in ("project2", "project3")]
+        handles = [thread.wait() for thread in threads]
+        self.assertFalse(handles[0] is handles[1])
+        self.assertEqual(2, pool._running)
+        self.assertEqual(handle.closed, True)
+        self.assertEqual([], pool._idle)
+
+    def test_appliance_pool_without_owner(self):
+        self.flags(libguestfs_appliances=1)
+        vfs = vfsimpl.VFSGuestFS(imgfile="/dummy.qcow2",
+                                 imgfmt="qcow2",
+                                 partition=None)
+        vfs.setup()
+        self.assertEqual(vfs.pool, None)
+        handle = vfs.handle
+        vfs.teardown()
+        self.assertEqual(handle.closed, True)
+
+    def test_appliance_pool_resized(self):
+        self.flags(libguestfs_appliances=1)
+        vfs = vfsimpl.VFSGuestFS(imgfile="/dummy.qcow2",
+                                 imgfmt="qcow2",
+                                 partition=None,
+                                 owner="fake-project")
+        vfs.setup()
+        handle = vfs.handle
+        vfs.teardown()
+        self.assertEqual(handle.running, True)
+
+        self.flags(libguestfs_appliances=2)
+        vfsimpl.appliance_pool()
+        self.assertEqual(handle.closed, True)
+
+    def test_appliance_pool_no_hotplug(self):
+        self.flags(libguestfs_appliances=1)
+        self.stubs.Set(fakeguestfs.GuestFS, 'remove_drive', None)
+        del fakeguestfs.GuestFS.remove_drive
+        self.assertEqual(vfsimpl.appliance_pool(), None)
+
+        vfs = vfsimpl.VFSGuestFS(imgfile="/dummy.qcow2",
+                                 imgfmt="qcow2",
+                                 partition=None)
+        vfs.setup()
+        self.assertEqual(vfs.handle.mounts[0][1], "/dev/sda")
+        handle = vfs.handle
+        vfs.teardown()
+        self.assertEqual(handle.closed, True)
+
     def test_makepath(self):
         vfs = vfsimpl.VFSGuestFS(imgfile="/dummy.qcow2", imgfmt="qcow2")
         vfs.setup()
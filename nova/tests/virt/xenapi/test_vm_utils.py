@@ -158,6 +158,7 @@ class GenerateConfigDriveTestCase(test.TestCase):
                 'nova.api.metadata.base.InstanceMetadata',
                 FakeInstanceMetadata))
 
+        self.flags(config_drive_external_tools=True)
         self.mox.StubOutWithMock(utils, 'execute')
         utils.execute('genisoimage', '-o', mox.IgnoreArg(), '-ldots',
                       '-allow-lowercase', '-allow-multidot', '-l',
@@ -29,6 +29,8 @@ from nova.openstack.common.gettextutils import _
 from nova.openstack.common import log as logging
 from nova import utils
 from nova import version
+from nova.virt.disk import iso9660
+from nova.virt.disk import vfat
 
 LOG = logging.getLogger(__name__)
 
@@ -48,7 +50,13 @@ configdrive_opts = [
     cfg.StrOpt('mkisofs_cmd',
                default='genisoimage',
                help='Name and optionally path of the tool used for '
-                    'ISO image creation')
+                    'ISO image creation'),
+    cfg.BoolOpt('config_drive_external_tools',
+                default=False,
+                help='Stage the files of config drives in a temporary '
+                     'directory and build the image with mkisofs_cmd, or '
+                     'mkfs and a loop mount, instead of writing the image '
+                     'directly'),
     ]
 
 CONF = cfg.CONF
@@ -63,13 +71,11 @@ class ConfigDriveBuilder(object):
 
     def __init__(self, instance_md=None):
         self.imagefile = None
+        # Only used by the external tools
+        self.tempdir = None
 
-        # TODO(mikal): I don't think I can use utils.tempdir here, because
-        # I need to have the directory last longer than the scope of this
-        # method call
-        self.tempdir = tempfile.mkdtemp(dir=CONF.config_drive_tempdir,
-                                        prefix='cd_gen_')
-
+        self._files = []
+        self._instance_mds = []
         if instance_md is not None:
             self.add_instance_metadata(instance_md)
 
@@ -85,24 +91,48 @@ class ConfigDriveBuilder(object):
         self.cleanup()
 
     def _add_file(self, path, data):
-        filepath = os.path.join(self.tempdir, path)
-        dirname = os.path.dirname(filepath)
-        fileutils.ensure_tree(dirname)
-        with open(filepath, 'w') as f:
-            f.write(data)
+        self._files.append((path, data))
 
     def add_instance_metadata(self, instance_md):
-        for (path, value) in instance_md.metadata_for_config_drive():
-            self._add_file(path, value)
-            LOG.debug(_('Added %(filepath)s to config drive'),
-                      {'filepath': path})
+        # The metadata is generated as the drive is written
+        self._instance_mds.append(instance_md)
+
+    def _iter_files(self):
+        for (path, value) in self._files:
+            yield path, value
+        for instance_md in self._instance_mds:
+            for (path, value) in instance_md.metadata_for_config_drive():
+                LOG.debug(_('Added %(filepath)s to config drive'),
+                          {'filepath': path})
+                yield path, value
+
+    def _stage(self):
+        """Writes the files to a temporary directory for the tools."""
+        if self.tempdir is not None:
+            return
 
-    def _make_iso9660(self, path):
-        publisher = "%(product)s %(version)s" % {
+        # TODO(mikal): I don't think I can use utils.tempdir here, because
+        # I need to have the directory last longer than the scope of this
+        # method call
+        self.tempdir = tempfile.mkdtemp(dir=CONF.config_drive_tempdir,
+                                        prefix='cd_gen_')
+        for (path, data) in self._iter_files():
+            filepath = os.path.join(self.tempdir, path)
+            dirname = os.path.dirname(filepath)
+            fileutils.ensure_tree(dirname)
+            with open(filepath, 'w') as f:
+                f.write(data)
+
+    def _publisher(self):
+        return "%(product)s %(version)s" % {
             'product': version.product_string(),
             'version': version.version_string_with_package()
             }
 
+    def _make_iso9660(self, path):
+        self._stage()
+        publisher = self._publisher()
+
         utils.execute(CONF.mkisofs_cmd,
                       '-o', path,
                       '-ldots',
@@ -122,6 +152,7 @@ class ConfigDriveBuilder(object):
     def _make_vfat(self, path):
         # NOTE(mikal): This is a little horrible, but I couldn't find an
         # equivalent to genisoimage for vfat filesystems.
+        self._stage()
         with open(path, 'w') as f:
             f.truncate(CONFIGDRIVESIZE_BYTES)
 
@@ -158,11 +189,20 @@ class ConfigDriveBuilder(object):
         :param path: the path to place the config drive image at
 
         :raises ProcessExecuteError if a helper process has failed.
+        :raises ConfigDriveTooLarge if the files don't fit in a vfat drive.
         """
         if CONF.config_drive_format == 'iso9660':
-            self._make_iso9660(path)
+            if CONF.config_drive_external_tools:
+                self._make_iso9660(path)
+            else:
+                iso9660.write_image(path, self._iter_files(), 'config-2',
+                                    self._publisher())
         elif CONF.config_drive_format == 'vfat':
-            self._make_vfat(path)
+            if CONF.config_drive_external_tools:
+                self._make_vfat(path)
+            else:
+                vfat.write_image(path, self._iter_files(), 'config-2',
+                                 CONFIGDRIVESIZE_BYTES)
         else:
             raise exception.ConfigDriveUnknownFormat(
                 format=CONF.config_drive_format)
@@ -171,6 +211,8 @@ class ConfigDriveBuilder(object):
         if self.imagefile:
             fileutils.delete_if_exists(self.imagefile)
 
+        if self.tempdir is None:
+            return
         try:
             shutil.rmtree(self.tempdir)
         except OSError as e:
@@ -268,7 +268,8 @@ class _DiskImage(object):
 # Public module functions
 
 def inject_data(image, key=None, net=None, metadata=None, admin_password=None,
-                files=None, partition=None, use_cow=False, mandatory=()):
+                files=None, partition=None, use_cow=False, mandatory=(),
+                owner=None):
     """Inject the specified items into a disk image.
 
     If an item name is not specified in the MANDATORY iterable, then a warning
@@ -279,6 +280,9 @@ def inject_data(image, key=None, net=None, metadata=None, admin_password=None,
 
     If PARTITION is not specified the image is mounted as a single partition.
 
+    OWNER identifies whose image it is, the images of an owner may be
+    injected by the same long-lived libguestfs appliance.
+
     Returns True if all requested operations completed without issue.
     Raises an exception if a mandatory item can't be injected.
     """
@@ -291,7 +295,7 @@ def inject_data(image, key=None, net=None, metadata=None, admin_password=None,
     if use_cow:
         fmt = "qcow2"
     try:
-        fs = vfs.VFS.instance_for_image(image, fmt, partition)
+        fs = vfs.VFS.instance_for_image(image, fmt, partition, owner)
         fs.setup()
     except Exception as e:
         # If a mandatory item is passed to this function,
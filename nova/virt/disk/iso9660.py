@@ -0,0 +1,271 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Writes ISO 9660 images with Joliet names.
+
+The data of the files is written to the image as the files are iterated
+over, from the sector following the volume descriptors.  The path tables
+and the directories of both namespaces follow once all the files are
+known, and the volume descriptors are written last.  The ISO 9660 names
+are relaxed as genisoimage -l -allow-lowercase -allow-multidot does, and
+the Joliet names keep the case and length of the file names.
+"""
+
+import struct
+
+from nova.openstack.common import timeutils
+
+SECTOR_SIZE = 2048
+
+# System area, then the primary and Joliet volume descriptors and the
+# set terminator
+_DESCRIPTORS_SECTOR = 16
+_DATA_SECTOR = _DESCRIPTORS_SECTOR + 3
+
+# UCS-2 level 3
+_JOLIET_ESCAPE = '%/E'
+
+_ISO_NAME_LENGTH = 31
+_JOLIET_NAME_LENGTH = 64
+_ISO_CHARS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+                       '0123456789_-.')
+
+
+def _both16(value):
+    return struct.pack('<H', value) + struct.pack('>H', value)
+
+
+def _both32(value):
+    return struct.pack('<I', value) + struct.pack('>I', value)
+
+
+def _sectors(size):
+    return (size + SECTOR_SIZE - 1) // SECTOR_SIZE
+
+
+class _IsoNames(object):
+    """Names of the primary volume descriptor."""
+
+    @staticmethod
+    def pad(text, length):
+        return text.encode('ascii', 'replace')[:length].ljust(length)
+
+    @staticmethod
+    def _encode(name, length):
+        name = ''.join([c if c in _ISO_CHARS else '_' for c in name])
+        return str(name[:length])
+
+    @staticmethod
+    def name(name, is_dir, taken):
+        """Returns a name unique among taken once truncated, adds it."""
+        identifier = _IsoNames._encode(name, _ISO_NAME_LENGTH)
+        suffix = 0
+        while identifier in taken:
+            suffix += 1
+            tail = '~%d' % suffix
+            identifier = _IsoNames._encode(
+                name, _ISO_NAME_LENGTH - len(tail)) + tail
+        taken.add(identifier)
+        if is_dir:
+            return identifier
+        return identifier + ';1'
+
+
+class _JolietNames(object):
+    """Names of the Joliet supplementary volume descriptor."""
+
+    @staticmethod
+    def pad(text, length):
+        text = text[:length // 2].ljust(length // 2)
+        return text.encode('utf-16-be').ljust(length, '\0')
+
+    @staticmethod
+    def name(name, is_dir, taken):
+        # Names longer than Joliet allows aren't expected
+        if is_dir:
+            return name[:_JOLIET_NAME_LENGTH].encode('utf-16-be')
+        return (name[:_JOLIET_NAME_LENGTH - 2] + ';1').encode('utf-16-be')
+
+
+class _Directory(object):
+
+    def __init__(self, parent=None):
+        self.parent = parent or self
+        self.dirs = {}
+        # Name to (sector, size) of the data
+        self.files = {}
+
+    def get_dir(self, names):
+        directory = self
+        for name in names:
+            directory = directory.dirs.setdefault(name, _Directory(directory))
+        return directory
+
+
+class _Tree(object):
+    """The directories of a namespace, laid out from a sector."""
+
+    def __init__(self, root, names, now):
+        self.names = names
+        self._date = struct.pack('7B', now.year - 1900, now.month, now.day,
+                                 now.hour, now.minute, now.second, 0)
+
+        # Identifiers of the entries of each directory, sorted
+        self._entries = {}
+        # Directories in path table order: by depth, then by parent and
+        # by identifier
+        self.dirs = [root]
+        for directory in self.dirs:
+            taken = set()
+            entries = []
+            for name in sorted(directory.dirs):
+                entries.append((names.name(name, True, taken),
+                                directory.dirs[name]))
+            for name in sorted(directory.files):
+                entries.append((names.name(name, False, taken),
+                                directory.files[name]))
+            entries.sort()
+            self._entries[directory] = entries
+            self.dirs.extend([entry for _identifier, entry in entries
+                              if isinstance(entry, _Directory)])
+
+        self._numbers = dict([(directory, i + 1)
+                              for i, directory in enumerate(self.dirs)])
+        self._identifiers = {root: '\0'}
+        for directory in self.dirs:
+            for identifier, entry in self._entries[directory]:
+                if isinstance(entry, _Directory):
+                    self._identifiers[entry] = identifier
+
+        # The sizes of the directories don't depend on where they are,
+        # nor on the sizes of the others
+        self._locations = dict([(directory, (0, 0))
+                                for directory in self.dirs])
+        self._locations = dict([(directory,
+                                 (0, len(self._directory(directory))))
+                                for directory in self.dirs])
+        self.path_table_size = len(self._path_table('<'))
+
+    def layout(self, sector):
+        """Places the path tables and the directories from sector."""
+        self._l_table_sector = sector
+        self._m_table_sector = sector + _sectors(self.path_table_size)
+        sector = self._m_table_sector + _sectors(self.path_table_size)
+        for directory in self.dirs:
+            size = self._locations[directory][1]
+            self._locations[directory] = (sector, size)
+            sector += _sectors(size)
+        return sector
+
+    def _record(self, identifier, location, is_dir):
+        padding = '\0' * (1 - len(identifier) % 2)
+        return (struct.pack('<BB', 33 + len(identifier) + len(padding), 0) +
+                _both32(location[0]) + _both32(location[1]) + self._date +
+                struct.pack('<BBB', 2 if is_dir else 0, 0, 0) +
+                _both16(1) + struct.pack('<B', len(identifier)) +
+                identifier + padding)
+
+    def root_record(self):
+        return self._record('\0', self._locations[self.dirs[0]], True)
+
+    def _directory(self, directory):
+        records = [self._record('\0', self._locations[directory], True),
+                   self._record('\1', self._locations[directory.parent],
+                                True)]
+        for identifier, entry in self._entries[directory]:
+            if isinstance(entry, _Directory):
+                records.append(self._record(identifier,
+                                            self._locations[entry], True))
+            else:
+                records.append(self._record(identifier, entry, False))
+
+        # Records don't cross sectors
+        data = ''
+        for record in records:
+            if len(data) % SECTOR_SIZE + len(record) > SECTOR_SIZE:
+                data += '\0' * (SECTOR_SIZE - len(data) % SECTOR_SIZE)
+            data += record
+        return data + '\0' * (-len(data) % SECTOR_SIZE)
+
+    def _path_table(self, endian):
+        data = ''
+        for directory in self.dirs:
+            identifier = self._identifiers[directory]
+            data += (struct.pack(endian + 'BBIH', len(identifier), 0,
+                                 self._locations[directory][0],
+                                 self._numbers[directory.parent]) +
+                     identifier + '\0' * (len(identifier) % 2))
+        return data
+
+    def write(self, f):
+        for sector, endian in ((self._l_table_sector, '<'),
+                               (self._m_table_sector, '>')):
+            f.seek(sector * SECTOR_SIZE)
+            f.write(self._path_table(endian))
+        for directory in self.dirs:
+            f.seek(self._locations[directory][0] * SECTOR_SIZE)
+            f.write(self._directory(directory))
+
+    def descriptor(self, descriptor_type, volume_id, publisher, sectors,
+                   escape, now):
+        pad = self.names.pad
+        date = now.strftime('%Y%m%d%H%M%S') + '00\0'
+        no_date = '0' * 16 + '\0'
+        return ''.join([
+            struct.pack('<B', descriptor_type), 'CD001\1\0',
+            pad('', 32), pad(volume_id, 32), '\0' * 8, _both32(sectors),
+            escape.ljust(32, '\0'), _both16(1), _both16(1),
+            _both16(SECTOR_SIZE), _both32(self.path_table_size),
+            struct.pack('<II', self._l_table_sector, 0),
+            struct.pack('>II', self._m_table_sector, 0),
+            self.root_record(),
+            pad('', 128), pad(publisher, 128), pad('', 128), pad('', 128),
+            pad('', 37), pad('', 37), pad('', 37),
+            date, date, no_date, no_date, '\1\0',
+        ]).ljust(SECTOR_SIZE, '\0')
+
+
+def write_image(path, files, volume_id, publisher=''):
+    """Writes an image of files to path.
+
+    :param files: iterable of (path, data) pairs, the data is written to
+                  the image as it is iterated over
+    :param volume_id: volume identifier, at most 16 characters
+    """
+    root = _Directory()
+    now = timeutils.utcnow()
+    with open(path, 'wb') as f:
+        f.seek(_DATA_SECTOR * SECTOR_SIZE)
+        sector = _DATA_SECTOR
+        for file_path, data in files:
+            if isinstance(data, unicode):
+                data = data.encode('utf-8')
+            names = [name for name in file_path.split('/') if name]
+            directory = root.get_dir(names[:-1])
+            directory.files[names[-1]] = (sector, len(data))
+            f.write(data)
+            f.write('\0' * (-len(data) % SECTOR_SIZE))
+            sector += _sectors(len(data))
+
+        trees = (_Tree(root, _IsoNames, now), _Tree(root, _JolietNames, now))
+        for tree in trees:
+            sector = tree.layout(sector)
+            tree.write(f)
+        f.truncate(sector * SECTOR_SIZE)
+
+        f.seek(_DESCRIPTORS_SECTOR * SECTOR_SIZE)
+        f.write(trees[0].descriptor(1, volume_id, publisher, sector, '', now))
+        f.write(trees[1].descriptor(2, volume_id, publisher, sector,
+                                    _JOLIET_ESCAPE, now))
+        f.write('\xffCD001\1'.ljust(SECTOR_SIZE, '\0'))
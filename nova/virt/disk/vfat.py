@@ -0,0 +1,273 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Writes FAT16 images with long file names.
+
+The data of the files is written to consecutive clusters as the files are
+iterated over.  The directories are given the clusters following the data
+once all the files are known, and the allocation tables and the boot
+sector are written last.  The image is sparse, what isn't written reads
+as zeroes.
+"""
+
+import random
+import struct
+
+from nova import exception
+from nova.openstack.common import timeutils
+
+SECTOR_SIZE = 512
+
+_SECTORS_PER_CLUSTER = 4
+_CLUSTER_SIZE = SECTOR_SIZE * _SECTORS_PER_CLUSTER
+_RESERVED_SECTORS = 1
+_FATS = 2
+_ROOT_ENTRIES = 512
+_ENTRY_SIZE = 32
+_FIRST_CLUSTER = 2
+_END_OF_CHAIN = 0xffff
+
+_ATTR_VOLUME_ID = 0x08
+_ATTR_DIRECTORY = 0x10
+_ATTR_ARCHIVE = 0x20
+_ATTR_LONG_NAME = 0x0f
+_LAST_LONG_ENTRY = 0x40
+_LONG_NAME_CHARS = 13
+
+_SHORT_CHARS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+                         '!#$%&\'()-@^_`{}~')
+
+
+def _clusters(size):
+    return (size + _CLUSTER_SIZE - 1) // _CLUSTER_SIZE
+
+
+def _short_name(name, taken):
+    """Returns an 8.3 name unique among taken, adds it."""
+    base, _sep, ext = name.rpartition('.')
+    if not base:
+        base, ext = ext, ''
+
+    def encode(text):
+        return ''.join([c for c in text.upper().replace(' ', '')
+                        if c in _SHORT_CHARS])
+
+    base = encode(base) or '_'
+    ext = encode(ext)[:3]
+    suffix = 0
+    while True:
+        suffix += 1
+        tail = '~%d' % suffix
+        short_name = (base[:8 - len(tail)] + tail).ljust(8) + ext.ljust(3)
+        if short_name not in taken:
+            taken.add(short_name)
+            return short_name
+
+
+def _checksum(short_name):
+    total = 0
+    for c in short_name:
+        total = (((total & 1) << 7) + (total >> 1) + ord(c)) & 0xff
+    return total
+
+
+class _Directory(object):
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.dirs = {}
+        # Name to (cluster, size) of the data
+        self.files = {}
+        self.cluster = 0
+
+    def get_dir(self, names):
+        directory = self
+        for name in names:
+            directory = directory.dirs.setdefault(name, _Directory(directory))
+        return directory
+
+
+class _Layout(object):
+    """Where the regions of a FAT16 file system of sectors are."""
+
+    def __init__(self, sectors):
+        self.sectors = sectors
+        self.root_sectors = _ROOT_ENTRIES * _ENTRY_SIZE // SECTOR_SIZE
+        # Each table must cover the clusters left by the tables
+        self.fat_sectors = 1
+        while True:
+            self.clusters = ((sectors - _RESERVED_SECTORS - self.root_sectors -
+                              _FATS * self.fat_sectors) //
+                             _SECTORS_PER_CLUSTER)
+            if (self.clusters + _FIRST_CLUSTER) * 2 <= (self.fat_sectors *
+                                                        SECTOR_SIZE):
+                break
+            self.fat_sectors += 1
+        self.root_sector = _RESERVED_SECTORS + _FATS * self.fat_sectors
+        self.data_sector = self.root_sector + self.root_sectors
+
+    def offset(self, cluster):
+        return ((self.data_sector +
+                 (cluster - _FIRST_CLUSTER) * _SECTORS_PER_CLUSTER) *
+                SECTOR_SIZE)
+
+
+class _Writer(object):
+
+    def __init__(self, f, size, label, now):
+        self._f = f
+        self._size = size
+        self._label = label
+        self.layout = _Layout(size // SECTOR_SIZE)
+        self._next_cluster = _FIRST_CLUSTER
+        # (first cluster, count) of the chains
+        self._chains = []
+        self._date = ((now.year - 1980) << 9) | (now.month << 5) | now.day
+        self._time = (now.hour << 11) | (now.minute << 5) | (now.second // 2)
+
+    def allocate(self, size):
+        """Returns the first of enough consecutive clusters for size."""
+        count = _clusters(size)
+        if not count:
+            return 0
+        cluster = self._next_cluster
+        if cluster + count > self.layout.clusters + _FIRST_CLUSTER:
+            raise exception.ConfigDriveTooLarge(size=self._size)
+        self._next_cluster += count
+        self._chains.append((cluster, count))
+        return cluster
+
+    def write_file(self, data):
+        cluster = self.allocate(len(data))
+        if cluster:
+            self._f.seek(self.layout.offset(cluster))
+            self._f.write(data)
+        return cluster
+
+    def _entry(self, short_name, attributes, cluster=0, size=0):
+        return struct.pack('<11sBBBHHHHHHHI', short_name, attributes, 0, 0,
+                           self._time, self._date, self._date, 0,
+                           self._time, self._date, cluster, size)
+
+    def _entries(self, name, short_name, attributes, cluster=0, size=0):
+        """The long name entries, last part first, and the 8.3 entry."""
+        chars = name.encode('utf-16-le')
+        if len(chars) % (_LONG_NAME_CHARS * 2):
+            chars += '\0\0'
+        chars += '\xff' * (-len(chars) % (_LONG_NAME_CHARS * 2))
+        parts = [chars[i:i + _LONG_NAME_CHARS * 2]
+                 for i in xrange(0, len(chars), _LONG_NAME_CHARS * 2)]
+        checksum = _checksum(short_name)
+        entries = []
+        for i, part in enumerate(parts):
+            sequence = i + 1
+            if sequence == len(parts):
+                sequence |= _LAST_LONG_ENTRY
+            entries.insert(0, struct.pack('<B10sBBB12sH4s', sequence,
+                                          part[:10], _ATTR_LONG_NAME, 0,
+                                          checksum, part[10:22], 0,
+                                          part[22:]))
+        entries.append(self._entry(short_name, attributes, cluster, size))
+        return entries
+
+    def _directory(self, directory):
+        if directory.parent is None:
+            entries = [self._entry(self._label[:11].ljust(11),
+                                   _ATTR_VOLUME_ID)]
+        else:
+            parent_cluster = directory.parent.cluster
+            entries = [self._entry('.'.ljust(11), _ATTR_DIRECTORY,
+                                   directory.cluster),
+                       self._entry('..'.ljust(11), _ATTR_DIRECTORY,
+                                   parent_cluster)]
+        taken = set()
+        for name in sorted(directory.dirs):
+            entries.extend(self._entries(name, _short_name(name, taken),
+                                         _ATTR_DIRECTORY,
+                                         directory.dirs[name].cluster))
+        for name in sorted(directory.files):
+            cluster, size = directory.files[name]
+            entries.extend(self._entries(name, _short_name(name, taken),
+                                         _ATTR_ARCHIVE, cluster, size))
+        return ''.join(entries)
+
+    def write_directories(self, root):
+        """Allocates the subdirectories, then writes all of them."""
+        directories = [root]
+        for directory in directories:
+            for name in sorted(directory.dirs):
+                directories.append(directory.dirs[name])
+        for directory in directories[1:]:
+            # Clusters don't depend on the entries of the directories
+            directory.cluster = self.allocate(
+                len(self._directory(directory)))
+
+        data = self._directory(root)
+        if len(data) > _ROOT_ENTRIES * _ENTRY_SIZE:
+            raise exception.ConfigDriveTooLarge(size=self._size)
+        self._f.seek(self.layout.root_sector * SECTOR_SIZE)
+        self._f.write(data)
+        for directory in directories[1:]:
+            self._f.seek(self.layout.offset(directory.cluster))
+            self._f.write(self._directory(directory))
+
+    def write_tables(self):
+        table = [0xfff8, _END_OF_CHAIN]
+        table.extend([0] * self.layout.clusters)
+        for cluster, count in self._chains:
+            for i in xrange(cluster, cluster + count - 1):
+                table[i] = i + 1
+            table[cluster + count - 1] = _END_OF_CHAIN
+        data = struct.pack('<%dH' % len(table), *table)
+        data = data.ljust(self.layout.fat_sectors * SECTOR_SIZE, '\0')
+        self._f.seek(_RESERVED_SECTORS * SECTOR_SIZE)
+        for _i in xrange(_FATS):
+            self._f.write(data)
+
+    def write_boot_sector(self):
+        layout = self.layout
+        boot = struct.pack('<3s8sHBHBHHBHHHII', '\xeb\x3c\x90', 'NOVA    ',
+                           SECTOR_SIZE, _SECTORS_PER_CLUSTER,
+                           _RESERVED_SECTORS, _FATS, _ROOT_ENTRIES,
+                           layout.sectors if layout.sectors < 0x10000 else 0,
+                           0xf8, layout.fat_sectors, 32, 64, 0,
+                           layout.sectors if layout.sectors >= 0x10000 else 0)
+        boot += struct.pack('<BBBI11s8s', 0x80, 0, 0x29,
+                            random.randint(0, 0xffffffff),
+                            self._label[:11].ljust(11), 'FAT16   ')
+        self._f.seek(0)
+        self._f.write(boot.ljust(SECTOR_SIZE - 2, '\0') + '\x55\xaa')
+
+
+def write_image(path, files, label, size):
+    """Writes an image of size bytes holding files to path.
+
+    :param files: iterable of (path, data) pairs, the data is written to
+                  the image as it is iterated over
+    :param label: volume label, at most 11 characters
+    :raises ConfigDriveTooLarge: if the files don't fit in the image
+    """
+    root = _Directory()
+    with open(path, 'wb') as f:
+        f.truncate(size)
+        writer = _Writer(f, size, str(label), timeutils.utcnow())
+        for file_path, data in files:
+            if isinstance(data, unicode):
+                data = data.encode('utf-8')
+            names = [name for name in file_path.split('/') if name]
+            directory = root.get_dir(names[:-1])
+            directory.files[names[-1]] = (writer.write_file(data), len(data))
+        writer.write_directories(root)
+        writer.write_tables()
+        writer.write_boot_sector()
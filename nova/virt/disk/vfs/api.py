@@ -24,11 +24,12 @@ LOG = logging.getLogger(__name__)
 class VFS(object):
 
     @staticmethod
-    def instance_for_image(imgfile, imgfmt, partition):
+    def instance_for_image(imgfile, imgfmt, partition, owner=None):
         LOG.debug(_("Instance for image imgfile=%(imgfile)s "
-                    "imgfmt=%(imgfmt)s partition=%(partition)s"),
+                    "imgfmt=%(imgfmt)s partition=%(partition)s "
+                    "owner=%(owner)s"),
                   {'imgfile': imgfile, 'imgfmt': imgfmt,
-                   'partition': partition})
+                   'partition': partition, 'owner': owner})
         hasGuestfs = False
         try:
             LOG.debug(_("Trying to import guestfs"))
@@ -41,7 +42,7 @@ class VFS(object):
             LOG.debug(_("Using primary VFSGuestFS"))
             return importutils.import_object(
                 "nova.virt.disk.vfs.guestfs.VFSGuestFS",
-                imgfile, imgfmt, partition)
+                imgfile, imgfmt, partition, owner)
         else:
             LOG.debug(_("Falling back to VFSLocalFS"))
             return importutils.import_object(
@@ -14,8 +14,10 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+from eventlet import semaphore
 from eventlet import tpool
 import guestfs
+from oslo.config import cfg
 
 from nova import exception
 from nova.openstack.common.gettextutils import _
@@ -24,10 +26,151 @@ from nova.virt.disk.vfs import api as vfs
 from nova.virt.libvirt import driver as libvirt_driver
 
 
+libguestfs_opts = [
+    cfg.IntOpt('libguestfs_appliances',
+               default=0,
+               help='Number of libguestfs appliances kept running to inject '
+                    'data into images, each image is hotplugged into one of '
+                    'them. An appliance only takes the images of the '
+                    'project it was launched for: an image exploiting the '
+                    'appliance could read the data injected into the next '
+                    'ones. Needs libguestfs 1.20 or later and its libvirt '
+                    'attach method. 0 launches an appliance for each image'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(libguestfs_opts)
+
 LOG = logging.getLogger(__name__)
 
 guestfs = None
 
+# Only one image is attached to an appliance at a time
+DRIVE_LABEL = 'image'
+
+_pool = None
+
+
+def _shutdown(handle):
+    try:
+        handle.shutdown()
+    except AttributeError:
+        # Older libguestfs versions haven't an explicit shutdown
+        pass
+    except RuntimeError as e:
+        LOG.warn(_("Failed to shutdown appliance %s"), e)
+
+    try:
+        handle.close()
+    except AttributeError:
+        # Older libguestfs versions haven't an explicit close
+        pass
+    except RuntimeError as e:
+        LOG.warn(_("Failed to close guest handle %s"), e)
+
+
+class AppliancePool(object):
+    """Appliances kept running, which images are hotplugged into.
+
+    An appliance is only given the images of the owner it was launched
+    for.  Once all of them are running, the idle appliance of another
+    owner that was given back first is shut down to launch one.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.configured_size = size
+        self._semaphore = semaphore.Semaphore(size)
+        # (owner, appliance), least recently given back first
+        self._idle = []
+        self._running = 0
+        self._closed = False
+
+    def _launch(self):
+        LOG.debug(_("Launching pooled appliance"))
+        handle = tpool.Proxy(guestfs.GuestFS())
+        try:
+            # Hotplugging needs the libvirt attach method
+            handle.set_attach_method('libvirt:' +
+                                     libvirt_driver.LibvirtDriver.uri())
+            handle.launch()
+        except Exception:
+            _shutdown(handle)
+            raise
+        return handle
+
+    def get(self, owner):
+        """Returns an appliance of owner without drives.
+
+        Waits for one if all of them are in use.
+        """
+        self._semaphore.acquire()
+        try:
+            for i, (idle_owner, handle) in enumerate(self._idle):
+                if idle_owner == owner:
+                    del self._idle[i]
+                    return handle
+            if self._running >= self.size:
+                _idle_owner, handle = self._idle.pop(0)
+                self._running -= 1
+                _shutdown(handle)
+            # Launching yields, so the slot is taken before others look
+            self._running += 1
+            try:
+                return self._launch()
+            except Exception:
+                self._running -= 1
+                raise
+        except Exception:
+            self._semaphore.release()
+            raise
+
+    def put(self, owner, handle):
+        """Gives back an appliance of owner whose drive was removed."""
+        try:
+            if self._closed:
+                self._running -= 1
+                _shutdown(handle)
+            else:
+                self._idle.append((owner, handle))
+        finally:
+            self._semaphore.release()
+
+    def discard(self, handle):
+        """Gives back an appliance in an unknown state, shutting it down."""
+        try:
+            self._running -= 1
+            _shutdown(handle)
+        finally:
+            self._semaphore.release()
+
+    def close(self):
+        """Shuts down the idle appliances, and the others once given back."""
+        self._closed = True
+        while self._idle:
+            _owner, handle = self._idle.pop()
+            self._running -= 1
+            _shutdown(handle)
+
+
+def appliance_pool():
+    """Returns the pool of appliances, None if images get their own."""
+    global _pool
+    size = CONF.libguestfs_appliances
+    if _pool is None or _pool.configured_size != size:
+        if _pool is not None:
+            _pool.close()
+        if size > 0 and not hasattr(guestfs.GuestFS, 'remove_drive'):
+            LOG.warn(_("libguestfs can't hotplug drives, launching an "
+                       "appliance for each image"))
+            _pool = AppliancePool(0)
+        else:
+            _pool = AppliancePool(size)
+        _pool.configured_size = size
+    if _pool.size <= 0:
+        return None
+    return _pool
+
 
 class VFSGuestFS(vfs.VFS):
 
@@ -37,14 +180,17 @@ class VFSGuestFS(vfs.VFS):
     the host filesystem, thus avoiding any potential for symlink
     attacks from the guest filesystem.
     """
-    def __init__(self, imgfile, imgfmt='raw', partition=None):
+    def __init__(self, imgfile, imgfmt='raw', partition=None, owner=None):
         super(VFSGuestFS, self).__init__(imgfile, imgfmt, partition)
+        # Images of the same owner may share pooled appliances
+        self.owner = owner
 
         global guestfs
         if guestfs is None:
             guestfs = __import__('guestfs')
 
         self.handle = None
+        self.pool = None
 
     def setup_os(self):
         if self.partition == -1:
@@ -56,10 +202,13 @@ class VFSGuestFS(vfs.VFS):
         LOG.debug(_("Mount guest OS image %(imgfile)s partition %(part)s"),
                   {'imgfile': self.imgfile, 'part': str(self.partition)})
 
-        if self.partition:
-            self.handle.mount_options("", "/dev/sda%d" % self.partition, "/")
+        if self.pool:
+            device = "/dev/disk/guestfs/" + DRIVE_LABEL
         else:
-            self.handle.mount_options("", "/dev/sda", "/")
+            device = "/dev/sda"
+        if self.partition:
+            device += "%d" % self.partition
+        self.handle.mount_options("", device, "/")
 
     def setup_os_inspect(self):
         LOG.debug(_("Inspecting guest OS image %s"), self.imgfile)
@@ -107,6 +256,11 @@ class VFSGuestFS(vfs.VFS):
                     raise exception.NovaException(msg)
 
     def setup(self):
+        pool = appliance_pool()
+        if pool and self.owner:
+            self.setup_pooled(pool)
+            return
+
         LOG.debug(_("Setting up appliance for %(imgfile)s %(imgfmt)s") %
                   {'imgfile': self.imgfile, 'imgfmt': self.imgfmt})
         self.handle = tpool.Proxy(guestfs.GuestFS())
@@ -131,6 +285,52 @@ class VFSGuestFS(vfs.VFS):
             self.handle = None
             raise
 
+    def setup_pooled(self, pool):
+        LOG.debug(_("Hotplugging %(imgfile)s %(imgfmt)s into a pooled "
+                    "appliance") %
+                  {'imgfile': self.imgfile, 'imgfmt': self.imgfmt})
+        try:
+            self.handle = pool.get(self.owner)
+        except RuntimeError as e:
+            raise exception.NovaException(
+                _("Error launching libguestfs appliance (%s)") % e)
+        self.pool = pool
+
+        try:
+            self.handle.add_drive_opts(self.imgfile, format=self.imgfmt,
+                                       label=DRIVE_LABEL)
+            self.setup_os()
+
+            self.handle.aug_init("/", 0)
+        except RuntimeError as e:
+            self.release_pooled()
+            raise exception.NovaException(
+                _("Error mounting %(imgfile)s with libguestfs (%(e)s)") %
+                {'imgfile': self.imgfile, 'e': e})
+        except Exception:
+            self.release_pooled()
+            raise
+
+    def release_pooled(self):
+        """Removes the image from the appliance, gives it back."""
+        handle = self.handle
+        pool = self.pool
+        self.handle = None
+        self.pool = None
+        try:
+            handle.umount_all()
+            handle.remove_drive(DRIVE_LABEL)
+        except RuntimeError as e:
+            LOG.warn(_("Failed to remove %(imgfile)s from the appliance, "
+                       "shutting it down (%(e)s)"),
+                     {'imgfile': self.imgfile, 'e': e})
+            pool.discard(handle)
+        except Exception:
+            pool.discard(handle)
+            raise
+        else:
+            pool.put(self.owner, handle)
+
     def teardown(self):
         LOG.debug(_("Tearing down appliance"))
 
@@ -140,22 +340,14 @@ class VFSGuestFS(vfs.VFS):
             except RuntimeError as e:
                 LOG.warn(_("Failed to close augeas %s"), e)
 
-            try:
-                self.handle.shutdown()
-            except AttributeError:
-                # Older libguestfs versions haven't an explicit shutdown
-                pass
-            except RuntimeError as e:
-                LOG.warn(_("Failed to shutdown appliance %s"), e)
-
-            try:
-                self.handle.close()
-            except AttributeError:
-                # Older libguestfs versions haven't an explicit close
-                pass
-            except RuntimeError as e:
-                LOG.warn(_("Failed to close guest handle %s"), e)
+            if self.pool:
+                self.release_pooled()
+            else:
+                _shutdown(self.handle)
         finally:
+            if self.pool:
+                self.pool.discard(self.handle)
+                self.pool = None
             # dereference object and implicitly close()
             self.handle = None
 
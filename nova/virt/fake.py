@@ -493,3 +493,9 @@ class FakeVirtAPI(virtapi.VirtAPI):
 
     def instance_type_get(self, context, instance_type_id):
         return db.instance_type_get(context, instance_type_id)
+
+    def action_event_start(self, context, values):
+        return db.action_event_start(context, values)
+
+    def action_event_finish(self, context, values):
+        return db.action_event_finish(context, values)
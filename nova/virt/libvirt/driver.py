@@ -95,6 +95,7 @@ from nova.virt.libvirt import imagebackend
 from nova.virt.libvirt import imagecache
 from nova.virt.libvirt import utils as libvirt_utils
 from nova.virt import netutils
+from nova.virt import stages
 
 native_threading = patcher.original("threading")
 native_Queue = patcher.original("Queue")
@@ -130,6 +131,22 @@ libvirt_opts = [
                 help='The partition to inject to : '
                      '-2 => disable, -1 => inspect (libguestfs only), '
                      '0 => not partitioned, >0 => partition number'),
+    cfg.ListOpt('libvirt_preformatted_ephemeral_sizes',
+                default=[],
+                help='Sizes in GB of the ephemeral disks whose formatted '
+                     'templates are created when the compute service '
+                     'starts, rather than when the first instance with '
+                     'such a disk is spawned'),
+    cfg.ListOpt('libvirt_preformatted_swap_sizes',
+                default=[],
+                help='Sizes in MB of the swap disks whose formatted '
+                     'templates are created when the compute service '
+                     'starts'),
+    cfg.IntOpt('libvirt_create_image_workers',
+               default=4,
+               help='Number of the disks of an instance fetched or created '
+                    'at once when it is spawned, 1 to create them one '
+                    'after the other'),
     cfg.BoolOpt('use_usb_tablet',
                 default=True,
                 help='Sync virtual and real mouse cursors in Windows VMs'),
@@ -201,6 +218,14 @@ libvirt_opts = [
                default='$instances_path/snapshots',
                help='Location where libvirt driver will store snapshots '
                     'before uploading them to image service'),
+    cfg.BoolOpt('libvirt_snapshot_direct_upload',
+                default=False,
+                help='Upload cold snapshots of raw disks from a reflink '
+                     'clone, and of thin LVM volumes from a thin snapshot, '
+                     'instead of extracting them to '
+                     'libvirt_snapshots_directory first. The instance is '
+                     'resumed before the upload. Other snapshots are '
+                     'extracted'),
     cfg.StrOpt('xen_hvmloader_path',
                 default='/usr/lib/xen/boot/hvmloader',
                 help='Location where the Xen hvmloader is kept'),
@@ -286,6 +311,8 @@ MIN_LIBVIRT_LIVESNAPSHOT_VERSION = (1, 0, 0)
 MIN_QEMU_LIVESNAPSHOT_VERSION = (1, 3, 0)
 # block size tuning requirements
 MIN_LIBVIRT_BLOCKIO_VERSION = (0, 10, 2)
+# Domains of the libguestfs appliances that inject data into images
+GUESTFS_DOMAIN_PREFIX = 'guestfs-'
 
 
 def libvirt_error_handler(context, err):
@@ -564,6 +591,55 @@ class LibvirtDriver(driver.ComputeDriver):
 
         self._init_events()
 
+        if (CONF.libvirt_preformatted_ephemeral_sizes or
+                CONF.libvirt_preformatted_swap_sizes):
+            utils.spawn_n(self._preformat_templates)
+
+    @staticmethod
+    def _preformatted_sizes(option):
+        """Returns the valid sizes of an option, logging the others."""
+        sizes = []
+        for value in CONF.get(option):
+            try:
+                size = int(value)
+            except ValueError:
+                size = 0
+            if size > 0:
+                sizes.append(size)
+            else:
+                LOG.warn(_('Ignoring invalid size %(size)r in %(option)s'),
+                         {'size': value, 'option': option})
+        return sizes
+
+    def _preformat_templates(self):
+        """Creates the templates of the ephemeral and swap disks."""
+        backend = self.image_backend.backend()
+        templates = []
+        for ephemeral_gb in self._preformatted_sizes(
+                'libvirt_preformatted_ephemeral_sizes'):
+            fn = functools.partial(self._create_ephemeral,
+                                   fs_label='ephemeral0', os_type=None)
+            templates.append(dict(fetch_func=fn,
+                                  filename='ephemeral_%s_default' %
+                                           ephemeral_gb,
+                                  size=ephemeral_gb * 1024 * 1024 * 1024,
+                                  ephemeral_size=ephemeral_gb))
+        for swap_mb in self._preformatted_sizes(
+                'libvirt_preformatted_swap_sizes'):
+            templates.append(dict(fetch_func=self._create_swap,
+                                  filename='swap_%s' % swap_mb,
+                                  size=swap_mb * 1024 * 1024,
+                                  swap_mb=swap_mb))
+
+        for template in templates:
+            try:
+                backend.cache_template(**template)
+            except Exception:
+                LOG.exception(_('Failed to create template %s'),
+                              template['filename'])
+            else:
+                LOG.debug(_('Template %s is ready'), template['filename'])
+
     def _get_connection(self):
         with self._wrapped_conn_lock:
             wrapped_conn = self._wrapped_conn
@@ -695,6 +771,10 @@ class LibvirtDriver(driver.ComputeDriver):
             return []
         return self._conn.listDomainsID()
 
+    @staticmethod
+    def _is_guestfs_appliance(domain):
+        return domain.name().startswith(GUESTFS_DOMAIN_PREFIX)
+
     def list_instances(self):
         names = []
         for domain_id in self.list_instance_ids():
@@ -702,7 +782,8 @@ class LibvirtDriver(driver.ComputeDriver):
                 # We skip domains with ID 0 (hypervisors).
                 if domain_id != 0:
                     domain = self._lookup_by_id(domain_id)
-                    names.append(domain.name())
+                    if not self._is_guestfs_appliance(domain):
+                        names.append(domain.name())
             except exception.InstanceNotFound:
                 # Ignore deleted instance while listing
                 continue
@@ -720,7 +801,8 @@ class LibvirtDriver(driver.ComputeDriver):
                 # We skip domains with ID 0 (hypervisors).
                 if domain_id != 0:
                     domain = self._lookup_by_id(domain_id)
-                    uuids.add(domain.UUIDString())
+                    if not self._is_guestfs_appliance(domain):
+                        uuids.add(domain.UUIDString())
             except exception.InstanceNotFound:
                 # Ignore deleted instance while listing
                 continue
@@ -1308,6 +1390,7 @@ class LibvirtDriver(driver.ComputeDriver):
                 snapshot_name,
                 image_type=source_format)
 
+        upload_path = None
         if live_snapshot:
             LOG.info(_("Beginning live snapshot process"),
                      instance=instance)
@@ -1315,8 +1398,30 @@ class LibvirtDriver(driver.ComputeDriver):
             LOG.info(_("Beginning cold snapshot process"),
                      instance=instance)
             snapshot_backend.snapshot_create()
+            if CONF.libvirt_snapshot_direct_upload:
+                try:
+                    upload_path = snapshot_backend.snapshot_upload_path(
+                        image_format)
+                except Exception:
+                    with excutils.save_and_reraise_exception():
+                        snapshot_backend.snapshot_delete()
+                        self._resume_after_snapshot(virt_dom, state)
+                if upload_path:
+                    # The snapshot doesn't change with the disk anymore
+                    self._resume_after_snapshot(virt_dom, state)
 
         update_task_state(task_state=task_states.IMAGE_PENDING_UPLOAD)
+        if upload_path:
+            try:
+                LOG.info(_("Beginning direct snapshot upload"),
+                         instance=instance)
+                self._upload_snapshot(context, instance, image_service,
+                                      image_href, metadata, upload_path,
+                                      update_task_state, extracted=False)
+            finally:
+                snapshot_backend.snapshot_delete()
+            return
+
         snapshot_directory = CONF.libvirt_snapshots_directory
         fileutils.ensure_tree(snapshot_directory)
         with utils.tempdir(dir=snapshot_directory) as tmpdir:
@@ -1333,28 +1438,52 @@ class LibvirtDriver(driver.ComputeDriver):
             finally:
                 if not live_snapshot:
                     snapshot_backend.snapshot_delete()
-                # NOTE(dkang): because previous managedSave is not called
-                #              for LXC, _create_domain must not be called.
-                if CONF.libvirt_type != 'lxc' and not live_snapshot:
-                    if state == power_state.RUNNING:
-                        self._create_domain(domain=virt_dom)
-                    elif state == power_state.PAUSED:
-                        self._create_domain(domain=virt_dom,
-                                launch_flags=libvirt.VIR_DOMAIN_START_PAUSED)
-                LOG.info(_("Snapshot extracted, beginning image upload"),
-                         instance=instance)
+                    self._resume_after_snapshot(virt_dom, state)
+            LOG.info(_("Snapshot extracted, beginning image upload"),
+                     instance=instance)
 
-            # Upload that image to the image service
+            self._upload_snapshot(context, instance, image_service,
+                                  image_href, metadata, out_path,
+                                  update_task_state, extracted=True)
 
-            update_task_state(task_state=task_states.IMAGE_UPLOADING,
-                     expected_state=task_states.IMAGE_PENDING_UPLOAD)
-            with libvirt_utils.file_open(out_path) as image_file:
-                image_service.update(context,
-                                     image_href,
-                                     metadata,
-                                     image_file)
-                LOG.info(_("Snapshot image upload complete"),
-                         instance=instance)
+    def _resume_after_snapshot(self, virt_dom, state):
+        """Restarts a domain saved for a cold snapshot."""
+        # NOTE(dkang): because previous managedSave is not called
+        #              for LXC, _create_domain must not be called.
+        if CONF.libvirt_type == 'lxc':
+            return
+        if state == power_state.RUNNING:
+            self._create_domain(domain=virt_dom)
+        elif state == power_state.PAUSED:
+            self._create_domain(domain=virt_dom,
+                    launch_flags=libvirt.VIR_DOMAIN_START_PAUSED)
+
+    def _upload_snapshot(self, context, instance, image_service, image_href,
+                         metadata, path, update_task_state, extracted):
+        """Uploads the snapshot at path to the image service.
+
+        :param extracted: whether the snapshot was extracted to path, which
+                          then took as much temporary space as it is large
+        """
+        update_task_state(task_state=task_states.IMAGE_UPLOADING,
+                 expected_state=task_states.IMAGE_PENDING_UPLOAD)
+        start = time.time()
+        with libvirt_utils.file_open(path) as image_file:
+            image_file.seek(0, os.SEEK_END)
+            size = image_file.tell()
+            image_file.seek(0)
+            image_service.update(context,
+                                 image_href,
+                                 metadata,
+                                 image_file)
+        elapsed = max(time.time() - start, 0.001)
+        LOG.info(_("Snapshot image upload complete, %(size)d MB in "
+                   "%(seconds).1fs (%(rate).1f MB/s), %(temp_size)d MB of "
+                   "temporary space"),
+                 {'size': size / (1024 * 1024), 'seconds': elapsed,
+                  'rate': size / (1024 * 1024.0) / elapsed,
+                  'temp_size': size / (1024 * 1024) if extracted else 0},
+                 instance=instance)
 
     @staticmethod
     def _wait_for_block_job(domain, disk_path):
@@ -1873,7 +2002,8 @@ class LibvirtDriver(driver.ComputeDriver):
     @staticmethod
     def _create_swap(target, swap_mb):
         """Create a swap file of specified size."""
-        libvirt_utils.create_image('raw', target, '%dM' % swap_mb)
+        if not CONF.libvirt_images_type == "lvm":
+            libvirt_utils.create_image('raw', target, '%dM' % swap_mb)
         utils.mkfs('swap', target)
 
     @staticmethod
@@ -1927,22 +2057,32 @@ class LibvirtDriver(driver.ComputeDriver):
                            'kernel_id': instance['kernel_id'],
                            'ramdisk_id': instance['ramdisk_id']}
 
+        # The disks are fetched or created concurrently, only injecting
+        # files waits for the root disk
+        pipeline = stages.Pipeline(context, self.virtapi, instance,
+                                   'libvirt_create_image_',
+                                   workers=CONF.libvirt_create_image_workers)
+
         if disk_images['kernel_id']:
             fname = imagecache.get_cache_fname(disk_images, 'kernel_id')
-            raw('kernel').cache(fetch_func=libvirt_utils.fetch_image,
-                                context=context,
-                                filename=fname,
-                                image_id=disk_images['kernel_id'],
-                                user_id=instance['user_id'],
-                                project_id=instance['project_id'])
+            pipeline.add('kernel', functools.partial(
+                raw('kernel').cache,
+                fetch_func=libvirt_utils.fetch_image,
+                context=context,
+                filename=fname,
+                image_id=disk_images['kernel_id'],
+                user_id=instance['user_id'],
+                project_id=instance['project_id']))
             if disk_images['ramdisk_id']:
                 fname = imagecache.get_cache_fname(disk_images, 'ramdisk_id')
-                raw('ramdisk').cache(fetch_func=libvirt_utils.fetch_image,
-                                     context=context,
-                                     filename=fname,
-                                     image_id=disk_images['ramdisk_id'],
-                                     user_id=instance['user_id'],
-                                     project_id=instance['project_id'])
+                pipeline.add('ramdisk', functools.partial(
+                    raw('ramdisk').cache,
+                    fetch_func=libvirt_utils.fetch_image,
+                    context=context,
+                    filename=fname,
+                    image_id=disk_images['ramdisk_id'],
+                    user_id=instance['user_id'],
+                    project_id=instance['project_id']))
 
         inst_type = flavors.extract_flavor(instance)
 
@@ -1956,13 +2096,15 @@ class LibvirtDriver(driver.ComputeDriver):
             if size == 0 or suffix == '.rescue':
                 size = None
 
-            image('disk').cache(fetch_func=libvirt_utils.fetch_image,
-                                context=context,
-                                filename=root_fname,
-                                size=size,
-                                image_id=disk_images['image_id'],
-                                user_id=instance['user_id'],
-                                project_id=instance['project_id'])
+            pipeline.add('disk', functools.partial(
+                image('disk').cache,
+                fetch_func=libvirt_utils.fetch_image,
+                context=context,
+                filename=root_fname,
+                size=size,
+                image_id=disk_images['image_id'],
+                user_id=instance['user_id'],
+                project_id=instance['project_id']))
 
         # Lookup the filesystem type if required
         os_type_with_default = instance['os_type']
@@ -1976,10 +2118,12 @@ class LibvirtDriver(driver.ComputeDriver):
                                    os_type=instance["os_type"])
             fname = "ephemeral_%s_%s" % (ephemeral_gb, os_type_with_default)
             size = ephemeral_gb * 1024 * 1024 * 1024
-            image('disk.local').cache(fetch_func=fn,
-                                      filename=fname,
-                                      size=size,
-                                      ephemeral_size=ephemeral_gb)
+            pipeline.add('disk.local', functools.partial(
+                image('disk.local').cache,
+                fetch_func=fn,
+                filename=fname,
+                size=size,
+                ephemeral_size=ephemeral_gb))
 
         for eph in driver.block_device_info_get_ephemerals(block_device_info):
             fn = functools.partial(self._create_ephemeral,
@@ -1987,11 +2131,12 @@ class LibvirtDriver(driver.ComputeDriver):
                                    os_type=instance["os_type"])
             size = eph['size'] * 1024 * 1024 * 1024
             fname = "ephemeral_%s_%s" % (eph['size'], os_type_with_default)
-            image(blockinfo.get_eph_disk(eph)).cache(
+            pipeline.add(blockinfo.get_eph_disk(eph), functools.partial(
+                image(blockinfo.get_eph_disk(eph)).cache,
                 fetch_func=fn,
                 filename=fname,
                 size=size,
-                ephemeral_size=eph['size'])
+                ephemeral_size=eph['size']))
 
         if 'disk.swap' in disk_mapping:
             mapping = disk_mapping['disk.swap']
@@ -2007,10 +2152,12 @@ class LibvirtDriver(driver.ComputeDriver):
 
             if swap_mb > 0:
                 size = swap_mb * 1024 * 1024
-                image('disk.swap').cache(fetch_func=self._create_swap,
-                                         filename="swap_%s" % swap_mb,
-                                         size=size,
-                                         swap_mb=swap_mb)
+                pipeline.add('disk.swap', functools.partial(
+                    image('disk.swap').cache,
+                    fetch_func=self._create_swap,
+                    filename="swap_%s" % swap_mb,
+                    size=size,
+                    swap_mb=swap_mb))
 
         # Config drive
         if configdrive.required_by(instance):
@@ -2019,20 +2166,25 @@ class LibvirtDriver(driver.ComputeDriver):
             if admin_pass:
                 extra_md['admin_pass'] = admin_pass
 
-            inst_md = instance_metadata.InstanceMetadata(instance,
-                content=files, extra_md=extra_md, network_info=network_info)
-            with configdrive.ConfigDriveBuilder(instance_md=inst_md) as cdb:
-                configdrive_path = basepath(fname='disk.config')
-                LOG.info(_('Creating config drive at %(path)s'),
-                         {'path': configdrive_path}, instance=instance)
+            def make_config_drive():
+                inst_md = instance_metadata.InstanceMetadata(instance,
+                    content=files, extra_md=extra_md,
+                    network_info=network_info)
+                with configdrive.ConfigDriveBuilder(
+                        instance_md=inst_md) as cdb:
+                    configdrive_path = basepath(fname='disk.config')
+                    LOG.info(_('Creating config drive at %(path)s'),
+                             {'path': configdrive_path}, instance=instance)
 
-                try:
-                    cdb.make_drive(configdrive_path)
-                except processutils.ProcessExecutionError as e:
-                    with excutils.save_and_reraise_exception():
-                        LOG.error(_('Creating config drive failed '
-                                  'with error: %s'),
-                                  e, instance=instance)
+                    try:
+                        cdb.make_drive(configdrive_path)
+                    except processutils.ProcessExecutionError as e:
+                        with excutils.save_and_reraise_exception():
+                            LOG.error(_('Creating config drive failed '
+                                      'with error: %s'),
+                                      e, instance=instance)
+
+            pipeline.add('disk.config', make_config_drive)
 
         # File injection
         elif CONF.libvirt_inject_partition != -2:
@@ -2071,18 +2223,27 @@ class LibvirtDriver(driver.ComputeDriver):
                                    '%(img_id)s'),
                                  {'inj': inj, 'img_id': img_id},
                                  instance=instance)
-                try:
-                    disk.inject_data(injection_path,
-                                     key, net, metadata, admin_pass, files,
-                                     partition=target_partition,
-                                     use_cow=CONF.use_cow_images,
-                                     mandatory=('files',))
-                except Exception as e:
-                    with excutils.save_and_reraise_exception():
-                        LOG.error(_('Error injecting data into image '
-                                    '%(img_id)s (%(e)s)'),
-                                  {'img_id': img_id, 'e': e},
-                                  instance=instance)
+
+                def inject():
+                    try:
+                        disk.inject_data(injection_path,
+                                         key, net, metadata, admin_pass,
+                                         files,
+                                         partition=target_partition,
+                                         use_cow=CONF.use_cow_images,
+                                         mandatory=('files',),
+                                         owner=instance['project_id'])
+                    except Exception as e:
+                        with excutils.save_and_reraise_exception():
+                            LOG.error(_('Error injecting data into image '
+                                        '%(img_id)s (%(e)s)'),
+                                      {'img_id': img_id, 'e': e},
+                                      instance=instance)
+
+                requires = () if booted_from_volume else ('disk',)
+                pipeline.add('inject', inject, requires=requires)
+
+        pipeline.run()
 
         if CONF.libvirt_type == 'uml':
             libvirt_utils.chown(image('disk').path, 'root')
@@ -2670,6 +2831,8 @@ class LibvirtDriver(driver.ComputeDriver):
         for dom_id in self.list_instance_ids():
             try:
                 domain = self._lookup_by_id(dom_id)
+                if self._is_guestfs_appliance(domain):
+                    continue
                 doc = etree.fromstring(domain.XMLDesc(0))
             except exception.InstanceNotFound:
                 LOG.info(_("libvirt can't find a domain with id: %s") % dom_id)
@@ -2856,6 +3019,8 @@ class LibvirtDriver(driver.ComputeDriver):
         for dom_id in dom_ids:
             try:
                 dom = self._lookup_by_id(dom_id)
+                if self._is_guestfs_appliance(dom):
+                    continue
                 vcpus = dom.vcpus()
                 if vcpus is None:
                     LOG.debug(_("couldn't obtain the vpu count from domain id:"
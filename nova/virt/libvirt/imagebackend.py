@@ -26,6 +26,7 @@ from nova.openstack.common import excutils
 from nova.openstack.common import fileutils
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import log as logging
+from nova.openstack.common import processutils
 from nova import utils
 from nova.virt.disk import api as disk
 from nova.virt import images
@@ -49,6 +50,11 @@ __imagebackend_opts = [
                default=1000,
                help='The amount of storage (in megabytes) to allocate for LVM'
                     ' snapshot copy-on-write blocks.'),
+    cfg.StrOpt('libvirt_images_thin_pool',
+               help='Thin pool of libvirt_images_volume_group. If set, the'
+                    ' root disks of LVM images are thin volumes of the pool,'
+                    ' and their ephemeral and swap disks thin snapshots of'
+                    ' formatted templates.'),
         ]
 
 CONF = cfg.CONF
@@ -59,6 +65,11 @@ CONF.import_opt('preallocate_images', 'nova.virt.driver')
 LOG = logging.getLogger(__name__)
 
 
+def _generated(kwargs):
+    """Whether the image is created from scratch rather than fetched."""
+    return 'ephemeral_size' in kwargs or 'swap_mb' in kwargs
+
+
 class Image(object):
     __metaclass__ = abc.ABCMeta
 
@@ -139,25 +150,57 @@ class Image(object):
         :filename: Name of the file in the image directory
         :size: Size of created image in bytes (optional)
         """
-        @utils.synchronized(filename, external=True, lock_path=self.lock_path)
+        call_if_not_exists = self._prepare_template(fetch_func, filename,
+                                                    self.lock_path)
+        base = self._base_path(filename)
+
+        if not os.path.exists(self.path) or not os.path.exists(base):
+            self.create_image(call_if_not_exists, base, size,
+                              *args, **kwargs)
+
+        if size and self.preallocate and self._can_fallocate():
+            utils.execute('fallocate', '-n', '-l', size, self.path)
+
+    @staticmethod
+    def _prepare_template(fetch_func, filename, lock_path):
+        @utils.synchronized(filename, external=True, lock_path=lock_path)
         def call_if_not_exists(target, *args, **kwargs):
             if not os.path.exists(target):
                 fetch_func(target=target, *args, **kwargs)
-            elif CONF.libvirt_images_type == "lvm" and \
-                    'ephemeral_size' in kwargs:
+            elif CONF.libvirt_images_type == "lvm" and _generated(kwargs):
                 fetch_func(target=target, *args, **kwargs)
+        return call_if_not_exists
 
+    @staticmethod
+    def _base_path(filename):
         base_dir = os.path.join(CONF.instances_path, CONF.base_dir_name)
         if not os.path.exists(base_dir):
             fileutils.ensure_tree(base_dir)
-        base = os.path.join(base_dir, filename)
+        return os.path.join(base_dir, filename)
 
-        if not os.path.exists(self.path) or not os.path.exists(base):
-            self.create_image(call_if_not_exists, base, size,
-                              *args, **kwargs)
+    @classmethod
+    def cache_template(cls, fetch_func, filename, size, *args, **kwargs):
+        """Creates the template of generated images ahead of time.
 
-        if size and self.preallocate and self._can_fallocate():
-            utils.execute('fallocate', '-n', '-l', size, self.path)
+        :fetch_func: Function that formats the template, as for cache()
+        :filename: Name of the template in the image directory
+        :size: Size of the images created from the template in bytes
+        """
+        lock_path = os.path.join(CONF.instances_path, 'locks')
+        cls.create_template(cls._prepare_template(fetch_func, filename,
+                                                  lock_path),
+                            cls._base_path(filename), size, *args, **kwargs)
+
+    @classmethod
+    def create_template(cls, prepare_template, base, size, *args, **kwargs):
+        """Create the template of generated images.
+
+        :prepare_template: function, that creates template.
+        Should accept `target` argument.
+        :base: Template name
+        :size: Size of the images created from the template in bytes
+        """
+        prepare_template(target=base, *args, **kwargs)
 
     def _can_fallocate(self):
         """Check once per class, whether fallocate(1) is available,
@@ -181,6 +224,17 @@ class Image(object):
     def snapshot_extract(self, target, out_format):
         raise NotImplementedError()
 
+    def snapshot_upload_path(self, out_format):
+        """Returns a path the snapshot can be uploaded from as it is.
+
+        The path is a copy-on-write view of the snapshot in out_format
+        that takes no space up front and that writes to the disk can't
+        invalidate, so the instance can resume while it is uploaded.
+        snapshot_delete removes it.  None means the snapshot has to be
+        extracted instead.
+        """
+        return None
+
     def snapshot_delete(self):
         raise NotImplementedError()
 
@@ -211,8 +265,12 @@ class Raw(Image):
 
         generating = 'image_id' not in kwargs
         if generating:
-            #Generating image in place
-            prepare_template(target=self.path, *args, **kwargs)
+            # Cloning the formatted template shares its blocks where the
+            # file system supports it
+            prepare_template(target=base, *args, **kwargs)
+            if not os.path.exists(self.path):
+                with fileutils.remove_path_on_error(self.path):
+                    libvirt_utils.clone_image(base, self.path)
         else:
             prepare_template(target=base, *args, **kwargs)
             if not os.path.exists(self.path):
@@ -226,8 +284,26 @@ class Raw(Image):
     def snapshot_extract(self, target, out_format):
         images.convert_image(self.path, target, out_format)
 
+    def _snapshot_clone_path(self):
+        return '%s.%s' % (self.path, self.snapshot_name)
+
+    def snapshot_upload_path(self, out_format):
+        if out_format != 'raw':
+            return None
+        clone_path = self._snapshot_clone_path()
+        try:
+            libvirt_utils.reflink_image(self.path, clone_path)
+        except processutils.ProcessExecutionError as e:
+            # Cloning would copy the disk, like extracting it does
+            LOG.debug(_('Unable to reflink %(path)s, extracting its '
+                        'snapshot: %(error)s'),
+                      {'path': self.path, 'error': e})
+            fileutils.delete_if_exists(clone_path)
+            return None
+        return clone_path
+
     def snapshot_delete(self):
-        pass
+        fileutils.delete_if_exists(self._snapshot_clone_path())
 
 
 class Qcow2(Image):
@@ -319,6 +395,7 @@ class Lvm(Image):
             info = libvirt_utils.logical_volume_info(path)
             self.vg = info['VG']
             self.lv = info['LV']
+            self.thin = bool(info.get('Pool'))
             self.path = path
         else:
             if not CONF.libvirt_images_volume_group:
@@ -329,6 +406,7 @@ class Lvm(Image):
             self.lv = '%s_%s' % (self.escape(instance['name']),
                                  self.escape(disk_name))
             self.path = os.path.join('/dev', self.vg, self.lv)
+            self.thin = False
 
         # TODO(pbrady): possibly deprecate libvirt_sparse_logical_volumes
         # for the more general preallocate_images
@@ -349,16 +427,24 @@ class Lvm(Image):
             base_size = disk.get_disk_size(base)
             resize = size > base_size
             size = size if resize else base_size
-            libvirt_utils.create_lvm_image(self.vg, self.lv,
-                                           size, sparse=self.sparse)
+            if CONF.libvirt_images_thin_pool:
+                libvirt_utils.create_thin_volume(
+                    self.vg, CONF.libvirt_images_thin_pool, self.lv, size)
+            else:
+                libvirt_utils.create_lvm_image(self.vg, self.lv,
+                                               size, sparse=self.sparse)
             images.convert_image(base, self.path, 'raw', run_as_root=True)
             if resize:
                 disk.resize2fs(self.path, run_as_root=True)
 
-        generated = 'ephemeral_size' in kwargs
+        generated = _generated(kwargs)
 
+        if generated and size and CONF.libvirt_images_thin_pool:
+            template = self._create_thin_template(prepare_template, base,
+                                                  size, *args, **kwargs)
+            libvirt_utils.create_thin_snapshot(self.vg, template, self.lv)
         #Generate images with specified size right on volume
-        if generated and size:
+        elif generated and size:
             libvirt_utils.create_lvm_image(self.vg, self.lv,
                                            size, sparse=self.sparse)
             with self.remove_volume_on_error(self.path):
@@ -368,8 +454,36 @@ class Lvm(Image):
             with self.remove_volume_on_error(self.path):
                 create_lvm_image(base, size)
 
+    @classmethod
+    def create_template(cls, prepare_template, base, size, *args, **kwargs):
+        # Without a thin pool the images are formatted in place
+        if CONF.libvirt_images_thin_pool:
+            cls._create_thin_template(prepare_template, base, size,
+                                      *args, **kwargs)
+
+    @classmethod
+    def _create_thin_template(cls, prepare_template, base, size,
+                              *args, **kwargs):
+        """Creates the template volume unless it exists, returns its name."""
+        vg = CONF.libvirt_images_volume_group
+        lv = 'template_%s' % cls.escape(os.path.basename(base))
+        path = os.path.join('/dev', vg, lv)
+        lock_path = os.path.join(CONF.instances_path, 'locks')
+
+        @utils.synchronized(base, external=True, lock_path=lock_path)
+        def create_thin_template():
+            if not os.path.exists(path):
+                libvirt_utils.create_thin_volume(
+                    vg, CONF.libvirt_images_thin_pool, lv, size)
+                with cls.remove_volume_on_error(path):
+                    prepare_template(target=path, *args, **kwargs)
+
+        create_thin_template()
+        return lv
+
+    @staticmethod
     @contextlib.contextmanager
-    def remove_volume_on_error(self, path):
+    def remove_volume_on_error(path):
         try:
             yield
         except Exception:
@@ -377,6 +491,10 @@ class Lvm(Image):
                 libvirt_utils.remove_logical_volumes(path)
 
     def snapshot_create(self):
+        if self.thin:
+            libvirt_utils.create_thin_snapshot(self.vg, self.lv,
+                                               self.snapshot_name)
+            return
         size = CONF.libvirt_lvm_snapshot_size
         cmd = ('lvcreate', '-L', size, '-s', '--name', self.snapshot_name,
                self.path)
@@ -386,6 +504,15 @@ class Lvm(Image):
         images.convert_image(self.snapshot_path, target, out_format,
                              run_as_root=True)
 
+    def snapshot_upload_path(self, out_format):
+        # Writes to the origin of a classic snapshot fill its fixed copy
+        # on write area, thin snapshots allocate from the pool as needed
+        if out_format != 'raw' or not self.thin:
+            return None
+        # The snapshot volume is removed once uploaded
+        libvirt_utils.chown(self.snapshot_path, os.getuid())
+        return self.snapshot_path
+
     def snapshot_delete(self):
         # NOTE (rmk): Snapshot volumes are automatically zeroed by LVM
         cmd = ('lvremove', '-f', self.snapshot_path)
@@ -258,6 +258,33 @@ def create_lvm_image(vg, lv, size, sparse=False):
     execute(*cmd, run_as_root=True, attempts=3)
 
 
+def create_thin_volume(vg, pool, lv, size):
+    """Create a thin logical volume.
+
+    :param vg: existing volume group which holds the thin pool
+    :param pool: existing thin pool of the volume group
+    :param lv: name for the volume
+    :size: virtual size of the volume in bytes
+    """
+    execute('lvcreate', '-V', '%db' % size, '-T', '%s/%s' % (vg, pool),
+            '-n', lv, run_as_root=True, attempts=3)
+
+
+def create_thin_snapshot(vg, origin, lv):
+    """Create a writable snapshot of a thin logical volume.
+
+    The snapshot shares the blocks of its origin, so it is created in
+    constant time whatever the size of the origin.
+
+    :param vg: volume group which holds the origin
+    :param origin: existing thin logical volume
+    :param lv: name for the snapshot
+    """
+    # Thin snapshots are skipped when activating by default
+    execute('lvcreate', '-s', '-kn', '-n', lv, '%s/%s' % (vg, origin),
+            run_as_root=True, attempts=3)
+
+
 def get_volume_group_info(vg):
     """Return free/used/total space info for a volume group in bytes
 
@@ -421,6 +448,31 @@ def get_disk_backing_file(path, basename=True):
     return backing_file
 
 
+def clone_image(src, dest):
+    """Clone a disk image to a local path
+
+    The clone shares the blocks of the source where the file system
+    supports it, otherwise the source is copied sparsely.
+
+    :param src: Source image
+    :param dest: Destination path
+    """
+    execute('cp', '--reflink=auto', '--sparse=always', src, dest)
+
+
+def reflink_image(src, dest):
+    """Clone a disk image sharing all the blocks of the source
+
+    Fails on file systems that can't share blocks between files, the
+    clone then takes no space and is independent of later writes to
+    the source.
+
+    :param src: Source image
+    :param dest: Destination path
+    """
+    execute('cp', '--reflink=always', src, dest)
+
+
 def copy_image(src, dest, host=None):
     """Copy a disk image to an existing directory
 
@@ -0,0 +1,142 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Runs the independent stages of preparing an instance concurrently.
+
+Each stage runs in a green thread once the stages it requires are done,
+with at most a given number of them running at once.  The start and the
+end of each stage are recorded as events of the instance action of the
+request, so that the time each one took shows in the action.
+"""
+
+import sys
+import time
+
+from eventlet import greenpool
+from eventlet import queue
+
+from nova.compute import utils as compute_utils
+from nova import exception
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class Pipeline(object):
+    """Stages of an instance, run in order of their requirements."""
+
+    def __init__(self, context, virtapi, instance, event_prefix, workers=1):
+        self._context = context
+        self._virtapi = virtapi
+        self._instance = instance
+        self._event_prefix = event_prefix
+        self._workers = max(workers, 1)
+        # (name, function, names of the stages required), in the order
+        # they were added
+        self._stages = []
+        self.timings = {}
+
+    def add(self, name, func, requires=()):
+        """Adds a stage calling func once the stages required are done."""
+        names = set([stage[0] for stage in self._stages])
+        if name in names:
+            raise ValueError(_('Stage %s added twice') % name)
+        for required in requires:
+            if required not in names:
+                raise ValueError(_('Stage %(name)s requires %(required)s, '
+                                   'which was not added before it') %
+                                 {'name': name, 'required': required})
+        self._stages.append((name, func, tuple(requires)))
+
+    def _report(self, method, pack, event_name, *args):
+        try:
+            method(self._context, pack(self._context, self._instance['uuid'],
+                                       event_name, *args))
+        except exception.InstanceActionNotFound:
+            # Not every operation preparing an instance records an action
+            pass
+        except Exception:
+            LOG.exception(_('Failed to record event %s'), event_name,
+                          instance=self._instance)
+
+    def _run_stage(self, name, func):
+        event_name = self._event_prefix + name
+        self._report(self._virtapi.action_event_start,
+                     compute_utils.pack_action_event_start, event_name)
+        start = time.time()
+        try:
+            func()
+        except Exception:
+            exc_info = sys.exc_info()
+            self.timings[name] = time.time() - start
+            self._report(self._virtapi.action_event_finish,
+                         compute_utils.pack_action_event_finish, event_name,
+                         exc_info[1], exc_info[2])
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+        self.timings[name] = time.time() - start
+        LOG.debug(_('Stage %(stage)s took %(seconds).2fs'),
+                  {'stage': name, 'seconds': self.timings[name]},
+                  instance=self._instance)
+        self._report(self._virtapi.action_event_finish,
+                     compute_utils.pack_action_event_finish, event_name)
+
+    def _run_stage_in_thread(self, name, func, finished):
+        try:
+            self._run_stage(name, func)
+        except Exception:
+            finished.put((name, sys.exc_info()))
+        else:
+            finished.put((name, None))
+
+    def run(self):
+        """Runs the stages, returns once all of them are done.
+
+        Once a stage fails no other stage is started, the ones running
+        are waited for and the first failure is raised.
+        """
+        pool = greenpool.GreenPool(self._workers)
+        finished = queue.LightQueue()
+        pending = list(self._stages)
+        done = set()
+        running = 0
+        failure = None
+        while pending or running:
+            if failure is None:
+                for stage in list(pending):
+                    if running >= self._workers:
+                        break
+                    name, func, requires = stage
+                    if done.issuperset(requires):
+                        pending.remove(stage)
+                        running += 1
+                        pool.spawn_n(self._run_stage_in_thread, name, func,
+                                     finished)
+            if not running:
+                break
+
+            name, exc_info = finished.get()
+            running -= 1
+            if exc_info is None:
+                done.add(name)
+            elif failure is None:
+                failure = exc_info
+            else:
+                LOG.error(_('Stage %(stage)s failed too: %(error)s'),
+                          {'stage': name, 'error': exc_info[1]},
+                          instance=self._instance)
+
+        if failure is not None:
+            raise failure[0], failure[1], failure[2]
@@ -90,3 +90,17 @@ class VirtAPI(object):
         :param instance_type_id: the id of the instance type in question
         """
         raise NotImplementedError()
+
+    def action_event_start(self, context, values):
+        """Record the start of an event of an instance action
+        :param context: security context
+        :param values: dict of the event, with the request_id of the action
+        """
+        raise NotImplementedError()
+
+    def action_event_finish(self, context, values):
+        """Record the end of an event of an instance action
+        :param context: security context
+        :param values: dict of the event, with the request_id of the action
+        """
+        raise NotImplementedError()